@@ -1,6 +1,6 @@
-import math
 import json
 import os
+import rti_python.ADCP.Predictor.Sweep as Sweep
 
 def calculate_storage_amount(**kwargs):
     """
@@ -214,23 +214,10 @@ def _calculate_storage_amount(_CEOUTPUT_, _CWPBN_, _Beams_,
     :return: Number of bytes required for the given deployment.
     """
 
-    ensembleSize = _calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_,
-                                           IsE0000001, IsE0000002,
-                                           IsE0000003, IsE0000004,
-                                           IsE0000005, IsE0000006,
-                                           IsE0000007, IsE0000008,
-                                           IsE0000009, IsE0000010,
-                                           IsE0000011, IsE0000012,
-                                           IsE0000013, IsE0000014,
-                                           IsE0000015)
-
-    # Number of Ensembles
-    if _CEI_ != 0:
-        ensembles = round(_DeploymentDuration_ * 24 * 3600 / _CEI_)
-    else:
-        ensembles = 0
-
-    return ensembles * ensembleSize
+    return int(Sweep._calculate_storage_amount(_CEOUTPUT_, _CWPBN_, _Beams_, _DeploymentDuration_, _CEI_, IsE0000001,
+                                               IsE0000002, IsE0000003, IsE0000004, IsE0000005, IsE0000006, IsE0000007,
+                                               IsE0000008, IsE0000009, IsE0000010, IsE0000011, IsE0000012, IsE0000013,
+                                               IsE0000014, IsE0000015))
 
 
 def _calculate_burst_storage_amount(_CEOUTPUT_, _CBI_NumEns_,
@@ -270,22 +257,11 @@ def _calculate_burst_storage_amount(_CEOUTPUT_, _CBI_NumEns_,
     :return: Number of bytes required for the given waves deployment.
     """
 
-    # Number of bytes per ensemble
-    ensemble_size = _calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_, IsE0000001, IsE0000002, IsE0000003, IsE0000004, IsE0000005,
-                                   IsE0000006, IsE0000007, IsE0000008, IsE0000009, IsE0000010, IsE0000011, IsE0000012,
-                                   IsE0000013, IsE0000014, IsE0000015)
-
-    # Memory per burst
-    burst_mem = _CBI_NumEns_ * ensemble_size
-
-    # Get the number of burst per deployment duration
-    # Seconds for the deployment duration
-    deployment_dur = _DeploymentDuration_ * 3600.0 * 24.0
-
-    # Divide total duration by burst duration to get number of burst in the deployment
-    num_bursts = round(deployment_dur / _CBI_BurstInterval_)
-
-    return burst_mem * num_bursts
+    return int(Sweep._calculate_burst_storage_amount(_CEOUTPUT_, _CBI_NumEns_, _CBI_BurstInterval_, _CWPBN_, _Beams_,
+                                                     _DeploymentDuration_, IsE0000001, IsE0000002, IsE0000003, IsE0000004,
+                                                     IsE0000005, IsE0000006, IsE0000007, IsE0000008, IsE0000009,
+                                                     IsE0000010, IsE0000011, IsE0000012, IsE0000013, IsE0000014,
+                                                     IsE0000015))
 
 
 def _calculate_ensemble_size(_CEOUTPUT_,
@@ -320,218 +296,9 @@ def _calculate_ensemble_size(_CEOUTPUT_,
     :return: Number of bytes for the ensemble.
     """
 
-    if _CEOUTPUT_ == "RTB":
-        return _calculate_rtb_ensemble_size(_CWPBN_, _Beams_,
-                                             IsE0000001, IsE0000002, IsE0000003,
-                                             IsE0000004, IsE0000005, IsE0000006,
-                                             IsE0000007, IsE0000008, IsE0000009,
-                                             IsE0000010, IsE0000011, IsE0000012,
-                                             IsE0000013, IsE0000014, IsE0000015)
-
-    else:
-        return _calculate_pd0_ensemble_size(_CWPBN_, _Beams_,
-                                             IsE0000001, IsE0000002, IsE0000003,
-                                             IsE0000004, IsE0000005, IsE0000006,
-                                             IsE0000007, IsE0000008, IsE0000009,
-                                             IsE0000010, IsE0000011, IsE0000012,
-                                             IsE0000013, IsE0000014, IsE0000015)
-
-
-def _calculate_rtb_ensemble_size(_CWPBN_, _Beams_,
-                                 IsE0000001, IsE0000002, IsE0000003,
-                                 IsE0000004, IsE0000005, IsE0000006,
-                                 IsE0000007, IsE0000008, IsE0000009,
-                                 IsE0000010, IsE0000011, IsE0000012,
-                                 IsE0000013, IsE0000014, IsE0000015):
-    """
-    Calculate the number of bytes for the RTB ensemble based off the parameters.
-    Value given in bytes.
-
-    :param _CWPBN_: Number of bins.
-    :param _Beams_: Number of beams.
-    :param IsE0000001: Flag if IsE0000001 is enabled.
-    :param IsE0000002: Flag if IsE0000002 is enabled.
-    :param IsE0000003: Flag if IsE0000003 is enabled.
-    :param IsE0000004: Flag if IsE0000004 is enabled.
-    :param IsE0000005: Flag if IsE0000005 is enabled.
-    :param IsE0000006: Flag if IsE0000006 is enabled.
-    :param IsE0000007: Flag if IsE0000007 is enabled.
-    :param IsE0000008: Flag if IsE0000008 is enabled.
-    :param IsE0000009: Flag if IsE0000009 is enabled.
-    :param IsE0000010: Flag if IsE0000010 is enabled.
-    :param IsE0000011: Flag if IsE0000011 is enabled.
-    :param IsE0000012: Flag if IsE0000012 is enabled.
-    :param IsE0000013: Flag if IsE0000013 is enabled.
-    :param IsE0000014: Flag if IsE0000014 is enabled.
-    :param IsE0000015: Flag if IsE0000015 is enabled.
-    :return: Number of bytes for the ensemble.
-    """
-
-    MATLAB_OVERHEAD = 7
-
-    # E0000001
-    E0000001 = 0
-    if IsE0000001:
-        E0000001 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000002
-    E0000002 = 0
-    if IsE0000002:
-        E0000002 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000003
-    E0000003 = 0
-    if IsE0000003:
-        E0000003 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000004
-    E0000004 = 0
-    if IsE0000004:
-        E0000004 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000005
-    E0000005 = 0
-    if IsE0000005:
-        E0000005 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000006
-    E0000006 = 0
-    if IsE0000006:
-        E0000006 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000007
-    E0000007 = 0
-    if IsE0000007:
-        E0000007 = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
-
-    #region E0000008
-    E0000008 = 0
-    if IsE0000008:
-        E0000008 = 4 * (23 + MATLAB_OVERHEAD)
-
-    # E0000009
-    E0000009 = 0
-    if IsE0000009:
-        E0000009 = 4 * (19 + MATLAB_OVERHEAD)
-
-    #E0000010
-    E0000010 = 0
-    if IsE0000010:
-        E0000010 = 4 * (14 + 15 * _Beams_ + MATLAB_OVERHEAD)
-
-    # E0000011
-    E0000011 = 0
-    if IsE0000011:
-        E0000011 = 0
-
-    # E0000012
-    E0000012 = 0
-    if IsE0000012:
-        E0000012 = 4 * (23 + MATLAB_OVERHEAD)
-
-    # E0000013
-    E0000013 = 0
-    if IsE0000013:
-        E0000013 = 4 * (30 + MATLAB_OVERHEAD)
-
-    # E0000014
-    E0000014 = 0
-    if IsE0000014:
-        E0000014 = 4 * (25 + MATLAB_OVERHEAD)
-
-    # E0000015
-    E0000015 = 0
-    if IsE0000015:
-        E0000015 = 4 * (8 * _Beams_ + 1 + MATLAB_OVERHEAD)
-
-    bytes_per_ensemble = E0000001 + E0000002 + E0000003 + E0000004 + E0000005 + E0000006 + E0000007 + E0000008 + E0000009 + E0000010 + E0000011 + E0000012 + E0000013 + E0000014 + E0000015
-    checksum = 4    # Checksum
-    wrapper = 32    # Header
-
-    return bytes_per_ensemble + checksum + wrapper
-
-
-def _calculate_pd0_ensemble_size(_CWPBN_, _Beams_,
-                                IsE0000001, IsE0000002, IsE0000003,
-                                IsE0000004, IsE0000005, IsE0000006,
-                                IsE0000007, IsE0000008, IsE0000009,
-                                IsE0000010, IsE0000011, IsE0000012,
-                                IsE0000013, IsE0000014, IsE0000015):
-    """
-    Calculate the number of bytes for the PD0 ensemble based off the parameters.
-    Value given in bytes.
-
-    :param _CWPBN_: Number of bins.
-    :param _Beams_: Number of beams.
-    :param IsE0000001: Flag if IsE0000001 is enabled.
-    :param IsE0000002: Flag if IsE0000002 is enabled.
-    :param IsE0000003: Flag if IsE0000003 is enabled.
-    :param IsE0000004: Flag if IsE0000004 is enabled.
-    :param IsE0000005: Flag if IsE0000005 is enabled.
-    :param IsE0000006: Flag if IsE0000006 is enabled.
-    :param IsE0000007: Flag if IsE0000007 is enabled.
-    :param IsE0000008: Flag if IsE0000008 is enabled.
-    :param IsE0000009: Flag if IsE0000009 is enabled.
-    :param IsE0000010: Flag if IsE0000010 is enabled.
-    :param IsE0000011: Flag if IsE0000011 is enabled.
-    :param IsE0000012: Flag if IsE0000012 is enabled.
-    :param IsE0000013: Flag if IsE0000013 is enabled.
-    :param IsE0000014: Flag if IsE0000014 is enabled.
-    :param IsE0000015: Flag if IsE0000015 is enabled.
-    :return: Number of bytes for the ensemble.
-    """
-
-    # Number of data types
-    num_dt = 0
-
-    # Fixed Leader
-    fl = 59
-    num_dt += 1
-
-    # Variable Leader
-    vl = 65
-    num_dt += 1
-
-    # Velocity
-    #vel = 0
-    #if IsE0000001 or IsE0000002 or IsE0000003:
-    vel = 2 + (_CWPBN_ * (2 * _Beams_))
-    num_dt += 1
-
-    # Echo Intensity (Amplitude)
-    #echo = 0
-    #if IsE0000004:
-    echo = 2 + (_CWPBN_ * _Beams_)
-    num_dt += 1
-
-    # Correlation
-    #corr = 0
-    #if IsE0000005:
-    corr = 2 + (_CWPBN_ * _Beams_)
-    num_dt += 1
-
-    # Percent Good
-    #pg = 0
-    #if IsE0000006:
-    pg = 2 + (_CWPBN_ * _Beams_)
-    num_dt += 1
-
-    # Bottom Track
-    #bt = 0
-    #if IsE0000010:
-    bt = 84
-    num_dt += 1
-
-    # Header
-    header = 6 + num_dt
-
-    # Bytes per ensemble
-    bytes_per_ensemble = header + fl + vl + vel + echo + corr + pg + bt
-
-    # Checksum
-    checksum = 2
-
-    return bytes_per_ensemble + checksum
+    return int(Sweep._calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_, IsE0000001, IsE0000002, IsE0000003,
+                                              IsE0000004, IsE0000005, IsE0000006, IsE0000007, IsE0000008, IsE0000009,
+                                              IsE0000010, IsE0000011, IsE0000012, IsE0000013, IsE0000014, IsE0000015))
 
 
 def bytes_2_human_readable(number_of_bytes):
@@ -0,0 +1,281 @@
+"""
+Find deployment configurations that meet the given constraints.
+
+The command space (CWPBS, CWPBN, CWPP, CWPTBP, CEI, CWPBB and the CBI burst
+settings) is evaluated at once with the vectorized predictor in Sweep.  All the
+configurations that meet the battery, range and accuracy constraints are then
+reduced to the Pareto set trading power against range, accuracy and data storage.
+"""
+import time
+import pytest
+import numpy as np
+import rti_python.ADCP.AdcpCommands as Commands
+import rti_python.ADCP.Predictor.Sweep as Sweep
+import rti_python.ADCP.Predictor.Power
+
+
+# Default search space
+DEFAULT_CWPBS = [0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0]
+DEFAULT_CWPBN = [5, 10, 15, 20, 25, 30, 40, 50, 60, 80, 100, 125, 150, 200]
+DEFAULT_CWPP = [1, 2, 3, 4, 6, 9, 12, 16, 24, 32, 48, 64]
+DEFAULT_CWPTBP = [0.0, 0.25, 0.5, 1.0, 2.0]
+DEFAULT_CEI = [1, 2, 5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600]
+DEFAULT_CWPBB = [0, 1]
+
+# Burst settings (CBI, CBI_BurstInterval, CBI_NumEns)
+DEFAULT_BURST = [(False, 3600, 0)]
+
+# Objectives for the Pareto set and if the value should be maximized
+OBJECTIVES = [('Power', False), ('WpRange', True), ('STD', False), ('DataStorage', False)]
+
+
+def optimize(**kwargs):
+    """
+    Search the command space for the configurations that meet the given constraints.
+    The result is the Pareto set of configurations ranked by power.  Each configuration
+    is a dictionary with the command values and the predicted results.
+
+    Any other parameter given is passed to the predictor.  This can be used to set
+    fixed values like Beams, BeamAngle, CWPBL, CBTON, Temperature or Salinity.
+
+    :param NumBatteries=: Number of batteries available for the deployment.
+    :param DeploymentDuration=: Deployment length in days.
+    :param MinRange=: Required profile range in meters.
+    :param MaxSTD=: Maximum allowed standard deviation in m/s.
+    :param MaxDataStorage=: Maximum amount of data in bytes.  Default no limit.
+    :param SystemFrequency=: System frequency for this configuration.
+    :param CWPBS=: List of bin sizes to search in meters.
+    :param CWPBN=: List of number of bins to search.
+    :param CWPP=: List of number of pings to search.
+    :param CWPTBP=: List of time between pings to search in seconds.
+    :param CEI=: List of time between ensembles to search in seconds.
+    :param CWPBB=: List of broadband and narrowband modes to search.
+    :param Burst=: List of burst settings to search.  Each burst setting is (CBI, CBI_BurstInterval, CBI_NumEns).
+    :param MaxResults=: Maximum number of configurations to return.
+    :return: List of configurations ranked by power.
+    """
+    num_batteries = kwargs.pop('NumBatteries', 1)
+    deployment_duration = kwargs.pop('DeploymentDuration', 30)
+    min_range = kwargs.pop('MinRange', 0.0)
+    max_std = kwargs.pop('MaxSTD', 1.0)
+    max_data_storage = kwargs.pop('MaxDataStorage', None)
+    max_results = kwargs.pop('MaxResults', 50)
+    burst = kwargs.pop('Burst', DEFAULT_BURST)
+
+    # Create the search grid
+    # The burst settings are searched together, so they are given as an index
+    grid = Sweep.make_grid(CWPBS=kwargs.pop('CWPBS', DEFAULT_CWPBS),
+                           CWPBN=kwargs.pop('CWPBN', DEFAULT_CWPBN),
+                           CWPP=kwargs.pop('CWPP', DEFAULT_CWPP),
+                           CWPTBP=kwargs.pop('CWPTBP', DEFAULT_CWPTBP),
+                           CEI=kwargs.pop('CEI', DEFAULT_CEI),
+                           CWPBB=kwargs.pop('CWPBB', DEFAULT_CWPBB),
+                           BurstIndex=np.arange(len(burst)))
+    burst_index = grid['BurstIndex']
+    grid['CBI'] = np.array([b[0] for b in burst], dtype=bool)[burst_index]
+    grid['CBI_BurstInterval'] = np.array([b[1] for b in burst], dtype=float)[burst_index]
+    grid['CBI_NumEns'] = np.array([b[2] for b in burst], dtype=float)[burst_index]
+
+    grid.update(kwargs)
+    grid['DeploymentDuration'] = deployment_duration
+    results = Sweep.sweep(**grid)
+    if results is None:
+        return []
+
+    # Remove all the configurations that do not meet the constraints
+    valid = _is_valid(results)
+    valid &= results['NumBatteries'] <= num_batteries
+    valid &= results['WpRange'] >= min_range
+    valid &= results['CfgRange'] >= min_range
+    valid &= results['STD'] <= max_std
+    if max_data_storage is not None:
+        valid &= results['DataStorage'] <= max_data_storage
+
+    candidates = {key: np.broadcast_to(value, valid.shape)[valid] for key, value in results.items()}
+
+    # Find the Pareto set and rank by power
+    front = pareto_front(np.column_stack([candidates[key] if not maximize else -candidates[key] for key, maximize in OBJECTIVES]))
+    front = front[np.lexsort((candidates['STD'][front], candidates['Power'][front]))][:max_results]
+
+    configs = []
+    for index in front:
+        config = {key: _to_scalar(value[index]) for key, value in candidates.items()}
+        del config['BurstIndex']
+        config['Commands'] = get_cmd_list(config)
+        configs.append(config)
+
+    return configs
+
+
+def _is_valid(results):
+    """
+    Check if the pinging can be done in the time given.  For a standard
+    deployment, all the pings must fit in the ensemble interval.  For a burst
+    deployment, all the ensembles must fit in the burst interval.
+    :param results: Results from the sweep.
+    :return: Mask of valid configurations.
+    """
+    ping_time = results['CWPP'] * results['CWPTBP']
+    is_burst = results['CBI']
+    burst_time = results['CBI_NumEns'] * results['CEI']
+
+    standard_valid = ping_time <= results['CEI']
+    burst_valid = (results['CBI_NumEns'] > 0) & (burst_time <= results['CBI_BurstInterval'])
+
+    return np.where(is_burst, burst_valid & standard_valid, standard_valid)
+
+
+def pareto_front(objectives):
+    """
+    Find the configurations that are not dominated by any other configuration.
+    All the objectives are minimized.
+
+    The configuration with the lowest value (ordered by each objective) is always
+    in the Pareto set.  It is added to the set and all the configurations it dominates
+    are removed.  This is repeated until no configurations are left.  If multiple
+    configurations have the same objectives, only the first one is kept.
+
+    :param objectives: Array of objectives.  Each row is a configuration.
+    :return: Indexes of the configurations in the Pareto set.
+    """
+    remaining = np.arange(len(objectives))
+    front = []
+
+    while len(remaining) > 0:
+        values = objectives[remaining]
+
+        # Lowest value ordered by each objective
+        best = np.lexsort(values.T[::-1])[0]
+        front.append(remaining[best])
+
+        # Remove all the values dominated by best
+        # Configurations with the same objectives as best are also removed, so only one is kept
+        dominated = np.all(values >= values[best], axis=1)
+        remaining = remaining[~dominated]
+
+    return np.array(front, dtype=int)
+
+
+def _to_scalar(value):
+    """
+    Convert a numpy value to a python value.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def get_cmd_list(config):
+    """
+    Create a list of commands for the subsystem configuration.
+    This follows SubsystemVM.get_cmd_list().
+    :param config: Configuration found by optimize().
+    :return: List of all the commands with the values.
+    """
+    command_list = []
+
+    if config.get('CWPON', True):
+        command_list.append(Commands.AdcpCmd("CWPON", "1"))                                              # CWPON
+        command_list.append(Commands.AdcpCmd("CWPBB", str(config['CWPBB']) + ", " + str(config.get('CWPBB_LagLength', 1.0))))
+        command_list.append(Commands.AdcpCmd("CWPBL", str(config.get('CWPBL', 1.0))))                   # CWPBL
+        command_list.append(Commands.AdcpCmd("CWPBS", str(config['CWPBS'])))                            # CWPBS
+        command_list.append(Commands.AdcpCmd("CWPBN", str(int(config['CWPBN']))))                       # CWPBN
+        command_list.append(Commands.AdcpCmd("CWPP", str(int(config['CWPP']))))                         # CWPP
+        command_list.append(Commands.AdcpCmd("CWPTBP", str(config['CWPTBP'])))                          # CWPTBP
+
+    if config.get('CBTON', True):
+        command_list.append(Commands.AdcpCmd("CBTON", "1"))                                              # CBTON
+        if config.get('CBTBB', 1) == 0:
+            command_list.append(Commands.AdcpCmd("CBTBB", "0"))                                          # CBTBB
+        else:
+            command_list.append(Commands.AdcpCmd("CBTBB", "7"))                                          # CBTBB
+
+    if config.get('CBI', False):
+        cbi_num_ens = str(int(config['CBI_NumEns']))
+        cbi_interval = Commands.sec_to_hmss(config['CBI_BurstInterval'])
+        command_list.append(Commands.AdcpCmd("CBI", cbi_interval + ", " + cbi_num_ens + " ,0"))         # CBI
+
+    return command_list
+
+
+def get_command_file(config, ss_code):
+    """
+    Create the command file for a single subsystem configuration.
+    This follows PredictorVM.update_command_file().
+    :param config: Configuration found by optimize().
+    :param ss_code: Subsystem code.
+    :return: List of command lines.
+    """
+    lines = ["CDEFAULT",
+             "CEPO " + str(ss_code),
+             "CEI " + Commands.sec_to_hmss(config['CEI']),
+             "CERECORD 1"]
+
+    for cmd in config.get('Commands', get_cmd_list(config)):
+        lines.append(cmd.to_str(0))
+
+    lines.append("CSAVE")
+    lines.append("START")
+
+    return lines
+
+
+def test_pareto_front():
+    objectives = np.array([[1.0, 5.0],
+                           [2.0, 4.0],
+                           [2.0, 6.0],          # Dominated by [1, 5]
+                           [3.0, 1.0],
+                           [4.0, 1.0],          # Dominated by [3, 1]
+                           [1.0, 5.0]])         # Same as the first
+
+    front = pareto_front(objectives)
+    assert sorted(front.tolist()) == [0, 1, 3]
+
+
+def test_optimize():
+    start = time.process_time()
+    configs = optimize(NumBatteries=2,
+                       DeploymentDuration=30,
+                       MinRange=60.0,
+                       MaxSTD=0.05,
+                       SystemFrequency=288000,
+                       Burst=[(False, 3600, 0), (True, 3600, 512), (True, 1800, 256)])
+
+    assert time.process_time() - start < 10.0
+    assert len(configs) > 0
+
+    for config in configs:
+        assert config['NumBatteries'] <= 2
+        assert config['WpRange'] >= 60.0
+        assert config['CfgRange'] >= 60.0
+        assert config['STD'] <= 0.05
+
+    # Ranked by power
+    assert [c['Power'] for c in configs] == sorted([c['Power'] for c in configs])
+
+    # Check the predicted power against the scalar predictor
+    config = configs[0]
+    if config['CBI']:
+        power = rti_python.ADCP.Predictor.Power.calculate_burst_power(CEI=config['CEI'], DeploymentDuration=30, SystemFrequency=288000,
+                                                                      CWPBS=config['CWPBS'], CWPBN=config['CWPBN'], CWPBB=config['CWPBB'],
+                                                                      CWPP=config['CWPP'], CWPTBP=config['CWPTBP'], CBI=True,
+                                                                      CBI_BurstInterval=config['CBI_BurstInterval'],
+                                                                      CBI_NumEns=config['CBI_NumEns'])
+    else:
+        power = rti_python.ADCP.Predictor.Power.calculate_power(CEI=config['CEI'], DeploymentDuration=30, SystemFrequency=288000,
+                                                                CWPBS=config['CWPBS'], CWPBN=config['CWPBN'], CWPBB=config['CWPBB'],
+                                                                CWPP=config['CWPP'], CWPTBP=config['CWPTBP'])
+    assert config['Power'] == pytest.approx(power, rel=1e-9)
+
+    # Command file
+    cmds = [cmd.to_str(0) for cmd in config['Commands']]
+    assert "CWPBS[0] " + str(config['CWPBS']) in cmds
+    assert "CWPBN[0] " + str(int(config['CWPBN'])) in cmds
+    lines = get_command_file(config, "4")
+    assert lines[0] == "CDEFAULT"
+    assert lines[1] == "CEPO 4"
+    assert lines[-1] == "START"
+
+
+def test_optimize_no_solution():
+    assert optimize(NumBatteries=1, DeploymentDuration=365, MinRange=1000.0, MaxSTD=0.001, SystemFrequency=1152000) == []
@@ -0,0 +1,262 @@
+"""
+Time-stepped battery simulation for a deployment.
+
+Power.calculate_power() gives the power for the whole deployment as a single
+average.  This simulation walks the ensemble and burst schedule one time step at a
+time.  The battery capacity and self discharge change with the water temperature,
+so the remaining capacity can be given over time and the end of life found.
+"""
+import time
+import pytest
+import numpy as np
+import rti_python.ADCP.Predictor.Sweep as Sweep
+import rti_python.ADCP.Predictor.Power
+
+
+# Battery capacity factor based off temperature in degrees C.
+# The capacity is the BatteryCapacity * BatteryDerate * factor.
+BATTERY_TEMP_CURVE = ([-20.0, -10.0, 0.0, 10.0, 40.0],
+                      [0.35, 0.55, 0.8, 1.0, 1.0])
+
+
+def simulate(**kwargs):
+    """
+    Simulate the battery usage over the deployment.  The deployment parameters
+    are the same as Power.calculate_power() and Power.calculate_burst_power().
+
+    :param TimeStep=: Time step of the simulation in seconds.  Default 60 seconds.
+    :param Temperature=: Water temperature in degrees C.  A scalar or an array of temperatures evenly spaced over the deployment.
+    :param NumBatteries=: Number of batteries.
+    :param BatteryCapacity=: Total battery capacity for a single battery in watt/hr
+    :param BatteryDerate=: Derate of the battery.
+    :param BatterySelfDischarge=: Self discharge of a single battery over a year in watt/hr
+    :param BatterySelfDischargeTemp=: Temperature the self discharge is given at in degrees C.
+    :param BatteryTempCurve=: Battery capacity factor based off temperature.  (temperatures, factors)
+    :param CBI=: Flag if we are using Burst Mode pinging.
+    :param CBI_NumEns=: Number of ensemble in a burst.
+    :param CBI_BurstInterval=: The length of time in seconds for a burst.
+    :return: Dictionary with the time in seconds, the remaining capacity in watt/hr, the used
+             power in watt/hr and the EndOfLife in days.  EndOfLife is None if the batteries last.
+    """
+    config = Sweep.get_config()
+    if config is None:
+        return None
+
+    time_step = kwargs.pop('TimeStep', 60.0)
+    temperature = kwargs.pop('Temperature', config['Temperature'])
+    num_batteries = kwargs.pop('NumBatteries', 1)
+    battery_capacity = kwargs.pop('BatteryCapacity', config['DEFAULT']['BatteryCapacity'])
+    battery_derate = kwargs.pop('BatteryDerate', config['DEFAULT']['BatteryDerate'])
+    battery_self_discharge = kwargs.pop('BatterySelfDischarge', config['DEFAULT']['BatterySelfDischarge'])
+    self_discharge_temp = kwargs.pop('BatterySelfDischargeTemp', config['Temperature'])
+    temp_curve = kwargs.pop('BatteryTempCurve', BATTERY_TEMP_CURVE)
+    is_burst = kwargs.pop('CBI', config['DEFAULT']['CBI'])
+    burst_interval = kwargs.pop('CBI_BurstInterval', config['DEFAULT']['CBI_BurstInterval'])
+    burst_num_ens = kwargs.pop('CBI_NumEns', config['DEFAULT']['CBI_NumEns'])
+
+    return _simulate(Sweep._power_args(kwargs, config),
+                     temperature, time_step,
+                     num_batteries, battery_capacity, battery_derate, battery_self_discharge, self_discharge_temp, temp_curve,
+                     is_burst, burst_interval, burst_num_ens,
+                     config)
+
+
+def _simulate(power_args, _temperature_, _time_step_,
+              _num_batteries_, _battery_capacity_, _battery_derate_, _battery_self_discharge_, _self_discharge_temp_, _temp_curve_,
+              _is_burst_, _burst_interval_, _burst_num_ens_,
+              config):
+    """
+    Simulate the battery usage over the deployment.
+
+    :param power_args: Arguments for Sweep._calculate_power().  The temperature is replaced.
+    :param _temperature_: Water temperature in degrees C.  Scalar or array evenly spaced over the deployment.
+    :param _time_step_: Time step of the simulation in seconds.
+    :param _num_batteries_: Number of batteries.
+    :param _battery_capacity_: Total battery capacity for a single battery in watt/hr
+    :param _battery_derate_: Derate of the battery.
+    :param _battery_self_discharge_: Self discharge of a single battery over a year in watt/hr
+    :param _self_discharge_temp_: Temperature the self discharge is given at.
+    :param _temp_curve_: Battery capacity factor based off temperature.  (temperatures, factors)
+    :param _is_burst_: Flag if we are using Burst Mode pinging.
+    :param _burst_interval_: The length of time in seconds for a burst.
+    :param _burst_num_ens_: Number of ensemble in a burst.
+    :param config: Predictor configuration.
+    :return: Dictionary with Time, Remaining, Used and EndOfLife.
+    """
+    cei = float(power_args[0])
+    deployment_duration = float(power_args[1])
+
+    # Time at the end of each step
+    num_steps = int(np.ceil(deployment_duration * 24.0 * 3600.0 / _time_step_))
+    step_time = np.arange(1, num_steps + 1, dtype=float) * _time_step_
+
+    # Temperature at each step
+    temperature = np.asarray(_temperature_, dtype=float)
+    if temperature.ndim == 0:
+        temperature = np.full(num_steps, float(temperature))
+    else:
+        temperature = np.interp(np.linspace(0.0, 1.0, num_steps), np.linspace(0.0, 1.0, len(temperature)), temperature)
+
+    # Energy used for each part of the schedule
+    # The temperature changes the range, so the energy is found for
+    # a few temperatures and interpolated
+    temp_table = np.unique(np.round(temperature))
+    (ens_energy, burst_energy, idle_power) = ensemble_energy(power_args, temp_table, _is_burst_, _burst_num_ens_, config)
+    ens_energy = np.interp(temperature, temp_table, ens_energy)
+    burst_energy = np.interp(temperature, temp_table, burst_energy)
+    idle_power = np.interp(temperature, temp_table, idle_power)
+
+    # Number of ensembles and bursts started in each time step
+    edges = np.concatenate(([0.0], step_time))
+    if _is_burst_ and (_burst_interval_ <= 0 or cei <= 0):
+        # Like Power.calculate_burst_power(), no burst interval is no bursts
+        ensembles = np.zeros(num_steps + 1)
+        bursts_per_step = np.zeros(num_steps)
+    elif _is_burst_:
+        bursts = np.ceil(edges / _burst_interval_)
+        in_burst = np.minimum(_burst_num_ens_, np.ceil(np.mod(edges, _burst_interval_) / cei))
+        ensembles = np.floor(edges / _burst_interval_) * _burst_num_ens_ + in_burst
+        bursts_per_step = np.diff(bursts)
+    elif cei > 0:
+        ensembles = np.ceil(edges / cei)
+        bursts_per_step = np.zeros(num_steps)
+        bursts_per_step[0] = 1                              # Single wakeup for the deployment
+    else:
+        ensembles = np.zeros(num_steps + 1)
+        bursts_per_step = np.zeros(num_steps)
+    ens_per_step = np.diff(ensembles)
+
+    # Self discharge doubles for every 10 degrees
+    self_discharge = _num_batteries_ * _battery_self_discharge_ / (365.0 * 24.0 * 3600.0) * 2.0 ** ((temperature - _self_discharge_temp_) / 10.0)
+
+    # Power used in each time step
+    used = ens_per_step * ens_energy + bursts_per_step * burst_energy + (idle_power / 3600.0 + self_discharge) * _time_step_
+    used = np.cumsum(used)
+
+    # Capacity available based off temperature
+    capacity = _num_batteries_ * _battery_capacity_ * _battery_derate_ * np.interp(temperature, _temp_curve_[0], _temp_curve_[1])
+    remaining = capacity - used
+
+    # Find the first time the batteries are empty
+    empty = np.flatnonzero(remaining <= 0.0)
+    end_of_life = None
+    if len(empty) > 0:
+        end_of_life = step_time[empty[0]] / (24.0 * 3600.0)
+
+    return {'Time': step_time,
+            'Temperature': temperature,
+            'Remaining': remaining,
+            'Used': used,
+            'EndOfLife': end_of_life}
+
+
+def ensemble_energy(power_args, temperature, is_burst, burst_num_ens, config):
+    """
+    Break the power model into the energy for each part of the schedule.  The
+    power model is linear in the number of ensembles and the deployment duration,
+    so each part is found by calculating the power with different values.
+
+    :param power_args: Arguments for Sweep._calculate_power().  The temperature is replaced.
+    :param temperature: Temperatures to calculate the energy for.
+    :param is_burst: Flag if we are using Burst Mode pinging.
+    :param burst_num_ens: Number of ensembles in a burst.
+    :param config: Predictor configuration.
+    :return: Energy per ensemble in watt/hr, Energy per burst or wakeup in watt/hr and Idle power in watts.
+    """
+    def power(cei, duration, burst, num_ens):
+        args = list(power_args)
+        args[0] = cei
+        args[1] = duration
+        args[-2] = temperature
+        return Sweep._calculate_power(*args, _is_burst_=burst, _ensembles_per_burst_=num_ens, config=config)
+
+    cei = power_args[0]
+
+    # Sleep and capacitor leakage
+    # With a CEI of 0, no ensembles are done
+    idle_per_day = power(0, 2, False, 0) - power(0, 1, False, 0)
+    idle_power = idle_per_day / 24.0
+
+    if is_burst:
+        # A burst includes an hour of idle power
+        ens_energy = (power(cei, 1, True, 2 * burst_num_ens) - power(cei, 1, True, burst_num_ens)) / max(burst_num_ens, 1)
+        burst_energy = power(cei, 1, True, burst_num_ens) - burst_num_ens * ens_energy - idle_power
+    else:
+        # Everything that is not idle power is from the ensembles
+        ens_per_day = np.round(24.0 * 3600.0 / cei) if cei > 0 else 0.0
+        per_day = power(cei, 2, False, 0) - power(cei, 1, False, 0)
+        ens_energy = (per_day - idle_per_day) / ens_per_day if ens_per_day > 0 else np.zeros_like(per_day)
+        burst_energy = power(cei, 1, False, 0) - per_day
+
+    return (np.broadcast_to(ens_energy, np.shape(temperature)),
+            np.broadcast_to(burst_energy, np.shape(temperature)),
+            np.broadcast_to(idle_power, np.shape(temperature)))
+
+
+def test_simulate_matches_average():
+    power = rti_python.ADCP.Predictor.Power.calculate_power(CEI=1, DeploymentDuration=30, SystemFrequency=288000,
+                                                            CWPBS=4, CWPBN=30, CWPP=9, CWPTBP=0.5, Temperature=10.0)
+    num_batt = rti_python.ADCP.Predictor.Power.calculate_number_batteries(PowerUsage=power, DeploymentDuration=30)
+
+    result = simulate(CEI=1, DeploymentDuration=30, SystemFrequency=288000,
+                      CWPBS=4, CWPBN=30, CWPP=9, CWPTBP=0.5, Temperature=10.0,
+                      NumBatteries=num_batt)
+
+    # Same energy used as the average model
+    capacity = num_batt * 440 * 0.85
+    assert result['Used'][-1] == pytest.approx(power + num_batt * 0.05 * 30 / 365.0, rel=1e-3)
+    assert result['Remaining'][-1] == pytest.approx(capacity - result['Used'][-1])
+    assert abs(result['Remaining'][-1]) < 0.01 * capacity
+
+
+def test_simulate_burst_matches_average():
+    power = rti_python.ADCP.Predictor.Power.calculate_burst_power(CEI=0.249, DeploymentDuration=30, SystemFrequency=288000,
+                                                                  CWPBS=4, CWPBN=30, CWPP=1, CBTON=False,
+                                                                  CBI=True, CBI_NumEns=4096, CBI_BurstInterval=3600)
+
+    result = simulate(CEI=0.249, DeploymentDuration=30, SystemFrequency=288000,
+                      CWPBS=4, CWPBN=30, CWPP=1, CBTON=False,
+                      CBI=True, CBI_NumEns=4096, CBI_BurstInterval=3600,
+                      NumBatteries=1, BatterySelfDischarge=0.0)
+
+    # The burst model only includes an hour of sleep for each burst
+    # The simulation includes the sleep for the entire deployment
+    assert result['Used'][-1] > power
+    assert result['Used'][-1] == pytest.approx(power, rel=0.05)
+
+
+def test_simulate_cold_end_of_life():
+    warm = simulate(CEI=1, DeploymentDuration=365, SystemFrequency=288000, CWPP=9, CWPTBP=0.5,
+                    NumBatteries=40, Temperature=20.0)
+    cold = simulate(CEI=1, DeploymentDuration=365, SystemFrequency=288000, CWPP=9, CWPTBP=0.5,
+                    NumBatteries=40, Temperature=[20.0, 0.0, 20.0])
+
+    assert warm['EndOfLife'] is not None
+    assert cold['EndOfLife'] is not None
+    assert cold['EndOfLife'] < warm['EndOfLife']
+    assert np.all(np.diff(warm['Used']) > 0)
+
+
+def test_simulate_speed():
+    temperature = 10.0 + 5.0 * np.sin(np.linspace(0, 2 * np.pi, 365))
+
+    simulate(CEI=60, DeploymentDuration=365, TimeStep=60, Temperature=temperature, NumBatteries=2)
+    start = time.perf_counter()
+    result = simulate(CEI=60, DeploymentDuration=365, TimeStep=60, Temperature=temperature, NumBatteries=2)
+    elapsed = time.perf_counter() - start
+
+    assert len(result['Time']) == 365 * 24 * 60
+    assert elapsed < 0.1
+
+
+def test_simulate_burst_no_interval():
+    for cei, burst_interval in [(0.249, 0), (0, 3600)]:
+        result = simulate(CEI=cei, DeploymentDuration=30, SystemFrequency=288000, CWPP=1, CBTON=False,
+                          CBI=True, CBI_NumEns=4096, CBI_BurstInterval=burst_interval,
+                          NumBatteries=1, BatterySelfDischarge=0.0)
+
+        # Only the idle power is used
+        idle = simulate(CEI=0, DeploymentDuration=30, SystemFrequency=288000, CWPP=1, CBTON=False,
+                        NumBatteries=1, BatterySelfDischarge=0.0)
+        assert np.all(np.isfinite(result['Used']))
+        assert result['Used'][-1] == pytest.approx(idle['Used'][-1])
@@ -0,0 +1,1225 @@
+"""
+Vectorized versions of the predictor calculations.
+
+Every parameter can be a scalar, a list or a numpy array.  All the parameters are
+broadcast together, so a deployment design space can be evaluated in a single call
+instead of calling the scalar predictor millions of times.  The scalar functions
+in Power, Range, STD, MaxVelocity and DataStorage call these with a single value
+for each parameter, so both give the same results.
+"""
+import json
+import os
+import math
+import itertools
+import time
+import pytest
+import numpy as np
+import rti_python.ADCP.AdcpCommands
+import rti_python.ADCP.Predictor.Power
+import rti_python.ADCP.Predictor.Range
+import rti_python.ADCP.Predictor.STD
+import rti_python.ADCP.Predictor.MaxVelocity
+import rti_python.ADCP.Predictor.DataStorage
+
+# Frequency bands in the order they are checked in the scalar predictor
+BANDS = ["1200000", "600000", "300000", "150000", "75000", "38000"]
+
+
+def get_config():
+    """
+    Get the predictor configuration from the json file.
+    :return: Predictor configuration or None if it could not be read.
+    """
+    script_dir = os.path.dirname(__file__)
+    json_file_path = os.path.join(script_dir, 'predictor.json')
+    try:
+        return json.loads(open(json_file_path).read())
+    except Exception as e:
+        print("Error opening predictor.JSON file. Sweep", e)
+        return None
+
+
+def make_grid(**kwargs):
+    """
+    Create a full grid of all the given parameter values.  Each
+    parameter is given as a list of values.  The result can be passed
+    to any of the sweep calculations.
+
+    Ex: make_grid(CWPBS=[1, 2, 4], CWPBN=range(10, 200), CWPP=[1, 9])
+
+    :param kwargs: Parameter name and list of values.
+    :return: Dictionary with the parameter name and a broadcastable array.
+    """
+    keys = list(kwargs.keys())
+    axes = np.meshgrid(*[np.asarray(kwargs[key]) for key in keys], indexing='ij', sparse=True)
+    return dict(zip(keys, axes))
+
+
+def _band_index(_SystemFrequency_, config):
+    """
+    Get the index into BANDS for each system frequency.  If the
+    frequency is not in any band, -1 is given.
+    :param _SystemFrequency_: System frequency in hz.
+    :param config: Predictor configuration.
+    :return: Array of band indexes.
+    """
+    freq = [config["DEFAULT"][band]["FREQ"] for band in BANDS]
+
+    conditions = [_SystemFrequency_ > freq[0]]
+    for i in range(1, len(BANDS)):
+        conditions.append((_SystemFrequency_ > freq[i]) & (_SystemFrequency_ < freq[i-1]))
+
+    return np.select(conditions, range(len(BANDS)), default=-1)
+
+
+def _band_value(band, key, config):
+    """
+    Lookup the configuration value for each band index.  A band index
+    of -1 will use the last entry in the table which is 0.
+    :param band: Array of band indexes.
+    :param key: Configuration key for the frequency.
+    :param config: Predictor configuration.
+    :return: Array of configuration values.
+    """
+    table = np.array([config["DEFAULT"][b][key] for b in BANDS] + [0.0], dtype=float)
+    return table[band]
+
+
+def _sample_rate(band, _SystemFrequency_, _CyclesPerElement_, config):
+    """
+    Calculate the sample rate for each frequency.
+    :param band: Array of band indexes.
+    :param _SystemFrequency_: System frequency in hz.
+    :param _CyclesPerElement_: Cycles per element.
+    :param config: Predictor configuration.
+    :return: Sample rate.
+    """
+    sum_sampling = _band_value(band, "SAMPLING", config) * _band_value(band, "CPE", config) / _CyclesPerElement_
+    sum_sampling = np.where(band >= 0, sum_sampling, 0.0)
+    return _SystemFrequency_ * sum_sampling
+
+
+def _meters_per_sample(sample_rate, _BeamAngle_, _SpeedOfSound_):
+    """
+    Meters per sample.
+    """
+    safe_rate = np.where(sample_rate == 0, 1.0, sample_rate)
+    return np.where(sample_rate == 0, 0.0, np.cos(_BeamAngle_ / 180.0 * math.pi) * _SpeedOfSound_ / 2.0 / safe_rate)
+
+
+def _lag_samples(meters_per_sample, _CWPBB_LagLength_):
+    """
+    Lag samples.
+    """
+    safe_mps = np.where(meters_per_sample == 0, 1.0, meters_per_sample)
+    return np.where(meters_per_sample == 0, 0, 2 * np.trunc((np.trunc(_CWPBB_LagLength_ / safe_mps) + 1.0) / 2.0))
+
+
+def _bin_samples(meters_per_sample, _CWPBS_):
+    """
+    Bin samples.
+    """
+    safe_mps = np.where(meters_per_sample == 0, 1.0, meters_per_sample)
+    return np.where(meters_per_sample == 0, 0, np.trunc(_CWPBS_ / safe_mps))
+
+
+def _code_repeats(bin_samples, lag_samples):
+    """
+    Code repeats.
+    """
+    safe_lag = np.where(lag_samples == 0, 1.0, lag_samples)
+    repeats = np.trunc(bin_samples / safe_lag) + 1
+    return np.where(lag_samples == 0, 0, np.where(repeats < 2.0, 2, repeats))
+
+
+def calc_absorption(_SystemFrequency_, _SpeedOfSound_, _Salinity_, _Temperature_, _XdcrDepth_):
+    """
+    Calculate the water absorption.  Vectorized version of Range.calc_absorption().
+    :param _SystemFrequency_: System frequency
+    :param _SpeedOfSound_:  Speed of Sound m/s
+    :param _Salinity_: Salinity in ppt.
+    :param _Temperature_: Water Temperature in C
+    :param _XdcrDepth_: Transducer Depth in m.
+    :return: Water Absorption.
+    """
+    invalid = (_SpeedOfSound_ == 0) | (_Salinity_ == 0) | (_SystemFrequency_ == 0)
+    _SpeedOfSound_ = np.where(invalid, 1.0, _SpeedOfSound_)
+
+    pH = 8.0
+    P1 = 1.0
+    freq = _SystemFrequency_ / 1000.0
+
+    A1 = 8.68 / _SpeedOfSound_ * 10.0 ** (0.78 * pH - 5.0)
+    f1 = 2.8 * ((_Salinity_ / 35.0) ** 0.5) * (10.0 ** (4.0 - 1245.0 / (273.0 + _Temperature_)))
+    A2 = 21.44 * _Salinity_ / _SpeedOfSound_ * (1.0 + 0.025 * _Temperature_)
+    P2 = 1.0 - 1.37 * (10.0 ** (-4.0)) * _XdcrDepth_ + 6.2 * (10.0 ** (-9.0)) * (_XdcrDepth_ ** 2)
+    f2 = 8.17 * (10.0 ** (8.0 - 1990.0 / (273.0 + _Temperature_))) / (1.0 + 0.0018 * (_Salinity_ - 35.0))
+    A3 = 4.93 * (10.0 ** (-4.0)) - 2.59 * (10.0 ** (-5.0)) * _Temperature_ + 9.11 * (10.0 ** (-7.0)) * (_Temperature_ ** 2.0)
+    P3 = 1.0 - 3.83 * (10.0 ** (-5.0)) * _XdcrDepth_ + 4.9 * (10.0 ** (-10.0)) * (_XdcrDepth_ ** 2.0)
+
+    # Boric Acid Relaxation, MgSO3 Magnesium Sulphate Relaxation and Freshwater Attenuation
+    bar = A1 * P1 * f1 * (freq ** 2.0) / ((freq ** 2.0) + (f1 ** 2.0)) / 1000.0
+    msr = A2 * P2 * f2 * (freq ** 2.0) / ((freq ** 2.0) + (f2 ** 2.0)) / 1000.0
+    fa = A3 * P3 * (freq ** 2.0) / 1000.0
+
+    return np.where(invalid, 0.0, bar + msr + fa)
+
+
+def calculate_predicted_range(**kwargs):
+    """
+    Vectorized version of Range.calculate_predicted_range().
+    All the parameters can be a scalar or an array.
+
+    :param SystemFrequency=: System frequency for this configuration.
+    :param CWPON=: Flag if Water Profile is turned on.
+    :param CWPBL=: WP Blank in meters.
+    :param CWPBS=: WP bin size in meters.
+    :param CWPBN=: Number of bins.
+    :param CWPBB_LagLength=: WP lag length in meters.
+    :param CWPBB=: WP broadband or narrowband.
+    :param CBTON=: Is Bottom Track turned on.
+    :param CBTBB=: BT broadband or narrowband.
+    :param BeamAngle=: Beam angle in degrees. Default 20 degrees.
+    :param SpeedOfSound=: Speed of sound in m/s.
+    :param BroadbandPower=: Flag if using Broadband power.
+    :param BeamDiameter=: The beam diameter in meters.
+    :param CyclesPerElement=: Cycles per element.
+    :param Salinity=: Salinity in ppt.
+    :param Temperature=: Temperature in C.
+    :param XdcrDepth=: Tranducer Depth in meter.
+    :return: BT Range, WP Range, Range First Bin, Configured Ranges
+    """
+    config = get_config()
+    if config is None:
+        return (0.0, 0.0, 0.0, 0.0)
+
+    return _calculate_predicted_range(kwargs.pop('CWPON', config['DEFAULT']['CWPON']),
+                                      kwargs.pop('CWPBB', config['DEFAULT']['CWPBB']),
+                                      kwargs.pop('CWPBS', config['DEFAULT']['CWPBS']),
+                                      kwargs.pop('CWPBN', config['DEFAULT']['CWPBN']),
+                                      kwargs.pop('CWPBL', config['DEFAULT']['CWPBL']),
+                                      kwargs.pop('CBTON', config['DEFAULT']['CBTON']),
+                                      kwargs.pop('CBTBB', config['DEFAULT']['CBTBB']),
+                                      kwargs.pop('SystemFrequency', config['DEFAULT']['SystemFrequency']),
+                                      kwargs.pop('BeamDiameter', config["BeamDiameter"]),
+                                      kwargs.pop('CyclesPerElement', config["CyclesPerElement"]),
+                                      kwargs.pop('BeamAngle', config["BeamAngle"]),
+                                      kwargs.pop('SpeedOfSound', config["SpeedOfSound"]),
+                                      kwargs.pop('CWPBB_LagLength', config["DEFAULT"]["CWPBB_LagLength"]),
+                                      kwargs.pop('BroadbandPower', config["BroadbandPower"]),
+                                      kwargs.pop('Salinity', config["Salinity"]),
+                                      kwargs.pop('Temperature', config["Temperature"]),
+                                      kwargs.pop('XdcrDepth', config["XdcrDepth"]),
+                                      config=config)
+
+
+def _calculate_predicted_range(_CWPON_, _CWPBB_TransmitPulseType_, _CWPBS_, _CWPBN_, _CWPBL_,
+                               _CBTON_, _CBTBB_TransmitPulseType_,
+                               _SystemFrequency_, _BeamDiameter_, _CyclesPerElement_,
+                               _BeamAngle_, _SpeedOfSound_, _CWPBB_LagLength_, _BroadbandPower_,
+                               _Salinity_, _Temperature_, _XdcrDepth_, config=None):
+    """
+    Vectorized version of Range._calculate_predicted_range().  All results are in meters.
+
+    :param _CWPON_: Flag if Water Profile is turned on.
+    :param _CWPBB_TransmitPulseType_: WP broadband or narrowband.
+    :param _CWPBS_: Bin size in meters.
+    :param _CWPBN_: Number of bins.
+    :param _CWPBL_: Blank distance in meters.
+    :param _CBTON_: Flag if Bottom Track is turned on.
+    :param _CBTBB_TransmitPulseType_: BT broadband or narrowband.
+    :param _SystemFrequency_: System frequency in hz.
+    :param _BeamDiameter_: Beam diameter in meters.
+    :param _CyclesPerElement_: Cycles per element.
+    :param _BeamAngle_: Beam angle in degrees.
+    :param _SpeedOfSound_: Speed of sound in m/s.
+    :param _CWPBB_LagLength_: WP lag length in meters.
+    :param _BroadbandPower_: Broadband power.
+    :param _Salinity_: Salinity in ppt.
+    :param _Temperature_: Temperature in C.
+    :param _XdcrDepth_: Transducer Depth in meter.
+    :param config: Predictor configuration.  If not given, it is read from the json file.
+    :return: BT Range, WP Range, Range First Bin, Configured Range
+    """
+    if config is None:
+        config = get_config()
+        if config is None:
+            return (0.0, 0.0, 0.0, 0.0)
+
+    nb = rti_python.ADCP.AdcpCommands.eCWPBB_TransmitPulseType.NARROWBAND.value
+    bt_nb = rti_python.ADCP.AdcpCommands.eCBTBB_Mode.NARROWBAND_LONG_RANGE.value
+
+    _CWPON_ = np.asarray(_CWPON_, dtype=bool)
+    _CBTON_ = np.asarray(_CBTON_, dtype=bool)
+    _BroadbandPower_ = np.asarray(_BroadbandPower_, dtype=bool)
+    _CWPBB_TransmitPulseType_ = np.asarray(_CWPBB_TransmitPulseType_)
+    _CBTBB_TransmitPulseType_ = np.asarray(_CBTBB_TransmitPulseType_)
+    _CWPBS_ = np.asarray(_CWPBS_, dtype=float)
+    _CWPBN_ = np.asarray(_CWPBN_, dtype=float)
+    _CWPBL_ = np.asarray(_CWPBL_, dtype=float)
+    _SystemFrequency_ = np.asarray(_SystemFrequency_, dtype=float)
+    _CyclesPerElement_ = np.asarray(_CyclesPerElement_, dtype=float)
+    _BeamAngle_ = np.asarray(_BeamAngle_, dtype=float)
+    _CWPBB_LagLength_ = np.asarray(_CWPBB_LagLength_, dtype=float)
+
+    # Speed of sound must be a value
+    _SpeedOfSound_ = np.asarray(_SpeedOfSound_, dtype=float)
+    _SpeedOfSound_ = np.where(_SpeedOfSound_ == 0, 1490.0, _SpeedOfSound_)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        band = _band_index(_SystemFrequency_, config)
+        in_band = band >= 0
+
+        # Wave length and DI
+        wave_length = _SpeedOfSound_ / _SystemFrequency_
+        dI = 20.0 * np.log10(math.pi * _BeamDiameter_ / wave_length)
+
+        # Absorption
+        absorption = calc_absorption(_SystemFrequency_, _SpeedOfSound_,
+                                     np.asarray(_Salinity_, dtype=float),
+                                     np.asarray(_Temperature_, dtype=float),
+                                     np.asarray(_XdcrDepth_, dtype=float))
+
+        # Values for the selected frequency
+        ref_bin = _band_value(band, "BIN", config)
+        xmt_w = _band_value(band, "XMIT_W", config)
+        ref_range = _band_value(band, "RANGE", config)
+        r_scale = np.cos(_BeamAngle_ / 180.0 * math.pi) / np.cos(_band_value(band, "BEAM_ANGLE", config) / 180.0 * math.pi)
+        dI_band = 20.0 * np.log10(math.pi * _band_value(band, "DIAM", config) / wave_length)
+
+        dB = np.where((ref_bin == 0) | (_CyclesPerElement_ == 0),
+                      0.0,
+                      10.0 * np.log10(_CWPBS_ / ref_bin) + dI - dI_band - 10.0 * np.log10(_band_value(band, "CPE", config) / _CyclesPerElement_))
+
+        absorption_range = ref_range + ((_band_value(band, "ABSORPTION_SCALE", config) - absorption) * ref_range)
+
+        # Bottom Track range
+        bt_range = 2.0 * r_scale * (absorption_range + ref_bin * dB + np.where(_CBTBB_TransmitPulseType_ == bt_nb, 15.0 * ref_bin, 0.0))
+        bt_range = np.where(in_band & _CBTON_, bt_range, 0.0)
+
+        # Water Profile range
+        wp_range = r_scale * (absorption_range + ref_bin * dB + np.where(_CWPBB_TransmitPulseType_ == nb, config["DEFAULT"]["NB_PROFILE_REF"] * ref_bin, 0.0))
+        wp_range = np.where(in_band & _CWPON_, wp_range, 0.0)
+
+        # Sample rate, meters per sample and lag samples
+        sample_rate = _sample_rate(band, _SystemFrequency_, _CyclesPerElement_, config)
+        meters_per_sample = _meters_per_sample(sample_rate, _BeamAngle_, _SpeedOfSound_)
+        lag_samples = _lag_samples(meters_per_sample, _CWPBB_LagLength_)
+        safe_lag = np.where(lag_samples == 0, 1.0, lag_samples)
+
+        # Xmt Scale
+        xmt_scale = np.where(_BroadbandPower_, (safe_lag - 1.0) / safe_lag, 1.0 / safe_lag)
+        xmt_scale = np.where((_CWPBB_TransmitPulseType_ == nb) | (lag_samples == 0), 1.0, xmt_scale)
+
+        # Range Reduction
+        beam_xmt_power_profile = xmt_scale * xmt_w
+        range_reduction = np.where(xmt_w == 0,
+                                   0.0,
+                                   10.0 * np.log10(beam_xmt_power_profile / xmt_w) * ref_bin + 1.0)
+
+        # Bin Samples and Code Repeats
+        bin_samples = _bin_samples(meters_per_sample, _CWPBS_)
+        code_repeats = _code_repeats(bin_samples, lag_samples)
+
+        # First Bin Position
+        pos = np.where(_CWPBB_TransmitPulseType_ > 1,
+                       _CWPBS_,
+                       (lag_samples * (code_repeats - 1.0) * meters_per_sample + _CWPBS_ + _CWPBB_LagLength_) / 2.0)
+        pos = np.where(_CWPBB_TransmitPulseType_ == nb, (2.0 * _CWPBS_ + 0.05) / 2.0, pos)
+        first_bin_position = _CWPBL_ + pos
+
+        # Profile Range based off Settings
+        profile_range_settings = _CWPBL_ + (_CWPBS_ * _CWPBN_)
+
+        # Predicted ranges
+        wp = np.where(in_band, wp_range + range_reduction, 0.0)
+        bt = bt_range
+
+    return (bt, wp, first_bin_position, profile_range_settings)
+
+
+def calculate_power(**kwargs):
+    """
+    Vectorized version of Power.calculate_power().
+    All the parameters can be a scalar or an array.
+
+    :param CEI=: Time between ensembles in seconds.
+    :param DeploymentDuration=: Deployment length in days.
+    :param Beams=: Number of beams for this configuration.
+    :param SystemFrequency=: System frequency for this configuration.
+    :param CWPON=: Flag if Water Profile is turned on.
+    :param CWPBL=: WP Blank in meters.
+    :param CWPBS=: WP bin size in meters.
+    :param CWPBN=: Number of bins.
+    :param CWPBB_LagLength=: WP lag length in meters.
+    :param CWPBB=: WP broadband or narrowband.
+    :param CWPP=: Number of pings to average.
+    :param CWPTBP=: Time between each ping in the average.
+    :param CBTON=: Is Bottom Track turned on.
+    :param CBTBB=: BT broadband or narrowband.
+    :param BeamAngle=: Beam angle in degrees. Default 20 degrees.
+    :param SpeedOfSound=: Speed of sound in m/s.  Default 1490m/s
+    :param SystemBootPower=: The amount of power required to boot the ADCP in watts.
+    :param SystemWakeupTime=: The amount of time to boot the ADCP in seconds.
+    :param SystemInitPower=: The amount of power required to initialize the ADCP in watts.
+    :param SystemInitTime=: The amount of time to initialize the ADCP in seconds.
+    :param BroadbandPower=: Flag if using Broadband power.
+    :param SystemSavePower=: The amount of power required to save on the ADCP in watts.
+    :param SystemSaveTime=: The amount of time to save on the ADCP in seconds.
+    :param SystemSleepPower=: The amount to power required to make the ADCP sleep in watts.
+    :param BeamDiameter=: The beam diameter in meters.
+    :param CyclesPerElement=: Cycles per element.
+    :param Salinity=: Salinity in ppt.
+    :param Temperature=: Temperature in degrees C.
+    :param XdcrDepth=: Transducer depth in meters.
+    :param IsBurst_: Flag if we are using Burst Mode pinging.
+    :param EnsemblesPerBurst: Number of ensemble in a burst.
+    :return: The amount of power required based of the deployment parameters.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_power(*_power_args(kwargs, config),
+                            kwargs.pop('IsBurst', False),
+                            kwargs.pop('EnsemblesPerBurst', 0),
+                            config=config)
+
+
+def calculate_burst_power(**kwargs):
+    """
+    Vectorized version of Power.calculate_burst_power().
+    All the parameters can be a scalar or an array.
+
+    Takes the same parameters as calculate_power() and the burst settings.
+
+    :param CBI=: Flag if we are using Burst Mode pinging.
+    :param CBI_NumEns: Number of ensemble in a burst.
+    :param CBI_BurstInterval: The length of time in seconds for a burst.
+    :return: The amount of power required based of the deployment parameters.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_burst_power(*_power_args(kwargs, config),
+                                  kwargs.pop('CBI', config["DEFAULT"]["CBI"]),
+                                  kwargs.pop('CBI_BurstInterval', config["DEFAULT"]["CBI_BurstInterval"]),
+                                  kwargs.pop('CBI_NumEns', config["DEFAULT"]["CBI_NumEns"]),
+                                  config=config)
+
+
+def _power_args(kwargs, config):
+    """
+    Get the positional arguments for the power calculation from the kwargs.
+    Any value not given will use the default from the configuration.
+    :param kwargs: Parameters given by the user.
+    :param config: Predictor configuration.
+    :return: List of arguments in the order of _calculate_power().
+    """
+    return [kwargs.pop('CEI', config['DEFAULT']['CEI']),
+            kwargs.pop('DeploymentDuration', config['DEFAULT']['DeploymentDuration']),
+            kwargs.pop('Beams', config['DEFAULT']['Beams']),
+            kwargs.pop('SystemFrequency', config['DEFAULT']['SystemFrequency']),
+            kwargs.pop('CWPON', config['DEFAULT']['CWPON']),
+            kwargs.pop('CWPBL', config['DEFAULT']['CWPBL']),
+            kwargs.pop('CWPBS', config['DEFAULT']['CWPBS']),
+            kwargs.pop('CWPBN', config['DEFAULT']['CWPBN']),
+            kwargs.pop('CWPBB_LagLength', config['DEFAULT']['CWPBB_LagLength']),
+            kwargs.pop('CWPBB', config['DEFAULT']['CWPBB']),
+            kwargs.pop('CWPP', config['DEFAULT']['CWPP']),
+            kwargs.pop('CWPTBP', config['DEFAULT']['CWPTBP']),
+            kwargs.pop('CBTON', config['DEFAULT']['CBTON']),
+            kwargs.pop('CBTBB', config['DEFAULT']['CBTBB']),
+            kwargs.pop('BeamAngle', config["BeamAngle"]),
+            kwargs.pop('SpeedOfSound', config["SpeedOfSound"]),
+            kwargs.pop('SystemBootPower', config["SystemBootPower"]),
+            kwargs.pop('SystemWakeUpTime', config["SystemWakeupTime"]),
+            kwargs.pop('SystemInitPower', config["SystemInitPower"]),
+            kwargs.pop('SystemInitTime', config["SystemInitTime"]),
+            kwargs.pop('BroadbandPower', config["BroadbandPower"]),
+            kwargs.pop('SystemSavePower', config["SystemSavePower"]),
+            kwargs.pop('SystemSaveTime', config["SystemSaveTime"]),
+            kwargs.pop('SystemSleepPower', config["SystemSleepPower"]),
+            kwargs.pop('BeamDiameter', config["BeamDiameter"]),
+            kwargs.pop('CyclesPerElement', config["CyclesPerElement"]),
+            kwargs.pop('Salinity', config["Salinity"]),
+            kwargs.pop('Temperature', config["Temperature"]),
+            kwargs.pop('XdcrDepth', config["XdcrDepth"])]
+
+
+def _calculate_power(_cei_, _deployment_duration_, _beams_, _system_frequency_,
+                     _cwpon_, _cwpbl_, _cwpbs_, _cwpbn_, _cwpbb_lag_length_, _cwpbb_transmit_pulse_type_,
+                     _cwpp_, _cwptbp_,
+                     _cbton_, _cbtbb_transmit_pulse_type_,
+                     _beam_angle_, _speed_of_sound_,
+                     _system_boot_power_, _system_wakeup_time_, _system_init_power_, _system_init_time_,
+                     _broadband_power_, _system_save_power_, _system_save_time_, _system_sleep_power_,
+                     _beam_diameter_, _cycles_per_element_,
+                     _salinity_, _temperature_, _xdcr_depth_,
+                     _is_burst_=False, _ensembles_per_burst_=0, config=None):
+    """
+    Vectorized version of Power._calculate_power().  The parameters are the same as
+    the scalar version, but each one can be an array.
+
+    :param config: Predictor configuration.  If not given, it is read from the json file.
+    :return: The amount of power required based of the deployment parameters.
+    """
+    if config is None:
+        config = get_config()
+        if config is None:
+            return 0.0
+
+    bb = rti_python.ADCP.AdcpCommands.eCWPBB_TransmitPulseType.BROADBAND.value
+    nb = rti_python.ADCP.AdcpCommands.eCWPBB_TransmitPulseType.NARROWBAND.value
+
+    _cei_ = np.asarray(_cei_, dtype=float)
+    _deployment_duration_ = np.asarray(_deployment_duration_, dtype=float)
+    _beams_ = np.asarray(_beams_, dtype=float)
+    _system_frequency_ = np.asarray(_system_frequency_, dtype=float)
+    _cwpbs_ = np.asarray(_cwpbs_, dtype=float)
+    _cwpbn_ = np.asarray(_cwpbn_, dtype=float)
+    _cwpbb_transmit_pulse_type_ = np.asarray(_cwpbb_transmit_pulse_type_)
+    _cwpp_ = np.asarray(_cwpp_, dtype=float)
+    _cwptbp_ = np.asarray(_cwptbp_, dtype=float)
+    _cbton_ = np.asarray(_cbton_, dtype=bool)
+    _beam_angle_ = np.asarray(_beam_angle_, dtype=float)
+    _speed_of_sound_ = np.asarray(_speed_of_sound_, dtype=float)
+    _broadband_power_ = np.asarray(_broadband_power_, dtype=bool)
+    _cycles_per_element_ = np.asarray(_cycles_per_element_, dtype=float)
+    _is_burst_ = np.asarray(_is_burst_, dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Number of Ensembles
+        safe_cei = np.where(_cei_ == 0, 1.0, _cei_)
+        num_ensembles = np.where(_cei_ == 0, 0.0, np.round((_deployment_duration_ * 24.0 * 3600.0) / safe_cei))
+        num_ensembles = np.where(_is_burst_, _ensembles_per_burst_, num_ensembles)
+
+        # Wakeups
+        wakeups = np.where(_cei_ > 3.0, np.where(_cwptbp_ > 3.0, num_ensembles * _cwpp_, num_ensembles), 1)
+
+        # Bottom Track Pings
+        bottom_track_pings = np.where(_cwpp_ / 10.0 < 1, num_ensembles, np.round(_cwpp_ / 10.0) * num_ensembles)
+        bottom_track_pings = np.where(_cbton_, bottom_track_pings, 0.0)
+
+        # Bottom Track Time
+        (bottom_track_range, wp_range, first_bin, cfg_range) = _calculate_predicted_range(_cwpon_,
+                                                                                          _cwpbb_transmit_pulse_type_,
+                                                                                          _cwpbs_,
+                                                                                          _cwpbn_,
+                                                                                          _cwpbl_,
+                                                                                          _cbton_,
+                                                                                          _cbtbb_transmit_pulse_type_,
+                                                                                          _system_frequency_,
+                                                                                          _beam_diameter_,
+                                                                                          _cycles_per_element_,
+                                                                                          _beam_angle_,
+                                                                                          _speed_of_sound_,
+                                                                                          _cwpbb_lag_length_,
+                                                                                          _broadband_power_,
+                                                                                          _salinity_,
+                                                                                          _temperature_,
+                                                                                          _xdcr_depth_,
+                                                                                          config=config)
+        bottom_track_time = 0.0015 * bottom_track_range
+
+        # Values for the selected frequency
+        band = _band_index(_system_frequency_, config)
+        xmt_w = _band_value(band, "XMIT_W", config)
+
+        # Bottom Track Transmit and Receive Power
+        bt_transmit_power = bottom_track_pings * 0.2 * (bottom_track_time * xmt_w * _beams_) / 3600.0
+        freq_mult = np.where(_system_frequency_ > 600000.0, 2, 1)
+        bt_receive_power = bottom_track_pings * (bottom_track_time * _system_boot_power_) / 3600.0 * freq_mult
+
+        # Wakeup and Init Power
+        wakeup_power = wakeups * _system_wakeup_time_ * _system_boot_power_ / 3600.0
+        init_power = wakeups * _system_init_power_ * _system_init_time_ / 3600.0
+
+        # Sample Rate, Meters Per Sample, Bin Samples and Lag Samples
+        sample_rate = _sample_rate(band, _system_frequency_, _cycles_per_element_, config)
+        safe_rate = np.where(sample_rate == 0, 1.0, sample_rate)
+        meters_per_sample = _meters_per_sample(sample_rate, _beam_angle_, _speed_of_sound_)
+        bin_samples = _bin_samples(meters_per_sample, _cwpbs_)
+        lag_samples = _lag_samples(meters_per_sample, _cwpbb_lag_length_)
+        safe_lag = np.where(lag_samples == 0, 1.0, lag_samples)
+
+        # Bin Time, Code Repeats and Lag Time
+        bin_time = np.where(sample_rate == 0, 0.0, bin_samples / safe_rate)
+        code_repeats = _code_repeats(bin_samples, lag_samples)
+        lag_time = np.where(sample_rate == 0, 0.0, lag_samples / safe_rate)
+
+        # Transmit Code Time
+        transmit_code_time = np.where(_cwpbb_transmit_pulse_type_ == nb, bin_time, 2.0 * bin_time)
+        transmit_code_time = np.where(_cwpbb_transmit_pulse_type_ == bb,
+                                      np.where(code_repeats < 3, 2.0 * bin_time, code_repeats * lag_time),
+                                      transmit_code_time)
+
+        # Transmit Scale
+        xmt_scale = np.where(_broadband_power_, (safe_lag - 1.0) / safe_lag, 1.0 / safe_lag)
+        xmt_scale = np.where(lag_samples == 0, 0.0, xmt_scale)
+        xmt_scale = np.where(_cwpbb_transmit_pulse_type_ == nb, 1.0, xmt_scale)
+
+        # Transmit Power
+        beam_xmt_power_profile = xmt_scale * xmt_w
+        transmit_power = (transmit_code_time * beam_xmt_power_profile * _beams_ * num_ensembles * _cwpp_) / 3600.0
+
+        # Time Between Pings
+        ping_time = _cwpbn_ * bin_samples / safe_rate
+        time_between_pings = np.where((sample_rate != 0) & (ping_time > _cwptbp_), ping_time, _cwptbp_)
+
+        # Profile Time / Receive Time
+        receive_time = np.where(time_between_pings > 1.0, ping_time, time_between_pings)
+        receive_time = np.where(_cwpp_ == 1, np.where(_cei_ > 3, ping_time, _cei_), receive_time)
+        receive_time = np.where(sample_rate == 0, _cei_, receive_time)
+
+        # If in burst mode, use different default timing
+        burst_receive_time = np.where(time_between_pings > 1.0, ping_time, time_between_pings)
+        burst_receive_time = np.where((_cwpp_ == 1) | (sample_rate == 0), _cei_, burst_receive_time)
+        receive_time = np.where(_is_burst_, burst_receive_time, receive_time)
+
+        # Receive Power
+        system_rcv_power = np.select([_beams_ == 4, _beams_ == 5, _beams_ >= 7], [3.8, 4.30, 5.00], default=3.80)
+        freq_mult_rcv_pwr = np.where(_system_frequency_ > 700000.0, 2, 1)
+        receive_power = (receive_time * system_rcv_power * num_ensembles * _cwpp_) / 3600.0 * freq_mult_rcv_pwr
+
+        # Save Power
+        save_power = (wakeups * _system_save_power_ * _system_save_time_) / 3600.0
+
+        # Sleep Power
+        sleep_power = np.where(_is_burst_, _system_sleep_power_, _system_sleep_power_ * _deployment_duration_ * 24.0)
+
+        # Transmit Voltage and Leakage
+        sum_xmt_v = _band_value(band, "XMIT_V", config)
+        sum_leakage_ua = 3.0 * np.sqrt(2.0 * 0.000001 * _band_value(band, "UF", config) * sum_xmt_v)
+
+        # Cap Charge Power
+        leakage_hours = np.where(_is_burst_, 1.0, _deployment_duration_ * 24.0)
+        cap_charge_power = 0.03 * (bt_transmit_power + transmit_power) + 1.3 * leakage_hours * sum_xmt_v * 0.000001 * sum_leakage_ua
+
+    return bt_transmit_power + bt_receive_power + wakeup_power + init_power + transmit_power + receive_power + save_power + sleep_power + cap_charge_power
+
+
+def _calculate_burst_power(_cei_, _deployment_duration_, _beams_, _system_frequency_,
+                           _cwpon_, _cwpbl_, _cwpbs_, _cwpbn_, _cwpbb_lag_length_, _cwpbb_transmit_pulse_type_,
+                           _cwpp_, _cwptbp_,
+                           _cbton_, _cbtbb_transmit_pulse_type_,
+                           _beam_angle_, _speed_of_sound_,
+                           _system_boot_power_, _system_wakeup_time_, _system_init_power_, _system_init_time_,
+                           _broadband_power_, _system_save_power_, _system_save_time_, _system_sleep_power_,
+                           _beam_diameter_, _cycles_per_element_,
+                           _salinity_, _temperature_, _xdcr_depth_,
+                           _is_burst_=True, _burst_interval_=3600, _ensembles_per_burst_=4096, config=None):
+    """
+    Vectorized version of Power._calculate_burst_power().  The parameters are the same as
+    the scalar version, but each one can be an array.
+
+    :param config: Predictor configuration.  If not given, it is read from the json file.
+    :return: The amount of power required based of the deployment parameters.
+    """
+    # Calculate the amount it takes to do 1 burst
+    # Set the deployment duration to 1 day
+    burst_pwr = _calculate_power(_cei_, 1, _beams_, _system_frequency_,
+                                 _cwpon_, _cwpbl_, _cwpbs_, _cwpbn_,
+                                 _cwpbb_lag_length_, _cwpbb_transmit_pulse_type_,
+                                 _cwpp_, _cwptbp_,
+                                 _cbton_, _cbtbb_transmit_pulse_type_,
+                                 _beam_angle_, _speed_of_sound_,
+                                 _system_boot_power_, _system_wakeup_time_,
+                                 _system_init_power_, _system_init_time_,
+                                 _broadband_power_,
+                                 _system_save_power_, _system_save_time_,
+                                 _system_sleep_power_,
+                                 _beam_diameter_, _cycles_per_element_,
+                                 _salinity_, _temperature_, _xdcr_depth_,
+                                 _is_burst_, _ensembles_per_burst_,
+                                 config=config)
+
+    # Get the number of burst per deployment duration
+    deployment_dur = np.asarray(_deployment_duration_, dtype=float) * 3600 * 24
+    _burst_interval_ = np.asarray(_burst_interval_, dtype=float)
+    safe_interval = np.where(_burst_interval_ == 0, 1.0, _burst_interval_)
+    num_burst = np.where(_burst_interval_ != 0, np.round(deployment_dur / safe_interval), 0.0)
+
+    return burst_pwr * num_burst
+
+
+def calculate_number_batteries(**kwargs):
+    """
+    Vectorized version of Power.calculate_number_batteries().
+
+    :param PowerUsage=: Power usage for the deployment in watt/hr
+    :param DeploymentDuration=: Length of the deployment in days.
+    :param BatteryCapacity=: Total battery capactiy for a single battery in watt/hr
+    :param BatteryDerate=: Derate of the battery in watt/hr
+    :param BatterySelf_discharge=: Self discharge of the battery over a year in watt/hr
+    :return: Number of batteries.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_number_batteries(kwargs.pop('PowerUsage', 0.0),
+                                       kwargs.pop('DeploymentDuration', config['DEFAULT']['DeploymentDuration']),
+                                       kwargs.pop('BatteryCapacity', config['DEFAULT']['BatteryCapacity']),
+                                       kwargs.pop('BatteryDerate', config['DEFAULT']['BatteryDerate']),
+                                       kwargs.pop('BatterySelfDischarge', config['DEFAULT']['BatterySelfDischarge']))
+
+
+def _calculate_number_batteries(_power_usage_, _deployment_duration, _battery_capacity_, _battery_derate_, _battery_self_discharge_):
+    """
+    Vectorized version of Power._calculate_number_batteries().
+    :param _power_usage_: Power usage for the deployment in watt/hr
+    :param _deployment_duration: Length of the deployment in days.
+    :param _battery_capacity_: Total battery capactiy for a single battery in watt/hr
+    :param _battery_derate_: Derate of the battery in watt/hr
+    :param _battery_self_discharge_: Self discharge of the battery over a year in watt/hr
+    :return: Number of batteries.
+    """
+    battery_pwr = np.asarray(_battery_capacity_, dtype=float) * _battery_derate_ - np.asarray(_battery_self_discharge_, dtype=float) * _deployment_duration / 365.0
+
+    return np.asarray(_power_usage_, dtype=float) / battery_pwr
+
+
+def calculate_std(**kwargs):
+    """
+    Vectorized version of STD.calculate_std().
+    All the parameters can be a scalar or an array.
+
+    :param CWPP=: WP Number of pings.
+    :param CWPBS=: WP Bin size in meters.
+    :param CWPBB_LagLength=: WP Lag length in meters.
+    :param BeamAngle=: Beam angle in degrees.
+    :param CWPBB=: WP Broadband or narrowband.
+    :param SystemFrequency=: System frequency in hz.
+    :param SpeedOfSound=: Speed of Sound in m/s.
+    :param CyclesPerElement=: Cycles per elements.
+    :param SNR=: SNR in db.
+    :param Beta=: Environmental decorrelation.
+    :param NbFudge=: Narrowband fudge number.
+    :return: Standard deviation in m/s.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_std(kwargs.pop('CWPP', config['DEFAULT']['CWPP']),
+                          kwargs.pop('CWPBS', config['DEFAULT']['CWPBS']),
+                          kwargs.pop('CWPBB_LagLength', config['DEFAULT']['CWPBB_LagLength']),
+                          kwargs.pop('BeamAngle', config['BeamAngle']),
+                          kwargs.pop('CWPBB', config['DEFAULT']['CWPBB']),
+                          kwargs.pop('SystemFrequency', config['DEFAULT']['SystemFrequency']),
+                          kwargs.pop('SpeedOfSound', config['DEFAULT']['SpeedOfSound']),
+                          kwargs.pop('CyclesPerElement', config['CyclesPerElement']),
+                          kwargs.pop('SNR', config['SNR']),
+                          kwargs.pop('Beta', config['Beta']),
+                          kwargs.pop('NbFudge', config['NbFudge']),
+                          config=config)
+
+
+def _calculate_std(_CWPP_, _CWPBS_, _CWPBB_LagLength_,
+                   _BeamAngle_, _CWPBB_TransmitPulseType_,
+                   _SystemFrequency_, _SpeedOfSound_, _CyclesPerElement_,
+                   _SNR_, _Beta_, _NbFudge_, config=None):
+    """
+    Vectorized version of STD._calculate_std().
+
+    :param _CWPP_: WP Number of pings.
+    :param _CWPBS_: WP Bin size in meters.
+    :param _CWPBB_LagLength_: WP Lag length in meters.
+    :param _BeamAngle_: Beam angle in degrees.
+    :param _CWPBB_TransmitPulseType_: WP Broadband or narrowband.
+    :param _SystemFrequency_: System frequency in hz.
+    :param _SpeedOfSound_: Speed of Sound in m/s.
+    :param _CyclesPerElement_: Cycles per elements.
+    :param _SNR_: SNR in db.
+    :param _Beta_: Environmental decorrelation.
+    :param _NbFudge_: Narrowband fudge number.
+    :param config: Predictor configuration.  If not given, it is read from the json file.
+    :return: Standard deviation in m/s.
+    """
+    if config is None:
+        config = get_config()
+        if config is None:
+            return 0.0
+
+    _CWPP_ = np.asarray(_CWPP_, dtype=float)
+    _CWPBS_ = np.asarray(_CWPBS_, dtype=float)
+    _BeamAngle_ = np.asarray(_BeamAngle_, dtype=float)
+    _CWPBB_TransmitPulseType_ = np.asarray(_CWPBB_TransmitPulseType_)
+    _SystemFrequency_ = np.asarray(_SystemFrequency_, dtype=float)
+    _SpeedOfSound_ = np.asarray(_SpeedOfSound_, dtype=float)
+    _CyclesPerElement_ = np.asarray(_CyclesPerElement_, dtype=float)
+    _SNR_ = np.asarray(_SNR_, dtype=float)
+    _Beta_ = np.asarray(_Beta_, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        band = _band_index(_SystemFrequency_, config)
+        sample_rate = _sample_rate(band, _SystemFrequency_, _CyclesPerElement_, config)
+        meters_per_sample = _meters_per_sample(sample_rate, _BeamAngle_, _SpeedOfSound_)
+        lag_samples = _lag_samples(meters_per_sample, _CWPBB_LagLength_)
+        bin_samples = _bin_samples(meters_per_sample, _CWPBS_)
+        code_repeats = _code_repeats(bin_samples, lag_samples)
+
+        # rho
+        rho = _Beta_ * ((code_repeats - 1.0) / code_repeats) / (1.0 + np.power(1.0 / 10.0, _SNR_ / 10.0))
+        rho = np.where((code_repeats == 0) | (_SNR_ == 0), 0.0, rho)
+        rho = np.where(_CWPBB_TransmitPulseType_ < 2, rho, _Beta_)
+
+        # STD Radial
+        std_dev_radial = 0.034 * (118.0 / lag_samples) * np.sqrt(14.0 / bin_samples) * np.power((rho / 0.5), -2.0)
+        std_dev_radial = np.where((lag_samples == 0) | (bin_samples == 0), 0.0, std_dev_radial)
+
+        # Broadband STD
+        beam_angle_rad = _BeamAngle_ / 180.0 * math.pi
+        std_dev_system = std_dev_radial / np.sqrt(_CWPP_) / math.sqrt(2.0) / np.sin(beam_angle_rad)
+        std_dev_system = np.where(_BeamAngle_ == 0, std_dev_radial, std_dev_system)
+        std_dev_system = np.where(_CWPP_ == 0, 0.0, std_dev_system)
+
+        # NbLamda, NbTa and NbL
+        nb_lamda = np.where(_SystemFrequency_ == 0, 0.0, _SpeedOfSound_ / _SystemFrequency_)
+        nb_ta = np.where((_SpeedOfSound_ == 0) | (beam_angle_rad == 0), 0.0, 2.0 * _CWPBS_ / _SpeedOfSound_ / np.cos(beam_angle_rad))
+        nb_l = 0.5 * _SpeedOfSound_ * nb_ta
+
+        # Narrowband STD Radial
+        snr_linear = np.power(10, (_SNR_ / 10))
+        nb_std_dev_radial = _NbFudge_ * (_SpeedOfSound_ * nb_lamda / (8 * math.pi * nb_l)) * np.sqrt(1 + 36 / snr_linear + 30 / np.power(snr_linear, 2))
+        nb_std_dev_radial = np.where((nb_l == 0) | (_SNR_ == 0), 0.0, nb_std_dev_radial)
+
+        # Narrowband STD
+        nb_std_dev_system = nb_std_dev_radial / np.sin(_BeamAngle_ / 180 * math.pi) / math.sqrt(2) / np.sqrt(_CWPP_)
+        nb_std_dev_system = np.where((_CWPP_ == 0) | (_BeamAngle_ == 0), 0.0, nb_std_dev_system)
+
+    # Check if using Broadband or Narrowband
+    return np.where(_CWPBB_TransmitPulseType_ > 0, std_dev_system, nb_std_dev_system)
+
+
+def calculate_max_velocity(**kwargs):
+    """
+    Vectorized version of MaxVelocity.calculate_max_velocity().
+    All the parameters can be a scalar or an array.
+
+    :param CWPBB=: Broadband or Narrowband.
+    :param CWPBB_LagLength=: WP lag length in meters.
+    :param CWPBS=: Bin Size.
+    :param BeamAngle=: Beam angle in degrees.
+    :param SystemFrequency=: System frequency in hz.
+    :param SpeedOfSound=: Speed of Sound in m/s.
+    :param CyclesPerElement=: Cycles per element.
+    :return: Maximum velocity the ADCP can read in m/s.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_max_velocity(kwargs.pop('CWPBB', config['DEFAULT']['CWPBB']),
+                                   kwargs.pop('CWPBB_LagLength', config['DEFAULT']['CWPBB_LagLength']),
+                                   kwargs.pop('CWPBS', config['DEFAULT']['CWPBS']),
+                                   kwargs.pop('BeamAngle', config['BeamAngle']),
+                                   kwargs.pop('SystemFrequency', config['DEFAULT']['SystemFrequency']),
+                                   kwargs.pop('SpeedOfSound', config['SpeedOfSound']),
+                                   kwargs.pop('CyclesPerElement', config['CyclesPerElement']),
+                                   config=config)
+
+
+def _calculate_max_velocity(_CWPBB_, _CWPBB_LagLength_, _CWPBS_, _BeamAngle_, _SystemFrequency_, _SpeedOfSound_, _CyclesPerElement_, config=None):
+    """
+    Vectorized version of MaxVelocity._calculate_max_velocity().
+
+    :param _CWPBB_ Broadband or Narrowband.
+    :param _CWPBB_LagLength_: WP lag length in meters.
+    :param _CWPBS_: Bin size in meters.
+    :param _BeamAngle_: Beam angle in degrees.
+    :param _SystemFrequency_: System frequency in hz.
+    :param _SpeedOfSound_: Speed of Sound in m/s.
+    :param _CyclesPerElement_: Cycles per element.
+    :param config: Predictor configuration.  If not given, it is read from the json file.
+    :return: Maximum velocity the ADCP can read in m/s.
+    """
+    if config is None:
+        config = get_config()
+        if config is None:
+            return 0.0
+
+    _CWPBB_ = np.asarray(_CWPBB_)
+    _CWPBS_ = np.asarray(_CWPBS_, dtype=float)
+    _BeamAngle_ = np.asarray(_BeamAngle_, dtype=float)
+
+    # Prevent divide by 0
+    _CyclesPerElement_ = np.asarray(_CyclesPerElement_, dtype=float)
+    _CyclesPerElement_ = np.where(_CyclesPerElement_ == 0, 1.0, _CyclesPerElement_)
+    _SpeedOfSound_ = np.asarray(_SpeedOfSound_, dtype=float)
+    _SpeedOfSound_ = np.where(_SpeedOfSound_ == 0, 1490.0, _SpeedOfSound_)
+    _SystemFrequency_ = np.asarray(_SystemFrequency_, dtype=float)
+    _SystemFrequency_ = np.where(_SystemFrequency_ == 0, config["DEFAULT"]["1200000"]["FREQ"], _SystemFrequency_)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        band = _band_index(_SystemFrequency_, config)
+        sample_rate = _sample_rate(band, _SystemFrequency_, _CyclesPerElement_, config)
+        meters_per_sample = _meters_per_sample(sample_rate, _BeamAngle_, _SpeedOfSound_)
+        lag_samples = _lag_samples(meters_per_sample, _CWPBB_LagLength_)
+
+        # Ua Hz and Ua Radial
+        ua_hz = np.where(lag_samples == 0, 0.0, sample_rate / (2.0 * lag_samples))
+        ua_radial = ua_hz * _SpeedOfSound_ / (2.0 * _SystemFrequency_)
+
+        # Narrowband
+        beam_angle_rad = _BeamAngle_ / 180.0 * math.pi
+        Ta = 2.0 * _CWPBS_ / _SpeedOfSound_ / np.cos(beam_angle_rad)
+        L = 0.5 * _SpeedOfSound_ * Ta
+
+        max_vel = np.where(_CWPBB_ == 0, L, ua_radial) / np.sin(beam_angle_rad)
+
+    # Check for vertical beam.No Beam angle
+    return np.where(_BeamAngle_ == 0, ua_radial, max_vel)
+
+
+def calculate_storage_amount(**kwargs):
+    """
+    Vectorized version of DataStorage.calculate_storage_amount().
+    All the parameters can be a scalar or an array.
+
+    :param CEOUTPUT= Format the data is in.  RTB or PD0
+    :param CWPBN=: Number of bins.
+    :param Beams=: Number of beams.
+    :param DeploymentDuration=: Deployment duration.
+    :param CEI=: Time between ensembles.
+    :param IsE0000001=: Flag if IsE0000001 is enabled.  Same for IsE0000002 to IsE0000015.
+    :return: Number of bytes required for the given deployment.
+    """
+    config = get_config()
+    if config is None:
+        return 0.0
+
+    return _calculate_storage_amount(kwargs.pop('CEOUTPUT', config['CEOUTPUT']),
+                                     kwargs.pop('CWPBN', config['DEFAULT']['CWPBN']),
+                                     kwargs.pop('Beams', config['DEFAULT']['Beams']),
+                                     kwargs.pop('DeploymentDuration', config['DEFAULT']['DeploymentDuration']),
+                                     kwargs.pop('CEI', config['DEFAULT']['CEI']),
+                                     *[kwargs.pop('IsE%07d' % ds, config['DEFAULT']['IsE%07d' % ds]) for ds in range(1, 16)])
+
+
+def _calculate_storage_amount(_CEOUTPUT_, _CWPBN_, _Beams_,
+                              _DeploymentDuration_, _CEI_,
+                              IsE0000001, IsE0000002, IsE0000003,
+                              IsE0000004, IsE0000005, IsE0000006,
+                              IsE0000007, IsE0000008, IsE0000009,
+                              IsE0000010, IsE0000011, IsE0000012,
+                              IsE0000013, IsE0000014, IsE0000015):
+    """
+    Vectorized version of DataStorage._calculate_storage_amount().
+
+    :param _CEOUTPUT_ Format the data is in.  RTB or PD0
+    :param _CWPBN_: Number of bins.
+    :param _Beams_: Number of beams.
+    :param _DeploymentDuration_: Deployment duration.
+    :param _CEI_: Time between ensembles.
+    :param IsE0000001: Flag if IsE0000001 is enabled.  Same for IsE0000002 to IsE0000015.
+    :return: Number of bytes required for the given deployment.
+    """
+    ensemble_size = _calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_,
+                                             IsE0000001, IsE0000002, IsE0000003,
+                                             IsE0000004, IsE0000005, IsE0000006,
+                                             IsE0000007, IsE0000008, IsE0000009,
+                                             IsE0000010, IsE0000011, IsE0000012,
+                                             IsE0000013, IsE0000014, IsE0000015)
+
+    # Number of Ensembles
+    _CEI_ = np.asarray(_CEI_, dtype=float)
+    safe_cei = np.where(_CEI_ == 0, 1.0, _CEI_)
+    ensembles = np.where(_CEI_ != 0, np.round(np.asarray(_DeploymentDuration_, dtype=float) * 24 * 3600 / safe_cei), 0)
+
+    return ensembles * ensemble_size
+
+
+def _calculate_burst_storage_amount(_CEOUTPUT_, _CBI_NumEns_, _CBI_BurstInterval_,
+                                    _CWPBN_, _Beams_, _DeploymentDuration_,
+                                    IsE0000001, IsE0000002, IsE0000003,
+                                    IsE0000004, IsE0000005, IsE0000006,
+                                    IsE0000007, IsE0000008, IsE0000009,
+                                    IsE0000010, IsE0000011, IsE0000012,
+                                    IsE0000013, IsE0000014, IsE0000015):
+    """
+    Vectorized version of DataStorage._calculate_burst_storage_amount().
+
+    :param _CEOUTPUT_ Format the data is in.  RTB or PD0
+    :param _CBI_NumEns_: Number of ensembles in the burst.
+    :param _CBI_BurstInterval_: Time between bursts in seconds.
+    :param _CWPBN_: Number of bins.
+    :param _Beams_: Number of beams.
+    :param _DeploymentDuration_: Deployment duration.
+    :param IsE0000001: Flag if IsE0000001 is enabled.  Same for IsE0000002 to IsE0000015.
+    :return: Number of bytes required for the given burst deployment.
+    """
+    ensemble_size = _calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_,
+                                             IsE0000001, IsE0000002, IsE0000003,
+                                             IsE0000004, IsE0000005, IsE0000006,
+                                             IsE0000007, IsE0000008, IsE0000009,
+                                             IsE0000010, IsE0000011, IsE0000012,
+                                             IsE0000013, IsE0000014, IsE0000015)
+
+    # Number of bursts in the deployment
+    burst_interval = np.asarray(_CBI_BurstInterval_, dtype=float)
+    safe_interval = np.where(burst_interval == 0, 1.0, burst_interval)
+    num_bursts = np.where(burst_interval != 0, np.round(np.asarray(_DeploymentDuration_, dtype=float) * 3600.0 * 24.0 / safe_interval), 0)
+
+    return np.asarray(_CBI_NumEns_, dtype=float) * ensemble_size * num_bursts
+
+
+def _calculate_ensemble_size(_CEOUTPUT_, _CWPBN_, _Beams_,
+                             IsE0000001, IsE0000002, IsE0000003,
+                             IsE0000004, IsE0000005, IsE0000006,
+                             IsE0000007, IsE0000008, IsE0000009,
+                             IsE0000010, IsE0000011, IsE0000012,
+                             IsE0000013, IsE0000014, IsE0000015):
+    """
+    Vectorized version of DataStorage._calculate_ensemble_size().
+
+    :param _CEOUTPUT_ Format the data is in.  RTB or PD0
+    :param _CWPBN_: Number of bins.
+    :param _Beams_: Number of beams.
+    :param IsE0000001: Flag if IsE0000001 is enabled.  Same for IsE0000002 to IsE0000015.
+    :return: Number of bytes for the ensemble.
+    """
+    MATLAB_OVERHEAD = 7
+
+    _CWPBN_ = np.asarray(_CWPBN_, dtype=float)
+    _Beams_ = np.asarray(_Beams_, dtype=float)
+
+    # RTB
+    # E0000001 to E0000007 are all bins x beams
+    profile_size = 4 * (_CWPBN_ * _Beams_ + MATLAB_OVERHEAD)
+    rtb = np.zeros(np.broadcast(_CWPBN_, _Beams_).shape)
+    for is_enabled in [IsE0000001, IsE0000002, IsE0000003, IsE0000004, IsE0000005, IsE0000006, IsE0000007]:
+        rtb = rtb + np.where(is_enabled, profile_size, 0)
+
+    rtb = rtb + np.where(IsE0000008, 4 * (23 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000009, 4 * (19 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000010, 4 * (14 + 15 * _Beams_ + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000012, 4 * (23 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000013, 4 * (30 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000014, 4 * (25 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + np.where(IsE0000015, 4 * (8 * _Beams_ + 1 + MATLAB_OVERHEAD), 0)
+    rtb = rtb + 4 + 32                                  # Checksum and Header
+
+    # PD0
+    # Header, Fixed Leader, Variable Leader, Velocity, Echo Intensity, Correlation, Percent Good, Bottom Track, Checksum
+    num_dt = 7
+    pd0 = (6 + num_dt) + 59 + 65 + (2 + (_CWPBN_ * (2 * _Beams_))) + 3 * (2 + (_CWPBN_ * _Beams_)) + 84 + 2
+
+    return np.where(np.asarray(_CEOUTPUT_) == "RTB", rtb, pd0)
+
+
+def sweep(as_dataframe=False, **kwargs):
+    """
+    Calculate all the predictions for every combination of the given parameters.
+    The parameters can be scalars, arrays or a grid from make_grid().  They are
+    broadcast together and the results are flattened, so each row is a single
+    configuration.
+
+    The parameters are the same as calculate_power() and calculate_std().
+    Also include SNR, Beta, NbFudge, CEOUTPUT, IsE0000001 to IsE0000015,
+    BatteryCapacity, BatteryDerate and BatterySelfDischarge.
+
+    :param as_dataframe: Return a pandas DataFrame instead of a dictionary.
+    :return: Dictionary (or DataFrame) with the parameters and the results.
+    """
+    config = get_config()
+    if config is None:
+        return None
+
+    # Keep the parameters broadcastable, so each calculation only
+    # uses the dimensions it depends on
+    params = {key: np.asarray(value) for key, value in kwargs.items()}
+    shape = np.broadcast_shapes(*[value.shape for value in params.values()])
+
+    def param(key, default):
+        return params.get(key, default)
+
+    is_burst = np.asarray(param('CBI', config["DEFAULT"]["CBI"]), dtype=bool)
+
+    power_args = _power_args(dict(params), config)
+    (cei, deployment_duration, beams, freq, cwpon, cwpbl, cwpbs, cwpbn, lag_length, cwpbb, cwpp, cwptbp,
+     cbton, cbtbb, beam_angle, speed_of_sound, boot_power, wakeup_time, init_power, init_time, broadband_power,
+     save_power, save_time, sleep_power, beam_diameter, cpe, salinity, temperature, xdcr_depth) = power_args
+    power = _calculate_power(*power_args, config=config)
+    if is_burst.any():
+        burst_power = _calculate_burst_power(*power_args,
+                                             True,
+                                             param('CBI_BurstInterval', config["DEFAULT"]["CBI_BurstInterval"]),
+                                             param('CBI_NumEns', config["DEFAULT"]["CBI_NumEns"]),
+                                             config=config)
+        power = np.where(is_burst, burst_power, power)
+
+    (bt_range, wp_range, first_bin, cfg_range) = _calculate_predicted_range(cwpon, cwpbb, cwpbs, cwpbn, cwpbl,
+                                                                            cbton, cbtbb, freq, beam_diameter, cpe,
+                                                                            beam_angle, speed_of_sound, lag_length,
+                                                                            broadband_power, salinity, temperature,
+                                                                            xdcr_depth, config=config)
+
+    std = _calculate_std(cwpp, cwpbs, lag_length,
+                         beam_angle, cwpbb, freq,
+                         speed_of_sound, cpe,
+                         param('SNR', config['SNR']),
+                         param('Beta', config['Beta']),
+                         param('NbFudge', config['NbFudge']),
+                         config=config)
+
+    max_vel = _calculate_max_velocity(cwpbb, lag_length, cwpbs, beam_angle,
+                                      freq, speed_of_sound, cpe, config=config)
+
+    flags = [param('IsE%07d' % ds, config['DEFAULT']['IsE%07d' % ds]) for ds in range(1, 16)]
+    storage = _calculate_storage_amount(param('CEOUTPUT', config['CEOUTPUT']), cwpbn, beams,
+                                        deployment_duration, cei, *flags)
+    if is_burst.any():
+        burst_storage = _calculate_burst_storage_amount(param('CEOUTPUT', config['CEOUTPUT']),
+                                                        param('CBI_NumEns', config["DEFAULT"]["CBI_NumEns"]),
+                                                        param('CBI_BurstInterval', config["DEFAULT"]["CBI_BurstInterval"]),
+                                                        cwpbn, beams, deployment_duration, *flags)
+        storage = np.where(is_burst, burst_storage, storage)
+
+    batteries = _calculate_number_batteries(power,
+                                            deployment_duration,
+                                            param('BatteryCapacity', config['DEFAULT']['BatteryCapacity']),
+                                            param('BatteryDerate', config['DEFAULT']['BatteryDerate']),
+                                            param('BatterySelfDischarge', config['DEFAULT']['BatterySelfDischarge']))
+
+    # Flatten everything, so each row is a single configuration
+    results = {key: np.broadcast_to(value, shape).ravel() for key, value in params.items()}
+    results['Power'] = np.broadcast_to(power, shape).ravel()
+    results['NumBatteries'] = np.broadcast_to(batteries, shape).ravel()
+    results['BtRange'] = np.broadcast_to(bt_range, shape).ravel()
+    results['WpRange'] = np.broadcast_to(wp_range, shape).ravel()
+    results['FirstBinRange'] = np.broadcast_to(first_bin, shape).ravel()
+    results['CfgRange'] = np.broadcast_to(cfg_range, shape).ravel()
+    results['STD'] = np.broadcast_to(std, shape).ravel()
+    results['MaxVelocity'] = np.broadcast_to(max_vel, shape).ravel()
+    results['DataStorage'] = np.broadcast_to(storage, shape).ravel()
+
+    if as_dataframe:
+        import pandas as pd
+        return pd.DataFrame(results)
+
+    return results
+
+
+def _scalar_cases():
+    """
+    Combination of parameters used to compare the scalar and vectorized calculations.
+    """
+    cases = []
+    for freq, cwpbb, cwpbs, cwpbn, cwpp, cei, cbton, beams in itertools.product([1152000, 576000, 288000, 144000, 72000, 36000],
+                                                                               [0, 1, 2],
+                                                                               [0.5, 4.0],
+                                                                               [10, 200],
+                                                                               [1, 9],
+                                                                               [1, 5],
+                                                                               [True, False],
+                                                                               [4, 5]):
+        cases.append(dict(SystemFrequency=freq, CWPBB=cwpbb, CWPBS=cwpbs, CWPBN=cwpbn, CWPP=cwpp, CEI=cei, CBTON=cbton, Beams=beams))
+    return cases
+
+
+def test_sweep_power_matches_scalar():
+    cases = _scalar_cases()
+    keys = cases[0].keys()
+    vector = calculate_power(**{key: np.array([case[key] for case in cases]) for key in keys})
+
+    for i, case in enumerate(cases):
+        assert vector[i] == pytest.approx(rti_python.ADCP.Predictor.Power.calculate_power(**case), rel=1e-9)
+
+
+def test_sweep_burst_power_matches_scalar():
+    cases = _scalar_cases()
+    keys = cases[0].keys()
+    vector = calculate_burst_power(CBI=True, CBI_NumEns=1024, CBI_BurstInterval=1800,
+                                   **{key: np.array([case[key] for case in cases]) for key in keys})
+
+    for i, case in enumerate(cases):
+        scalar = rti_python.ADCP.Predictor.Power.calculate_burst_power(CBI=True, CBI_NumEns=1024, CBI_BurstInterval=1800, **case)
+        assert vector[i] == pytest.approx(scalar, rel=1e-9)
+
+
+def test_sweep_range_matches_scalar():
+    cases = _scalar_cases()
+    vector = calculate_predicted_range(SystemFrequency=np.array([case['SystemFrequency'] for case in cases]),
+                                       CWPBB=np.array([case['CWPBB'] for case in cases]),
+                                       CWPBS=np.array([case['CWPBS'] for case in cases]),
+                                       CWPBN=np.array([case['CWPBN'] for case in cases]),
+                                       CBTON=np.array([case['CBTON'] for case in cases]),
+                                       CBTBB=np.array([case['CWPBB'] for case in cases]))
+
+    for i, case in enumerate(cases):
+        scalar = rti_python.ADCP.Predictor.Range.calculate_predicted_range(SystemFrequency=case['SystemFrequency'],
+                                                                           CWPBB=case['CWPBB'],
+                                                                           CWPBS=case['CWPBS'],
+                                                                           CWPBN=case['CWPBN'],
+                                                                           CBTON=case['CBTON'],
+                                                                           CBTBB=case['CWPBB'])
+        for j in range(4):
+            assert vector[j][i] == pytest.approx(scalar[j], rel=1e-9)
+
+
+def test_sweep_std_max_vel_matches_scalar():
+    cases = _scalar_cases()
+    freq = np.array([case['SystemFrequency'] for case in cases])
+    cwpbb = np.array([case['CWPBB'] for case in cases])
+    cwpbs = np.array([case['CWPBS'] for case in cases])
+    cwpp = np.array([case['CWPP'] for case in cases])
+
+    std = calculate_std(SystemFrequency=freq, CWPBB=cwpbb, CWPBS=cwpbs, CWPP=cwpp)
+    max_vel = calculate_max_velocity(SystemFrequency=freq, CWPBB=cwpbb, CWPBS=cwpbs)
+
+    for i, case in enumerate(cases):
+        scalar_std = rti_python.ADCP.Predictor.STD.calculate_std(SystemFrequency=case['SystemFrequency'], CWPBB=case['CWPBB'],
+                                                                 CWPBS=case['CWPBS'], CWPP=case['CWPP'])
+        scalar_max_vel = rti_python.ADCP.Predictor.MaxVelocity.calculate_max_velocity(SystemFrequency=case['SystemFrequency'],
+                                                                                      CWPBB=case['CWPBB'],
+                                                                                      CWPBS=case['CWPBS'])
+        assert std[i] == pytest.approx(scalar_std, rel=1e-9)
+        assert max_vel[i] == pytest.approx(scalar_max_vel, rel=1e-9)
+
+
+def test_sweep_storage_matches_scalar():
+    for output in ["RTB", "PD0"]:
+        vector = calculate_storage_amount(CEOUTPUT=output, CWPBN=np.array([10, 30, 200]), Beams=np.array([[3], [4]]),
+                                          IsE0000002=False, IsE0000013=False)
+        for i, beams in enumerate([3, 4]):
+            for j, bins in enumerate([10, 30, 200]):
+                scalar = rti_python.ADCP.Predictor.DataStorage.calculate_storage_amount(CEOUTPUT=output, CWPBN=bins, Beams=beams,
+                                                                                        IsE0000002=False, IsE0000013=False)
+                assert vector[i][j] == scalar
+
+
+def test_sweep_burst_storage():
+    results = sweep(CBI=[False, True], CBI_NumEns=1024, CBI_BurstInterval=1800, CWPBN=30, Beams=4, DeploymentDuration=30)
+
+    burst = rti_python.ADCP.Predictor.DataStorage.calculate_burst_storage_amount(CBI_NumEns=1024, CBI_BurstInterval=1800,
+                                                                                 CWPBN=30, Beams=4, DeploymentDuration=30)
+    ensemble_size = rti_python.ADCP.Predictor.DataStorage.calculate_ensemble_size(CWPBN=30, Beams=4)
+    assert results['DataStorage'][1] == burst
+    assert burst == 1024 * ensemble_size * 30 * 48
+
+
+def test_sweep_grid():
+    start = time.process_time()
+    grid = make_grid(CWPBS=np.linspace(0.5, 8, 16),
+                     CWPBN=np.arange(10, 260, 10),
+                     CWPP=[1, 2, 4, 9, 16, 32, 64, 128],
+                     CEI=[1, 2, 5, 10, 30, 60, 300, 600, 900, 1800],
+                     SystemFrequency=[288000, 576000, 1152000],
+                     Temperature=[0, 5, 10, 15, 20, 25, 30, 35],
+                     CWPBB=[0, 1])
+    results = sweep(**grid)
+
+    assert len(results['Power']) == 16 * 25 * 8 * 10 * 3 * 8 * 2
+    assert len(results['Power']) > 10 ** 6
+    assert time.process_time() - start < 10.0
+
+    # Check a single configuration against the scalar version
+    i = np.flatnonzero((results['CWPBS'] == 4.0) & (results['CWPBN'] == 30) & (results['CWPP'] == 9) &
+                       (results['CEI'] == 1) & (results['SystemFrequency'] == 288000) &
+                       (results['Temperature'] == 10) & (results['CWPBB'] == 1))[0]
+    assert results['Power'][i] == pytest.approx(rti_python.ADCP.Predictor.Power.calculate_power(CWPBS=4.0, CWPBN=30, CWPP=9, CEI=1,
+                                                                                                  SystemFrequency=288000,
+                                                                                                  Temperature=10, CWPBB=1), rel=1e-9)
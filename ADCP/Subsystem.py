@@ -65,3 +65,14 @@ def ss_label(ss_code):
     else:
         return "1200 kHz"                # Default is 1200 khz
 
+
+def ss_beam_angle(ss_code):
+    """
+    Get the beam angle based on the subsystem code.
+    :param ss_code: Subsystem code.
+    :return: Beam angle from vertical in degrees.
+    """
+    if ss_code in ("A", "B", "C", "D", "E"):    # Vertical beam
+        return 0.0
+    else:
+        return 20.0                             # Default is 20 degrees
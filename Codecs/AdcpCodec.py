@@ -2,7 +2,8 @@ import logging
 from Codecs.BinaryCodec import BinaryCodec
 from Codecs.BinaryCodecUdp import BinaryCodecUdp
 from Codecs.WaveForceCodec import WaveForceCodec
-from Utilities.events import EventHandler
+from Ensemble.EnsembleAverager import EnsembleAverager
+from Utilities.events import EventHandler, AsyncEventHandler
 
 logger = logging.getLogger("ADCP Codec")
 logger.setLevel(logging.ERROR)
@@ -17,7 +18,14 @@ class AdcpCodec:
     codecs to decode the data.
     """
 
-    def __init__(self, is_udp=False, udp_port=55057):
+    def __init__(self, is_udp=False, udp_port=55057, async_events=False):
+        """
+        :param is_udp: Stream the decoded datasets to the UDP port.
+        :param udp_port: UDP port to stream the data.
+        :param async_events: Call each EnsembleEvent subscriber on its own thread, so a slow subscriber does not stop the decoding.
+                             No ensembles are dropped unless the subscriber is added with a drop policy, like a plot:
+                             codec.EnsembleEvent.add(plot.update, policy=POLICY_DROP_OLDEST)
+        """
         if not is_udp:
             self.binary_codec = BinaryCodec()
         else:
@@ -28,8 +36,14 @@ class AdcpCodec:
         self.WaveForceCodec = WaveForceCodec()
         self.IsWfcEnabled = False
 
+        # Ensemble averager
+        self.averager = None
+
         # Event to receive the ensembles
-        self.EnsembleEvent = EventHandler(self)
+        if async_events:
+            self.EnsembleEvent = AsyncEventHandler(self)
+        else:
+            self.EnsembleEvent = EventHandler(self)
 
     def add(self, data):
         """
@@ -56,6 +70,34 @@ class AdcpCodec:
         self.WaveForceCodec.init(ens_in_burst, path, lat, lon, bin1, bin2, bin3, ps_depth)
         self.IsWfcEnabled = True
 
+    def enable_averaging(self, num_ens=0, seconds=0.0, linear_amplitude=False):
+        """
+        Average the ensembles before passing them to the subscribers.
+        The subscribers will receive the averaged ensembles.
+        :param num_ens: Number of ensembles to average.  0 to only use the time.
+        :param seconds: Time interval to average in seconds.  0 to only use the number of ensembles.
+        :param linear_amplitude: Average the amplitude in linear power instead of dB.
+        """
+        self.disable_averaging()
+        self.averager = EnsembleAverager(num_ens, seconds, linear_amplitude)
+        self.averager.EnsembleEvent += self.process_average
+
+    def disable_averaging(self):
+        """
+        Stop averaging the ensembles.  The ensembles in the
+        current average are averaged and passed to the subscribers.
+        """
+        if self.averager is not None:
+            self.averager.flush()
+            self.averager = None
+
+    def process_average(self, sender, ens):
+        """
+        Pass the averaged ensemble to all the subscribers.
+        :param ens: Averaged ensemble.
+        """
+        self.EnsembleEvent(ens)
+
     def process_ensemble(self, sender, ens):
         """
         Take the ensemble from the codec and pass it to all the subscribers.
@@ -71,7 +113,28 @@ class AdcpCodec:
             self.WaveForceCodec.add(ens)
 
         # Pass ensemble to all subscribers of the ensemble data.
-        self.EnsembleEvent(ens)
+        # If averaging, the subscribers get the averaged ensembles.
+        if self.averager is not None:
+            self.averager.process_ensemble(self, ens)
+        else:
+            self.EnsembleEvent(ens)
+
+
+def test_averaging():
+    from Ensemble.EnsembleAverager import _create_ens
 
+    codec = AdcpCodec()
+    received = []
+    codec.EnsembleEvent += lambda sender, ens: received.append(ens)
+    codec.enable_averaging(num_ens=2)
 
+    for ens_num in range(1, 6):
+        codec.process_ensemble(None, _create_ens(ens_num, ens_num, [float(ens_num)] * 4, 10.0, 0.0))
+    assert [ens.EnsembleData.EnsembleNumber for ens in received] == [1, 3]
+    assert received[1].EarthVelocity.Velocities[0] == [3.5] * 4
 
+    # The last ensemble is passed on when averaging stops
+    codec.disable_averaging()
+    assert received[2].EnsembleData.ActualPingCount == 10
+    codec.process_ensemble(None, _create_ens(6, 6, [6.0] * 4, 10.0, 0.0))
+    assert len(received) == 4
@@ -5,6 +5,7 @@ from log import logger
 
 from Codecs.BinaryCodec import BinaryCodec
 from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSerializer import EnsembleSerializer
 
 from Utilities.events import EventHandler
 
@@ -44,11 +45,18 @@ class BinaryCodecUdp(BinaryCodec):
     Decode RoweTech ADCP Binary data.
     """
 
-    def __init__(self, udp_port):
+    def __init__(self, udp_port, round_floats=False):
+        """
+        :param udp_port: UDP port to stream the JSON data.
+        :param round_floats: Round the dataset arrays to the precision of the instrument.
+        """
         super().__init__()
         # Set meta data
         self.Meta = EnsembleMetaData()
 
+        # Convert the datasets to JSON
+        self.serializer = EnsembleSerializer(round_floats=round_floats)
+
         # Set ProjectInfo
         #self.ProjectInfo = ProjectInfo()
 
@@ -104,84 +112,91 @@ class BinaryCodecUdp(BinaryCodec):
                 logger.error("BAD Date and Time: " + str(ensemble_number))
 
             ens.EnsembleData.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.EnsembleData).encode())
+            self.send_udp(self.to_json(ens.EnsembleData))
 
         if ens.IsBeamVelocity:
             ens.BeamVelocity.EnsembleNumber = ensemble_number
             ens.BeamVelocity.SerialNumber = serial_number
             ens.BeamVelocity.DateTime = date_time
             ens.BeamVelocity.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.BeamVelocity).encode())
+            self.send_udp(self.to_json(ens.BeamVelocity))
 
         if ens.IsInstrumentVelocity:
             ens.InstrumentVelocity.EnsembleNumber = ensemble_number
             ens.InstrumentVelocity.SerialNumber = serial_number
             ens.InstrumentVelocity.DateTime = date_time
             ens.InstrumentVelocity.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.InstrumentVelocity).encode())
+            self.send_udp(self.to_json(ens.InstrumentVelocity))
 
         if ens.IsEarthVelocity:
             ens.EarthVelocity.EnsembleNumber = ensemble_number
             ens.EarthVelocity.SerialNumber = serial_number
             ens.EarthVelocity.DateTime = date_time
             ens.EarthVelocity.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.EarthVelocity).encode())
+            self.send_udp(self.to_json(ens.EarthVelocity))
 
         if ens.IsAmplitude:
             ens.Amplitude.EnsembleNumber = ensemble_number
             ens.Amplitude.SerialNumber = serial_number
             ens.Amplitude.DateTime = date_time
             ens.Amplitude.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.Amplitude).encode())
+            self.send_udp(self.to_json(ens.Amplitude))
 
         if ens.IsCorrelation:
             ens.Correlation.EnsembleNumber = ensemble_number
             ens.Correlation.SerialNumber = serial_number
             ens.Correlation.DateTime = date_time
             ens.Correlation.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.Correlation).encode())
+            self.send_udp(self.to_json(ens.Correlation))
 
         if ens.IsGoodBeam:
             ens.GoodBeam.EnsembleNumber = ensemble_number
             ens.GoodBeam.SerialNumber = serial_number
             ens.GoodBeam.DateTime = date_time
             ens.GoodBeam.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.GoodBeam).encode())
+            self.send_udp(self.to_json(ens.GoodBeam))
 
         if ens.IsGoodEarth:
             ens.GoodEarth.EnsembleNumber = ensemble_number
             ens.GoodEarth.SerialNumber = serial_number
             ens.GoodEarth.DateTime = date_time
             ens.GoodEarth.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.GoodEarth).encode())
+            self.send_udp(self.to_json(ens.GoodEarth))
 
         if ens.IsAncillaryData:
             ens.AncillaryData.EnsembleNumber = ensemble_number
             ens.AncillaryData.SerialNumber = serial_number
             ens.AncillaryData.DateTime = date_time
             ens.AncillaryData.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.AncillaryData).encode())
+            self.send_udp(self.to_json(ens.AncillaryData))
 
         if ens.IsBottomTrack:
             ens.BottomTrack.EnsembleNumber = ensemble_number
             ens.BottomTrack.SerialNumber = serial_number
             ens.BottomTrack.DateTime = date_time
             ens.BottomTrack.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.BottomTrack).encode())
+            self.send_udp(self.to_json(ens.BottomTrack))
 
         if ens.IsRangeTracking:
             ens.RangeTracking.EnsembleNumber = ensemble_number
             ens.RangeTracking.SerialNumber = serial_number
             ens.RangeTracking.DateTime = date_time
             ens.RangeTracking.Meta = self.Meta
-            self.send_udp(Ensemble().toJSON(ens.RangeTracking).encode())
+            self.send_udp(self.to_json(ens.RangeTracking))
+
+    def to_json(self, ds):
+        """
+        Convert the dataset to JSON.  A newline is added at the end
+        of the JSON string.  This will allow anyone looking for the JSON
+        data to separate the JSON data by newline.
+        :param ds: Dataset.
+        :return: JSON as bytes.
+        """
+        return (self.serializer.to_json(ds) + "\n").encode()
 
     def send_udp(self, data):
         """
         Send the data to the UDP port.
-        Ensemble().toJSON added a newline at the end of the JSON
-        string.  This will allow anyone looking for the JSON data
-        to separate the JSON data by newline.
         :param data: Data to send.
         """
         self.socket.sendto(data, (self.udp_ip, self.udp_port))
@@ -0,0 +1,675 @@
+import os
+import sys
+import zlib
+import struct
+import getopt
+import calendar
+import logging
+from datetime import datetime
+from multiprocessing import Pool
+
+from Ensemble.Ensemble import Ensemble
+
+logger = logging.getLogger("Compressed Ensemble File")
+logger.setLevel(logging.ERROR)
+FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
+logging.basicConfig(format=FORMAT)
+
+# Optional compression libraries
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+# File header: Magic, Version, Codec ID
+FILE_MAGIC = b'RTIENSZ\x00'
+FILE_HEADER = struct.Struct("<8sBB6x")
+FILE_VERSION = 1
+
+# Frame header: Magic, Compressed size, Raw size, Number of ensembles
+FRAME_MAGIC = b'RTIF'
+FRAME_HEADER = struct.Struct("<4sIII")
+
+# Index entry: Frame offset, Compressed size, Raw size, Number of ensembles,
+#              First ensemble number, Last ensemble number, First time, Last time
+INDEX_ENTRY = struct.Struct("<QIIIIIdd")
+
+# Footer: Index offset, Number of frames, Magic
+INDEX_MAGIC = b'RTIENSIX'
+FOOTER = struct.Struct("<QI8s")
+
+# Codec name: Codec ID
+CODECS = {"zlib": 0, "zstd": 1, "lz4": 2}
+
+# Ensemble header delimiter
+DELIMITER = b'\x80' * 16
+
+
+def compress(codec, data, level=None):
+    """
+    Compress the data.
+    :param codec: Codec name.
+    :param data: Data to compress.
+    :param level: Compression level.  None for the codec's default.
+    :return: Compressed data.
+    """
+    if codec == "zlib":
+        return zlib.compress(data, 6 if level is None else level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for zstd compression")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    if codec == "lz4":
+        if lz4 is None:
+            raise ImportError("lz4 is required for lz4 compression")
+        return lz4.frame.compress(data, compression_level=0 if level is None else level)
+    raise ValueError("Unknown codec: " + str(codec))
+
+
+def decompress(codec, data):
+    """
+    Decompress the data.
+    :param codec: Codec name.
+    :param data: Compressed data.
+    :return: Raw data.
+    """
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for zstd compression")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        if lz4 is None:
+            raise ImportError("lz4 is required for lz4 compression")
+        return lz4.frame.decompress(data)
+    raise ValueError("Unknown codec: " + str(codec))
+
+
+def get_codec_name(codec_id):
+    """
+    Get the codec name from the ID in the file.
+    :param codec_id: Codec ID.
+    :return: Codec name.
+    """
+    for name, value in CODECS.items():
+        if value == codec_id:
+            return name
+    raise ValueError("Unknown codec ID: " + str(codec_id))
+
+
+def get_ens_time(ens):
+    """
+    Get the time of the ensemble from the Ensemble Data dataset
+    without decoding the entire ensemble.
+    :param ens: Raw ensemble with the header.
+    :return: Time in seconds since 1970 UTC.  NaN if there is no Ensemble Data.
+    """
+    payload_size = struct.unpack("I", ens[24:28])[0]
+    packet_pointer = Ensemble.HeaderSize
+    end = min(len(ens), Ensemble.HeaderSize + payload_size)
+
+    while packet_pointer + 28 <= end:
+        ds_type, num_elements, element_multiplier, image, name_len = struct.unpack("IIIII", ens[packet_pointer:packet_pointer + 20])
+        name = bytes(ens[packet_pointer + 20:packet_pointer + 28])
+        data_set_size = Ensemble.GetDataSetSize(ds_type, name_len, num_elements, element_multiplier)
+        if data_set_size <= 0:
+            break
+
+        if name.startswith(b"E000008"):
+            # Year, Month, Day, Hour, Minute, Second, HSec after the 6 values
+            values_start = packet_pointer + Ensemble.GetBaseDataSize(name_len) + Ensemble.BytesInInt32 * 6
+            if values_start + 28 > end:
+                break
+            year, month, day, hour, minute, second, hsec = struct.unpack("7I", ens[values_start:values_start + 28])
+            try:
+                return calendar.timegm((year, month, day, hour, minute, second)) + hsec / 100.0
+            except (ValueError, OverflowError):
+                break
+
+        packet_pointer += data_set_size
+
+    return float("nan")
+
+
+def split_ensembles(data):
+    """
+    Split the raw data of a frame into the ensembles.
+    :param data: Raw frame data.
+    :return: List of raw ensembles.
+    """
+    ensembles = []
+    pointer = 0
+    while pointer + Ensemble.HeaderSize <= len(data):
+        payload_size = struct.unpack("I", data[pointer + 24:pointer + 28])[0]
+        ens_size = Ensemble.HeaderSize + payload_size + Ensemble.ChecksumSize
+        ensembles.append(data[pointer:pointer + ens_size])
+        pointer += ens_size
+    return ensembles
+
+
+def is_compressed_file(file_path):
+    """
+    Check if the file is a compressed ensemble file.
+    :param file_path: File path.
+    :return: TRUE if the file is a compressed ensemble file.
+    """
+    with open(file_path, 'rb') as f:
+        return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+
+
+def open_ens_file(file_path):
+    """
+    Open an ensemble file to read the raw ensemble data.  If the file
+    is a compressed ensemble file, the data is decompressed as it is read.
+    :param file_path: Raw or compressed ensemble file.
+    :return: File object with read() and close().
+    """
+    if is_compressed_file(file_path):
+        return CompressedEnsReader(file_path)
+    return open(file_path, 'rb')
+
+
+class CompressedEnsWriter:
+    """
+    Write the ensembles to a compressed ensemble file.
+
+    The ensembles are grouped in frames.  Each frame is compressed on its
+    own, so any frame can be decompressed without the rest of the file.
+    At the end of the file, an index gives the offset, ensemble numbers and
+    time of each frame.  Only complete ensembles with a good header are
+    stored.  All other data is skipped.
+    """
+
+    def __init__(self, file_path, codec="zlib", level=None, frame_size=262144):
+        """
+        :param file_path: File to write.
+        :param codec: Compression codec.  zlib, zstd or lz4.
+        :param level: Compression level.  None for the codec's default.
+        :param frame_size: Raw bytes of ensembles in each frame.
+        """
+        if codec not in CODECS:
+            raise ValueError("Unknown codec: " + str(codec))
+
+        self.codec = codec
+        self.level = level
+        self.frame_size = frame_size
+
+        self.buffer = bytearray()
+        self.frame = bytearray()
+        self.frame_ens = []             # (Ensemble number, Time) of each ensemble in the frame
+        self.index = []
+        self.bytes_skipped = 0
+
+        self.file = open(file_path, 'wb')
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, CODECS[codec]))
+
+    def write(self, data):
+        """
+        Add the raw ensemble data.  The data can be any part of the recorded data.
+        :param data: Raw data.
+        """
+        self.buffer.extend(data)
+
+        while True:
+            ens_start = self.buffer.find(DELIMITER)
+            if ens_start < 0:
+                # Keep enough to find a header split between writes
+                skip = max(len(self.buffer) - (len(DELIMITER) - 1), 0)
+                self.bytes_skipped += skip
+                del self.buffer[:skip]
+                return
+
+            self.bytes_skipped += ens_start
+            del self.buffer[:ens_start]
+
+            # Wait for the entire header
+            if len(self.buffer) < Ensemble.HeaderSize:
+                return
+
+            ens_num, ens_num_inv, payload_size, payload_size_inv = struct.unpack("IIII", self.buffer[16:32])
+            if ens_num != (~ens_num_inv & 0xFFFFFFFF) or payload_size != (~payload_size_inv & 0xFFFFFFFF):
+                # Bad header, look for the next header
+                self.bytes_skipped += 1
+                del self.buffer[:1]
+                continue
+
+            # Wait for the entire ensemble
+            ens_size = Ensemble.HeaderSize + payload_size + Ensemble.ChecksumSize
+            if len(self.buffer) < ens_size:
+                return
+
+            self.add_ensemble(ens_num, self.buffer[:ens_size])
+            del self.buffer[:ens_size]
+
+    def add_ensemble(self, ens_num, ens):
+        """
+        Add the ensemble to the frame.  Write the frame when it is full.
+        :param ens_num: Ensemble number.
+        :param ens: Raw ensemble.
+        """
+        self.frame.extend(ens)
+        self.frame_ens.append((ens_num, get_ens_time(ens)))
+
+        if len(self.frame) >= self.frame_size:
+            self.write_frame()
+
+    def write_frame(self):
+        """
+        Compress and write the frame.
+        """
+        if not self.frame_ens:
+            return
+
+        data = compress(self.codec, bytes(self.frame), self.level)
+        offset = self.file.tell()
+        self.file.write(FRAME_HEADER.pack(FRAME_MAGIC, len(data), len(self.frame), len(self.frame_ens)))
+        self.file.write(data)
+
+        self.index.append((offset, len(data), len(self.frame), len(self.frame_ens),
+                           self.frame_ens[0][0], self.frame_ens[-1][0],
+                           self.frame_ens[0][1], self.frame_ens[-1][1]))
+
+        self.frame = bytearray()
+        self.frame_ens = []
+
+    def close(self):
+        """
+        Write the last frame and the index.  Then close the file.
+        """
+        self.write_frame()
+
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.write(FOOTER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CompressedEnsReader:
+    """
+    Read a compressed ensemble file.
+
+    read() returns the raw ensemble data like a raw ensemble file, so the
+    codec and file readers can use the file as is.  The index is used to
+    find a frame by ensemble number or time, so only that frame is
+    decompressed.  The frames can be decoded in parallel with decode().
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: Compressed ensemble file.
+        """
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+
+        magic, version, codec_id = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC:
+            raise ValueError("Not a compressed ensemble file: " + file_path)
+        if version > FILE_VERSION:
+            raise ValueError("Unsupported compressed ensemble file version: " + str(version))
+        self.codec = get_codec_name(codec_id)
+
+        self.index = self.read_index()
+        if self.index is None:
+            logger.error("Index not found, scanning the frames: " + file_path)
+            self.index = self.scan_index()
+
+        # Position for read()
+        self.frame_num = 0
+        self.frame_data = b''
+        self.frame_pos = 0
+
+    def read_index(self):
+        """
+        Read the index at the end of the file.
+        :return: List of index entries.  None if the file has no index.
+        """
+        file_size = os.fstat(self.file.fileno()).st_size
+        if file_size < FILE_HEADER.size + FOOTER.size:
+            return None
+
+        self.file.seek(file_size - FOOTER.size)
+        index_offset, num_frames, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != INDEX_MAGIC or index_offset + num_frames * INDEX_ENTRY.size + FOOTER.size != file_size:
+            return None
+
+        self.file.seek(index_offset)
+        data = self.file.read(num_frames * INDEX_ENTRY.size)
+        return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(num_frames)]
+
+    def scan_index(self):
+        """
+        Create the index by reading every frame.  Used if the file was not closed.
+        :return: List of index entries.
+        """
+        index = []
+        offset = FILE_HEADER.size
+        self.file.seek(offset)
+        while True:
+            header = self.file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            magic, comp_size, raw_size, num_ens = FRAME_HEADER.unpack(header)
+            data = self.file.read(comp_size)
+            if magic != FRAME_MAGIC or len(data) < comp_size:
+                break
+
+            ensembles = split_ensembles(decompress(self.codec, data))
+            first_num = struct.unpack("I", ensembles[0][16:20])[0]
+            last_num = struct.unpack("I", ensembles[-1][16:20])[0]
+            index.append((offset, comp_size, raw_size, num_ens, first_num, last_num,
+                          get_ens_time(ensembles[0]), get_ens_time(ensembles[-1])))
+            offset += FRAME_HEADER.size + comp_size
+        return index
+
+    @property
+    def num_frames(self):
+        return len(self.index)
+
+    @property
+    def num_ensembles(self):
+        return sum(entry[3] for entry in self.index)
+
+    def read_frame(self, frame_num):
+        """
+        Read and decompress the frame.
+        :param frame_num: Frame number.
+        :return: Raw ensemble data in the frame.
+        """
+        offset, comp_size = self.index[frame_num][0:2]
+        self.file.seek(offset + FRAME_HEADER.size)
+        return decompress(self.codec, self.file.read(comp_size))
+
+    def find_frame(self, ens_num):
+        """
+        Find the frame with the ensemble number.
+        :param ens_num: Ensemble number.
+        :return: Frame number or -1 if not found.
+        """
+        for frame_num, entry in enumerate(self.index):
+            if entry[4] <= ens_num <= entry[5]:
+                return frame_num
+        return -1
+
+    def find_frame_time(self, time):
+        """
+        Find the first frame with data at or after the time.
+        :param time: Datetime in UTC or seconds since 1970.
+        :return: Frame number or -1 if not found.
+        """
+        if isinstance(time, datetime):
+            time = calendar.timegm(time.timetuple()) + time.microsecond / 1e6
+
+        for frame_num, entry in enumerate(self.index):
+            if entry[7] >= time:
+                return frame_num
+        return -1
+
+    def get_ensemble(self, ens_num):
+        """
+        Get the raw ensemble.  Only the frame with the ensemble is decompressed.
+        :param ens_num: Ensemble number.
+        :return: Raw ensemble or None if not found.
+        """
+        frame_num = self.find_frame(ens_num)
+        if frame_num < 0:
+            return None
+
+        for ens in split_ensembles(self.read_frame(frame_num)):
+            if struct.unpack("I", ens[16:20])[0] == ens_num:
+                return ens
+        return None
+
+    def read(self, size=-1):
+        """
+        Read the raw ensemble data like a raw ensemble file.
+        :param size: Number of bytes to read.  -1 to read all the data.
+        :return: Raw ensemble data.  Empty when all the data is read.
+        """
+        result = bytearray()
+        while size < 0 or len(result) < size:
+            if self.frame_pos >= len(self.frame_data):
+                if self.frame_num >= len(self.index):
+                    break
+                self.frame_data = self.read_frame(self.frame_num)
+                self.frame_num += 1
+                self.frame_pos = 0
+
+            end = len(self.frame_data) if size < 0 else self.frame_pos + size - len(result)
+            result.extend(self.frame_data[self.frame_pos:end])
+            self.frame_pos += len(self.frame_data[self.frame_pos:end])
+        return bytes(result)
+
+    def seek_ensemble(self, ens_num):
+        """
+        Move read() to the start of the frame with the ensemble number.
+        :param ens_num: Ensemble number.
+        :return: TRUE if the ensemble was found.
+        """
+        frame_num = self.find_frame(ens_num)
+        if frame_num < 0:
+            return False
+
+        self.frame_num = frame_num
+        self.frame_data = b''
+        self.frame_pos = 0
+        return True
+
+    def decode(self, frames=None, processes=None):
+        """
+        Decode the ensembles in the frames.  Each frame is decoded in a separate process.
+        :param frames: List of frame numbers.  None for all the frames.
+        :param processes: Number of processes.  None for the number of CPUs.  1 to decode in this process.
+        :return: List of decoded ensembles.
+        """
+        if frames is None:
+            frames = range(len(self.index))
+        jobs = [(self.file_path, self.codec, self.index[frame_num][0], self.index[frame_num][1]) for frame_num in frames]
+
+        if processes == 1:
+            results = [_decode_frame(job) for job in jobs]
+        else:
+            with Pool(processes) as pool:
+                results = pool.map(_decode_frame, jobs)
+
+        return [ens for frame in results for ens in frame]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _decode_frame(job):
+    """
+    Read, decompress and decode a frame.  Run in the decode processes.
+    :param job: (File path, Codec, Frame offset, Compressed size)
+    :return: List of decoded ensembles.
+    """
+    from Codecs.BinaryCodec import BinaryCodec
+
+    file_path, codec, offset, comp_size = job
+    with open(file_path, 'rb') as f:
+        f.seek(offset + FRAME_HEADER.size)
+        data = decompress(codec, f.read(comp_size))
+
+    ensembles = []
+    binary_codec = BinaryCodec()
+    binary_codec.EnsembleEvent += lambda sender, ens: ensembles.append(ens)
+    for ens in split_ensembles(data):
+        binary_codec.add(ens)
+    return ensembles
+
+
+def compress_file(in_file, out_file, codec="zlib", level=None, frame_size=262144):
+    """
+    Compress a raw ensemble file.
+    :param in_file: Raw ensemble file.
+    :param out_file: Compressed ensemble file.
+    :param codec: Compression codec.  zlib, zstd or lz4.
+    :param level: Compression level.
+    :param frame_size: Raw bytes of ensembles in each frame.
+    :return: Writer used to compress the file.
+    """
+    with open(in_file, 'rb') as f, CompressedEnsWriter(out_file, codec, level, frame_size) as writer:
+        data = f.read(1048576)
+        while data:
+            writer.write(data)
+            data = f.read(1048576)
+    return writer
+
+
+def _create_ens(ens_num, num_bins=30, num_beams=4, dt=None):
+    """
+    Create a raw ensemble with Ensemble Data and Amplitude.
+    """
+    import math
+    from PyCRC.CRCCCITT import CRCCCITT
+
+    if dt is None:
+        dt = datetime(2017, 7, 1, 12, 0, 0)
+
+    # Ensemble Data
+    values = [ens_num, num_bins, num_beams, 1, 1, 0,
+              dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, int(dt.microsecond / 10000)]
+    ens_data = struct.pack("IIIII8s", 20, 23, 1, 0, 8, b"E000008") + struct.pack("13I", *values) + b"01300000000000000000000000000000" + bytes(8)
+
+    # Amplitude decreasing with range
+    amp = [60.0 - bin_num * 1.5 + math.sin(ens_num + beam) for beam in range(num_beams) for bin_num in range(num_bins)]
+    amplitude = struct.pack("IIIII8s", 10, num_bins, num_beams, 0, 8, b"E000004") + struct.pack(str(len(amp)) + "f", *amp)
+
+    payload = ens_data + amplitude
+    header = DELIMITER + struct.pack("IIII", ens_num, ~ens_num & 0xFFFFFFFF, len(payload), ~len(payload) & 0xFFFFFFFF)
+    return header + payload + struct.pack("I", CRCCCITT().calculate(input_data=payload))
+
+
+def test_write_read(tmpdir):
+    from datetime import timedelta
+
+    raw_file = str(tmpdir.join("test.ens"))
+    comp_file = str(tmpdir.join("test.ensz"))
+
+    start = datetime(2017, 7, 1, 12, 0, 0)
+    with open(raw_file, 'wb') as f:
+        f.write(b"garbage before\r\n")
+        for ens_num in range(1, 501):
+            f.write(_create_ens(ens_num, dt=start + timedelta(seconds=ens_num)))
+        f.write(_create_ens(501)[:100])         # Incomplete
+
+    writer = compress_file(raw_file, comp_file, frame_size=16384)
+    assert writer.bytes_skipped >= 16
+
+    raw = b"".join(_create_ens(ens_num, dt=start + timedelta(seconds=ens_num)) for ens_num in range(1, 501))
+    assert os.path.getsize(comp_file) < len(raw)
+
+    with CompressedEnsReader(comp_file) as reader:
+        assert reader.num_ensembles == 500
+        assert reader.num_frames > 1
+
+        # Transparent read in small blocks
+        data = b""
+        block = reader.read(4096)
+        while block:
+            data += block
+            block = reader.read(4096)
+        assert data == raw
+
+        # Random access
+        assert reader.get_ensemble(377) == _create_ens(377, dt=start + timedelta(seconds=377))
+        assert reader.get_ensemble(1000) is None
+
+        frame_num = reader.find_frame_time(start + timedelta(seconds=250))
+        assert reader.index[frame_num][4] <= 250 <= reader.index[frame_num][5]
+
+        assert reader.seek_ensemble(250)
+        assert struct.unpack("I", reader.read(32)[16:20])[0] == reader.index[frame_num][4]
+
+    f = open_ens_file(raw_file)
+    assert not isinstance(f, CompressedEnsReader)
+    f.close()
+
+
+def test_decode_parallel(tmpdir):
+    import math
+
+    comp_file = str(tmpdir.join("test.ensz"))
+    with CompressedEnsWriter(comp_file, frame_size=8192) as writer:
+        for ens_num in range(1, 101):
+            writer.write(_create_ens(ens_num))
+
+    with open_ens_file(comp_file) as reader:
+        ensembles = reader.decode(processes=2)
+        assert [ens.EnsembleData.EnsembleNumber for ens in ensembles] == list(range(1, 101))
+        assert abs(ensembles[0].Amplitude.Amplitude[0][0] - (60.0 + math.sin(1))) < 0.001
+
+
+def test_recover_index(tmpdir):
+    comp_file = str(tmpdir.join("test.ensz"))
+    writer = CompressedEnsWriter(comp_file, frame_size=8192)
+    for ens_num in range(1, 101):
+        writer.write(_create_ens(ens_num))
+    writer.write_frame()
+    writer.file.close()             # Not closed with close(), no index
+
+    with CompressedEnsReader(comp_file) as reader:
+        assert reader.num_ensembles == 100
+        assert reader.find_frame(100) == reader.num_frames - 1
+
+
+def main(argv):
+    inputfile = ''
+    outputfile = ''
+    codec = "zlib"
+    level = None
+    frame_size = 262144
+    usage = 'CompressedEnsFile.py -i <inputfile> -o <outputfile> -c <zlib|zstd|lz4> -l <level> -f <frame size>'
+    try:
+        opts, args = getopt.getopt(argv, "hi:o:c:l:f:", ["ifile=", "ofile=", "codec=", "level=", "frame="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-i", "--ifile"):
+            inputfile = arg
+        elif opt in ("-o", "--ofile"):
+            outputfile = arg
+        elif opt in ("-c", "--codec"):
+            codec = arg
+        elif opt in ("-l", "--level"):
+            level = int(arg)
+        elif opt in ("-f", "--frame"):
+            frame_size = int(arg)
+
+    if not outputfile:
+        outputfile = inputfile + "z"
+    print('Input file is: ', inputfile)
+    print('Output file is: ', outputfile)
+
+    writer = compress_file(inputfile, outputfile, codec, level, frame_size)
+    print("Frames: ", len(writer.index))
+    print("Ensembles: ", sum(entry[3] for entry in writer.index))
+    print("Compression Ratio: {0:.2f}".format(os.path.getsize(inputfile) / max(os.path.getsize(outputfile), 1)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
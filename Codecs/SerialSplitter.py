@@ -0,0 +1,165 @@
+import struct
+import codecs
+
+
+class SerialSplitter:
+    """
+    Split the raw serial data into terminal text and binary ensembles.
+
+    The ADCP outputs the terminal responses as text and the ensembles as
+    RoweTech binary.  The binary ensembles are found by the header, 16 bytes
+    of 0x80, and the payload size in the header.  Everything else is terminal text.
+    The data is not decoded, so the binary data is passed through untouched.
+    """
+
+    # Type of data
+    TEXT = "command"
+    BINARY = "binary"
+
+    # Header of a binary ensemble
+    DELIMITER = b'\x80' * 16
+    HEADER_SIZE = 32
+    CHECKSUM_SIZE = 4
+
+    # Largest ensemble payload.  If the payload size is larger, the header is bad
+    MAX_PAYLOAD_SIZE = 10 * 1024 * 1024
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.ens_remaining = 0          # Bytes remaining in the current ensemble
+
+        # Text can be split in the middle of a character
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def add(self, data):
+        """
+        Add serial data and split it into text and binary.
+        :param data: Raw serial data.
+        :return: List of (Type, Data).  Type is TEXT or BINARY.
+        """
+        self.buffer.extend(data)
+        results = []
+
+        while self.buffer:
+            # Currently in an ensemble
+            if self.ens_remaining > 0:
+                size = min(self.ens_remaining, len(self.buffer))
+                self._append(results, SerialSplitter.BINARY, self.buffer[:size])
+                del self.buffer[:size]
+                self.ens_remaining -= size
+                continue
+
+            ens_start = self.buffer.find(SerialSplitter.DELIMITER)
+            if ens_start < 0:
+                # Keep any 0x80 at the end, it could be the start of a header
+                keep = len(self.buffer) - len(self.buffer.rstrip(b'\x80'))
+                keep = min(keep, len(SerialSplitter.DELIMITER) - 1)
+                text_end = len(self.buffer) - keep
+                if text_end > 0:
+                    self._append(results, SerialSplitter.TEXT, self.buffer[:text_end])
+                    del self.buffer[:text_end]
+                break
+
+            # Text before the ensemble
+            if ens_start > 0:
+                self._append(results, SerialSplitter.TEXT, self.buffer[:ens_start])
+                del self.buffer[:ens_start]
+
+            # Wait for the entire header
+            if len(self.buffer) < SerialSplitter.HEADER_SIZE:
+                break
+
+            # Verify the payload size with the inverse
+            payload_size, payload_size_inv = struct.unpack("II", self.buffer[24:32])
+            if payload_size != (~payload_size_inv & 0xFFFFFFFF) or payload_size > SerialSplitter.MAX_PAYLOAD_SIZE:
+                # Bad header, pass the first byte as text and look again
+                self._append(results, SerialSplitter.TEXT, self.buffer[:1])
+                del self.buffer[:1]
+                continue
+
+            self.ens_remaining = SerialSplitter.HEADER_SIZE + payload_size + SerialSplitter.CHECKSUM_SIZE
+
+        return results
+
+    def decode(self, text):
+        """
+        Decode the terminal text.  Only give the TEXT data, the binary ensembles are not decoded.
+        A character split between serial reads is decoded when the rest of it is received.
+        :param text: Terminal text bytes.
+        :return: Decoded text.
+        """
+        return self.decoder.decode(text)
+
+    def _append(self, results, data_type, data):
+        """
+        Add the data to the results.  Combine with the last
+        result if it is the same type.
+        """
+        if results and results[-1][0] == data_type:
+            results[-1] = (data_type, results[-1][1] + bytes(data))
+        else:
+            results.append((data_type, bytes(data)))
+
+
+def _create_ens(ens_num, payload_size):
+    """
+    Create a binary ensemble with a random payload.
+    """
+    payload = bytes([ens_num % 256]) * payload_size
+    header = b'\x80' * 16 + struct.pack("IIII", ens_num, ~ens_num & 0xFFFFFFFF, payload_size, ~payload_size & 0xFFFFFFFF)
+    return header + payload + b'\x00\x00\x00\x00'
+
+
+def test_split():
+    ens1 = _create_ens(1, 1000)
+    ens2 = _create_ens(2, 200)
+    data = b"CSHOW\r\nCEI 00:00:01.00\r\n" + ens1 + b"\x80 text" + ens2 + b"STOP\r\n"
+
+    splitter = SerialSplitter()
+    results = splitter.add(data)
+
+    assert results == [(SerialSplitter.TEXT, b"CSHOW\r\nCEI 00:00:01.00\r\n"),
+                       (SerialSplitter.BINARY, ens1),
+                       (SerialSplitter.TEXT, b"\x80 text"),
+                       (SerialSplitter.BINARY, ens2),
+                       (SerialSplitter.TEXT, b"STOP\r\n")]
+
+
+def test_split_chunks():
+    ens1 = _create_ens(1, 1000)
+    ens2 = _create_ens(2, 200)
+    data = b"CSHOW\r\n" + ens1 + ens2 + b"STOP\r\n"
+
+    # Send the data in small chunks
+    for chunk_size in [1, 7, 31, 100]:
+        splitter = SerialSplitter()
+        text = b""
+        binary = b""
+        for i in range(0, len(data), chunk_size):
+            for data_type, value in splitter.add(data[i:i + chunk_size]):
+                if data_type == SerialSplitter.TEXT:
+                    text += value
+                else:
+                    binary += value
+
+        assert text == b"CSHOW\r\nSTOP\r\n"
+        assert binary == ens1 + ens2
+
+
+def test_decode_split_character():
+    ens = _create_ens(1, 100)
+    data = "Temp 20\u00b0C\r\n".encode('utf-8') + ens
+
+    # Split in the middle of the degree sign
+    splitter = SerialSplitter()
+    text = ""
+    binary = b""
+    for i in range(0, len(data), 9):
+        for data_type, value in splitter.add(data[i:i + 9]):
+            if data_type == SerialSplitter.TEXT:
+                text += splitter.decode(value)
+            else:
+                binary += value
+
+    assert text == "Temp 20\u00b0C\r\n"
+    assert binary == ens
@@ -0,0 +1,678 @@
+import sys
+import time
+import struct
+import asyncio
+import getopt
+import logging
+import collections
+
+from Ensemble.Ensemble import Ensemble
+
+logger = logging.getLogger("ADCP Pipeline")
+logger.setLevel(logging.ERROR)
+FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
+logging.basicConfig(format=FORMAT)
+
+
+# Policy when a stage's queue is full
+POLICY_BLOCK = "block"                  # Wait for space.  Slows down all the stages before it.
+POLICY_DROP_NEWEST = "drop_newest"      # Drop the new item
+POLICY_DROP_OLDEST = "drop_oldest"      # Drop the oldest item in the queue
+
+# Passed through the stages when the source has no more data
+END = object()
+
+# Ensemble header delimiter
+DELIMITER = b'\x80' * 16
+
+
+def decode_ensemble(raw):
+    """
+    Verify the checksum and decode the raw ensemble.
+    This is run in the decoder's executor.
+    :param raw: Raw ensemble with the header and checksum.
+    :return: Decoded ensemble or None if the checksum is bad.
+    """
+    from PyCRC.CRCCCITT import CRCCCITT
+    from Codecs.BinaryCodec import BinaryCodec
+
+    payload_size = struct.unpack("I", raw[24:28])[0]
+    payload_end = Ensemble.HeaderSize + payload_size
+    checksum = struct.unpack("I", raw[payload_end:payload_end + Ensemble.ChecksumSize])[0]
+    if checksum != CRCCCITT().calculate(input_data=bytes(raw[Ensemble.HeaderSize:payload_end])):
+        return None
+
+    return BinaryCodec().decode_data_sets(raw[:payload_end])
+
+
+class StageMetrics:
+    """
+    Metrics for a stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.received = 0           # Items processed
+        self.sent = 0               # Items passed to the next stages
+        self.dropped = 0            # Items dropped because the queue was full
+        self.errors = 0             # Items that failed to process
+        self.bytes = 0              # Bytes read by a source
+        self.wait_total = 0.0       # Time the items waited in the queue
+        self.latency_total = 0.0    # Time to process the items
+        self.latency_max = 0.0
+        self.max_queue = 0
+
+    def get(self, queue_size=0):
+        """
+        Get the metrics.
+        :param queue_size: Items currently in the queue.
+        :return: Dictionary of the metrics.
+        """
+        received = max(self.received, 1)
+        return {"name": self.name,
+                "received": self.received,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "bytes": self.bytes,
+                "queue_size": queue_size,
+                "max_queue": self.max_queue,
+                "avg_wait": self.wait_total / received,
+                "avg_latency": self.latency_total / received,
+                "max_latency": self.latency_max}
+
+
+class Stage:
+    """
+    Stage in the pipeline.  Each stage has a bounded queue of items to
+    process and passes its results to all the stages connected to it.
+    Subclasses override process() and call emit() with the results.
+    """
+
+    def __init__(self, name=None, queue_size=100, policy=POLICY_BLOCK):
+        """
+        :param name: Name of the stage for the metrics.
+        :param queue_size: Max number of items waiting in the queue.
+        :param policy: Policy when the queue is full.  POLICY_BLOCK, POLICY_DROP_NEWEST or POLICY_DROP_OLDEST.
+        """
+        self.name = name if name is not None else self.__class__.__name__
+        self.queue_size = queue_size
+        self.policy = policy
+        self.queue = None                   # Created in the event loop
+        self.outputs = []                   # Stages to pass the results
+        self.metrics = StageMetrics(self.name)
+
+    def connect(self, stage):
+        """
+        Pass the results of this stage to the given stage.
+        :param stage: Next stage.
+        :return: Next stage, so the stages can be chained.
+        """
+        self.outputs.append(stage)
+        return stage
+
+    def create_queue(self):
+        """
+        Create the queue in the running event loop.
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+
+    async def put(self, item):
+        """
+        Add the item to the queue based on the policy.
+        :param item: Item to process.
+        """
+        entry = (time.perf_counter(), item)
+        if item is END or self.policy == POLICY_BLOCK:
+            await self.queue.put(entry)
+        elif self.policy == POLICY_DROP_NEWEST:
+            if self.queue.full():
+                self.metrics.dropped += 1
+                return
+            self.queue.put_nowait(entry)
+        else:
+            while self.queue.full():
+                self.queue.get_nowait()
+                self.metrics.dropped += 1
+            self.queue.put_nowait(entry)
+
+        self.metrics.max_queue = max(self.metrics.max_queue, self.queue.qsize())
+
+    async def emit(self, item):
+        """
+        Pass the item to all the next stages.
+        :param item: Result of this stage.
+        """
+        self.metrics.sent += 1
+        for stage in self.outputs:
+            await stage.put(item)
+
+    async def run(self):
+        """
+        Process the items in the queue until the end of the data.
+        """
+        while True:
+            queued, item = await self.queue.get()
+            if item is END:
+                break
+
+            start = time.perf_counter()
+            self.metrics.received += 1
+            self.metrics.wait_total += start - queued
+            try:
+                await self.process(item)
+            except Exception as e:
+                self.metrics.errors += 1
+                logger.error("Error in stage " + self.name + ". " + str(e))
+
+            latency = time.perf_counter() - start
+            self.metrics.latency_total += latency
+            self.metrics.latency_max = max(self.metrics.latency_max, latency)
+
+        try:
+            await self.finish()
+        except Exception as e:
+            logger.error("Error finishing stage " + self.name + ". " + str(e))
+
+        for stage in self.outputs:
+            await stage.put(END)
+
+    async def process(self, item):
+        """
+        Process the item.  Pass the item through by default.
+        :param item: Item from the queue.
+        """
+        await self.emit(item)
+
+    async def finish(self):
+        """
+        Called when there is no more data.
+        """
+        pass
+
+    def get_metrics(self):
+        """
+        :return: Dictionary of the stage metrics.
+        """
+        return self.metrics.get(self.queue.qsize() if self.queue is not None else 0)
+
+
+class Source(Stage):
+    """
+    Source of the data.  A source has no queue.  read() is awaited until
+    the source is stopped or has no more data.  When the next stages'
+    queues are full and their policy is POLICY_BLOCK, the source waits
+    before it reads more data.
+    """
+
+    def __init__(self, name=None):
+        super().__init__(name)
+        self.is_alive = True
+
+    def create_queue(self):
+        pass
+
+    async def run(self):
+        try:
+            await self.open()
+            while self.is_alive:
+                data = await self.read()
+                if not data:
+                    break
+                self.metrics.received += 1
+                self.metrics.bytes += len(data)
+                await self.emit(data)
+        except Exception as e:
+            self.metrics.errors += 1
+            logger.error("Error reading source " + self.name + ". " + str(e))
+        finally:
+            self.close()
+
+        for stage in self.outputs:
+            await stage.put(END)
+
+    def stop(self):
+        """
+        Stop reading the source.
+        """
+        self.is_alive = False
+
+    async def open(self):
+        pass
+
+    async def read(self):
+        """
+        Read the next block of data.
+        :return: Data read.  Empty when there is no more data.
+        """
+        return b''
+
+    def close(self):
+        pass
+
+
+class TcpSource(Source):
+    """
+    Read the data from a TCP port.  The ADCP serial port server outputs the serial data on a TCP port.
+    """
+
+    def __init__(self, host='localhost', port=55056, read_size=65536):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.read_size = read_size
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def read(self):
+        # Time out to check if the source was stopped
+        while self.is_alive:
+            try:
+                return await asyncio.wait_for(self.reader.read(self.read_size), 1.0)
+            except asyncio.TimeoutError:
+                continue
+        return b''
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SerialSource(Source):
+    """
+    Read the data from the serial port.  The blocking reads are done in an executor.
+    """
+
+    def __init__(self, comm_port, baud, read_size=65536):
+        super().__init__()
+        self.comm_port = comm_port
+        self.baud = baud
+        self.read_size = read_size
+        self.serial = None
+
+    async def open(self):
+        import serial
+        self.serial = serial.Serial(self.comm_port, int(self.baud), timeout=0.1)
+
+    async def read(self):
+        loop = asyncio.get_event_loop()
+        while self.is_alive:
+            waiting = max(self.serial.in_waiting, 1)
+            data = await loop.run_in_executor(None, self.serial.read, min(waiting, self.read_size))
+            if data:
+                return data
+        return b''
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+
+
+class FileSource(Source):
+    """
+    Read the data from a raw or compressed ensemble file.
+    """
+
+    def __init__(self, file_path, read_size=65536):
+        super().__init__()
+        self.file_path = file_path
+        self.read_size = read_size
+        self.file = None
+
+    async def open(self):
+        from Codecs.CompressedEnsFile import open_ens_file
+        self.file = open_ens_file(self.file_path)
+
+    async def read(self):
+        return await asyncio.get_event_loop().run_in_executor(None, self.file.read, self.read_size)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class EnsembleFramer(Stage):
+    """
+    Find the complete ensembles in the raw data.  Each raw ensemble is
+    passed to the next stages.  All other data is skipped.
+    """
+
+    def __init__(self, name=None, queue_size=100, policy=POLICY_BLOCK):
+        super().__init__(name, queue_size, policy)
+        self.buffer = bytearray()
+        self.bytes_skipped = 0
+
+    async def process(self, data):
+        self.buffer.extend(data)
+
+        while True:
+            ens_start = self.buffer.find(DELIMITER)
+            if ens_start < 0:
+                # Keep enough to find a header split between reads
+                skip = max(len(self.buffer) - (len(DELIMITER) - 1), 0)
+                self.bytes_skipped += skip
+                del self.buffer[:skip]
+                return
+
+            self.bytes_skipped += ens_start
+            del self.buffer[:ens_start]
+
+            # Wait for the entire header
+            if len(self.buffer) < Ensemble.HeaderSize:
+                return
+
+            ens_num, ens_num_inv, payload_size, payload_size_inv = struct.unpack("IIII", self.buffer[16:32])
+            if ens_num != (~ens_num_inv & 0xFFFFFFFF) or payload_size != (~payload_size_inv & 0xFFFFFFFF):
+                # Bad header, look for the next header
+                self.bytes_skipped += 1
+                del self.buffer[:1]
+                continue
+
+            # Wait for the entire ensemble
+            ens_size = Ensemble.HeaderSize + payload_size + Ensemble.ChecksumSize
+            if len(self.buffer) < ens_size:
+                return
+
+            raw = bytes(self.buffer[:ens_size])
+            del self.buffer[:ens_size]
+            await self.emit(raw)
+
+
+class EnsembleDecoder(Stage):
+    """
+    Decode the raw ensembles in an executor, so the decoding does not
+    block the event loop.  Up to concurrency ensembles are decoded at the
+    same time.  The ensembles are passed on in the order received.
+    Ensembles with a bad checksum are dropped and counted as errors.
+    """
+
+    def __init__(self, executor=None, concurrency=4, name=None, queue_size=100, policy=POLICY_BLOCK):
+        """
+        :param executor: Executor to decode the ensembles.  None for the default thread pool.  Use a ProcessPoolExecutor to use multiple CPUs.
+        :param concurrency: Number of ensembles decoded at the same time.
+        """
+        super().__init__(name, queue_size, policy)
+        self.executor = executor
+        self.concurrency = max(concurrency, 1)
+        self.pending = collections.deque()
+
+    async def process(self, raw):
+        loop = asyncio.get_event_loop()
+        self.pending.append(loop.run_in_executor(self.executor, decode_ensemble, raw))
+        if len(self.pending) >= self.concurrency:
+            await self.emit_next()
+
+    async def emit_next(self):
+        """
+        Wait for the oldest ensemble to be decoded and pass it on.
+        """
+        ens = await self.pending.popleft()
+        if ens is None:
+            self.metrics.errors += 1
+        else:
+            await self.emit(ens)
+
+    async def finish(self):
+        while self.pending:
+            await self.emit_next()
+
+
+class CallbackSink(Stage):
+    """
+    Pass each item to a function.  A blocking function, like a database
+    insert, is run in an executor, so it does not block the other stages.
+    """
+
+    def __init__(self, callback, blocking=True, executor=None, name=None, queue_size=100, policy=POLICY_BLOCK):
+        """
+        :param callback: Function to call with each item.  Can be a coroutine function.
+        :param blocking: Run the function in the executor.
+        :param executor: Executor to run the function.  None for the default thread pool.
+        """
+        super().__init__(name, queue_size, policy)
+        self.callback = callback
+        self.blocking = blocking
+        self.executor = executor
+
+    async def process(self, item):
+        if asyncio.iscoroutinefunction(self.callback):
+            await self.callback(item)
+        elif self.blocking:
+            await asyncio.get_event_loop().run_in_executor(self.executor, self.callback, item)
+        else:
+            self.callback(item)
+
+
+class FileSink(Stage):
+    """
+    Record the raw data to files with an AsyncFileWriter.
+    """
+
+    def __init__(self, get_file_path, name=None, queue_size=100, policy=POLICY_BLOCK, **kwargs):
+        """
+        :param get_file_path: Function to get the file path for a new file.
+        :param kwargs: AsyncFileWriter settings.
+        """
+        super().__init__(name, queue_size, policy)
+        from Utilities.AsyncFileWriter import AsyncFileWriter
+        self.writer = AsyncFileWriter(get_file_path, **kwargs)
+
+    async def process(self, data):
+        if not self.writer.write(data):
+            self.metrics.dropped += 1
+
+    async def finish(self):
+        await asyncio.get_event_loop().run_in_executor(None, self.writer.close)
+
+
+class DbSink(CallbackSink):
+    """
+    Add the ensembles to the database.
+    """
+
+    def __init__(self, projects, name=None, queue_size=100, policy=POLICY_DROP_OLDEST):
+        """
+        :param projects: RtiProjects with a project batch started.
+        """
+        super().__init__(projects.add_ensemble, True, None, name, queue_size, policy)
+
+
+class WampSink(CallbackSink):
+    """
+    Publish the ensembles to the WAMP topics.
+    """
+
+    def __init__(self, publish, track_subscriptions=False, name=None, queue_size=100, policy=POLICY_DROP_OLDEST):
+        """
+        :param publish: Function to publish the topic and payload.  session.publish()
+        :param track_subscriptions: Only publish the topics with subscribers.
+        """
+        from Wamp.EnsemblePublisher import EnsemblePublisher
+        self.publisher = EnsemblePublisher(publish, track_subscriptions)
+        super().__init__(self.publisher.publish_ensemble, False, None, name, queue_size, policy)
+
+
+class UdpSink(CallbackSink):
+    """
+    Stream the ensemble datasets as JSON to the UDP port.
+    """
+
+    def __init__(self, udp_port=55057, round_floats=False, name=None, queue_size=100, policy=POLICY_DROP_OLDEST):
+        from Codecs.BinaryCodecUdp import BinaryCodecUdp
+        self.codec = BinaryCodecUdp(udp_port, round_floats)
+        super().__init__(self.codec.stream_data, False, None, name, queue_size, policy)
+
+
+class Pipeline:
+    """
+    Run the source and all the stages connected to it in an asyncio event loop.
+
+    source -> framer -> decoder -> sinks
+       |
+       +----> file sink
+    """
+
+    def __init__(self, source):
+        """
+        :param source: Source of the data with the stages connected.
+        """
+        self.source = source
+
+    def get_stages(self):
+        """
+        :return: List of the source and all the stages connected to it.
+        """
+        stages = []
+        pending = [self.source]
+        while pending:
+            stage = pending.pop(0)
+            if stage not in stages:
+                stages.append(stage)
+                pending.extend(stage.outputs)
+        return stages
+
+    async def run(self):
+        """
+        Run until the source has no more data or is stopped.
+        """
+        stages = self.get_stages()
+        for stage in stages:
+            stage.create_queue()
+        await asyncio.gather(*[stage.run() for stage in stages])
+
+    def stop(self):
+        """
+        Stop the source.  The stages finish the data already read.
+        """
+        self.source.stop()
+
+    def get_metrics(self):
+        """
+        :return: List of the metrics for each stage.
+        """
+        return [stage.get_metrics() for stage in self.get_stages()]
+
+    def print_metrics(self):
+        for metrics in self.get_metrics():
+            print("{name:16} recv {received:8} sent {sent:8} drop {dropped:6} err {errors:4} "
+                  "queue {queue_size:4}/{max_queue:4} wait {avg_wait:.6f} s  latency {avg_latency:.6f} s "
+                  "max {max_latency:.6f} s".format(**metrics))
+
+
+class _ListSource(Source):
+    """
+    Source of the items in a list.
+    """
+
+    def __init__(self, items):
+        super().__init__()
+        self.items = list(items)
+
+    async def read(self):
+        await asyncio.sleep(0)
+        return self.items.pop(0) if self.items else b''
+
+
+def test_block_policy():
+    received = []
+
+    async def slow(item):
+        await asyncio.sleep(0.001)
+        received.append(item)
+
+    source = _ListSource([bytes([i]) for i in range(50)])
+    sink = source.connect(CallbackSink(slow, queue_size=2, policy=POLICY_BLOCK))
+    asyncio.run(Pipeline(source).run())
+
+    # Nothing is dropped, the source waits for the slow sink
+    assert received == [bytes([i]) for i in range(50)]
+    assert sink.metrics.dropped == 0
+    assert sink.metrics.max_queue <= 2
+
+
+def test_drop_slow_sink():
+    from Codecs.CompressedEnsFile import _create_ens
+
+    data = b"".join(_create_ens(ens_num) for ens_num in range(1, 41))
+    blocks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+
+    fast = []
+    slow = []
+
+    def slow_insert(ens):
+        time.sleep(0.01)
+        slow.append(ens.EnsembleData.EnsembleNumber)
+
+    source = _ListSource(blocks)
+    decoder = source.connect(EnsembleFramer()).connect(EnsembleDecoder())
+    decoder.connect(CallbackSink(lambda ens: fast.append(ens.EnsembleData.EnsembleNumber), blocking=False))
+    slow_sink = decoder.connect(CallbackSink(slow_insert, queue_size=2, policy=POLICY_DROP_OLDEST))
+
+    pipeline = Pipeline(source)
+    asyncio.run(pipeline.run())
+
+    # Slow sink does not stall the decoder or the other sink
+    assert fast == list(range(1, 41))
+    assert slow_sink.metrics.dropped > 0
+    assert len(slow) + slow_sink.metrics.dropped == 40
+    assert slow[-1] == 40
+
+    metrics = {m["name"]: m for m in pipeline.get_metrics()}
+    assert metrics["EnsembleDecoder"]["sent"] == 40
+    assert metrics["_ListSource"]["bytes"] == len(data)
+
+
+def main(argv):
+    host = 'localhost'
+    tcp_port = 55056
+    udp_port = None
+    inputfile = ''
+    outputfolder = ''
+    usage = 'AdcpPipeline.py -t <tcp port> | -i <ens file>  -o <record folder> -u <udp port>'
+    try:
+        opts, args = getopt.getopt(argv, "ht:i:o:u:", ["tcp=", "ifile=", "out=", "udp="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-t", "--tcp"):
+            tcp_port = int(arg)
+        elif opt in ("-i", "--ifile"):
+            inputfile = arg
+        elif opt in ("-o", "--out"):
+            outputfolder = arg
+        elif opt in ("-u", "--udp"):
+            udp_port = int(arg)
+
+    if inputfile:
+        source = FileSource(inputfile)
+    else:
+        source = TcpSource(host, tcp_port)
+
+    # Record the raw data
+    if outputfolder:
+        import os
+        os.makedirs(outputfolder, exist_ok=True)
+        source.connect(FileSink(lambda: os.path.join(outputfolder, "Adcp_" + time.strftime("%Y%m%d_%H%M%S") + ".ens")))
+
+    decoder = source.connect(EnsembleFramer()).connect(EnsembleDecoder())
+    decoder.connect(CallbackSink(lambda ens: print("Ensemble: " + str(ens.EnsembleData.EnsembleNumber)) if ens.IsEnsembleData else None, blocking=False))
+    if udp_port is not None:
+        decoder.connect(UdpSink(udp_port, round_floats=True))
+
+    pipeline = Pipeline(source)
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        pipeline.stop()
+    pipeline.print_metrics()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -6,18 +6,30 @@ import sys
 import codecs
 import binascii
 import struct
-from twisted.internet import reactor, protocol, endpoints
-from twisted.protocols import basic
+import time
+from collections import deque
+from twisted.internet import reactor, protocol, endpoints, interfaces
 from twisted.internet.serialport import SerialPort
+from zope.interface import implementer
 
 from log import logger
 
 
-class SerialDevice(basic.LineReceiver):
+# Policy for a TCP client that can not keep up with the serial data
+POLICY_DROP_OLDEST = "drop_oldest"      # Drop the oldest data queued for the client
+POLICY_DISCONNECT = "disconnect"        # Disconnect the client
+POLICY_PAUSE = "pause"                  # Pause reading the serial port until the client catches up
+
+# Number of bytes that can be queued for a client before the policy is used
+DEFAULT_HIGH_WATER = 1024 * 1024
+
+
+class SerialDevice(protocol.Protocol):
     """
     Serial device that will send data to
     all the TCP clients connected.
     Custom serial protocol for the serial port.
+    The data is passed through as raw binary.
     """
     def __init__(self, factory, tcp_server):
         self.factory = factory
@@ -42,21 +54,19 @@ class SerialDevice(basic.LineReceiver):
         connected on the TCP port
         """
         #print("Response: {0}", format(data))
-        for c in self.tcp_server.factory.clients:
-            c.transport.write(data)
-            #c.sendLine(data)
+        self.tcp_server.factory.send(data)
 
-    def lineReceived(self, line):
-        logger.debug('Serial line received: ', line)
 
-    def rawDataReceived(self, data):
-        logger.debug('Serial Raw Data received: ', data)
-
-
-class SerialTcpProtocol(basic.LineReceiver):
+@implementer(interfaces.IPushProducer)
+class SerialTcpProtocol(protocol.Protocol):
     """
     Create TCP Connections for user that
-    want to get serial data
+    want to get serial data.
+
+    The protocol is registered as a producer with the TCP transport.
+    When the transport's buffer is full, the transport will pause
+    the protocol and the serial data is queued.  If the queue goes
+    above the high water mark, the factory's slow client policy is used.
     """
 
     def __init__(self, factory, comm_port, baud):
@@ -64,6 +74,17 @@ class SerialTcpProtocol(basic.LineReceiver):
         self.comm_port = comm_port
         self.baud = baud
 
+        # Data waiting to be sent to the client
+        self.queue = deque()
+        self.queue_bytes = 0
+        self.paused = False
+
+        # Statistics
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.chunks_dropped = 0
+        self.connect_time = time.time()
+
         if self.factory.serial_port is None:
             # Create a Serial Port device to read in serial data
             self.factory.serial_port = SerialPort(SerialDevice(self, self), comm_port, reactor, baudrate=baud)
@@ -96,6 +117,8 @@ class SerialTcpProtocol(basic.LineReceiver):
         """
         Add TCP connections
         """
+        self.connect_time = time.time()
+        self.transport.registerProducer(self, True)
         self.factory.clients.add(self)
         logger.debug('TCP Connection made')
 
@@ -103,9 +126,101 @@ class SerialTcpProtocol(basic.LineReceiver):
         """
         Disconnect TCP Connections
         """
-        self.factory.clients.remove(self)
+        self.factory.clients.discard(self)
+        self.clear_queue()
+        self.factory.resume_serial(self)
         logger.debug('TCP Connection lost')
 
+    def send(self, data):
+        """
+        Send the serial data to the TCP client.  If the client
+        is paused, the data is queued.
+        :param data: Serial data.
+        """
+        if self.transport is None or self.transport.disconnecting:
+            return
+
+        if not self.paused and not self.queue:
+            self.transport.write(data)
+            self.bytes_sent += len(data)
+            return
+
+        self.queue.append(data)
+        self.queue_bytes += len(data)
+
+        if self.queue_bytes > self.factory.high_water:
+            self.slow_client()
+
+    def slow_client(self):
+        """
+        The client can not keep up with the serial data.
+        Use the factory's policy to handle the client.
+        """
+        if self.factory.policy == POLICY_DISCONNECT:
+            logger.warning(str(self.transport.getPeer()) + " - Slow TCP client disconnected")
+            self.bytes_dropped += self.queue_bytes
+            self.chunks_dropped += len(self.queue)
+            self.clear_queue()
+            self.transport.abortConnection()
+        elif self.factory.policy == POLICY_PAUSE:
+            self.factory.pause_serial(self)
+        else:
+            # Drop the oldest data, always keep the latest chunk
+            while self.queue_bytes > self.factory.high_water and len(self.queue) > 1:
+                chunk = self.queue.popleft()
+                self.queue_bytes -= len(chunk)
+                self.bytes_dropped += len(chunk)
+                self.chunks_dropped += 1
+
+    def clear_queue(self):
+        """
+        Remove all the data waiting to be sent.
+        """
+        self.queue.clear()
+        self.queue_bytes = 0
+
+    def pauseProducing(self):
+        """
+        The TCP transport buffer is full.  Queue the data.
+        """
+        self.paused = True
+
+    def resumeProducing(self):
+        """
+        The TCP transport buffer has room.  Send the queued data.
+        Writing can pause the protocol again.
+        """
+        self.paused = False
+        while self.queue and not self.paused:
+            chunk = self.queue.popleft()
+            self.queue_bytes -= len(chunk)
+            self.transport.write(chunk)
+            self.bytes_sent += len(chunk)
+
+        if not self.queue:
+            self.factory.resume_serial(self)
+
+    def stopProducing(self):
+        """
+        The TCP connection is closing.
+        """
+        self.clear_queue()
+
+    def get_stats(self):
+        """
+        Get the statistics for the client.
+        :return: Dictionary of the statistics.
+        """
+        elapsed = max(time.time() - self.connect_time, 1e-6)
+        peer = str(self.transport.getPeer()) if self.transport is not None else ""
+        return {'Peer': peer,
+                'BytesSent': self.bytes_sent,
+                'BytesDropped': self.bytes_dropped,
+                'ChunksDropped': self.chunks_dropped,
+                'QueuedBytes': self.queue_bytes,
+                'Paused': self.paused,
+                'Throughput': self.bytes_sent / elapsed}
+
     def dataReceived(self, data):
         """
         Receive data from the TCP port and send the data to the serial port
@@ -113,16 +228,6 @@ class SerialTcpProtocol(basic.LineReceiver):
         # Parse command
         self.parse_cmds(data)
 
-    def lineReceived(self, line):
-        logger.debug('TCP line received: ', line)
-        #for c in self.factory.clients:
-            #source = u"<{}> ".format(self.transport.getHost()).encode("ascii")
-            #c.sendLine(source + line)
-            #print('line received: ', line)
-
-    def rawDataReceived(self, data):
-        logger.debug('TCP Raw data received: ', data)
-
     def CMD_reconnect(self, cmd):
         """
         Decode the RECONNECT command to configure a new serial port.
@@ -219,22 +324,73 @@ class AdcpFactory(protocol.Factory):
     Create a serial connection and allow
     TCP clients to view the data
     """
-    def __init__(self, comm_port, baud):
+    def __init__(self, comm_port, baud, high_water=DEFAULT_HIGH_WATER, policy=POLICY_DROP_OLDEST):
+        """
+        :param comm_port: Serial port.
+        :param baud: Baud rate.
+        :param high_water: Number of bytes queued for a client before the policy is used.
+        :param policy: Policy for slow clients.  POLICY_DROP_OLDEST, POLICY_DISCONNECT or POLICY_PAUSE.
+        """
         self.clients = set()
         self.serial_port = None
         self.serial_comm_port = comm_port
         self.serial_baud = baud
+        self.high_water = high_water
+        self.policy = policy
+        self.paused_clients = set()
 
     def buildProtocol(self, addr):
         return SerialTcpProtocol(self, self.serial_comm_port, self.serial_baud)
 
+    def send(self, data):
+        """
+        Send the serial data to all the TCP clients.
+        :param data: Serial data.
+        """
+        for c in list(self.clients):
+            c.send(data)
+
+    def pause_serial(self, client):
+        """
+        Stop reading the serial port until the client catches up.
+        :param client: Slow client.
+        """
+        if client in self.paused_clients:
+            return
+
+        self.paused_clients.add(client)
+        if len(self.paused_clients) == 1 and self.serial_port is not None:
+            self.serial_port.pauseProducing()
+            logger.warning("Serial port paused for slow TCP client")
+
+    def resume_serial(self, client):
+        """
+        The client has caught up.  If no other client is
+        behind, start reading the serial port again.
+        :param client: Client that caught up.
+        """
+        if client not in self.paused_clients:
+            return
+
+        self.paused_clients.discard(client)
+        if len(self.paused_clients) == 0 and self.serial_port is not None:
+            self.serial_port.resumeProducing()
+            logger.debug("Serial port resumed")
+
+    def get_stats(self):
+        """
+        Get the statistics for all the clients.
+        :return: List of statistics for each client.
+        """
+        return [c.get_stats() for c in self.clients]
+
 
 class AdcpSerialPortServer:
     """
     Create a serial connection and allow TCP
     clients to view the data
     """
-    def __init__(self, port, comm_port, baud):
+    def __init__(self, port, comm_port, baud, high_water=DEFAULT_HIGH_WATER, policy=POLICY_DROP_OLDEST):
         self.port = "tcp:" + port       # TCP Port
         self.comm_port = comm_port      # Serial Port
         self.baud = baud                # Baud Rate
@@ -243,7 +399,8 @@ class AdcpSerialPortServer:
         logger.info("Start TCP server at: " + str(port))
 
         # Set the TCP port to output ADCP data
-        endpoints.serverFromString(reactor, self.port).listen(AdcpFactory(self.comm_port, self.baud))
+        self.factory = AdcpFactory(self.comm_port, self.baud, high_water, policy)
+        endpoints.serverFromString(reactor, self.port).listen(self.factory)
         logger.info("Serial port connected on " + str(self.comm_port) + " baud: " + str(baud))
         logger.info("TCP Port open on " + str(self.port))
 
@@ -306,3 +463,107 @@ class AdcpSerialPortServer:
 # Set the PORT to output ADCP data
 #endpoints.serverFromString(reactor, "tcp:55056").listen(AdcpFactory('/dev/cu.usbserial-FTYNODPO', 115200))
 #reactor.run()
+
+
+def _connect_clients(factory, num_clients):
+    """
+    Connect clients to the factory using a string transport.
+    """
+    from twisted.test import proto_helpers
+
+    clients = []
+    for i in range(num_clients):
+        client = factory.buildProtocol(None)
+        client.makeConnection(proto_helpers.StringTransport())
+        clients.append(client)
+    return clients
+
+
+def _create_factory(policy):
+    """
+    Create a factory with a string transport for the serial port.
+    """
+    from twisted.test import proto_helpers
+
+    factory = AdcpFactory("/dev/null", 115200, high_water=1000, policy=policy)
+    factory.serial_port = proto_helpers.StringTransport()
+    return factory
+
+
+def test_slow_clients_drop_oldest():
+    factory = _create_factory(POLICY_DROP_OLDEST)
+    fast = _connect_clients(factory, 4)
+    slow = _connect_clients(factory, 4)
+
+    # Slow clients have a full TCP buffer
+    for c in slow:
+        c.pauseProducing()
+
+    for i in range(100):
+        factory.send(bytes([i]) * 100)
+
+    for c in fast:
+        assert len(c.transport.value()) == 10000
+        assert c.bytes_dropped == 0
+
+    for c in slow:
+        assert c.queue_bytes <= factory.high_water
+        assert c.bytes_dropped == 9000
+        assert c.chunks_dropped == 90
+        assert len(c.transport.value()) == 0
+
+        # Catch up with the latest data
+        c.resumeProducing()
+        assert c.transport.value() == b"".join(bytes([i]) * 100 for i in range(90, 100))
+
+    assert len(factory.get_stats()) == 8
+    assert factory.serial_port.producerState == 'producing'
+
+
+def test_slow_clients_disconnect():
+    factory = _create_factory(POLICY_DISCONNECT)
+    fast = _connect_clients(factory, 2)
+    slow = _connect_clients(factory, 2)
+
+    for c in slow:
+        c.pauseProducing()
+
+    for i in range(100):
+        factory.send(b"1" * 100)
+
+    for c in fast:
+        assert len(c.transport.value()) == 10000
+        assert not c.transport.disconnecting
+
+    for c in slow:
+        assert c.transport.disconnecting
+        assert c.queue_bytes == 0
+        assert c.bytes_dropped == 1100
+
+        c.connectionLost(None)
+
+    assert len(factory.clients) == 2
+
+
+def test_slow_clients_pause():
+    factory = _create_factory(POLICY_PAUSE)
+    fast = _connect_clients(factory, 2)
+    slow = _connect_clients(factory, 2)
+
+    for c in slow:
+        c.pauseProducing()
+
+    for i in range(20):
+        factory.send(b"1" * 100)
+
+    # Serial port is paused until all the slow clients catch up
+    assert factory.serial_port.producerState == 'paused'
+    slow[0].resumeProducing()
+    assert factory.serial_port.producerState == 'paused'
+    slow[1].resumeProducing()
+    assert factory.serial_port.producerState == 'producing'
+
+    # No data lost
+    for c in fast + slow:
+        assert len(c.transport.value()) == 2000
+        assert c.bytes_dropped == 0
@@ -0,0 +1,512 @@
+import os
+import time
+import struct
+import calendar
+import logging
+import numpy as np
+from multiprocessing import shared_memory
+
+logger = logging.getLogger("Ensemble Bus")
+logger.setLevel(logging.ERROR)
+FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
+logging.basicConfig(format=FORMAT)
+
+
+# Default shared memory name
+BUS_NAME = "rti_ensemble_bus"
+
+# [Bin x Beam] arrays in each slot.
+# (Flag in ensemble, Dataset in ensemble, Array in dataset)
+ARRAYS = [
+    ("IsBeamVelocity", "BeamVelocity", "Velocities"),
+    ("IsInstrumentVelocity", "InstrumentVelocity", "Velocities"),
+    ("IsEarthVelocity", "EarthVelocity", "Velocities"),
+    ("IsAmplitude", "Amplitude", "Amplitude"),
+    ("IsCorrelation", "Correlation", "Correlation"),
+    ("IsGoodBeam", "GoodBeam", "GoodBeam"),
+    ("IsGoodEarth", "GoodEarth", "GoodEarth"),
+]
+
+# Ancillary data values in each slot
+SCALARS = ["FirstBinRange", "BinSize", "Heading", "Pitch", "Roll", "WaterTemp",
+           "SystemTemp", "Salinity", "Pressure", "TransducerDepth", "SpeedOfSound"]
+
+# Bus header: Magic, Version, Number of slots, Slot size, Max bins, Max beams, Writer process ID, Write sequence
+BUS_MAGIC = b'RTIENSBS'
+BUS_HEADER = struct.Struct("<8sIIIIIIQ")
+WRITE_SEQ_OFFSET = BUS_HEADER.size - 8
+VERSION = 2
+
+# Slot header: Sequence start, Ensemble number, Bins, Beams, Dataset flags, Ensemble time, Publish time
+SLOT_HEADER = struct.Struct("<QIIIIdd")
+
+# Sequence end is written after the data
+SEQ_END = struct.Struct("<Q")
+
+# Shared memory created by the writers in this process
+_created = set()
+
+
+def _attach(name):
+    """
+    Open the shared memory created by another writer.  It is not
+    removed when this process exits.
+    :param name: Shared memory name.
+    :return: SharedMemory.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _created:
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+def _is_running(pid):
+    """
+    Check if the writer's process is still running.
+    :param pid: Process ID.
+    :return: TRUE if the process is running.
+    """
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # The shared memory is removed when the last process closes it,
+        # so it only exists if the writer is still running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EnsembleSlot:
+    """
+    Ensemble read from the bus.  The arrays are views of the shared memory.
+    Use EnsembleBusReader.is_valid() after using the arrays to verify the
+    writer did not overwrite the slot, or use copy().
+    """
+
+    def __init__(self, seq, ens_num, ens_time, publish_time, arrays, scalars):
+        self.seq = seq                      # Sequence number
+        self.EnsembleNumber = ens_num
+        self.Time = ens_time                # Ensemble time.  Seconds since 1970
+        self.PublishTime = publish_time     # time.perf_counter() when published
+        self.arrays = arrays                # Dataset: [Bin x Beam] array
+        self.scalars = scalars              # Ancillary value: Value
+
+    def copy(self):
+        """
+        :return: Slot with the arrays copied out of the shared memory.
+        """
+        return EnsembleSlot(self.seq, self.EnsembleNumber, self.Time, self.PublishTime,
+                            {name: array.copy() for name, array in self.arrays.items()}, dict(self.scalars))
+
+
+class _EnsembleBus:
+    """
+    Layout of the ring of slots in the shared memory.
+
+    | Bus header | Slot 0 | Slot 1 | ... |
+    Slot: | Slot header | Scalars | Arrays | Sequence end |
+
+    Each slot has the sequence number written before and after the data.
+    If they do not match, the writer was writing the slot while it was read.
+    """
+
+    def __init__(self, shm, num_slots, max_bins, max_beams):
+        self.shm = shm
+        self.num_slots = num_slots
+        self.max_bins = max_bins
+        self.max_beams = max_beams
+
+        self.array_size = max_bins * max_beams * 4
+        self.scalars_offset = SLOT_HEADER.size
+        self.arrays_offset = self.scalars_offset + len(SCALARS) * 8
+        self.seq_end_offset = self.arrays_offset + len(ARRAYS) * self.array_size
+        self.slot_size = self.seq_end_offset + SEQ_END.size
+        self.slot_size += -self.slot_size % 64            # Align the slots
+
+        self.write_seq = np.ndarray((1,), dtype=np.uint64, buffer=shm.buf, offset=WRITE_SEQ_OFFSET)
+
+    @staticmethod
+    def get_size(num_slots, max_bins, max_beams):
+        slot_size = SLOT_HEADER.size + len(SCALARS) * 8 + len(ARRAYS) * max_bins * max_beams * 4 + SEQ_END.size
+        slot_size += -slot_size % 64
+        return BUS_HEADER.size + num_slots * slot_size
+
+    def slot_offset(self, seq):
+        return BUS_HEADER.size + (seq % self.num_slots) * self.slot_size
+
+
+class EnsembleBusWriter(_EnsembleBus):
+    """
+    Publish the decoded ensembles to a ring of slots in shared memory.
+    Any number of local processes can read the latest ensembles with
+    EnsembleBusReader without decoding JSON.  The writer never waits
+    for the readers.  Slow readers are overrun and can detect it.
+    """
+
+    def __init__(self, name=BUS_NAME, num_slots=64, max_bins=200, max_beams=4):
+        """
+        :param name: Shared memory name.
+        :param num_slots: Number of ensembles kept.
+        :param max_bins: Max number of bins.
+        :param max_beams: Max number of beams.
+        """
+        size = _EnsembleBus.get_size(num_slots, max_bins, max_beams)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            EnsembleBusWriter.remove_stale(name)
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+
+        super().__init__(shm, num_slots, max_bins, max_beams)
+        BUS_HEADER.pack_into(shm.buf, 0, BUS_MAGIC, VERSION, num_slots, self.slot_size, max_bins, max_beams, os.getpid(), 0)
+        self.seq = 0
+
+    @staticmethod
+    def remove_stale(name):
+        """
+        Remove the shared memory left over from a writer that did not close.
+        If the writer is still running, or it is not an ensemble bus, it is not removed.
+        :param name: Shared memory name.
+        """
+        old = _attach(name)
+        try:
+            if old.size < BUS_HEADER.size:
+                raise FileExistsError("Shared memory is not an ensemble bus: " + name)
+            magic, version, num_slots, slot_size, max_bins, max_beams, pid, write_seq = BUS_HEADER.unpack_from(old.buf, 0)
+            if magic != BUS_MAGIC:
+                raise FileExistsError("Shared memory is not an ensemble bus: " + name)
+            if version == VERSION and (name in _created if pid == os.getpid() else _is_running(pid)):
+                raise FileExistsError("Ensemble bus " + name + " is in use by process " + str(pid))
+        finally:
+            old.close()
+
+        logger.info("Remove the stale ensemble bus: " + name)
+        old = shared_memory.SharedMemory(name=name)
+        old.close()
+        old.unlink()
+
+    def publish(self, ens, ens_time=float("nan")):
+        """
+        Publish the ensemble.
+        :param ens: Ensemble.
+        :param ens_time: Ensemble time in seconds since 1970.  Taken from the Ensemble Data if not given.
+        :return: Sequence number.
+        """
+        ens_num = 0
+        if ens.IsEnsembleData:
+            ens_num = ens.EnsembleData.EnsembleNumber
+            if ens_time != ens_time and ens.EnsembleData.Month > 0:
+                ens_time = calendar.timegm(ens.EnsembleData.datetime().timetuple())
+
+        arrays = {}
+        for flag, ds_name, array_name in ARRAYS:
+            if getattr(ens, flag):
+                arrays[ds_name] = getattr(getattr(ens, ds_name), array_name)
+
+        scalars = {}
+        if ens.IsAncillaryData:
+            scalars = {name: getattr(ens.AncillaryData, name) for name in SCALARS}
+
+        return self.publish_arrays(ens_num, ens_time, arrays, scalars)
+
+    def publish_arrays(self, ens_num, ens_time, arrays, scalars):
+        """
+        Publish the ensemble arrays.
+        :param ens_num: Ensemble number.
+        :param ens_time: Ensemble time in seconds since 1970.
+        :param arrays: Dataset name: [Bin x Beam] values.
+        :param scalars: Ancillary value name: Value.
+        :return: Sequence number.
+        """
+        self.seq += 1
+        offset = self.slot_offset(self.seq)
+        buf = self.shm.buf
+
+        # Mark the slot as being written.  The sequence start no longer matches the sequence end.
+        SEQ_END.pack_into(buf, offset, self.seq)
+
+        num_bins = 0
+        num_beams = 0
+        flags = 0
+        for index, (flag, ds_name, array_name) in enumerate(ARRAYS):
+            if ds_name not in arrays:
+                continue
+            try:
+                values = np.asarray(arrays[ds_name], dtype=np.float32)
+            except ValueError:
+                logger.error("Ragged array not published: " + ds_name)
+                continue
+            if values.ndim == 3:
+                values = values[..., 0]
+            if values.ndim != 2:
+                continue
+
+            num_bins = min(values.shape[0], self.max_bins)
+            num_beams = min(values.shape[1], self.max_beams)
+            dest = np.ndarray((num_bins, num_beams), dtype=np.float32, buffer=buf,
+                              offset=offset + self.arrays_offset + index * self.array_size)
+            dest[:] = values[:num_bins, :num_beams]
+            flags |= 1 << index
+
+        scalar_values = np.ndarray((len(SCALARS),), dtype=np.float64, buffer=buf, offset=offset + self.scalars_offset)
+        scalar_values[:] = [scalars.get(name, np.nan) for name in SCALARS]
+
+        SLOT_HEADER.pack_into(buf, offset, self.seq, ens_num, num_bins, num_beams, flags, ens_time, time.perf_counter())
+        SEQ_END.pack_into(buf, offset + self.seq_end_offset, self.seq)
+
+        # Readers see the ensemble after the slot is complete
+        self.write_seq[0] = self.seq
+        return self.seq
+
+    def process_ensemble(self, sender, ens):
+        """
+        Publish the ensemble from the codec's EnsembleEvent.
+        codec.EnsembleEvent += writer.process_ensemble
+        """
+        self.publish(ens)
+
+    def close(self):
+        """
+        Close and remove the shared memory.
+        """
+        self.write_seq = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _created.discard(self.shm.name.lstrip("/"))
+
+
+class EnsembleBusReader(_EnsembleBus):
+    """
+    Read the ensembles from the shared memory written by EnsembleBusWriter.
+    """
+
+    def __init__(self, name=BUS_NAME):
+        """
+        :param name: Shared memory name.
+        """
+        # The writer owns the shared memory.  Do not remove it when the reader exits.
+        shm = _attach(name)
+
+        magic, version, num_slots, slot_size, max_bins, max_beams, pid, write_seq = BUS_HEADER.unpack_from(shm.buf, 0)
+        if magic != BUS_MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError("Not an ensemble bus: " + name)
+
+        super().__init__(shm, num_slots, max_bins, max_beams)
+        self.next_seq = write_seq + 1           # Only read new ensembles
+        self.overruns = 0                       # Ensembles missed because the reader was too slow
+
+    def get_write_seq(self):
+        """
+        :return: Sequence number of the latest ensemble published.
+        """
+        return int(self.write_seq[0])
+
+    def read_slot(self, seq):
+        """
+        Read the slot for the sequence number.
+        :param seq: Sequence number.
+        :return: EnsembleSlot or None if the slot was overwritten.
+        """
+        offset = self.slot_offset(seq)
+        buf = self.shm.buf
+        slot_seq, ens_num, num_bins, num_beams, flags, ens_time, publish_time = SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None
+
+        arrays = {}
+        for index, (flag, ds_name, array_name) in enumerate(ARRAYS):
+            if flags & (1 << index):
+                arrays[ds_name] = np.ndarray((num_bins, num_beams), dtype=np.float32, buffer=buf,
+                                             offset=offset + self.arrays_offset + index * self.array_size)
+
+        scalar_values = np.ndarray((len(SCALARS),), dtype=np.float64, buffer=buf, offset=offset + self.scalars_offset)
+        scalars = dict(zip(SCALARS, scalar_values.tolist()))
+
+        slot = EnsembleSlot(seq, ens_num, ens_time, publish_time, arrays, scalars)
+        if not self.is_valid(slot):
+            return None
+        return slot
+
+    def is_valid(self, slot):
+        """
+        Check the writer has not started to overwrite the slot.
+        :param slot: Slot read.
+        :return: TRUE if the slot's data is still the ensemble read.
+        """
+        offset = self.slot_offset(slot.seq)
+        return SLOT_HEADER.unpack_from(self.shm.buf, offset)[0] == slot.seq and \
+            SEQ_END.unpack_from(self.shm.buf, offset + self.seq_end_offset)[0] == slot.seq and \
+            self.get_write_seq() - slot.seq < self.num_slots
+
+    def read_next(self):
+        """
+        Read the next ensemble.  If the reader was overrun, the missed
+        ensembles are counted in overruns and the oldest ensemble
+        still in the ring is read.
+        :return: EnsembleSlot or None if there is no new ensemble.
+        """
+        while True:
+            write_seq = self.get_write_seq()
+            if self.next_seq > write_seq:
+                return None
+
+            # Skip the ensembles already overwritten.  Keep one slot free for the writer.
+            oldest = write_seq - self.num_slots + 2
+            if self.next_seq < oldest:
+                self.overruns += oldest - self.next_seq
+                self.next_seq = oldest
+
+            slot = self.read_slot(self.next_seq)
+            if slot is None:
+                # Overwritten while reading
+                self.overruns += 1
+                self.next_seq += 1
+                continue
+
+            self.next_seq += 1
+            return slot
+
+    def wait_next(self, timeout=1.0, poll=0.0001):
+        """
+        Wait for the next ensemble.
+        :param timeout: Seconds to wait.
+        :param poll: Seconds between checks.
+        :return: EnsembleSlot or None if timed out.
+        """
+        end = time.perf_counter() + timeout
+        while True:
+            slot = self.read_next()
+            if slot is not None or time.perf_counter() > end:
+                return slot
+            time.sleep(poll)
+
+    def latest(self, count):
+        """
+        Read the latest ensembles.  This does not change the position of read_next().
+        :param count: Number of ensembles.
+        :return: List of EnsembleSlot from the oldest to the latest.
+        """
+        write_seq = self.get_write_seq()
+        first = max(write_seq - min(count, self.num_slots - 1) + 1, 1)
+        slots = [self.read_slot(seq) for seq in range(first, write_seq + 1)]
+        return [slot for slot in slots if slot is not None]
+
+    def close(self):
+        self.write_seq = None
+        self.shm.close()
+
+
+def test_publish_read():
+    name = "rti_test_bus_" + str(time.time_ns())
+    writer = EnsembleBusWriter(name, num_slots=8, max_bins=10, max_beams=4)
+    reader = EnsembleBusReader(name)
+    try:
+        assert reader.read_next() is None
+
+        vel = np.arange(20, dtype=np.float32).reshape(5, 4)
+        writer.publish_arrays(1, 100.0, {"EarthVelocity": vel, "Amplitude": vel.tolist()}, {"Heading": 45.0})
+
+        slot = reader.read_next()
+        assert slot.EnsembleNumber == 1
+        assert slot.Time == 100.0
+        assert np.array_equal(slot.arrays["EarthVelocity"], vel)
+        assert np.array_equal(slot.arrays["Amplitude"], vel)
+        assert "BeamVelocity" not in slot.arrays
+        assert slot.scalars["Heading"] == 45.0
+        assert reader.read_next() is None
+
+        # Zero copy view is overwritten by the writer
+        for ens_num in range(2, 12):
+            writer.publish_arrays(ens_num, 100.0, {"EarthVelocity": vel * ens_num}, {})
+        assert not reader.is_valid(slot)
+
+        # Reader was overrun
+        slot = reader.read_next()
+        assert reader.overruns > 0
+        assert slot.EnsembleNumber == 11 - 8 + 2
+        assert np.array_equal(slot.arrays["EarthVelocity"], vel * slot.EnsembleNumber)
+
+        latest = reader.latest(3)
+        assert [s.EnsembleNumber for s in latest] == [9, 10, 11]
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_publish_ensemble():
+    from Ensemble.Ensemble import Ensemble
+    from Ensemble.EnsembleData import EnsembleData
+    from Ensemble.BeamVelocity import BeamVelocity
+
+    ens = Ensemble()
+    ens_data = EnsembleData(0, 0)
+    ens_data.EnsembleNumber = 12
+    ens.AddEnsembleData(ens_data)
+    ds = BeamVelocity(3, 4)
+    for bin_num in range(3):
+        for beam in range(4):
+            ds.Velocities[bin_num][beam] = bin_num + beam / 10.0
+    ens.AddBeamVelocity(ds)
+
+    name = "rti_test_bus_" + str(time.time_ns())
+    writer = EnsembleBusWriter(name, num_slots=4, max_bins=10, max_beams=4)
+    reader = EnsembleBusReader(name)
+    try:
+        writer.process_ensemble(None, ens)
+        slot = reader.read_next().copy()
+        assert slot.EnsembleNumber == 12
+        assert np.allclose(slot.arrays["BeamVelocity"], ds.Velocities)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_second_writer():
+    name = "rti_test_bus_" + str(time.time_ns())
+    writer = EnsembleBusWriter(name, num_slots=4, max_bins=10, max_beams=4)
+    reader = EnsembleBusReader(name)
+    try:
+        # A second writer does not remove the bus of a running writer
+        try:
+            EnsembleBusWriter(name, num_slots=4, max_bins=10, max_beams=4)
+            assert False
+        except FileExistsError:
+            pass
+
+        writer.publish_arrays(1, 100.0, {"EarthVelocity": np.ones((2, 4))}, {})
+        assert reader.read_next().EnsembleNumber == 1
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reclaim_stale():
+    name = "rti_test_bus_" + str(time.time_ns())
+
+    # Left over from a writer that exited without closing
+    size = _EnsembleBus.get_size(4, 10, 4)
+    stale = shared_memory.SharedMemory(name=name, create=True, size=size)
+    BUS_HEADER.pack_into(stale.buf, 0, BUS_MAGIC, VERSION, 4, 0, 10, 4, 0, 5)
+    stale.close()
+
+    writer = EnsembleBusWriter(name, num_slots=4, max_bins=10, max_beams=4)
+    reader = EnsembleBusReader(name)
+    try:
+        assert reader.get_write_seq() == 0
+    finally:
+        reader.close()
+        writer.close()
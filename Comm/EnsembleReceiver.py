@@ -1,4 +1,8 @@
 import socket
+import select
+import threading
+import queue
+import collections
 import sys, getopt
 import json
 import abc
@@ -12,22 +16,78 @@ settings._interpolation = configparser.ExtendedInterpolation()
 settings.read('settings.ini')
 
 
+class DatagramBatch:
+    """
+    Preallocated buffer to receive a batch of datagrams.
+    """
+
+    def __init__(self, batch_size, max_size):
+        self.max_size = max_size
+        self.buffer = bytearray(batch_size * max_size)
+        self.view = memoryview(self.buffer)
+        self.sizes = []                         # Size of each datagram received
+
+    def get(self, index):
+        """
+        :param index: Datagram index in the batch.
+        :return: Datagram data.
+        """
+        start = index * self.max_size
+        return self.view[start:start + self.sizes[index]]
+
+
 class EnsembleReceiver:
     """
     Create a UDP reader class
+
+    A receive thread drains the datagrams from the socket in batches into
+    preallocated buffers.  The JSON is decoded and processed on the thread
+    that called read(), so a slow process() does not stop the socket from
+    being read.
     """
     __metaclass__ = abc.ABCMeta
 
+    # Socket receive buffer size.  Linux limits this to net.core.rmem_max.
+    RECV_BUFFER_SIZE = 8 * 1024 * 1024
+
+    # Largest UDP datagram
+    MAX_DATAGRAM_SIZE = 65536
+
+    # Datagrams in a batch
+    BATCH_SIZE = 8
+
+    # Number of batches that can wait to be decoded.
+    # The batches use NUM_BATCHES * BATCH_SIZE * MAX_DATAGRAM_SIZE (4 MB),
+    # the socket receive buffer holds the data when they are all in use.
+    NUM_BATCHES = 8
+
     def __init__(self):
         #self.port = int(settings.get('SerialServerSection', 'JsonEnsUdpPort'))   # Default port
         self.socket = None
-        self.file_socket = None
         self.is_alive = False
         self.adcp_data = EnsembleJsonData()
         self.EnsembleEvent = EventHandler(self)     # Event to handle a JSON ensemble
 
         self.prev_ens_num = 0
 
+        # Batches of datagrams, allocated when the socket is opened
+        self.free_batches = queue.Queue()
+        self.full_batches = queue.Queue()
+        self.num_batches = 0
+        self.recv_thread = None
+        self.recv_buffer_size = 0
+
+        # Statistics
+        self.datagrams = 0                      # Datagrams received
+        self.decode_errors = 0                  # Datagrams that could not be decoded
+        self.recv_stalls = 0                    # Times the receive thread waited for a free batch
+        self.num_ensembles = 0                  # Ensembles received
+        self.missing_ensembles = 0              # Ensembles missing between the ensembles received
+        self.num_gaps = 0                       # Number of gaps in the ensemble numbers
+        self.max_gap = 0                        # Largest gap
+        self.gap_sizes = collections.Counter()  # Gap size: Number of gaps
+        self.restarts = 0                       # Ensemble number went backwards
+
     def connect(self, udp_port):
         """
         Connect to the UDP port and begin reading data.
@@ -46,9 +106,24 @@ class EnsembleReceiver:
         try:
             self.is_alive = True
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP
-            self.socket.settimeout(10)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECV_BUFFER_SIZE)
             self.socket.bind(('', udp_port))
-            self.file_socket = self.socket.makefile()   # Convert to file, to use ReadLine
+            self.socket.setblocking(False)          # Drained until empty, select() waits for data
+
+            # Linux doubles the value set and limits it to net.core.rmem_max
+            self.recv_buffer_size = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            if self.recv_buffer_size < self.RECV_BUFFER_SIZE:
+                logger.info("UDP receive buffer limited to " + str(self.recv_buffer_size) + " bytes.  Increase net.core.rmem_max.")
+
+            # Allocate the batches
+            while self.num_batches < self.NUM_BATCHES:
+                self.free_batches.put(DatagramBatch(self.BATCH_SIZE, self.MAX_DATAGRAM_SIZE))
+                self.num_batches += 1
+
+            # Start draining the socket
+            self.recv_thread = threading.Thread(name="EnsembleReceiver", target=self.receive)
+            self.recv_thread.daemon = True
+            self.recv_thread.start()
         except ConnectionRefusedError as err:
             logger.error(err)
             sys.exit(2)
@@ -56,58 +131,130 @@ class EnsembleReceiver:
             print('Error Opening socket: ', err)
             sys.exit(2)
 
-    def read(self):
+    def receive(self):
         """
-        Read data from the serial port
+        Receive thread.  Drain all the datagrams waiting in the socket
+        into a batch, then pass the batch to read() to be decoded.
         """
+        sock = self.socket
         while self.is_alive:
             try:
-                # Get the JSON data
-                # Each dataset has a Newline added to the end to find the end of each dataset
-                response = self.file_socket.readline()
-
-                # JSON data
-                json_response = json.loads(response)
-
-                # Send the JSON data to the abstract class to process
-                # the JSON data.
-                self.process(json_response)
-
-                # Check if disconnected
-                if len(response) == 0:
-                    logger.info("Disconnected")
+                batch = self.free_batches.get(timeout=1)
+            except queue.Empty:
+                # Decoding is behind, the socket buffer holds the data
+                self.recv_stalls += 1
+                continue
 
-                    # Close the socket
-                    self.close()
+            batch.sizes = []
+            try:
+                # Wait for data
+                readable, writable, error = select.select([sock], [], [], 1)
+                while readable and len(batch.sizes) < self.BATCH_SIZE:
+                    start = len(batch.sizes) * self.MAX_DATAGRAM_SIZE
+                    batch.sizes.append(sock.recv_into(batch.view[start:start + self.MAX_DATAGRAM_SIZE]))
+            except BlockingIOError:
+                # Socket is empty
+                pass
+            except (OSError, ValueError) as ex:
+                if self.is_alive:
+                    logger.error("Error receiving UDP data. " + str(ex))
+                self.free_batches.put(batch)
+                break
 
-                    # Reconnect to the server
-                    self.reconnect(self.port)
+            if batch.sizes:
+                self.full_batches.put(batch)
+            else:
+                self.free_batches.put(batch)
 
-                    # Try to read again
-                    self.read()
+    def read(self):
+        """
+        Decode and process the datagrams received.
+        """
+        while self.is_alive:
+            try:
+                batch = self.full_batches.get(timeout=1)
+            except queue.Empty:
+                continue
             except KeyboardInterrupt:
                 # Ctrl-C will stop the application
                 logger.info("Keyboard interrupt stopped app")
                 self.close()
                 break
-            except socket.timeout:
-                # Do nothing
-                continue
-            except OSError as ex:
-                logger.error("Socket is timed out.", ex)
-                return
-            except Exception as ex:
-                logger.error("Error receiving ensemble data. ", ex)
-                print(str(ex))
-                return
+
+            try:
+                self.process_batch(batch)
+            finally:
+                self.free_batches.put(batch)
+
+    def process_batch(self, batch):
+        """
+        Decode the JSON datasets in the batch and process them.
+        Each dataset has a Newline added to the end to find the end of each dataset.
+        :param batch: Batch of datagrams.
+        """
+        for index in range(len(batch.sizes)):
+            self.datagrams += 1
+            for line in bytes(batch.get(index)).split(b"\n"):
+                if not line.strip():
+                    continue
+                try:
+                    json_data = json.loads(line.decode())
+                except ValueError as ex:
+                    # JSONDecodeError and UnicodeDecodeError are ValueErrors
+                    self.decode_errors += 1
+                    logger.debug("Error decoding ensemble data. " + str(ex))
+                    continue
+
+                try:
+                    # Send the JSON data to the abstract class to process
+                    # the JSON data.
+                    self.process(json_data)
+                except Exception:
+                    logger.exception("Error processing ensemble data.")
 
     def close(self):
         """
         Close the socket.
         """
         self.is_alive = False
+        if self.recv_thread is not None and self.recv_thread is not threading.current_thread():
+            self.recv_thread.join()
+            self.recv_thread = None
         self.socket.close()
 
+    def record_ensemble(self, ens_num):
+        """
+        Keep track of the gaps in the ensemble numbers.
+        :param ens_num: Ensemble number received.
+        """
+        self.num_ensembles += 1
+        if self.prev_ens_num > 0:
+            gap = ens_num - self.prev_ens_num - 1
+            if gap > 0:
+                self.missing_ensembles += gap
+                self.num_gaps += 1
+                self.max_gap = max(self.max_gap, gap)
+                self.gap_sizes[gap] += 1
+            elif gap < 0:
+                self.restarts += 1
+        self.prev_ens_num = ens_num
+
+    def get_stats(self):
+        """
+        Get the receive and gap statistics.
+        :return: Dictionary of the statistics.
+        """
+        return {"datagrams": self.datagrams,
+                "decode_errors": self.decode_errors,
+                "recv_stalls": self.recv_stalls,
+                "recv_buffer_size": self.recv_buffer_size,
+                "ensembles": self.num_ensembles,
+                "missing_ensembles": self.missing_ensembles,
+                "gaps": self.num_gaps,
+                "max_gap": self.max_gap,
+                "gap_sizes": dict(self.gap_sizes),
+                "restarts": self.restarts}
+
     @abc.abstractmethod
     def process(self, json_data):
         """
@@ -131,15 +278,72 @@ class EnsembleReceiver:
             self.adcp_data.process(json_data)
 
             # Check for missing ensembles
-            if self.prev_ens_num > 0 and self.prev_ens_num + 1 != self.adcp_data.EnsembleNumber:
-                for msens in range((self.adcp_data.EnsembleNumber - 1) - self.prev_ens_num):
-                    logger.info("Missing Ens: " + str(self.prev_ens_num + msens + 1) + " prev: " + str(
-                        self.prev_ens_num) + " cur: " + str(self.adcp_data.EnsembleNumber))  # add 1 to msens because 0 based
-
-            self.prev_ens_num = self.adcp_data.EnsembleNumber
+            self.record_ensemble(self.adcp_data.EnsembleNumber)
 
         return json_data
 
+
+def test_receive_gaps():
+    import time
+
+    receiver = EnsembleReceiver()
+    ensembles = []
+    receiver.EnsembleEvent += lambda sender, ens: ensembles.append(ens.EnsembleNumber)
+
+    # Bind to any free port
+    thread = threading.Thread(target=receiver.connect, args=(0,))
+    thread.start()
+    while receiver.recv_thread is None:
+        time.sleep(0.01)
+    port = receiver.socket.getsockname()[1]
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for ens_num in [1, 2, 3, 6, 7, 11, 12]:
+        for name in ["E000008", "E000003"]:
+            sender.sendto((json.dumps({"EnsembleNumber": ens_num, "Name": name}) + "\n").encode(), ("127.0.0.1", port))
+    sender.sendto(b"not json\n", ("127.0.0.1", port))
+    sender.close()
+
+    timeout = time.time() + 5
+    while receiver.datagrams < 15 and time.time() < timeout:
+        time.sleep(0.01)
+    receiver.close()
+    thread.join()
+
+    stats = receiver.get_stats()
+    assert receiver.num_batches == EnsembleReceiver.NUM_BATCHES
+    assert stats["datagrams"] == 15
+    assert stats["decode_errors"] == 1
+    assert stats["ensembles"] == 7
+    assert stats["missing_ensembles"] == 5
+    assert stats["gaps"] == 2
+    assert stats["max_gap"] == 3
+    assert stats["gap_sizes"] == {2: 1, 3: 1}
+    assert ensembles == [0, 1, 2, 3, 6, 7, 11]
+
+
+def test_no_buffers_until_connect():
+    receiver = EnsembleReceiver()
+    assert receiver.num_batches == 0
+    assert receiver.free_batches.empty()
+
+
+def test_process_error_not_decode_error():
+    class FailReceiver(EnsembleReceiver):
+        def process(self, json_data):
+            raise KeyError("EnsembleNumber")
+
+    receiver = FailReceiver()
+    batch = DatagramBatch(2, 64)
+    for index, data in enumerate([b'{"Name": "E000008"}\n', b'not json\n']):
+        batch.view[index * 64:index * 64 + len(data)] = data
+        batch.sizes.append(len(data))
+    receiver.process_batch(batch)
+
+    assert receiver.datagrams == 2
+    assert receiver.decode_errors == 1
+
+
 if __name__ == '__main__':
     argv = sys.argv[1:]
     port = 55057
@@ -159,4 +363,5 @@ if __name__ == '__main__':
     reader = EnsembleReceiver()
     reader.connect(port)
     reader.close()
-    logger.info("Socket Closed")
\ No newline at end of file
+    logger.info("Socket Closed")
+    logger.info(str(reader.get_stats()))
\ No newline at end of file
@@ -1,5 +1,6 @@
 import struct
 import json
+from Ensemble.EnsembleSerializer import to_json
 
 
 class Ensemble:
@@ -194,7 +195,7 @@ class Ensemble:
         if pretty is True:
             return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4) + "\n"
         else:
-            return json.dumps(self, default=lambda o: o.__dict__) + "\n"
+            return to_json(self) + "\n"
 
     @staticmethod
     def GetInt32(start, numBytes, ens):
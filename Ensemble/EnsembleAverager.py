@@ -0,0 +1,466 @@
+import copy
+from datetime import datetime
+import numpy as np
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSeries import is_bad_value
+from Ensemble.BeamVelocity import BeamVelocity
+from Ensemble.InstrumentVelocity import InstrumentVelocity
+from Ensemble.EarthVelocity import EarthVelocity
+from Ensemble.Amplitude import Amplitude
+from Ensemble.Correlation import Correlation
+from Ensemble.GoodBeam import GoodBeam
+from Ensemble.GoodEarth import GoodEarth
+from Utilities.events import EventHandler
+
+# Profile datasets: (Dataset, Attribute, Class, Average)
+PROFILES = [('BeamVelocity', 'Velocities', BeamVelocity, 'mean'),
+            ('InstrumentVelocity', 'Velocities', InstrumentVelocity, 'vector'),
+            ('EarthVelocity', 'Velocities', EarthVelocity, 'vector'),
+            ('Amplitude', 'Amplitude', Amplitude, 'amplitude'),
+            ('Correlation', 'Correlation', Correlation, 'mean'),
+            ('GoodBeam', 'GoodBeam', GoodBeam, 'sum'),
+            ('GoodEarth', 'GoodEarth', GoodEarth, 'sum')]
+
+# Ancillary data values averaged.  Heading is averaged as an angle.
+ANCILLARY = ['FirstBinRange', 'BinSize', 'Pitch', 'Roll', 'WaterTemp', 'SystemTemp', 'Salinity',
+             'Pressure', 'TransducerDepth', 'SpeedOfSound', 'RawMagFieldStrength',
+             'PitchGravityVector', 'RollGravityVector', 'VerticalGravityVector']
+
+# Bottom Track values averaged.  Heading is averaged as an angle.
+# The Status flags are combined and NumBeams is taken from the first ensemble.
+BT_VALUES = ['Pitch', 'Roll', 'WaterTemp', 'SystemTemp', 'Salinity', 'Pressure', 'TransducerDepth',
+             'SpeedOfSound']
+
+# Bottom Track beam values: (Attribute, Average)
+BT_BEAMS = [('Range', 'range'),
+            ('SNR', 'mean'),
+            ('Amplitude', 'mean'),
+            ('Correlation', 'mean'),
+            ('BeamVelocity', 'mean'),
+            ('BeamGood', 'sum'),
+            ('InstrumentVelocity', 'vector'),
+            ('InstrumentGood', 'sum'),
+            ('EarthVelocity', 'vector'),
+            ('EarthGood', 'sum')]
+
+
+class Accumulator:
+    """
+    Sum of the good values of an array for each ensemble.
+    The arrays are allocated once and cleared for each average.
+
+    Average:
+    mean: Mean of the good values.
+    vector: Mean of the good values.  The first 3 beams (X, Y, Z or East, North,
+            Vertical) are only used together, so the velocity is averaged as a vector.
+    amplitude: Mean of the good dB values, or of the power if linear.
+    range: Mean of the good values greater than 0.
+    sum: Sum of the good values.  Used for the good ping counts.
+    angle: Mean direction in degrees.  Used for the heading.
+    """
+
+    def __init__(self, shape, average='mean', linear=False):
+        """
+        :param shape: Shape of the array.
+        :param average: How the values are averaged.
+        :param linear: Average the amplitude in linear power instead of dB.
+        """
+        self.shape = tuple(shape)
+        self.average = average
+        self.linear = linear
+        self.sum = np.zeros(self.shape)
+        self.sum_sin = np.zeros(self.shape)
+        self.count = np.zeros(self.shape)
+        self.num_ens = 0                        # Ensembles added
+
+    def clear(self):
+        """
+        Clear the sums for the next average.
+        """
+        self.sum.fill(0.0)
+        self.sum_sin.fill(0.0)
+        self.count.fill(0.0)
+        self.num_ens = 0
+
+    def add(self, values):
+        """
+        Add the values of an ensemble.  Bad values (88.888 or NaN) are not included.
+        :param values: Array of values with the same shape.
+        """
+        values = np.asarray(values, dtype=float)
+        good = ~is_bad_value(values)
+        if self.average == 'vector' and values.shape[-1] >= 3:
+            good[..., :3] = good[..., :3].all(axis=-1)[..., np.newaxis]
+        elif self.average == 'range':
+            good &= values > 0.0
+
+        if self.average == 'angle':
+            radians = np.radians(np.where(good, values, 0.0))
+            self.sum += np.cos(radians) * good
+            self.sum_sin += np.sin(radians) * good
+        elif self.average == 'amplitude' and self.linear:
+            self.sum += np.where(good, np.power(10.0, np.where(good, values, 0.0) / 10.0), 0.0)
+        else:
+            self.sum += np.where(good, values, 0.0)
+        self.count += good
+        self.num_ens += 1
+
+    def result(self):
+        """
+        Get the average.  Values without any good values are bad values (88.888).
+        :return: Array of the average.
+        """
+        if self.average == 'sum':
+            return self.sum.copy()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.average == 'angle':
+                avg = np.degrees(np.arctan2(self.sum_sin, self.sum)) % 360.0
+            elif self.average == 'amplitude' and self.linear:
+                avg = 10.0 * np.log10(self.sum / self.count)
+            else:
+                avg = self.sum / self.count
+        return np.where(self.count > 0, avg, Ensemble.BadVelocity)
+
+
+class EnsembleAverager:
+    """
+    Average the ensembles over a number of ensembles or a time interval.
+    Subscribe to the codec's EnsembleEvent.  The averaged ensembles are
+    passed to this EnsembleEvent, so the writers and plots can use them
+    like any other ensemble:
+
+    averager = EnsembleAverager(seconds=600)
+    codec.EnsembleEvent += averager.process_ensemble
+    averager.EnsembleEvent += writer.process_ensemble
+
+    The velocities are averaged as vectors, the amplitude in dB or linear
+    power and the heading as an angle.  The good ping counts and the ping
+    counts are added together.  The Bottom Track status flags of all the
+    ensembles are combined.  Bad values are not included in the
+    average.  If a bin has no good values, it is a bad value.
+
+    The averaged ensemble has the ensemble number and date and time of the
+    first ensemble, the FirstPingTime of the first ensemble and the
+    LastPingTime of the last ensemble.  The other datasets, like the
+    System Setup and NMEA data, are taken from the last ensemble.
+    """
+
+    def __init__(self, num_ens=0, seconds=0.0, linear_amplitude=False):
+        """
+        :param num_ens: Number of ensembles to average.  0 to only use the time.
+        :param seconds: Time interval to average in seconds.  The intervals start on the clock, so 600 is
+                        every 10 minutes on the hour.  0 to only use the number of ensembles.
+        :param linear_amplitude: Average the amplitude in linear power instead of dB.
+        """
+        if num_ens <= 0 and seconds <= 0:
+            raise ValueError("Set the number of ensembles or the time interval to average")
+
+        self.num_ens = num_ens
+        self.seconds = seconds
+        self.linear_amplitude = linear_amplitude
+        self.shape = None                       # (Bins, Beams) of the accumulators
+        self.bt_beams = None                    # Bottom Track beams of the accumulators
+        self.count = 0                          # Ensembles in the current average
+        self.interval = None                    # Time interval of the current average
+        self.first = {}                         # Datasets of the first ensemble
+        self.last = None                        # Last ensemble
+
+        # Event to receive the averaged ensembles
+        self.EnsembleEvent = EventHandler(self)
+
+    def allocate(self, num_bins, num_beams):
+        """
+        Allocate the accumulators for the profile and ancillary data.
+        :param num_bins: Number of bins.
+        :param num_beams: Number of beams.
+        """
+        self.shape = (num_bins, num_beams)
+        self.profiles = {ds: Accumulator(self.shape, average, self.linear_amplitude)
+                         for ds, attr, cls, average in PROFILES}
+        self.ancillary = Accumulator((len(ANCILLARY),))
+        self.heading = Accumulator((1,), 'angle')
+        self.pings = Accumulator((2,), 'sum')   # Desired and actual ping count
+
+    def allocate_bt(self, num_beams):
+        """
+        Allocate the accumulators for the Bottom Track data.
+        :param num_beams: Number of Bottom Track beams.
+        """
+        self.bt_beams = num_beams
+        self.bt = {attr: Accumulator((num_beams,), average) for attr, average in BT_BEAMS}
+        self.bt_values = Accumulator((len(BT_VALUES),))
+        self.bt_heading = Accumulator((1,), 'angle')
+        self.bt_pings = Accumulator((1,), 'sum')
+        self.bt_status = 0                      # Status flags of all the ensembles
+
+    def clear(self):
+        """
+        Clear the accumulators for the next average.
+        """
+        for acc in self.accumulators():
+            acc.clear()
+        self.count = 0
+        self.bt_status = 0
+        self.first = {}
+        self.last = None
+
+    def accumulators(self):
+        """
+        :return: List of all the accumulators allocated.
+        """
+        accs = []
+        if self.shape is not None:
+            accs += list(self.profiles.values()) + [self.ancillary, self.heading, self.pings]
+        if self.bt_beams is not None:
+            accs += list(self.bt.values()) + [self.bt_values, self.bt_heading, self.bt_pings]
+        return accs
+
+    def get_interval(self, ens):
+        """
+        Get the time interval of the ensemble.
+        :param ens: Ensemble.
+        :return: Interval number since 1970, or None if not averaging by time or the ensemble has no date and time.
+        """
+        if self.seconds <= 0 or not ens.IsEnsembleData:
+            return None
+        try:
+            ens_time = ens.EnsembleData.datetime()
+        except ValueError:
+            return None
+        return int((ens_time - datetime(1970, 1, 1)).total_seconds() // self.seconds)
+
+    def process_ensemble(self, sender, ens):
+        """
+        Add the ensemble to the average.  When the average is complete,
+        the averaged ensemble is passed to the EnsembleEvent.
+        :param sender: Sender of the ensemble.
+        :param ens: Ensemble.
+        """
+        # Start a new average for a new time interval or a new number of bins
+        interval = self.get_interval(ens)
+        if self.count > 0 and interval is not None and interval != self.interval:
+            self.flush()
+        if ens.IsEnsembleData and (ens.EnsembleData.NumBins, ens.EnsembleData.NumBeams) != self.shape:
+            self.flush()
+            self.allocate(ens.EnsembleData.NumBins, ens.EnsembleData.NumBeams)
+        if ens.IsBottomTrack and len(ens.BottomTrack.Range) != self.bt_beams:
+            self.flush()
+            self.allocate_bt(len(ens.BottomTrack.Range))
+
+        if interval is not None:
+            self.interval = interval
+        self.add(ens)
+
+        if 0 < self.num_ens <= self.count:
+            self.flush()
+
+    def add(self, ens):
+        """
+        Add the ensemble to the accumulators.
+        :param ens: Ensemble.
+        """
+        if self.shape is not None:
+            for ds, attr, cls, average in PROFILES:
+                if getattr(ens, 'Is' + ds, False):
+                    values = np.asarray(getattr(getattr(ens, ds), attr), dtype=float)
+                    if values.shape == self.shape:
+                        self.profiles[ds].add(values)
+
+            if ens.IsEnsembleData:
+                self.pings.add([ens.EnsembleData.DesiredPingCount, ens.EnsembleData.ActualPingCount])
+                self.first.setdefault('EnsembleData', ens.EnsembleData)
+
+            if ens.IsAncillaryData:
+                self.ancillary.add([getattr(ens.AncillaryData, name) for name in ANCILLARY])
+                self.heading.add([ens.AncillaryData.Heading])
+                self.first.setdefault('AncillaryData', ens.AncillaryData)
+
+        if ens.IsBottomTrack and self.bt_beams is not None:
+            for attr, average in BT_BEAMS:
+                values = getattr(ens.BottomTrack, attr)
+                if len(values) == self.bt_beams:
+                    self.bt[attr].add(values)
+            self.bt_values.add([getattr(ens.BottomTrack, name) for name in BT_VALUES])
+            self.bt_heading.add([ens.BottomTrack.Heading])
+            self.bt_pings.add([ens.BottomTrack.ActualPingCount])
+            self.bt_status |= int(ens.BottomTrack.Status)
+            self.first.setdefault('BottomTrack', ens.BottomTrack)
+
+        self.last = ens
+        self.count += 1
+
+    def flush(self):
+        """
+        Create the averaged ensemble of the ensembles added, pass it to
+        the EnsembleEvent and start a new average.
+        :return: Averaged ensemble or None if no ensembles were added.
+        """
+        if self.count == 0:
+            return None
+
+        avg_ens = self.create_ensemble()
+        self.clear()
+        self.EnsembleEvent(avg_ens)
+        return avg_ens
+
+    def create_ensemble(self):
+        """
+        Create an ensemble with the averages.
+        :return: Averaged ensemble.
+        """
+        ens = Ensemble()
+        last = self.last
+
+        if self.shape is not None:
+            num_bins, num_beams = self.shape
+            for ds, attr, cls, average in PROFILES:
+                acc = self.profiles[ds]
+                if acc.num_ens > 0:
+                    dataset = cls(num_bins, num_beams)
+                    values = acc.result()
+                    if average == 'sum':
+                        values = values.astype(int)
+                    setattr(dataset, attr, values.tolist())
+                    getattr(ens, 'Add' + ds)(dataset)
+
+            if 'EnsembleData' in self.first:
+                ens_data = copy.copy(self.first['EnsembleData'])
+                ens_data.DesiredPingCount, ens_data.ActualPingCount = self.pings.result().astype(int).tolist()
+                ens.AddEnsembleData(ens_data)
+
+            if 'AncillaryData' in self.first:
+                anc = copy.copy(self.first['AncillaryData'])
+                for name, value in zip(ANCILLARY, self.ancillary.result()):
+                    setattr(anc, name, float(value))
+                anc.Heading = float(self.heading.result()[0])
+                if last.IsAncillaryData:
+                    anc.LastPingTime = last.AncillaryData.LastPingTime
+                ens.AddAncillaryData(anc)
+
+        if 'BottomTrack' in self.first:
+            bt = copy.copy(self.first['BottomTrack'])
+            for attr, average in BT_BEAMS:
+                setattr(bt, attr, self.bt[attr].result().tolist())
+            for name, value in zip(BT_VALUES, self.bt_values.result()):
+                setattr(bt, name, float(value))
+            bt.Heading = float(self.bt_heading.result()[0])
+            bt.ActualPingCount = float(self.bt_pings.result()[0])
+            bt.Status = float(self.bt_status)
+            if last.IsBottomTrack:
+                bt.LastPingTime = last.BottomTrack.LastPingTime
+            ens.AddBottomTrack(bt)
+
+        # Datasets not averaged
+        for ds in ['SystemSetup', 'NmeaData', 'RangeTracking']:
+            if getattr(last, 'Is' + ds, False):
+                getattr(ens, 'Add' + ds)(getattr(last, ds))
+
+        return ens
+
+
+def _create_ens(ens_num, second, vel, amp, heading):
+    """
+    Create an ensemble with 2 bins and 4 beams.
+    """
+    from Ensemble.EnsembleData import EnsembleData
+    from Ensemble.AncillaryData import AncillaryData
+
+    ens = Ensemble()
+    ens_data = EnsembleData(0, 0)
+    ens_data.EnsembleNumber = ens_num
+    ens_data.NumBins = 2
+    ens_data.NumBeams = 4
+    ens_data.DesiredPingCount = 10
+    ens_data.ActualPingCount = 10
+    ens_data.Year, ens_data.Month, ens_data.Day = 2017, 1, 1
+    ens_data.Minute, ens_data.Second = divmod(second, 60)
+    ens.AddEnsembleData(ens_data)
+
+    anc = AncillaryData(0, 0)
+    anc.FirstPingTime = float(second)
+    anc.LastPingTime = second + 0.9
+    anc.Heading = heading
+    anc.Pitch = 2.0
+    ens.AddAncillaryData(anc)
+
+    earth = EarthVelocity(2, 4)
+    earth.Velocities = [list(vel), list(vel)]
+    ens.AddEarthVelocity(earth)
+
+    ds = Amplitude(2, 4)
+    ds.Amplitude = [[amp] * 4, [amp] * 4]
+    ens.AddAmplitude(ds)
+
+    good = GoodEarth(2, 4)
+    good.GoodEarth = [[10] * 4, [10] * 4]
+    ens.AddGoodEarth(good)
+    return ens
+
+
+def test_average_num_ens():
+    bad = Ensemble.BadVelocity
+    averaged = []
+    averager = EnsembleAverager(num_ens=3)
+    averager.EnsembleEvent += lambda sender, ens: averaged.append(ens)
+
+    averager.process_ensemble(None, _create_ens(1, 0, [1.0, 2.0, 0.0, 0.1], 10.0, 350.0))
+    averager.process_ensemble(None, _create_ens(2, 1, [3.0, bad, 0.0, bad], 20.0, 10.0))
+    averager.process_ensemble(None, _create_ens(3, 2, [3.0, 4.0, 1.0, 0.3], 30.0, 20.0))
+    assert len(averaged) == 1
+    ens = averaged[0]
+
+    # East is bad in ensemble 2 with North, the vector is not used
+    assert np.allclose(ens.EarthVelocity.Velocities[0], [2.0, 3.0, 0.5, 0.2])
+    assert np.allclose(ens.Amplitude.Amplitude[1], [20.0] * 4)
+    assert ens.GoodEarth.GoodEarth[0] == [30] * 4
+    assert ens.EnsembleData.EnsembleNumber == 1
+    assert ens.EnsembleData.ActualPingCount == 30
+    assert np.isclose(ens.AncillaryData.Heading, 6.7, atol=0.01)          # 350, 10 and 20 degrees
+    assert ens.AncillaryData.Pitch == 2.0
+    assert ens.AncillaryData.FirstPingTime == 0.0
+    assert ens.AncillaryData.LastPingTime == 2.9
+
+    # Nothing left to average
+    assert averager.flush() is None
+
+
+def test_average_bottom_track_status():
+    from Ensemble.BottomTrack import BottomTrack
+
+    averaged = []
+    averager = EnsembleAverager(num_ens=3)
+    averager.EnsembleEvent += lambda sender, ens: averaged.append(ens)
+    for ens_num, status in [(1, 0x0001), (2, 0x0000), (3, 0x0400)]:
+        ens = _create_ens(ens_num, ens_num, [1.0] * 4, 10.0, 0.0)
+        bt = BottomTrack(0, 0)
+        bt.Status = float(status)
+        bt.NumBeams = float(4 + ens_num)
+        bt.Range = [10.0 + ens_num] * 4
+        ens.AddBottomTrack(bt)
+        averager.process_ensemble(None, ens)
+
+    assert len(averaged) == 1
+    bt = averaged[0].BottomTrack
+    assert int(bt.Status) == 0x0401                 # Flags of all the ensembles
+    assert bt.NumBeams == 5.0                       # First ensemble
+    assert np.allclose(bt.Range, [12.0] * 4)
+    assert averager.bt_status == 0
+
+
+def test_average_seconds():
+    bad = Ensemble.BadVelocity
+    averager = EnsembleAverager(seconds=60, linear_amplitude=True)
+    averaged = []
+    averager.EnsembleEvent += lambda sender, ens: averaged.append(ens)
+
+    for second in [58, 59, 60, 61]:
+        averager.process_ensemble(None, _create_ens(second, second, [bad] * 4, 10.0 * (second % 2 + 1), 0.0))
+    assert len(averaged) == 1
+    assert averaged[0].EnsembleData.EnsembleNumber == 58
+    assert averaged[0].EarthVelocity.Velocities[0] == [bad] * 4
+    assert np.isclose(averaged[0].Amplitude.Amplitude[0][0], 10.0 * np.log10((10.0 + 100.0) / 2.0))
+
+    ens = averager.flush()
+    assert ens.EnsembleData.EnsembleNumber == 60
+    assert len(averaged) == 2
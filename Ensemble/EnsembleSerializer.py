@@ -0,0 +1,227 @@
+import io
+import json
+import threading
+import numpy as np
+
+
+class EnsembleSerializer:
+    """
+    Serialize the ensemble and datasets to JSON.
+
+    By default, the output is the same as
+    json.dumps(ens, default=lambda o: o.__dict__).  With round_floats, the
+    floats in the [Bin x Beam] arrays are rounded to the precision of the
+    instrument.  The rounded arrays are written in bulk using a format
+    template for the array shape, which is faster and smaller than writing
+    the full precision of each float.
+    """
+
+    # Number of decimal places for each array in the datasets.
+    # Dataset Name: {Array: Decimal places}
+    SCHEMA = {
+        "E000001": {"Velocities": 3},                                       # Beam Velocity (m/s)
+        "E000002": {"Velocities": 3},                                       # Instrument Velocity (m/s)
+        "E000003": {"Velocities": 3},                                       # Earth Velocity (m/s)
+        "E000004": {"Amplitude": 2},                                        # Amplitude (dB)
+        "E000005": {"Correlation": 3},                                      # Correlation
+        "E000006": {"GoodBeam": 0},                                         # Good Beam pings
+        "E000007": {"GoodEarth": 0},                                        # Good Earth pings
+        "E000010": {"Range": 3, "SNR": 2, "Amplitude": 2, "Correlation": 3,   # Bottom Track
+                    "BeamVelocity": 3, "BeamGood": 0,
+                    "InstrumentVelocity": 3, "InstrumentGood": 0,
+                    "EarthVelocity": 3, "EarthGood": 0,
+                    "SNR_PulseCoherent": 2, "Amp_PulseCoherent": 2, "Vel_PulseCoherent": 3,
+                    "Noise_PulseCoherent": 2, "Corr_PulseCoherent": 3},
+        "E000015": {"SNR": 2, "Range": 3, "Pings": 0, "Amplitude": 2,        # Range Tracking
+                    "Correlation": 3, "BeamVelocity": 3,
+                    "InstrumentVelocity": 3, "EarthVelocity": 3},
+    }
+
+    def __init__(self, round_floats=False, compact=False):
+        """
+        :param round_floats: Round the array values to the decimal places in the SCHEMA.
+        :param compact: Do not add spaces after the separators.
+        """
+        self.round_floats = round_floats
+        if compact:
+            self.item_sep = ","
+            self.key_sep = ":"
+        else:
+            self.item_sep = ", "
+            self.key_sep = ": "
+
+        self.encoder = json.JSONEncoder(default=lambda o: o.__dict__, separators=(self.item_sep, self.key_sep))
+        self.templates = {}                 # (Shape, Format): Format template
+        self.buffer = io.StringIO()         # Reusable buffer for to_json()
+
+    def to_json(self, obj):
+        """
+        Convert the ensemble or dataset to a JSON string.
+        :param obj: Ensemble or dataset.
+        :return: JSON string.
+        """
+        self.buffer.seek(0)
+        self.buffer.truncate(0)
+        self.write(obj, self.buffer)
+        return self.buffer.getvalue()
+
+    @staticmethod
+    def to_dict(obj):
+        """
+        Convert the ensemble or dataset to a dictionary, the same as
+        json.loads(json.dumps(obj, default=lambda o: o.__dict__)) without
+        encoding the JSON.  The lists are not copied.
+        :param obj: Ensemble or dataset.
+        :return: Dictionary of the values.
+        """
+        result = {}
+        for key, value in obj.__dict__.items():
+            if hasattr(value, "__dict__"):
+                value = EnsembleSerializer.to_dict(value)
+            result[key] = value
+        return result
+
+    def write(self, obj, out):
+        """
+        Write the ensemble or dataset as JSON.
+        :param obj: Ensemble or dataset.
+        :param out: Object to write the JSON to.  Any object with write(str).
+        """
+        schema = EnsembleSerializer.SCHEMA.get(getattr(obj, "Name", None), {})
+
+        out.write("{")
+        first = True
+        for key, value in obj.__dict__.items():
+            if not first:
+                out.write(self.item_sep)
+            first = False
+
+            out.write(self.encoder.encode(key))
+            out.write(self.key_sep)
+
+            if isinstance(value, list):
+                self.write_array(value, schema.get(key), out)
+            elif hasattr(value, "__dict__"):
+                # Datasets in the ensemble
+                self.write(value, out)
+            else:
+                out.write(self.encoder.encode(value))
+        out.write("}")
+
+    def write_array(self, value, decimals, out):
+        """
+        Write the array.  If the values are rounded, the array is written in
+        bulk with a format template.  If the array is not a rectangular array
+        of floats, or the values are not rounded, the JSON encoder is used.
+        :param value: List or list of lists.
+        :param decimals: Decimal places to round to.  None to not round.
+        :param out: Object to write the JSON to.
+        """
+        if not self.round_floats or decimals is None:
+            out.write(self.encoder.encode(value))
+            return
+
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            array = None
+
+        if array is None or array.ndim > 2 or array.dtype.kind != "f" or not np.all(np.isfinite(array)):
+            # Integers, NaN and Infinity are written by the JSON encoder
+            out.write(self.encoder.encode(value))
+            return
+
+        fmt = "%." + str(decimals) + "f"
+        out.write(self.get_template(array.shape, fmt) % tuple(array.ravel().tolist()))
+
+    def get_template(self, shape, fmt):
+        """
+        Get the format template for the array shape.
+        :param shape: Shape of the array.
+        :param fmt: Format for each value.
+        :return: Format template.
+        """
+        template = self.templates.get((shape, fmt))
+        if template is None:
+            if len(shape) == 1:
+                template = "[" + self.item_sep.join([fmt] * shape[0]) + "]"
+            else:
+                row = "[" + self.item_sep.join([fmt] * shape[1]) + "]"
+                template = "[" + self.item_sep.join([row] * shape[0]) + "]"
+            self.templates[(shape, fmt)] = template
+        return template
+
+
+# Serializer for each thread, used by to_json()
+_local = threading.local()
+
+
+def to_json(obj):
+    """
+    Convert the ensemble or dataset to a JSON string, the same as
+    json.dumps(obj, default=lambda o: o.__dict__).  The serializer and
+    its buffer are reused for each thread.
+    :param obj: Ensemble or dataset.
+    :return: JSON string.
+    """
+    serializer = getattr(_local, "serializer", None)
+    if serializer is None:
+        serializer = _local.serializer = EnsembleSerializer()
+    return serializer.to_json(obj)
+
+
+def _create_ens(num_bins, num_beams):
+    """
+    Create an ensemble with random float32 values.
+    """
+    import random
+    import struct
+    from Ensemble.Ensemble import Ensemble
+    from Ensemble.BeamVelocity import BeamVelocity
+    from Ensemble.Amplitude import Amplitude
+    from Ensemble.GoodBeam import GoodBeam
+    from Ensemble.EnsembleData import EnsembleData
+
+    ens = Ensemble()
+    ens.AddEnsembleData(EnsembleData(23, 1))
+    vel = BeamVelocity(num_bins, num_beams)
+    amp = Amplitude(num_bins, num_beams)
+    good = GoodBeam(num_bins, num_beams)
+    for bin_num in range(num_bins):
+        for beam in range(num_beams):
+            vel.Velocities[bin_num][beam] = struct.unpack('f', struct.pack('f', random.uniform(-2.0, 2.0)))[0]
+            amp.Amplitude[bin_num][beam] = struct.unpack('f', struct.pack('f', random.uniform(20.0, 80.0)))[0]
+            good.GoodBeam[bin_num][beam] = random.randint(0, 10)
+    ens.AddBeamVelocity(vel)
+    ens.AddAmplitude(amp)
+    ens.AddGoodBeam(good)
+    return ens
+
+
+def test_same_as_json():
+    ens = _create_ens(30, 4)
+    ens.BeamVelocity.Velocities[0][0] = 88.888
+
+    serializer = EnsembleSerializer()
+    assert serializer.to_json(ens) == json.dumps(ens, default=lambda o: o.__dict__)
+    assert serializer.to_json(ens.BeamVelocity) == json.dumps(ens.BeamVelocity, default=lambda o: o.__dict__)
+    assert to_json(ens) == json.dumps(ens, default=lambda o: o.__dict__)
+    assert ens.toJSON(ens) == json.dumps(ens, default=lambda o: o.__dict__) + "\n"
+
+    assert EnsembleSerializer.to_dict(ens) == json.loads(json.dumps(ens, default=lambda o: o.__dict__))
+
+    # Ragged array
+    rounded = EnsembleSerializer(round_floats=True)
+    ens.BeamVelocity.Velocities[1] = [0.5, 0.5]
+    assert rounded.to_json(ens.BeamVelocity) == json.dumps(ens.BeamVelocity, default=lambda o: o.__dict__)
+
+
+def test_round_floats():
+    ens = _create_ens(30, 4)
+    serializer = EnsembleSerializer(round_floats=True, compact=True)
+    result = json.loads(serializer.to_json(ens))
+
+    assert np.allclose(result["BeamVelocity"]["Velocities"], ens.BeamVelocity.Velocities, atol=0.0005)
+    assert np.allclose(result["Amplitude"]["Amplitude"], ens.Amplitude.Amplitude, atol=0.005)
+    assert result["GoodBeam"]["GoodBeam"] == ens.GoodBeam.GoodBeam
+
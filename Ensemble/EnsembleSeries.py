@@ -0,0 +1,161 @@
+import numpy as np
+from Ensemble.Ensemble import Ensemble
+
+
+class EnsembleSeries:
+    """
+    Datasets of a list of ensembles stacked into arrays.
+
+    The profile data is [ensemble x bin x beam] and the ancillary data is
+    [ensemble].  Values are kept as the ADCP gave them, so bad velocities
+    are still 88.888.  A dataset missing from an ensemble, or bins past
+    the number of bins of an ensemble, are NaN.
+    """
+
+    # Profile datasets: (Array name, Dataset, Attribute)
+    PROFILES = [('beam_vel', 'BeamVelocity', 'Velocities'),
+                ('instr_vel', 'InstrumentVelocity', 'Velocities'),
+                ('earth_vel', 'EarthVelocity', 'Velocities'),
+                ('amplitude', 'Amplitude', 'Amplitude'),
+                ('correlation', 'Correlation', 'Correlation'),
+                ('good_beam', 'GoodBeam', 'GoodBeam'),
+                ('good_earth', 'GoodEarth', 'GoodEarth')]
+
+    # Ensemble values: (Array name, Dataset, Attribute)
+    VALUES = [('ens_num', 'EnsembleData', 'EnsembleNumber'),
+              ('num_bins', 'EnsembleData', 'NumBins'),
+              ('num_beams', 'EnsembleData', 'NumBeams'),
+              ('desired_ping_count', 'EnsembleData', 'DesiredPingCount'),
+              ('actual_ping_count', 'EnsembleData', 'ActualPingCount'),
+              ('first_bin_range', 'AncillaryData', 'FirstBinRange'),
+              ('bin_size', 'AncillaryData', 'BinSize'),
+              ('first_ping_time', 'AncillaryData', 'FirstPingTime'),
+              ('heading', 'AncillaryData', 'Heading'),
+              ('pitch', 'AncillaryData', 'Pitch'),
+              ('roll', 'AncillaryData', 'Roll'),
+              ('water_temp', 'AncillaryData', 'WaterTemp'),
+              ('transducer_depth', 'AncillaryData', 'TransducerDepth'),
+              ('speed_of_sound', 'AncillaryData', 'SpeedOfSound')]
+
+    def __init__(self, num_ens, num_bins, num_beams=4):
+        """
+        Create the arrays for the series.  All the values are NaN.
+        :param num_ens: Number of ensembles.
+        :param num_bins: Number of bins.
+        :param num_beams: Number of beams.
+        """
+        self.num_ens = num_ens
+        self.ss_code = ""
+        for name, ds, attr in self.PROFILES:
+            setattr(self, name, np.full((num_ens, num_bins, num_beams), np.nan))
+        for name, ds, attr in self.VALUES:
+            setattr(self, name, np.full(num_ens, np.nan))
+        self.bt_range = np.full((num_ens, num_beams), np.nan)      # Bottom Track range for each beam
+
+    @classmethod
+    def from_ensembles(cls, ensembles):
+        """
+        Stack the datasets of the ensembles.
+        :param ensembles: List of decoded ensembles.
+        :return: EnsembleSeries.
+        """
+        num_bins = 0
+        num_beams = 0
+        for ens in ensembles:
+            if ens.IsEnsembleData:
+                num_bins = max(num_bins, ens.EnsembleData.NumBins)
+                num_beams = max(num_beams, ens.EnsembleData.NumBeams)
+
+        series = cls(len(ensembles), num_bins, num_beams)
+        for index, ens in enumerate(ensembles):
+            series.set_ensemble(index, ens)
+        return series
+
+    def set_ensemble(self, index, ens):
+        """
+        Copy the datasets of the ensemble to the arrays.
+        :param index: Ensemble index in the series.
+        :param ens: Decoded ensemble.
+        """
+        for name, ds, attr in self.PROFILES:
+            if getattr(ens, 'Is' + ds, False):
+                values = np.asarray(getattr(getattr(ens, ds), attr), dtype=float)
+                if values.ndim == 2:
+                    array = getattr(self, name)
+                    num_bins = min(values.shape[0], array.shape[1])
+                    num_beams = min(values.shape[1], array.shape[2])
+                    array[index, :num_bins, :num_beams] = values[:num_bins, :num_beams]
+
+        for name, ds, attr in self.VALUES:
+            if getattr(ens, 'Is' + ds, False):
+                getattr(self, name)[index] = getattr(getattr(ens, ds), attr)
+
+        if ens.IsEnsembleData and not self.ss_code:
+            self.ss_code = ens.EnsembleData.SysFirmwareSubsystemCode
+
+        if ens.IsBottomTrack:
+            num_beams = min(len(ens.BottomTrack.Range), self.bt_range.shape[1])
+            self.bt_range[index, :num_beams] = ens.BottomTrack.Range[:num_beams]
+
+    def bin_depths(self):
+        """
+        Depth of the center of each bin below the transducer.
+        :return: Depth in meters.  [ensemble x bin]
+        """
+        num_bins = self.beam_vel.shape[1]
+        return self.first_bin_range[:, np.newaxis] + np.arange(num_bins) * self.bin_size[:, np.newaxis]
+
+
+def is_bad_value(values):
+    """
+    Find the bad values.  A value is bad if it is the bad velocity
+    value (88.888) or NaN.
+    :param values: Array of values.
+    :return: Boolean array, True for the bad values.
+    """
+    values = np.asarray(values, dtype=float)
+    return np.isnan(values) | is_bad_velocity(values)
+
+
+def is_bad_velocity(values):
+    """
+    Find the bad velocity values (88.888).  NaN is not included.
+    :param values: Array of values.
+    :return: Boolean array, True for the bad values.
+    """
+    values = np.asarray(values, dtype=float)
+    return (values > Ensemble.BadVelocity - 1e-3) & (values < Ensemble.BadVelocity + 1e-3)
+
+
+def test_series():
+    from Ensemble.EnsembleData import EnsembleData
+    from Ensemble.AncillaryData import AncillaryData
+    from Ensemble.BeamVelocity import BeamVelocity
+
+    ensembles = []
+    for ens_num, num_bins in [(1, 3), (2, 2)]:
+        ens = Ensemble()
+        ens_data = EnsembleData(0, 0)
+        ens_data.EnsembleNumber = ens_num
+        ens_data.NumBins = num_bins
+        ens_data.NumBeams = 4
+        ens.AddEnsembleData(ens_data)
+        anc = AncillaryData(0, 0)
+        anc.FirstBinRange = 1.0
+        anc.BinSize = 0.5
+        anc.Heading = 10.0 * ens_num
+        ens.AddAncillaryData(anc)
+        beam_vel = BeamVelocity(num_bins, 4)
+        beam_vel.Velocities = [[ens_num + bin_num * 0.1] * 4 for bin_num in range(num_bins)]
+        beam_vel.Velocities[0][3] = Ensemble.BadVelocity
+        ens.AddBeamVelocity(beam_vel)
+        ensembles.append(ens)
+
+    series = EnsembleSeries.from_ensembles(ensembles)
+    assert series.beam_vel.shape == (2, 3, 4)
+    assert list(series.ens_num) == [1.0, 2.0]
+    assert list(series.heading) == [10.0, 20.0]
+    assert np.isnan(series.beam_vel[1, 2, 0])                       # Bin past the ensemble bins
+    assert np.isnan(series.amplitude).all()                         # Dataset missing
+    assert list(is_bad_value(series.beam_vel[0, 0])) == [False, False, False, True]
+    assert np.allclose(series.bin_depths()[0], [1.0, 1.5, 2.0])
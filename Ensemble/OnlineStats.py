@@ -0,0 +1,285 @@
+import math
+import threading
+import numpy as np
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSeries import is_bad_velocity
+
+# Datasets with statistics.  Dataset: [Bin x Beam] array in dataset
+DATASETS = {"BeamVelocity": "Velocities",
+            "EarthVelocity": "Velocities",
+            "Amplitude": "Amplitude",
+            "Correlation": "Correlation"}
+
+
+class RollingStats:
+    """
+    Running statistics of a [bin x beam] array, updated one ensemble at a time.
+
+    The window is split into blocks.  Each block keeps the count, mean,
+    sum of squared differences (Welford), min and max of its ensembles.
+    When the newest block is full, the oldest block is cleared and used
+    for the next ensembles.  The blocks are combined for a snapshot, so
+    the memory and the time to add an ensemble do not depend on the
+    window or how long it runs.  The window holds between
+    window - block size and window ensembles.
+
+    With the exponential mode, the mean, variance and percent good are
+    exponentially weighted with a span of window ensembles.  The min and
+    max are still over the last window ensembles.
+    """
+
+    def __init__(self, window=100, mode='fixed', num_blocks=10):
+        """
+        :param window: Number of ensembles in the window.
+        :param mode: 'fixed' for the last window ensembles or 'exponential'.
+        :param num_blocks: Number of blocks in the window.
+        """
+        if mode not in ('fixed', 'exponential'):
+            raise ValueError("Unknown window mode: " + str(mode))
+
+        self.window = window
+        self.mode = mode
+        self.num_blocks = max(1, min(num_blocks, window))
+        self.block_size = int(math.ceil(window / float(self.num_blocks)))
+        self.alpha = 2.0 / (window + 1.0)
+        self.shape = None
+        self.total = 0                          # Ensembles added since the reset
+
+    def reset(self, shape):
+        """
+        Clear the statistics and allocate the blocks.
+        :param shape: Shape of the array.  (Bins, Beams)
+        """
+        self.shape = tuple(shape)
+        block_shape = (self.num_blocks,) + self.shape
+        self.pos = 0                            # Block used for the new ensembles
+        self.block_count = np.zeros(self.num_blocks, dtype=int)   # Ensembles in each block
+        self.n = np.zeros(block_shape)          # Good values
+        self.mean = np.zeros(block_shape)
+        self.m2 = np.zeros(block_shape)
+        self.min = np.full(block_shape, np.nan)
+        self.max = np.full(block_shape, np.nan)
+        self.total = 0
+
+        # Exponential mode
+        self.ew_mean = np.full(self.shape, np.nan)
+        self.ew_var = np.zeros(self.shape)
+        self.ew_good = np.zeros(self.shape)
+
+        # Buffers for each update
+        self.good = np.zeros(self.shape, dtype=bool)
+        self.delta = np.zeros(self.shape)
+
+    def add(self, values):
+        """
+        Add the values of an ensemble.  Bad values (88.888 or NaN) are not included.
+        If the shape changes, like a new number of bins, the statistics are cleared.
+        :param values: [Bin x Beam] array.
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.shape:
+            self.reset(values.shape)
+
+        # Move to the next block, clearing the oldest
+        if self.block_count[self.pos] >= self.block_size:
+            self.pos = (self.pos + 1) % self.num_blocks
+            self.block_count[self.pos] = 0
+            self.n[self.pos] = 0.0
+            self.mean[self.pos] = 0.0
+            self.m2[self.pos] = 0.0
+            self.min[self.pos] = np.nan
+            self.max[self.pos] = np.nan
+
+        good = self.good
+        np.isnan(values, out=good)
+        good |= is_bad_velocity(values)
+        np.logical_not(good, out=good)
+        x = np.where(good, values, 0.0)
+
+        # Welford update of the block
+        n = self.n[self.pos]
+        mean = self.mean[self.pos]
+        n += good
+        np.subtract(x, mean, out=self.delta)
+        self.delta *= good
+        mean += self.delta / np.maximum(n, 1.0)
+        self.m2[self.pos] += self.delta * (x - mean) * good
+        np.fmin(self.min[self.pos], np.where(good, values, np.nan), out=self.min[self.pos])
+        np.fmax(self.max[self.pos], np.where(good, values, np.nan), out=self.max[self.pos])
+        self.block_count[self.pos] += 1
+
+        if self.mode == 'exponential':
+            first = good & np.isnan(self.ew_mean)
+            self.ew_mean[first] = x[first]
+            delta = np.where(good, x - self.ew_mean, 0.0)
+            self.ew_mean += self.alpha * delta
+            self.ew_var[:] = np.where(good, (1.0 - self.alpha) * (self.ew_var + self.alpha * delta * delta), self.ew_var)
+            if self.total == 0:
+                self.ew_good[:] = good
+            else:
+                self.ew_good += self.alpha * (good - self.ew_good)
+
+        self.total += 1
+
+    def snapshot(self):
+        """
+        Get the statistics of the window.
+        :return: Dictionary of [Bin x Beam] arrays: count, mean, var, std, min, max and good (percent good).
+                 NumEnsembles is the number of ensembles in the window.
+        """
+        if self.shape is None:
+            return None
+
+        num_ens = int(self.block_count.sum())
+        count = self.n.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.mode == 'fixed':
+                # Combine the blocks
+                mean = (self.n * self.mean).sum(axis=0) / count
+                m2 = self.m2.sum(axis=0) + (self.n * np.square(self.mean - mean)).sum(axis=0)
+                var = np.where(count > 1, m2 / (count - 1), np.nan)
+                good = count / num_ens * 100.0
+            else:
+                mean = self.ew_mean.copy()
+                var = np.where(count > 1, self.ew_var, np.nan)
+                good = self.ew_good * 100.0
+            mean[count == 0] = np.nan
+
+        return {'NumEnsembles': num_ens,
+                'count': count,
+                'mean': mean,
+                'var': var,
+                'std': np.sqrt(var),
+                'min': np.fmin.reduce(self.min, axis=0),
+                'max': np.fmax.reduce(self.max, axis=0),
+                'good': good}
+
+
+class EnsembleStats:
+    """
+    Running statistics of the profile datasets for live monitoring.
+    Subscribe to the codec's EnsembleEvent:
+
+    stats = EnsembleStats(window=600)
+    codec.EnsembleEvent += stats.process_ensemble
+
+    The snapshots can be published to WAMP with create_payload() or
+    given to a Bokeh ColumnDataSource.  The memory does not grow,
+    so it can run for months.
+    """
+
+    def __init__(self, window=100, mode='fixed', num_blocks=10, datasets=None):
+        """
+        :param window: Number of ensembles in the window.
+        :param mode: 'fixed' for the last window ensembles or 'exponential'.
+        :param num_blocks: Number of blocks in the window.
+        :param datasets: List of datasets.  If None, all the DATASETS.
+        """
+        if datasets is None:
+            datasets = list(DATASETS.keys())
+        self.stats = {ds: RollingStats(window, mode, num_blocks) for ds in datasets}
+        self.ens_num = 0                        # Latest ensemble number
+        self.lock = threading.Lock()            # Ensembles and snapshots can be on different threads
+
+    def process_ensemble(self, sender, ens):
+        """
+        Add the ensemble to the statistics.
+        :param sender: Sender of the ensemble.
+        :param ens: Ensemble.
+        """
+        with self.lock:
+            if ens.IsEnsembleData:
+                self.ens_num = ens.EnsembleData.EnsembleNumber
+            for ds, stats in self.stats.items():
+                if getattr(ens, "Is" + ds, False):
+                    stats.add(getattr(getattr(ens, ds), DATASETS[ds]))
+
+    def snapshot(self, dataset):
+        """
+        Get the statistics of the dataset.
+        :param dataset: Dataset name.  Amplitude
+        :return: Dictionary of [Bin x Beam] arrays, or None if no ensembles have the dataset.
+        """
+        with self.lock:
+            return self.stats[dataset].snapshot()
+
+    def create_payload(self, dataset, binary=False):
+        """
+        Create a payload of the statistics to publish to WAMP.
+        The format is like the EnsemblePublisher payloads.
+        :param dataset: Dataset name.
+        :param binary: Publish the values as float32 bytes instead of a list.
+        :return: Payload or None if no ensembles have the dataset.
+        """
+        snapshot = self.snapshot(dataset)
+        if snapshot is None:
+            return None
+
+        payload = {"EnsembleNumber": self.ens_num,
+                   "Name": dataset,
+                   "NumEnsembles": snapshot['NumEnsembles'],
+                   "Shape": list(snapshot['mean'].shape)}
+        if binary:
+            payload["Format"] = "<f4"
+        for stat in ['mean', 'std', 'min', 'max', 'good']:
+            values = np.where(np.isnan(snapshot[stat]), Ensemble.BadVelocity, snapshot[stat])
+            if binary:
+                payload[stat] = values.astype("<f4").tobytes()
+            else:
+                payload[stat] = values.tolist()
+        return payload
+
+
+def test_rolling_fixed():
+    rng = np.random.RandomState(0)
+    data = rng.normal(1.0, 2.0, (95, 3, 4))
+    data[rng.uniform(size=data.shape) < 0.1] = Ensemble.BadVelocity
+
+    stats = RollingStats(window=20, num_blocks=4)
+    for values in data:
+        stats.add(values)
+    snapshot = stats.snapshot()
+
+    # 95 ensembles, blocks of 5: the last block has all 5 and the window is 20
+    assert snapshot['NumEnsembles'] == 20
+    window = np.where(data[-20:] == Ensemble.BadVelocity, np.nan, data[-20:])
+    assert np.allclose(snapshot['mean'], np.nanmean(window, axis=0))
+    assert np.allclose(snapshot['var'], np.nanvar(window, axis=0, ddof=1))
+    assert np.array_equal(snapshot['min'], np.nanmin(window, axis=0))
+    assert np.array_equal(snapshot['max'], np.nanmax(window, axis=0))
+    assert np.allclose(snapshot['good'], np.mean(~np.isnan(window), axis=0) * 100.0)
+
+    # New number of bins clears the statistics
+    stats.add(np.ones((2, 4)))
+    assert stats.snapshot()['NumEnsembles'] == 1
+    assert np.isnan(stats.snapshot()['var']).all()
+
+
+def test_rolling_exponential():
+    stats = RollingStats(window=9, mode='exponential')
+    for value in [1.0, 1.0, Ensemble.BadVelocity, 3.0]:
+        stats.add(np.full((1, 1), value))
+    snapshot = stats.snapshot()
+    # alpha = 0.2: mean 1, 1, 1 (bad), 1 + 0.2 * 2
+    assert np.isclose(snapshot['mean'][0, 0], 1.4)
+    assert np.isclose(snapshot['var'][0, 0], 0.8 * 0.2 * 4.0)
+    assert snapshot['max'][0, 0] == 3.0
+    assert np.isclose(snapshot['good'][0, 0], 84.0)                   # 100, 100, 80, 84
+
+
+def test_ensemble_stats():
+    from Ensemble.Amplitude import Amplitude
+
+    stats = EnsembleStats(window=10, datasets=["Amplitude"])
+    for amp in [10.0, 20.0]:
+        ens = Ensemble()
+        ds = Amplitude(2, 4)
+        ds.Amplitude = [[amp] * 4, [amp] * 4]
+        ens.AddAmplitude(ds)
+        stats.process_ensemble(None, ens)
+
+    payload = stats.create_payload("Amplitude")
+    assert payload["NumEnsembles"] == 2
+    assert payload["mean"] == [[15.0] * 4] * 2
+    assert payload["good"] == [[100.0] * 4] * 2
+    assert stats.create_payload("Amplitude", binary=True)["mean"] == np.full((2, 4), 15.0, dtype="<f4").tobytes()
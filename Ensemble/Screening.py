@@ -0,0 +1,282 @@
+import numpy as np
+from Ensemble.EnsembleSeries import is_bad_value
+from ADCP.Subsystem import ss_beam_angle
+
+# Screens that mark a beam of a bin bad
+BEAM_SCREENS = ['bad_velocity', 'correlation', 'amplitude', 'good_beam', 'fish', 'side_lobe']
+
+# Screens that mark the earth velocity of a bin bad
+EARTH_SCREENS = ['bad_earth', 'bad_beams', 'good_earth', 'error_velocity', 'side_lobe']
+
+
+class ProfileScreen:
+    """
+    Screen the profile data of an EnsembleSeries.
+
+    All the screens are combined into two masks, True where the data is bad:
+    the beam mask [ensemble x bin x beam] for the beam data and the earth
+    mask [ensemble x bin] for the earth velocities.  The masks are
+    calculated for a block of ensembles at a time and kept, so the data
+    can be screened again without calculating the masks again.  Changing
+    an option clears the masks.
+    """
+
+    def __init__(self, series, block_size=1000, bad_velocity=True, min_correlation=None, min_amplitude=None,
+                 min_good_beam=None, min_good_earth=None, max_error_velocity=None, side_lobe=False,
+                 fish_threshold=None, beam_angle=None, three_beam=True):
+        """
+        :param series: EnsembleSeries to screen.
+        :param block_size: Number of ensembles in each block.
+        :param bad_velocity: Screen the bad velocity value (88.888).
+        :param min_correlation: Minimum correlation (0.0 to 1.0).  If None, not screened.
+        :param min_amplitude: Minimum amplitude in dB.  If None, not screened.
+        :param min_good_beam: Minimum fraction of good pings for each beam (0.0 to 1.0).  If None, not screened.
+        :param min_good_earth: Minimum fraction of good pings for the earth velocity (0.0 to 1.0).  If None, not screened.
+        :param max_error_velocity: Maximum error velocity in m/s.  If None, not screened.
+        :param side_lobe: Screen the bins past the Bottom Track side lobe cutoff.
+        :param fish_threshold: Amplitude in dB a beam can be above the weakest beam of the bin.  If None, not screened.
+        :param beam_angle: Beam angle from vertical in degrees for the side lobe cutoff.  If None, use the subsystem code.
+        :param three_beam: Keep the earth velocity if only one beam is bad.
+        """
+        self.series = series
+        self.block_size = block_size
+        self.bad_velocity = bad_velocity
+        self.min_correlation = min_correlation
+        self.min_amplitude = min_amplitude
+        self.min_good_beam = min_good_beam
+        self.min_good_earth = min_good_earth
+        self.max_error_velocity = max_error_velocity
+        self.side_lobe = side_lobe
+        self.fish_threshold = fish_threshold
+        self.beam_angle = beam_angle
+        self.three_beam = three_beam
+        self.blocks = {}                        # Masks for each block index
+
+    def set_options(self, **kwargs):
+        """
+        Change the screening options.  The masks are calculated again.
+        :param kwargs: Options like in the constructor.  set_options(min_correlation=0.5)
+        """
+        for key, value in kwargs.items():
+            if key == 'series' or not hasattr(self, key):
+                raise ValueError("Unknown screening option: " + key)
+            setattr(self, key, value)
+        self.clear()
+
+    def clear(self, start=0, end=None):
+        """
+        Clear the masks for the ensembles.  Call this when the ensembles change.
+        :param start: First ensemble index.
+        :param end: Last ensemble index (not included).  If None, to the end of the series.
+        """
+        if end is None:
+            end = self.series.num_ens
+        for index in range(start // self.block_size, (end - 1) // self.block_size + 1):
+            self.blocks.pop(index, None)
+
+    def screen_block(self, start, end):
+        """
+        Calculate the masks for the ensembles.
+        :param start: First ensemble index.
+        :param end: Last ensemble index (not included).
+        :return: Beam mask, Earth mask, Dictionary with the number of values each screen marked bad.
+        """
+        series = self.series
+        rows = slice(start, end)
+        beam_vel = series.beam_vel[rows]
+        beam_shape = beam_vel.shape
+        screens = {}
+
+        if self.bad_velocity:
+            screens['bad_velocity'] = is_bad_value(beam_vel)
+            screens['bad_earth'] = is_bad_value(series.earth_vel[rows][..., :3]).any(axis=-1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.min_correlation is not None:
+                screens['correlation'] = series.correlation[rows] < self.min_correlation
+
+            if self.min_amplitude is not None:
+                screens['amplitude'] = series.amplitude[rows] < self.min_amplitude
+
+            if self.min_good_beam is not None:
+                ratio = series.good_beam[rows] / series.actual_ping_count[rows, np.newaxis, np.newaxis]
+                screens['good_beam'] = ratio < self.min_good_beam
+
+            if self.min_good_earth is not None:
+                ratio = series.good_earth[rows][..., :3] / series.actual_ping_count[rows, np.newaxis, np.newaxis]
+                screens['good_earth'] = (ratio < self.min_good_earth).any(axis=-1)
+
+            if self.max_error_velocity is not None:
+                error_vel = series.earth_vel[rows][..., 3]
+                screens['error_velocity'] = (np.abs(error_vel) > self.max_error_velocity) & ~is_bad_value(error_vel)
+
+            if self.fish_threshold is not None:
+                # A beam much stronger than the other beams hit a fish
+                amp = series.amplitude[rows]
+                weakest = np.fmin.reduce(amp, axis=-1)
+                screens['fish'] = amp - weakest[..., np.newaxis] > self.fish_threshold
+
+            if self.side_lobe:
+                # Echo of the side lobe off the bottom reaches the beams at range x cos(beam angle)
+                beam_angle = self.beam_angle if self.beam_angle is not None else ss_beam_angle(series.ss_code)
+                bt_range = series.bt_range[rows]
+                bt_range = np.where(bt_range > 0.0, bt_range, np.nan)
+                cutoff = np.fmin.reduce(bt_range, axis=-1) * np.cos(np.radians(beam_angle))
+                bin_size = series.bin_size[rows, np.newaxis]
+                bin_bottom = series.first_bin_range[rows, np.newaxis] + (np.arange(beam_shape[1]) + 0.5) * bin_size
+                screens['side_lobe'] = bin_bottom > cutoff[:, np.newaxis]
+
+        beam_mask = np.zeros(beam_shape, dtype=bool)
+        earth_mask = np.zeros(beam_shape[:2], dtype=bool)
+        for name, mask in screens.items():
+            if name in BEAM_SCREENS:
+                beam_mask |= mask if mask.ndim == 3 else mask[..., np.newaxis]
+        for name, mask in screens.items():
+            if name in EARTH_SCREENS:
+                earth_mask |= mask
+
+        # Earth velocity needs 4 good beams, or 3 with a 3 beam solution
+        screens['bad_beams'] = beam_mask.sum(axis=-1) > (1 if self.three_beam else 0)
+        earth_mask |= screens['bad_beams']
+
+        counts = {name: int(mask.sum()) for name, mask in screens.items()}
+        return beam_mask, earth_mask, counts
+
+    def get_block(self, index):
+        """
+        Get the masks of the block.  The masks are only calculated the first time.
+        :param index: Block index.
+        :return: Beam mask, Earth mask, Counts.
+        """
+        if index not in self.blocks:
+            start = index * self.block_size
+            end = min(start + self.block_size, self.series.num_ens)
+            self.blocks[index] = self.screen_block(start, end)
+        return self.blocks[index]
+
+    def get_masks(self, start=0, end=None):
+        """
+        Get the masks of the ensembles.
+        :param start: First ensemble index.
+        :param end: Last ensemble index (not included).  If None, to the end of the series.
+        :return: Beam mask [ensemble x bin x beam], Earth mask [ensemble x bin].  True where the data is bad.
+        """
+        if end is None:
+            end = self.series.num_ens
+        if end <= start:
+            num_bins, num_beams = self.series.beam_vel.shape[1:]
+            return np.zeros((0, num_bins, num_beams), dtype=bool), np.zeros((0, num_bins), dtype=bool)
+
+        first = start // self.block_size
+        last = (end - 1) // self.block_size
+        blocks = [self.get_block(index) for index in range(first, last + 1)]
+        offset = first * self.block_size
+        if len(blocks) == 1:
+            beam_mask, earth_mask, counts = blocks[0]
+        else:
+            beam_mask = np.concatenate([block[0] for block in blocks])
+            earth_mask = np.concatenate([block[1] for block in blocks])
+        return beam_mask[start - offset:end - offset], earth_mask[start - offset:end - offset]
+
+    def beam_mask(self, start=0, end=None):
+        """
+        :return: Beam mask [ensemble x bin x beam].  True where the beam data is bad.
+        """
+        return self.get_masks(start, end)[0]
+
+    def earth_mask(self, start=0, end=None):
+        """
+        :return: Earth mask [ensemble x bin].  True where the earth velocity is bad.
+        """
+        return self.get_masks(start, end)[1]
+
+    def apply_beam(self, values, start=0, end=None):
+        """
+        Screen beam data like the beam velocity, amplitude or correlation.
+        :param values: Beam data for the ensembles.  [ensemble x bin x beam]
+        :param start: First ensemble index of the values.
+        :param end: Last ensemble index of the values (not included).
+        :return: Copy of the values with the bad values set to NaN.
+        """
+        values = np.array(values, dtype=float)
+        values[self.beam_mask(start, end)] = np.nan
+        return values
+
+    def apply_earth(self, values, start=0, end=None):
+        """
+        Screen earth data like the earth velocity.
+        :param values: Earth data for the ensembles.  [ensemble x bin] or [ensemble x bin x 4]
+        :param start: First ensemble index of the values.
+        :param end: Last ensemble index of the values (not included).
+        :return: Copy of the values with the bad values set to NaN.
+        """
+        values = np.array(values, dtype=float)
+        values[self.earth_mask(start, end)] = np.nan
+        return values
+
+    def counts(self):
+        """
+        Number of values each screen marked bad in the whole series.
+        A value can be marked bad by more than one screen.
+        :return: Dictionary of screen name: Number of values.
+        """
+        totals = {}
+        for index in range((self.series.num_ens - 1) // self.block_size + 1):
+            for name, count in self.get_block(index)[2].items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+
+def test_screen():
+    from Ensemble.Ensemble import Ensemble
+    from Ensemble.EnsembleSeries import EnsembleSeries
+
+    series = EnsembleSeries(5, 4)
+    series.beam_vel[:] = 0.5
+    series.earth_vel[:] = 0.5
+    series.earth_vel[..., 3] = 0.0
+    series.correlation[:] = 0.9
+    series.amplitude[:] = 40.0
+    series.good_beam[:] = 10
+    series.good_earth[:] = 10
+    series.actual_ping_count[:] = 10
+    series.first_bin_range[:] = 1.0
+    series.bin_size[:] = 1.0
+    series.bt_range[:] = 100.0
+
+    series.beam_vel[0, 0, 0] = Ensemble.BadVelocity
+    series.correlation[1, 1, 2] = 0.2
+    series.amplitude[2, 2, 3] = 70.0                # Fish
+    series.good_beam[3, 0, :2] = 2                  # 2 beams bad
+    series.earth_vel[4, 1, 3] = 0.5                 # Error velocity
+    series.bt_range[4] = [3.0, 3.1, 3.2, -1.0]      # Bottom at 3 meters
+
+    screen = ProfileScreen(series, block_size=2, min_correlation=0.5, min_good_beam=0.5, max_error_velocity=0.2,
+                           fish_threshold=20.0, side_lobe=True, beam_angle=20.0)
+    beam_mask, earth_mask = screen.get_masks()
+    assert beam_mask.shape == (5, 4, 4)
+    assert list(np.argwhere(beam_mask[:4]).tolist()) == [[0, 0, 0], [1, 1, 2], [2, 2, 3], [3, 0, 0], [3, 0, 1]]
+    assert list(earth_mask[:4].nonzero()[0]) == [3]                 # 3 beam solution keeps the single bad beams
+    assert list(earth_mask[4]) == [False, True, True, True]         # Error velocity and side lobe
+    assert beam_mask[4, 2:].all() and not beam_mask[4, :2].any()    # Side lobe cutoff 3 x cos(20)
+    assert len(screen.blocks) == 3
+
+    counts = screen.counts()
+    assert counts['bad_velocity'] == 1
+    assert counts['fish'] == 1
+    assert counts['side_lobe'] == 2
+
+    # Cached block is reused, a range inside the cache
+    assert np.array_equal(screen.beam_mask(1, 4), beam_mask[1:4])
+    vel = screen.apply_earth(series.earth_vel[:, :, :3])
+    assert np.isnan(vel[3, 0]).all() and not np.isnan(vel[0, 0]).any()
+
+    # Changing an option screens again
+    screen.set_options(three_beam=False, side_lobe=False)
+    assert len(screen.blocks) == 0
+    assert list(screen.earth_mask()[:, 0]) == [True, False, False, True, False]
+    try:
+        screen.set_options(min_snr=3.0)
+        assert False
+    except ValueError:
+        pass
@@ -0,0 +1,322 @@
+import numpy as np
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSeries import is_bad_velocity
+from ADCP.Subsystem import ss_beam_angle
+
+# Sign of each beam in the error velocity.  A 3 beam solution
+# sets the error velocity to 0 to calculate the missing beam.
+ERROR_SIGN = np.array([1.0, 1.0, -1.0, -1.0])
+
+
+def beam_matrix(beam_angle=20.0):
+    """
+    Beam to instrument matrix for a 4 beam Janus ADCP.
+    Beam 0 and 1 measure X.  Beam 2 and 3 measure Y.
+    :param beam_angle: Beam angle from vertical in degrees.
+    :return: Matrix [X, Y, Z, Error] x [Beam 0, 1, 2, 3].
+    """
+    angle = np.radians(beam_angle)
+    a = 1.0 / (2.0 * np.sin(angle))
+    b = 1.0 / (4.0 * np.cos(angle))
+    d = a / np.sqrt(2.0)
+    return np.array([[a, -a, 0.0, 0.0],
+                     [0.0, 0.0, -a, a],
+                     [b, b, b, b],
+                     [d, d, -d, -d]])
+
+
+def beam_directions(beam_angle=20.0):
+    """
+    Direction of each beam in the instrument frame.  The beam velocity
+    is the instrument velocity projected on the direction.
+    :param beam_angle: Beam angle from vertical in degrees.
+    :return: Unit vectors [Beam 0, 1, 2, 3] x [X, Y, Z].
+    """
+    s = np.sin(np.radians(beam_angle))
+    c = np.cos(np.radians(beam_angle))
+    return np.array([[s, 0.0, c],
+                     [-s, 0.0, c],
+                     [0.0, -s, c],
+                     [0.0, s, c]])
+
+
+def rotation_matrix(heading, pitch, roll):
+    """
+    Instrument to earth rotation matrix for each ensemble.
+    :param heading: Heading in degrees.  [ensemble]
+    :param pitch: Pitch in degrees.  [ensemble]
+    :param roll: Roll in degrees.  [ensemble]
+    :return: Matrix [ensemble] x [East, North, Up] x [X, Y, Z].
+    """
+    h = np.radians(np.asarray(heading, dtype=float))
+    p = np.radians(np.asarray(pitch, dtype=float))
+    r = np.radians(np.asarray(roll, dtype=float))
+    ch, sh = np.cos(h), np.sin(h)
+    cp, sp = np.cos(p), np.sin(p)
+    cr, sr = np.cos(r), np.sin(r)
+
+    matrix = np.empty(h.shape + (3, 3))
+    matrix[..., 0, 0] = ch * cr + sh * sp * sr
+    matrix[..., 0, 1] = sh * cp
+    matrix[..., 0, 2] = ch * sr - sh * sp * cr
+    matrix[..., 1, 0] = -sh * cr + ch * sp * sr
+    matrix[..., 1, 1] = ch * cp
+    matrix[..., 1, 2] = -sh * sr - ch * sp * cr
+    matrix[..., 2, 0] = -cp * sr
+    matrix[..., 2, 1] = sp
+    matrix[..., 2, 2] = cp * cr
+    return matrix
+
+
+def to_nan(values):
+    """
+    Copy the values with the bad values set to NaN.
+    :param values: Array of values.
+    :return: Float array.
+    """
+    values = np.array(values, dtype=float)
+    values[is_bad_velocity(values)] = np.nan
+    return values
+
+
+def to_bad_value(values):
+    """
+    Copy the values with NaN set to the bad velocity value, like the ADCP output.
+    :param values: Array of values.
+    :return: Float array.
+    """
+    values = np.array(values, dtype=float)
+    values[np.isnan(values)] = Ensemble.BadVelocity
+    return values
+
+
+def beam_to_instrument(beam_vel, beam_angle=20.0, three_beam=True):
+    """
+    Transform the beam velocities to instrument velocities.
+    :param beam_vel: Beam velocities.  [ensemble x bin x beam]
+    :param beam_angle: Beam angle from vertical in degrees.
+    :param three_beam: If one beam is bad, use the other 3 beams.  The error velocity is 0.
+    :return: Instrument velocities [ensemble x bin x (X, Y, Z, Error)].  Bad values are NaN.
+    """
+    beam = to_nan(beam_vel)
+    if beam.shape[-1] != 4:
+        raise ValueError("Only 4 beam systems can be transformed")
+
+    bad = np.isnan(beam)
+    one_bad = bad.sum(axis=-1) == 1
+    if three_beam and one_bad.any():
+        # Missing beam that makes the error velocity 0
+        partial = np.where(bad, 0.0, beam) @ ERROR_SIGN
+        fill = -ERROR_SIGN * partial[..., np.newaxis]
+        replace = bad & one_bad[..., np.newaxis]
+        beam[replace] = fill[replace]
+
+    instr = beam @ beam_matrix(beam_angle).T
+    if three_beam:
+        instr[one_bad, 3] = 0.0
+    return instr
+
+
+def instrument_to_earth(instr_vel, heading, pitch, roll, declination=0.0, heading_offset=0.0, upward=False):
+    """
+    Transform the instrument velocities to earth velocities.
+    :param instr_vel: Instrument velocities.  [ensemble x bin x (X, Y, Z, Error)]
+    :param heading: Heading in degrees.  [ensemble]
+    :param pitch: Pitch in degrees.  [ensemble]
+    :param roll: Roll in degrees.  [ensemble]
+    :param declination: Magnetic declination in degrees, added to the heading.
+    :param heading_offset: Heading offset in degrees, added to the heading.
+    :param upward: The ADCP is looking up.  The roll is turned 180 degrees.
+    :return: Earth velocities [ensemble x bin x (East, North, Up, Error)].  Bad values are NaN.
+    """
+    instr = to_nan(instr_vel)
+    heading = np.asarray(heading, dtype=float) + declination + heading_offset
+    roll = np.asarray(roll, dtype=float)
+    if upward:
+        roll = roll + 180.0
+
+    matrix = rotation_matrix(heading, pitch, roll)
+    earth = np.empty_like(instr)
+    earth[..., :3] = np.einsum('eij,ebj->ebi', matrix, instr[..., :3])
+    earth[..., 3] = instr[..., 3]                   # Error velocity is not rotated
+    return earth
+
+
+def bin_map(beam_vel, pitch, roll, first_bin_range, bin_size, beam_angle=20.0, method='nearest'):
+    """
+    Map the bins of each beam to the depth of the bins.  When the ADCP is
+    tilted, the same bin of each beam is at a different depth.
+    :param beam_vel: Beam velocities.  [ensemble x bin x beam]
+    :param pitch: Pitch in degrees.  [ensemble]
+    :param roll: Roll in degrees.  [ensemble]
+    :param first_bin_range: Depth of the first bin in meters.  [ensemble]
+    :param bin_size: Bin size in meters.  [ensemble]
+    :param beam_angle: Beam angle from vertical in degrees.
+    :param method: 'nearest' to use the nearest bin or 'linear' to interpolate between the bins.
+    :return: Beam velocities at the depth of each bin.  Bins outside the beam are NaN.
+    """
+    beam = to_nan(beam_vel)
+    num_ens, num_bins, num_beams = beam.shape
+    first_bin_range = np.asarray(first_bin_range, dtype=float)[:, np.newaxis, np.newaxis]
+    bin_size = np.asarray(bin_size, dtype=float)[:, np.newaxis, np.newaxis]
+
+    # Vertical of each beam compared to a level ADCP.  Heading does not change it.
+    p = np.radians(np.asarray(pitch, dtype=float))
+    r = np.radians(np.asarray(roll, dtype=float))
+    up = np.stack([-np.cos(p) * np.sin(r), np.sin(p), np.cos(p) * np.cos(r)], axis=-1)
+    scale = np.abs(up @ beam_directions(beam_angle).T) / np.cos(np.radians(beam_angle))
+
+    # Bin of each beam at the depth of each bin
+    depths = first_bin_range + np.arange(num_bins)[:, np.newaxis] * bin_size
+    with np.errstate(invalid='ignore', divide='ignore'):
+        index = (depths / scale[:, np.newaxis, :] - first_bin_range) / bin_size
+        snap = np.rint(index)
+        index = np.where(np.abs(index - snap) < 1e-6, snap, index)
+        valid = (index >= 0) & (index <= num_bins - 1)
+    index[~valid] = 0.0
+
+    # Index of [ensemble, bin 0, beam] in the flat array
+    flat = beam.ravel()
+    base = np.arange(num_ens)[:, np.newaxis, np.newaxis] * (num_bins * num_beams) + np.arange(num_beams)
+
+    if method == 'nearest':
+        mapped = flat[base + np.rint(index).astype(int) * num_beams]
+    elif method == 'linear':
+        lower = np.minimum(index.astype(int), max(num_bins - 2, 0))
+        weight = index - lower
+        lower_vel = flat[base + lower * num_beams]
+        upper_vel = flat[base + np.minimum(lower + 1, num_bins - 1) * num_beams]
+        mapped = np.where(weight > 0, lower_vel + weight * (upper_vel - lower_vel), lower_vel)
+    else:
+        raise ValueError("Unknown bin mapping: " + str(method))
+
+    mapped[~valid] = np.nan
+    return mapped
+
+
+def transform(series, beam_angle=None, declination=0.0, heading_offset=0.0, three_beam=True, bin_mapping=None, upward=False):
+    """
+    Calculate the instrument and earth velocities from the beam velocities
+    of all the ensembles in the series.
+    :param series: EnsembleSeries.
+    :param beam_angle: Beam angle from vertical in degrees.  If None, use the subsystem code.
+    :param declination: Magnetic declination in degrees.
+    :param heading_offset: Heading offset in degrees.
+    :param three_beam: If one beam is bad, use the other 3 beams.
+    :param bin_mapping: None for no bin mapping, 'nearest' or 'linear'.
+    :param upward: The ADCP is looking up.
+    :return: Instrument velocities, Earth velocities.  [ensemble x bin x 4]  Bad values are NaN.
+    """
+    if beam_angle is None:
+        beam_angle = ss_beam_angle(series.ss_code)
+
+    beam = series.beam_vel
+    if bin_mapping is not None:
+        beam = bin_map(beam, series.pitch, series.roll, series.first_bin_range, series.bin_size,
+                       beam_angle=beam_angle, method=bin_mapping)
+
+    instr = beam_to_instrument(beam, beam_angle, three_beam)
+    earth = instrument_to_earth(instr, series.heading, series.pitch, series.roll,
+                                declination=declination, heading_offset=heading_offset, upward=upward)
+    return instr, earth
+
+
+def compare_velocity(calc_vel, adcp_vel, tolerance=0.005):
+    """
+    Compare the calculated velocities to the velocities from the ADCP.
+    :param calc_vel: Calculated velocities.  [ensemble x bin x 4]
+    :param adcp_vel: Velocities from the ADCP, like EnsembleSeries.earth_vel.
+    :param tolerance: Difference in m/s to count a value as matching.
+    :return: Dictionary with the number of values compared, the RMS and max difference for each
+             component, the fraction of values within the tolerance and the number of values bad in only one.
+    """
+    calc_vel = to_nan(calc_vel)
+    adcp_vel = to_nan(adcp_vel)
+    calc_bad = np.isnan(calc_vel)
+    adcp_bad = np.isnan(adcp_vel)
+    both = ~calc_bad & ~adcp_bad
+
+    diff = np.where(both, calc_vel - adcp_vel, 0.0)
+    count = both.sum(axis=(0, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rms = np.sqrt(np.square(diff).sum(axis=(0, 1)) / count)
+        within = (both & (np.abs(diff) <= tolerance)).sum() / both.sum()
+
+    return {'count': int(both.sum()),
+            'rms': rms,
+            'max': np.abs(diff).max(axis=(0, 1)),
+            'within': within,
+            'bad_mismatch': int((calc_bad != adcp_bad).sum())}
+
+
+def earth_to_beam(earth_vel, heading, pitch, roll, beam_angle=20.0):
+    """
+    Beam velocities that give the earth velocities.  Used to test the transform.
+    :param earth_vel: Earth velocities.  [ensemble x bin x (East, North, Up)]
+    :param heading: Heading in degrees.  [ensemble]
+    :param pitch: Pitch in degrees.  [ensemble]
+    :param roll: Roll in degrees.  [ensemble]
+    :param beam_angle: Beam angle from vertical in degrees.
+    :return: Beam velocities.  [ensemble x bin x beam]
+    """
+    matrix = rotation_matrix(heading, pitch, roll)
+    instr = np.einsum('eji,ebj->ebi', matrix, np.asarray(earth_vel, dtype=float)[..., :3])
+    return instr @ beam_directions(beam_angle).T
+
+
+def test_transform():
+    rng = np.random.RandomState(1)
+    heading = rng.uniform(0, 360, 5)
+    pitch = rng.uniform(-10, 10, 5)
+    roll = rng.uniform(-10, 10, 5)
+    earth_vel = rng.uniform(-2, 2, (5, 8, 3))
+    beam_vel = earth_to_beam(earth_vel, heading, pitch, roll)
+
+    # Matrix is a rotation
+    matrix = rotation_matrix(heading, pitch, roll)
+    assert np.allclose(matrix @ np.swapaxes(matrix, 1, 2), np.eye(3))
+
+    instr = beam_to_instrument(beam_vel)
+    earth = instrument_to_earth(instr, heading, pitch, roll)
+    assert np.allclose(earth[..., :3], earth_vel)
+    assert np.allclose(earth[..., 3], 0.0)
+
+    # 3 beam solution
+    beam_vel[0, 0, 2] = Ensemble.BadVelocity
+    beam_vel[0, 1, 0:2] = Ensemble.BadVelocity
+    earth = instrument_to_earth(beam_to_instrument(beam_vel), heading, pitch, roll)
+    assert np.allclose(earth[0, 0], list(earth_vel[0, 0]) + [0.0])
+    assert np.isnan(earth[0, 1]).all()
+    assert np.isnan(beam_to_instrument(beam_vel, three_beam=False)[0, 0]).all()
+
+    # Declination turns the velocity
+    earth = instrument_to_earth(beam_to_instrument(np.array([[[1.0, -1.0, 0.0, 0.0]]])), [0.0], [0.0], [0.0], declination=90.0)
+    assert np.allclose(earth[0, 0, :3], [0.0, -1.0 / np.sin(np.radians(20.0)), 0.0])
+
+    # Compare
+    stats = compare_velocity(to_bad_value(earth), earth)
+    assert stats['within'] == 1.0
+    assert stats['bad_mismatch'] == 0
+
+
+def test_bin_map():
+    beam_vel = np.tile(np.arange(10, dtype=float)[np.newaxis, :, np.newaxis], (2, 1, 4))
+    first_bin_range = np.array([1.0, 1.0])
+    bin_size = np.array([0.5, 0.5])
+
+    # Level ADCP does not change
+    mapped = bin_map(beam_vel, [0.0, 0.0], [0.0, 0.0], first_bin_range, bin_size)
+    assert np.array_equal(mapped, beam_vel)
+
+    # Pitched ADCP, beam 2 and 3 are at different depths
+    mapped = bin_map(beam_vel, [10.0, 10.0], [0.0, 0.0], first_bin_range, bin_size, method='linear')
+    assert np.array_equal(mapped[:, :, 0], mapped[:, :, 1], equal_nan=True)
+    assert mapped[0, 5, 3] < 5.0 < mapped[0, 5, 2]
+    assert np.isnan(mapped[0, 9, 2])                # Deepest bin is past the end of the slanted beam
+    assert not np.isnan(mapped[0, 9, 3])
+
+    try:
+        bin_map(beam_vel, [0.0, 0.0], [0.0, 0.0], first_bin_range, bin_size, method='cubic')
+        assert False
+    except ValueError:
+        pass
@@ -1,12 +1,12 @@
 import logging
-import threading
 
+import numpy as np
 from bokeh.io import curdoc
 from bokeh.models import ColumnDataSource
 from bokeh.plotting import Figure
 
-from Comm.EnsembleJsonData import ADCP
 from Ensemble.Ensemble import Ensemble
+from Frontend.Bokeh.EnsembleStream import get_hub, DocumentStream, ProfileStream
 
 logger = logging.getLogger("EnsembleReceiver")
 logger.setLevel(logging.DEBUG)
@@ -14,6 +14,18 @@ FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
 logging.basicConfig(format=FORMAT)
 
 
+def get_beam_vel(ens, beam):
+    """
+    Get the beam velocity for each bin.  Bad velocities are set to NaN.
+    :param ens: Ensemble.
+    :param beam: Beam number.
+    :return: Velocity for each bin.
+    """
+    vel = np.array([bin_vel[beam] for bin_vel in ens['BeamVelocity']['Velocities']], dtype=float)
+    vel[np.isclose(vel, Ensemble().BadVelocity)] = np.nan
+    return vel
+
+
 class BeamVelocityLivePlot:
     """
     Plot Beam Velocity data live using Bokeh server.
@@ -23,65 +35,39 @@ class BeamVelocityLivePlot:
 
     def __init__(self, udp_port):
         """
-        Call the super class to pass the UDP port.
+        Receive the ensembles from the UDP port.
         :param udp_port: UDP Port to read the JSON data.
         """
-        #super(LivePlot, self).__init__(udp_port)
-        super().__init__()
-        self.source = ColumnDataSource(dict(bins=[], beamVelB0=[], beamVelB1=[]))
-
-        self.lastData = None
+        self.source = ColumnDataSource(dict(bins=[], beamVelB0=[], beamVelB1=[], beamVelB2=[], beamVelB3=[]))
 
         fig = Figure()
         fig.line(source=self.source, x='beamVelB0', y='bins', line_width=2, alpha=.85, color='red')
         fig.line(source=self.source, x='beamVelB1', y='bins', line_width=2, alpha=.85, color='blue')
-
-
+        fig.line(source=self.source, x='beamVelB2', y='bins', line_width=2, alpha=.85, color='green')
+        fig.line(source=self.source, x='beamVelB3', y='bins', line_width=2, alpha=.85, color='orange')
         curdoc().add_root(fig)
-        curdoc().add_periodic_callback(self.update_data, 200)
 
-        self.Adcp = ADCP()
-        self.t = threading.Thread(target=self.Adcp.connect, args=[55057])
-        self.t.start()
+        # One UDP receiver is shared by all the browsers
+        self.hub = get_hub()
+        self.hub.connect_udp(udp_port)
+
+        # Update the plot with the latest beam velocity 5 times a second
+        self.stream = DocumentStream(self.hub, curdoc(), period_ms=200)
+        self.stream.add(ProfileStream(self.source, {
+            'bins': lambda ens: range(len(ens['BeamVelocity']['Velocities'])),
+            'beamVelB0': lambda ens: get_beam_vel(ens, 0),
+            'beamVelB1': lambda ens: get_beam_vel(ens, 1),
+            'beamVelB2': lambda ens: get_beam_vel(ens, 2),
+            'beamVelB3': lambda ens: get_beam_vel(ens, 3),
+        }))
         logger.info("init Beam Velocity plot")
 
     def close(self):
         logger.info("Close plot")
-        self.Adcp.close()
-
-    def update_data(self):
-        #logger.info("Update plot")
-
-        if self.Adcp.EnsembleData is None and self.Adcp.BeamVelocity is None:
-            pass
-
-        bins = []
-        velB0 = []
-        velB1 = []
-        velB2 = []
-        velB3 = []
-        for bin in range(self.Adcp.EnsembleData["NumBins"]):
-            bins.append(bin)
-            if Ensemble().is_float_close(self.Adcp.BeamVelocity["Velocities"][bin][0], Ensemble().BadVelocity):
-                velB0.append(self.Adcp.BeamVelocity["Velocities"][bin][0])
-            else:
-                velB0.append(0.0)
-            if Ensemble().is_float_close(self.Adcp.BeamVelocity["Velocities"][bin][1], Ensemble().BadVelocity):
-                velB1.append(self.Adcp.BeamVelocity["Velocities"][bin][1])
-            else:
-                velB1.append(0.0)
-            velB2.append(self.Adcp.BeamVelocity["Velocities"][bin][2])
-            velB3.append(self.Adcp.BeamVelocity["Velocities"][bin][3])
-
-        #new_data = dict(x=[self.Adcp.Amplitude["EnsembleNumber"]], amp=[self.Adcp.Amplitude["Amplitude"][0][1]])
-        new_data = dict(beamVelB0=velB0, beamVelB1=velB1, bins=bins)
-        self.source.stream(new_data, 100)
-
-
+        self.hub.close()
 
 
 logger.info("Start Beam Velocity Plot")
 amp = BeamVelocityLivePlot(55057)
 #amp.close()
 logger.info("Beam Velocity Plot Closed")
-
@@ -0,0 +1,367 @@
+import json
+import logging
+import threading
+import itertools
+import collections
+
+import numpy as np
+
+from Comm.EnsembleReceiver import EnsembleReceiver
+
+logger = logging.getLogger("EnsembleStream")
+logger.setLevel(logging.INFO)
+FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
+logging.basicConfig(format=FORMAT)
+
+# Datasets copied from the UDP ensembles
+DATASETS = ["BeamVelocity", "InstrumentVelocity", "EarthVelocity", "Amplitude",
+            "Correlation", "BottomTrack", "EnsembleData", "RangeTracking"]
+
+
+class EnsembleHub:
+    """
+    Receive the ensembles once for all the Bokeh documents in the process.
+
+    The Bokeh server runs the app for every browser connected.  The apps
+    share the hub, so there is only one WAMP or UDP connection, and each
+    ensemble is decoded once.  Each document takes the ensembles it has
+    not seen yet on its own tick.
+    """
+
+    def __init__(self, history=100):
+        """
+        :param history: Number of ensembles kept for documents that fall behind or just connected.
+        """
+        self.lock = threading.Lock()
+        self.ensembles = collections.deque(maxlen=history)
+        self.seq = 0                            # Sequence number of the latest ensemble
+        self.is_connected = False
+        self.receiver = None
+        self.thread = None
+
+    def add(self, ens):
+        """
+        Add an ensemble.  Can be called from any thread.
+        :param ens: Dictionary of the datasets.  {"Amplitude": {...}, "EnsembleData": {...}}
+        """
+        with self.lock:
+            self.seq += 1
+            self.ensembles.append(ens)
+
+    def add_json(self, data):
+        """
+        Add a JSON ensemble, like the ensembles published to WAMP.
+        :param data: JSON string of the ensemble.
+        """
+        self.add(json.loads(data))
+
+    def get_since(self, seq):
+        """
+        Get the ensembles after the sequence number.
+        :param seq: Sequence number of the last ensemble seen.
+        :return: Latest sequence number, List of the new ensembles, Number of ensembles skipped.
+        """
+        with self.lock:
+            num_new = self.seq - seq
+            num_kept = min(num_new, len(self.ensembles))
+            ensembles = list(itertools.islice(self.ensembles, len(self.ensembles) - num_kept, None))
+            return self.seq, ensembles, num_new - num_kept
+
+    def on_ensemble(self, sender, adcp_data):
+        """
+        Add the ensemble from the EnsembleReceiver.
+        :param sender: EnsembleReceiver.
+        :param adcp_data: EnsembleJsonData.
+        """
+        self.add({name: getattr(adcp_data, name) for name in DATASETS if getattr(adcp_data, "Is" + name, False)})
+
+    def connect_udp(self, udp_port=55057):
+        """
+        Receive the ensembles from the UDP port.  Only the first call connects.
+        :param udp_port: UDP port.
+        """
+        if self.is_connected:
+            return
+        self.is_connected = True
+
+        self.receiver = EnsembleReceiver()
+        self.receiver.EnsembleEvent += self.on_ensemble
+        self.thread = threading.Thread(name="EnsembleHub", target=self.receiver.connect, args=(udp_port,))
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info("Ensemble hub UDP port: " + str(udp_port))
+
+    def connect_wamp(self, url=u"ws://localhost:55058/ws", realm=u"realm1", topic=u"com.rti.data.ens"):
+        """
+        Receive the ensembles from WAMP.  Only the first call connects.
+        The Twisted reactor runs on its own thread.
+        :param url: WAMP router URL.
+        :param realm: WAMP realm.
+        :param topic: Topic of the JSON ensembles.
+        """
+        if self.is_connected:
+            return
+        self.is_connected = True
+
+        # Only needed for WAMP
+        from twisted.internet import reactor
+        from twisted.internet.defer import inlineCallbacks
+        from autobahn.twisted.wamp import ApplicationSession, ApplicationRunner
+
+        hub = self
+
+        class EnsembleSession(ApplicationSession):
+
+            @inlineCallbacks
+            def onJoin(self, details):
+                yield self.subscribe(hub.add_json, topic)
+                self.log.info("Ensemble hub WAMP connected")
+
+        runner = ApplicationRunner(url=url, realm=realm)
+        runner.run(EnsembleSession, start_reactor=False, auto_reconnect=True)
+        self.thread = threading.Thread(name="EnsembleHub", target=reactor.run, kwargs={'installSignalHandlers': False})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        """
+        Close the UDP receiver.
+        """
+        if self.receiver is not None:
+            self.receiver.close()
+
+
+# Hub shared by all the documents in the process
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub(history=100):
+    """
+    Get the hub shared by all the documents in the process.
+    :param history: Number of ensembles kept, used when the hub is created.
+    :return: EnsembleHub.
+    """
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = EnsembleHub(history)
+        return _hub
+
+
+class DocumentStream:
+    """
+    Update the data sources of a Bokeh document with the new ensembles.
+    All the ensembles received since the last tick are given to the
+    streams at once, so each tick makes one update for each data source.
+    """
+
+    def __init__(self, hub, doc=None, period_ms=100):
+        """
+        :param hub: EnsembleHub with the ensembles.
+        :param doc: Bokeh document to add the periodic callback to.  If None, call tick().
+        :param period_ms: Time between the ticks in milliseconds.
+        """
+        self.hub = hub
+        self.seq = 0
+        self.streams = []
+        self.skipped = 0                        # Ensembles skipped because the document fell behind
+        self.callback = None
+        if doc is not None:
+            self.callback = doc.add_periodic_callback(self.tick, period_ms)
+
+    def add(self, stream):
+        """
+        Add a stream to update on each tick.
+        :param stream: TimeSeriesStream, ProfileStream or HeatmapStream.
+        :return: The stream.
+        """
+        self.streams.append(stream)
+        return stream
+
+    def tick(self):
+        """
+        Give the new ensembles to all the streams.
+        :return: Number of new ensembles.
+        """
+        self.seq, ensembles, skipped = self.hub.get_since(self.seq)
+        self.skipped += skipped
+        if not ensembles:
+            return 0
+
+        for stream in self.streams:
+            stream.update(ensembles)
+        return len(ensembles)
+
+
+class TimeSeriesStream:
+    """
+    Add a row for each ensemble with ColumnDataSource.stream().
+    The oldest rows are removed after the rollover.
+    """
+
+    def __init__(self, source, columns, rollover=1000):
+        """
+        :param source: ColumnDataSource.
+        :param columns: Dictionary of column name: function to get the value from the ensemble.
+        :param rollover: Maximum number of rows.
+        """
+        self.source = source
+        self.columns = columns
+        self.rollover = rollover
+
+    def update(self, ensembles):
+        """
+        Stream a row for each ensemble.  Ensembles missing a value are skipped.
+        :param ensembles: New ensembles.
+        """
+        rows = {col: [] for col in self.columns}
+        for ens in ensembles:
+            try:
+                values = {col: func(ens) for col, func in self.columns.items()}
+            except (KeyError, IndexError, TypeError):
+                continue
+            for col, value in values.items():
+                rows[col].append(value)
+
+        if any(rows.values()):
+            self.source.stream(rows, self.rollover)
+
+
+class ProfileStream:
+    """
+    Show the profile of the latest ensemble, like the amplitude of each bin.
+    Only the latest ensemble of each tick is used.
+    """
+
+    def __init__(self, source, columns):
+        """
+        :param source: ColumnDataSource.
+        :param columns: Dictionary of column name: function to get the list of values from the ensemble.
+        """
+        self.source = source
+        self.columns = columns
+
+    def update(self, ensembles):
+        """
+        Patch the columns with the latest profile.
+        :param ensembles: New ensembles.
+        """
+        data = None
+        for ens in reversed(ensembles):
+            try:
+                data = {col: np.asarray(func(ens), dtype=float) for col, func in self.columns.items()}
+                break
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+        if data is None:
+            return
+
+        num_rows = len(next(iter(data.values())))
+        if all(len(self.source.data.get(col, [])) == num_rows for col in data):
+            # Same size, patch the values in place
+            self.source.patch({col: [(slice(0, num_rows), values)] for col, values in data.items()})
+        else:
+            self.source.data = data
+
+
+class HeatmapStream:
+    """
+    Heatmap of a profile for each ensemble, like the amplitude of a beam.
+    The image holds "window" ensembles.  Each ensemble is written to the
+    next column, wrapping to the first column at the end, and only the
+    new columns are patched.
+    """
+
+    def __init__(self, source, func, num_bins, window=200):
+        """
+        :param source: ColumnDataSource for the image glyph.  Use x='x', y='y', dw='dw', dh='dh', image='image'.
+        :param func: Function to get the list of values for each bin from the ensemble.
+        :param num_bins: Number of bins in the image.
+        :param window: Number of ensembles in the image.
+        """
+        self.source = source
+        self.func = func
+        self.num_bins = num_bins
+        self.window = window
+        self.next_col = 0
+        self.image = np.full((num_bins, window), np.nan)
+        self.source.data = {'image': [self.image], 'x': [0], 'y': [0], 'dw': [window], 'dh': [num_bins]}
+
+    def update(self, ensembles):
+        """
+        Write the new ensembles to the image and patch the new columns.
+        :param ensembles: New ensembles.
+        """
+        profiles = []
+        for ens in ensembles[-self.window:]:
+            try:
+                profiles.append(np.asarray(self.func(ens), dtype=float)[:self.num_bins])
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+        if not profiles:
+            return
+
+        start = self.next_col
+        for profile in profiles:
+            self.image[:, self.next_col] = np.nan
+            self.image[:len(profile), self.next_col] = profile
+            self.next_col = (self.next_col + 1) % self.window
+
+        # Columns written, in one or two ranges if they wrapped
+        end = start + len(profiles)
+        ranges = [(start, min(end, self.window))]
+        if end > self.window:
+            ranges.append((0, end - self.window))
+
+        rows = slice(0, self.num_bins)
+        self.source.patch({'image': [((0, rows, slice(col_start, col_end)), self.image[:, col_start:col_end].ravel())
+                                     for col_start, col_end in ranges]})
+
+
+def test_streams():
+    from bokeh.document import Document
+    from bokeh.models import ColumnDataSource
+
+    hub = EnsembleHub(history=10)
+    doc = Document()
+    stream = DocumentStream(hub)
+
+    series = ColumnDataSource(dict(ens=[], heading=[]))
+    stream.add(TimeSeriesStream(series, {'ens': lambda ens: ens['EnsembleData']['EnsembleNumber'],
+                                         'heading': lambda ens: ens['AncillaryData']['Heading']}, rollover=5))
+    profile = ColumnDataSource(dict(bin=[], amp0=[]))
+    stream.add(ProfileStream(profile, {'bin': lambda ens: range(len(ens['Amplitude']['Amplitude'])),
+                                       'amp0': lambda ens: [amp[0] for amp in ens['Amplitude']['Amplitude']]}))
+    heatmap = ColumnDataSource()
+    stream.add(HeatmapStream(heatmap, lambda ens: [amp[0] for amp in ens['Amplitude']['Amplitude']], num_bins=3, window=4))
+    for source in [series, profile, heatmap]:
+        doc.add_root(source)
+
+    def create_ens(ens_num):
+        return {'EnsembleData': {'EnsembleNumber': ens_num},
+                'AncillaryData': {'Heading': float(ens_num)},
+                'Amplitude': {'Amplitude': [[float(ens_num * 10 + bin_num)] * 4 for bin_num in range(3)]}}
+
+    assert stream.tick() == 0
+    for ens_num in range(1, 4):
+        hub.add(create_ens(ens_num))
+    assert stream.tick() == 3
+    assert list(series.data['ens']) == [1, 2, 3]
+    assert list(profile.data['amp0']) == [30.0, 31.0, 32.0]
+    assert list(heatmap.data['image'][0][:, 2]) == [30.0, 31.0, 32.0]
+
+    # Rollover and wrap the heatmap
+    for ens_num in range(4, 7):
+        hub.add(create_ens(ens_num))
+    assert stream.tick() == 3
+    assert list(series.data['ens']) == [2, 3, 4, 5, 6]
+    assert list(profile.data['amp0']) == [60.0, 61.0, 62.0]
+    assert list(heatmap.data['image'][0][0, :]) == [50.0, 60.0, 30.0, 40.0]
+
+    # Fell behind the history
+    for ens_num in range(7, 20):
+        hub.add(create_ens(ens_num))
+    assert stream.tick() == 10
+    assert stream.skipped == 3
+    assert list(series.data['ens']) == [15, 16, 17, 18, 19]
@@ -1,14 +1,16 @@
 import getopt
 import logging
 import sys
+import threading
 
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 
 from Comm.EnsembleReceiver import EnsembleReceiver
 
 logger = logging.getLogger("EnsembleReceiver")
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.INFO)
 FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
 logging.basicConfig(format=FORMAT)
 
@@ -18,15 +20,23 @@ class LivePlot(EnsembleReceiver):
     Live plot will display live data from the UDP port.
     This inherits from Ensemble Receiver to receive
     and decode the JSON data from the UDP port.
+
+    The amplitude plot (IsAmpSpline) reuses one figure.  The data is
+    received on a separate thread and only the latest amplitude is kept.
+    A timer on the GUI thread draws the latest amplitude with blitting,
+    so the receiver never waits for the drawing.
     """
 
-    def __init__(self, udp_port):
+    def __init__(self, udp_port, refresh_rate=10.0, start=True):
         """
         Call the super class to pass the UDP port.
         :param udp_port: UDP Port to read the JSON data.
+        :param refresh_rate: Amplitude plot updates per second.
+        :param start: Start receiving and plotting.  This blocks until the plot is closed.
         """
         #super(LivePlot, self).__init__(udp_port)
         super().__init__()
+        self.udp_port = udp_port
         self.plot_index = 0
         self.IsBeam = False
         self.IsAmp = False
@@ -36,13 +46,112 @@ class LivePlot(EnsembleReceiver):
                    'spline36', 'hanning', 'hamming', 'hermite', 'kaiser', 'quadric',
                    'catrom', 'gaussian', 'bessel', 'mitchell', 'sinc', 'lanczos']
 
-        plt.axis([0, 10, 0, 1])
-        plt.ion()
-
-        self.connect(udp_port)
-
+        # Amplitude plot
+        self.refresh_rate = refresh_rate
+        self.fig = None
+        self.ax = None
+        self.image = None
+        self.background = None
+        self.timer = None
+        self.reader_thread = None
+        self.latest_amp = None                  # Latest amplitude received, older ones are skipped
+        self.amp_count = 0                      # Amplitude datasets received
+        self.frame_count = 0                    # Amplitude plots drawn
+
+        if start:
+            self.start()
+
+    def start(self):
+        """
+        Start receiving and plotting the data.  This blocks
+        until the plot is closed.
+        """
+        if self.IsAmpSpline:
+            # Receive on a separate thread, draw on this thread
+            self.create_amp_plot()
+            self.start_reader()
+            self.timer = self.fig.canvas.new_timer(interval=int(1000 / self.refresh_rate))
+            self.timer.add_callback(self.update_amp_plot)
+            self.timer.start()
+            plt.show()
+            self.close()
+        else:
+            plt.axis([0, 10, 0, 1])
+            plt.ion()
+
+            self.connect(self.udp_port)
+
+    def start_reader(self):
+        """
+        Receive the data on a separate thread.
+        """
+        self.reader_thread = threading.Thread(name="LivePlot", target=self.connect, args=(self.udp_port,))
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
 
+    def create_amp_plot(self):
+        """
+        Create the amplitude figure.  It is reused for every ensemble.
+        """
+        self.fig, self.ax = plt.subplots()
+        self.image = self.ax.imshow(np.zeros((1, 4)), interpolation=self.methods[1], cmap=cm.coolwarm,
+                                    vmin=0, vmax=12, aspect='auto', animated=True)
+        self.ax.set_title('Amplitude Data')
+        # Move left and bottom spines outward by 10 points
+        self.ax.spines['left'].set_position(('outward', 10))
+        self.ax.spines['bottom'].set_position(('outward', 10))
+        # Hide the right and top spines
+        self.ax.spines['right'].set_visible(False)
+        self.ax.spines['top'].set_visible(False)
+        # Only show ticks on the left and bottom spines
+        self.ax.yaxis.set_ticks_position('left')
+        self.ax.xaxis.set_ticks_position('bottom')
+        self.fig.colorbar(self.image)
+
+        # Keep the background without the image, to restore it before each update
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        """
+        Save the background when the whole figure is drawn.
+        :param event: Draw event.
+        """
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.image)
 
+    def update_amp_plot(self):
+        """
+        Draw the latest amplitude received.  Called by the timer.
+        """
+        amp = self.latest_amp
+        if amp is None:
+            return
+        self.latest_amp = None
+
+        amp = np.asarray(amp, dtype=float)
+        if amp.ndim != 2 or amp.size == 0:
+            return
+
+        self.image.set_data(amp)
+        if self.background is None or amp.shape != self.image_shape():
+            # Size changed, so draw the whole figure and save the new background
+            self.image.set_extent((-0.5, amp.shape[1] - 0.5, amp.shape[0] - 0.5, -0.5))
+            self.ax.set_xticks(range(amp.shape[1]))
+            self.fig.canvas.draw()
+
+        # Only draw the image over the background
+        self.fig.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.image)
+        self.fig.canvas.blit(self.ax.bbox)
+        self.fig.canvas.flush_events()
+        self.frame_count += 1
+
+    def image_shape(self):
+        """
+        :return: Shape of the data shown in the plot.
+        """
+        left, right, bottom, top = self.image.get_extent()
+        return int(round(bottom - top)), int(round(right - left))
 
     def process(self, jsonData):
         """
@@ -50,7 +159,7 @@ class LivePlot(EnsembleReceiver):
         :param jsonData: JSON ADCP data.
         :return:
         """
-        logger.info(jsonData["Name"])
+        logger.debug(jsonData["Name"])
 
         if self.IsBeam:
             if "E000001" in jsonData["Name"]:
@@ -70,23 +179,9 @@ class LivePlot(EnsembleReceiver):
 
         if self.IsAmpSpline:
             if "E000004" in jsonData["Name"]:
-                fig, ax = plt.subplots()
-                cax = ax.imshow(jsonData["Amplitude"], interpolation=self.methods[1], cmap=cm.coolwarm, vmin=0, vmax=12)
-                ax.set_title('Amplitude Data')
-                # Move left and bottom spines outward by 10 points
-                ax.spines['left'].set_position(('outward', 10))
-                ax.spines['bottom'].set_position(('outward', 10))
-                # Hide the right and top spines
-                ax.spines['right'].set_visible(False)
-                ax.spines['top'].set_visible(False)
-                # Only show ticks on the left and bottom spines
-                ax.yaxis.set_ticks_position('left')
-                ax.xaxis.set_ticks_position('bottom')
-
-                plt.colorbar(cax)
-                plt.xticks(range(0, int(plt.xticks()[0][-1]) + 1, 1))
-                plt.pause(0.05)
-
+                # Only keep the latest, the timer will draw it
+                self.latest_amp = jsonData["Amplitude"]
+                self.amp_count += 1
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@ import ADCP.AdcpCommands as Commands
 import ADCP.Predictor.DataStorage as DS
 import ADCP.Subsystem as SS
 import AdcpJson as JSON
+from predictor_worker import PredictorCalculator
 from subsystem_view import Ui_Subsystem
 from subsystem_vm import SubsystemVM
 
@@ -58,6 +59,11 @@ class PredictorVM(Ui_RoweTechPredictor):
         self.cepo_list = []
         self.command_file = []
 
+        # Calculate in the background
+        self.calculator = PredictorCalculator(self.get_settings_list, parent=self.parent)
+        self.calculator.tabCalculated.connect(self.tab_calculated)
+        self.calculator.calculated.connect(self.calculated)
+
         # Run initial Calculate
         self.calculate()
 
@@ -114,7 +120,7 @@ class PredictorVM(Ui_RoweTechPredictor):
         self.cepo_list.append(ss)
 
         # Recalculate
-        self.calculate()
+        self.request_calculate()
 
         self.parent.statusBar().showMessage(ss_label + ' added to configuration.')
 
@@ -135,7 +141,7 @@ class PredictorVM(Ui_RoweTechPredictor):
             self.parent.statusBar().showMessage('Add a subsystem to begin configuring...')
 
         # Recalculate
-        self.calculate()
+        self.request_calculate()
 
     def valueChanged(self, value):
         """
@@ -143,11 +149,57 @@ class PredictorVM(Ui_RoweTechPredictor):
         :param value: New value.
         :return:
         """
-        self.calculate()
+        self.request_calculate()
+
+    def request_calculate(self):
+        """
+        Request the prediction results to be calculated in the background.
+        The calculation will wait for the values to stop changing.
+        :return:
+        """
+        self.calculator.request()
+
+    def get_settings_list(self):
+        """
+        Get the settings for all the subsystems.  This is called on the UI thread
+        by the calculator before starting the workers.
+        :return: List of settings, one for each subsystem tab.
+        """
+        return [self.tabSubsystem.widget(tab).get_settings() for tab in range(self.tabSubsystem.count())]
+
+    def tab_calculated(self, generation, index, results):
+        """
+        Results calculated for a subsystem tab.
+        :param generation: Generation of the calculation.
+        :param index: Tab index.
+        :param results: Results for the tab.
+        :return:
+        """
+        self.tabSubsystem.widget(index).display_results(results)
+
+    def calculated(self, generation, results):
+        """
+        Results calculated for all the subsystem tabs.
+        :param generation: Generation of the calculation.
+        :param results: List of results for each tab.
+        :return:
+        """
+        self.display_results()
 
     def calculate(self):
         """
         Calculate the new prediction results.
+        This will block the UI thread.
+        :return:
+        """
+        for tab in range(self.tabSubsystem.count()):
+            self.tabSubsystem.widget(tab).calculate()
+
+        self.display_results()
+
+    def display_results(self):
+        """
+        Accumulate the results from all the subsystems and display them.
         :return:
         """
         # Clear the results
@@ -156,9 +208,6 @@ class PredictorVM(Ui_RoweTechPredictor):
         self.calc_num_batt = 0.0
 
         for tab in range(self.tabSubsystem.count()):
-            self.tabSubsystem.widget(tab).calculate()
-            # print(self.tabSubsystem.widget(tab).cwpblDoubleSpinBox.value())
-
             # Accuulate the values
             self.calc_data += self.tabSubsystem.widget(tab).calc_data
             self.calc_num_batt += self.tabSubsystem.widget(tab).calc_num_batt
@@ -0,0 +1,368 @@
+import os
+import time
+import logging
+
+import ADCP.AdcpCommands as Commands
+import ADCP.Predictor.DataStorage as DS
+import ADCP.Predictor.MaxVelocity as Velocity
+import ADCP.Predictor.Power as Power
+import ADCP.Predictor.Range as Range
+import ADCP.Predictor.STD as STD
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+logger = logging.getLogger("Predictor Worker")
+
+# Time in milliseconds to wait for the values to stop changing before calculating
+DEBOUNCE_MS = 150
+
+
+def calculate_prediction(settings):
+    """
+    Calculate the prediction model results for a subsystem.
+    This does not use any widgets, so it can be run in a worker thread.
+    :param settings: Dictionary of the subsystem settings.  See SubsystemVM.get_settings().
+    :return: Dictionary of the results.
+    """
+    results = {}
+
+    # Settings used by all the calculations
+    wp_settings = dict(SystemFrequency=settings['SystemFrequency'],
+                       Beams=settings['Beams'],
+                       CWPON=settings['CWPON'],
+                       CWPBL=settings['CWPBL'],
+                       CWPBS=settings['CWPBS'],
+                       CWPBN=settings['CWPBN'],
+                       CWPBB=settings['CWPBB'],
+                       CWPBB_LagLength=settings['CWPBB_LagLength'],
+                       CWPP=settings['CWPP'],
+                       CWPTBP=settings['CWPTBP'],
+                       CBTON=settings['CBTON'])
+
+    # Data sets selected
+    ced_settings = {}
+    for ds in range(1, 16):
+        key = "IsE%07d" % ds
+        ced_settings[key] = settings[key]
+
+    # Calculate
+    if settings['CBI']:
+        results['Power'] = Power.calculate_burst_power(DeploymentDuration=settings['DeploymentDuration'],
+                                                       CEI=settings['CEI'],
+                                                       CBTBB=settings['CBTBB'],
+                                                       CBI=settings['CBI'],
+                                                       CBI_BurstInterval=settings['CBI_BurstInterval'],
+                                                       CBI_NumEns=settings['CBI_NumEns'],
+                                                       **wp_settings)
+    else:
+        results['Power'] = Power.calculate_power(DeploymentDuration=settings['DeploymentDuration'],
+                                                 CEI=settings['CEI'],
+                                                 CBTBB=settings['CBTBB'],
+                                                 **wp_settings)
+
+    # Calculate the number of batteries used
+    results['NumBatteries'] = Power.calculate_number_batteries(DeploymentDuration=settings['DeploymentDuration'],
+                                                               PowerUsage=results['Power'])
+
+    # Calculate all the ranges
+    (bt_range, wp_range, first_bin, cfg_range) = Range.calculate_predicted_range(**wp_settings)
+    results['BtRange'] = bt_range
+    results['WpRange'] = wp_range
+    results['FirstBin'] = first_bin
+    results['CfgWpRange'] = cfg_range
+
+    # Calculate the maximum velocity
+    results['MaxVelocity'] = Velocity.calculate_max_velocity(**wp_settings)
+
+    if settings['CBI']:
+        results['DataStorage'] = DS.calculate_burst_storage_amount(CBI_BurstInterval=settings['CBI_BurstInterval'],
+                                                                   CBI_NumEns=settings['CBI_NumEns'],
+                                                                   DeploymentDuration=settings['DeploymentDuration'],
+                                                                   Beams=settings['Beams'],
+                                                                   CEI=settings['CEI'],
+                                                                   CWPBN=settings['CWPBN'],
+                                                                   **ced_settings)
+    else:
+        results['DataStorage'] = DS.calculate_storage_amount(DeploymentDuration=settings['DeploymentDuration'],
+                                                             CEI=settings['CEI'],
+                                                             Beams=settings['Beams'],
+                                                             CWPBN=settings['CWPBN'],
+                                                             **ced_settings)
+
+    results['STD'] = STD.calculate_std(**wp_settings)
+
+    # Set the ping description
+    cfg_status_str = ""
+    err_status_str = ""
+
+    # CBI
+    if settings['CBI']:
+        msg, error_msg = Commands.pretty_print_burst(settings['CEI'],
+                                                     settings['CBI_BurstInterval'],
+                                                     settings['CBI_NumEns'],
+                                                     settings['CWPP'],
+                                                     settings['CWPTBP'])
+    else:
+        msg, error_msg = Commands.pretty_print_standard(settings['CEI'],
+                                                        settings['CWPP'],
+                                                        settings['CWPTBP'])
+    cfg_status_str += msg
+    err_status_str += error_msg
+
+    if settings['CWPON']:
+        # Configured Water Profile depth
+        msg = Commands.pretty_print_cfg_depth(settings['CWPBL'],
+                                              settings['CWPBS'],
+                                              settings['CWPBN'],
+                                              results['FirstBin'])
+        cfg_status_str += msg
+        err_status_str += error_msg
+
+    # Max Velocity and Accuracy tooltip
+    max_vel_acc_tt, error_msg = Commands.pretty_print_accuracy(results['MaxVelocity'], results['STD'])
+    err_status_str += error_msg
+    if settings['CWPON']:
+        cfg_status_str += max_vel_acc_tt
+
+    # Recording turned on
+    if settings['CERECORD']:
+        cfg_status_str += "-Recording to the internal SD card.\n"
+
+    results['AccuracyToolTip'] = max_vel_acc_tt
+    results['Status'] = cfg_status_str
+    results['Error'] = err_status_str
+
+    return results
+
+
+class PredictorWorkerSignals(QObject):
+    """
+    Signals for the worker.  A QRunnable is not a QObject, so
+    the signals are kept in a separate object.
+    Result: Generation, Tab index and the results.
+    Error: Generation, Tab index and the error message.
+    """
+    result = pyqtSignal(int, int, object)
+    error = pyqtSignal(int, int, str)
+
+
+class PredictorWorker(QRunnable):
+    """
+    Calculate the prediction for a single subsystem in the thread pool.
+    """
+
+    def __init__(self, calculator, generation, index, settings):
+        QRunnable.__init__(self)
+        self.calculator = calculator
+        self.generation = generation
+        self.index = index
+        self.settings = settings
+        self.signals = PredictorWorkerSignals()
+
+    def run(self):
+        """
+        Calculate the results and post them back to the UI thread.
+        If a newer calculation has been requested, do nothing.
+        :return:
+        """
+        if self.calculator.is_stale(self.generation):
+            return
+
+        try:
+            results = calculate_prediction(self.settings)
+        except Exception as e:
+            logger.exception("Error calculating subsystem " + str(self.index))
+            self.signals.error.emit(self.generation, self.index, str(e))
+            return
+
+        if not self.calculator.is_stale(self.generation):
+            self.signals.result.emit(self.generation, self.index, results)
+
+
+class PredictorCalculator(QObject):
+    """
+    Recalculate the predictions off the UI thread.
+
+    Requests are debounced, so changing a value many times will only
+    calculate once the value stops changing.  Each subsystem tab is
+    calculated in its own worker.  If a new request is made while
+    calculating, the old results are thrown away.
+
+    The settings are read from the widgets on the UI thread by get_settings().
+    The results are given back on the UI thread with the signals.
+    """
+
+    # Generation, Tab index and results for a single subsystem
+    tabCalculated = pyqtSignal(int, int, object)
+
+    # Generation and the list of results for all the subsystems
+    calculated = pyqtSignal(int, object)
+
+    def __init__(self, get_settings, debounce_ms=DEBOUNCE_MS, parent=None):
+        """
+        Initialize the calculator.
+        :param get_settings: Function to get a list of settings.  One settings dictionary for each subsystem.
+        :param debounce_ms: Time in milliseconds to wait for the values to stop changing.
+        :param parent: Parent QObject.
+        """
+        QObject.__init__(self, parent)
+        self.get_settings = get_settings
+        self.generation = 0
+        self.results = []
+        self.remaining = 0
+
+        # Thread pool to calculate each tab
+        self.thread_pool = QThreadPool(self)
+
+        # Debounce timer
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.start)
+
+    def request(self):
+        """
+        Request a new calculation.  The calculation will start
+        when no new request has been made for the debounce time.
+        :return:
+        """
+        # Any calculation running is now stale
+        self.generation += 1
+        self.timer.start()
+
+    def is_stale(self, generation):
+        """
+        Check if the calculation is older then the latest request.
+        :param generation: Generation of the calculation.
+        :return: TRUE if a newer calculation was requested.
+        """
+        return generation != self.generation
+
+    def is_busy(self):
+        """
+        :return: TRUE if a calculation is waiting or running.
+        """
+        return self.timer.isActive() or self.remaining > 0
+
+    def start(self):
+        """
+        Start a calculation for all the subsystems.
+        :return:
+        """
+        self.generation += 1
+
+        # Remove any workers that have not started
+        self.thread_pool.clear()
+
+        settings_list = self.get_settings()
+        self.results = [None] * len(settings_list)
+        self.remaining = len(settings_list)
+
+        if self.remaining == 0:
+            self.calculated.emit(self.generation, self.results)
+            return
+
+        for index, settings in enumerate(settings_list):
+            worker = PredictorWorker(self, self.generation, index, settings)
+            worker.signals.result.connect(self.on_result)
+            worker.signals.error.connect(self.on_error)
+            self.thread_pool.start(worker)
+
+    def on_result(self, generation, index, results):
+        """
+        Result from a worker.  Ignore the result if a newer
+        calculation was requested.
+        :param generation: Generation of the calculation.
+        :param index: Tab index.
+        :param results: Results for the tab.
+        :return:
+        """
+        if self.is_stale(generation):
+            return
+
+        self.results[index] = results
+        self.tabCalculated.emit(generation, index, results)
+
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.calculated.emit(generation, self.results)
+
+    def on_error(self, generation, index, error_msg):
+        """
+        Error from a worker.  The tab will have no results.
+        :param generation: Generation of the calculation.
+        :param index: Tab index.
+        :param error_msg: Error message.
+        :return:
+        """
+        if self.is_stale(generation):
+            return
+
+        # The worker logged the error with the traceback
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.calculated.emit(generation, self.results)
+
+    def wait_for_done(self, msecs=-1):
+        """
+        Wait for the thread pool to finish.
+        :param msecs: Time to wait in milliseconds.  -1 waits forever.
+        :return: TRUE if all the workers are done.
+        """
+        return self.thread_pool.waitForDone(msecs)
+
+
+def test_calculator_ui_blocking():
+    """
+    Measure the time the UI thread is blocked while values are changing.
+    Run headless with the offscreen platform.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QCoreApplication, QElapsedTimer
+    app = QCoreApplication.instance() or QCoreApplication([])
+
+    settings = dict(DeploymentDuration=30, CEI=1, Beams=4, SystemFrequency=288000,
+                    CWPON=True, CWPBL=1.0, CWPBS=4.0, CWPBN=30, CWPBB=1, CWPBB_LagLength=1.0,
+                    CWPP=1, CWPTBP=0.5, CBTON=True, CBTBB=0,
+                    CBI=False, CBI_BurstInterval=3600, CBI_NumEns=4096, CERECORD=True)
+    for ds in range(1, 16):
+        settings["IsE%07d" % ds] = True
+
+    # 6 subsystem tabs
+    calls = []
+    def get_settings():
+        calls.append(1)
+        return [dict(settings) for ss in range(6)]
+
+    calculator = PredictorCalculator(get_settings, debounce_ms=20)
+    done = []
+    tabs = []
+    calculator.tabCalculated.connect(lambda gen, index, results: tabs.append(index))
+    calculator.calculated.connect(lambda gen, results: done.append(results))
+
+    # Spin box ticks
+    timer = QElapsedTimer()
+    max_blocked_ms = 0
+    for tick in range(50):
+        timer.start()
+        calculator.request()
+        max_blocked_ms = max(max_blocked_ms, timer.elapsed())
+        app.processEvents()
+
+    # Wait for the results while measuring the UI event loop
+    deadline = time.time() + 10.0
+    while not done and time.time() < deadline:
+        timer.start()
+        app.processEvents()
+        max_blocked_ms = max(max_blocked_ms, timer.elapsed())
+        time.sleep(0.001)
+
+    calculator.wait_for_done()
+
+    # Only a single calculation after the debounce
+    assert len(done) == 1
+    assert len(calls) == 1
+    assert sorted(tabs) == list(range(6))
+    assert all(result['Power'] > 0 for result in done[0])
+
+    # The UI thread is never blocked for more than a few frames
+    assert max_blocked_ms < 50
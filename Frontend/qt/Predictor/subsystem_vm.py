@@ -1,11 +1,8 @@
 import ADCP.AdcpCommands as Commands
 import ADCP.Predictor.DataStorage as DS
-import ADCP.Predictor.MaxVelocity as Velocity
-import ADCP.Predictor.Power  as Power
-import ADCP.Predictor.Range as Range
-import ADCP.Predictor.STD as STD
 import ADCP.Subsystem as SS
 from PyQt5.QtWidgets import QWidget
+from predictor_worker import calculate_prediction
 from subsystem_view import Ui_Subsystem
 
 from predictor import AdcpJson as JSON
@@ -208,7 +205,7 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         :return:
         """
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def valueChanged(self, value):
         """
@@ -217,7 +214,7 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         :return:
         """
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def cwpon_enable_disable(self, state):
         """
@@ -241,7 +238,7 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         self.cwptbpDoubleSpinBox.setEnabled(enable_state)
 
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def cbton_enable_disable(self, state):
         """
@@ -260,7 +257,7 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         self.cbttbpDoubleSpinBox.setEnabled(enable_state)
 
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def cbi_enable_disable(self, state):
         """
@@ -279,7 +276,7 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         self.cbiNumEnsSpinBox.setEnabled(enable_state)
 
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def cwprt_enable_disable(self, index):
         """
@@ -305,140 +302,75 @@ class SubsystemVM(Ui_Subsystem, QWidget):
             self.cwprtMaxBinSpinBox.setEnabled(0)
 
         # Recalculate
-        self.predictor.calculate()
+        self.predictor.request_calculate()
 
     def calculate(self):
         """
         Calculate the prediction model results based off the settings.
+        This will block the UI thread.  Use predictor.request_calculate()
+        to calculate in the background.
         :return:
         """
-        # Get the global settings
-        deployment = self.predictor.deploymentDurationSpinBox.value()
-        cei = self.predictor.ceiDoubleSpinBox.value()
-
-        # Calculate
-        self.calc_power = Power.calculate_power(DeploymentDuration=deployment,
-                                                Beams=self.numBeamsSpinBox.value(),
-                                                CEI=cei,
-                                                SystemFrequency=self.freq,
-                                                CWPON=self.cwponCheckBox.isChecked(),
-                                                CWPBL=self.cwpblDoubleSpinBox.value(),
-                                                CWPBS=self.cwpbsDoubleSpinBox.value(),
-                                                CWPBN=self.cwpbnSpinBox.value(),
-                                                CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
-                                                CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
-                                                CWPP=self.cwppSpinBox.value(),
-                                                CWPTBP=self.cwptbpDoubleSpinBox.value(),
-                                                CBTON=self.cbtonCheckBox.isChecked(),
-                                                CBTBB=self.cbtbbComboBox.itemData(self.cbtbbComboBox.currentIndex()),)
+        self.display_results(calculate_prediction(self.get_settings()))
 
-        if self.cbiEnabledCheckBox.isChecked():
-            self.calc_power = Power.calculate_burst_power(DeploymentDuration=deployment,
-                                                          Beams=self.numBeamsSpinBox.value(),
-                                                          CEI=cei,
-                                                          SystemFrequency=self.freq,
-                                                          CWPON=self.cwponCheckBox.isChecked(),
-                                                          CWPBL=self.cwpblDoubleSpinBox.value(),
-                                                          CWPBS=self.cwpbsDoubleSpinBox.value(),
-                                                          CWPBN=self.cwpbnSpinBox.value(),
-                                                          CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
-                                                          CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
-                                                          CWPP=self.cwppSpinBox.value(),
-                                                          CWPTBP=self.cwptbpDoubleSpinBox.value(),
-                                                          CBTON=self.cbtonCheckBox.isChecked(),
-                                                          CBTBB=self.cbtbbComboBox.itemData(self.cbtbbComboBox.currentIndex()),
-                                                          CBI=self.cbiEnabledCheckBox.isChecked(),
-                                                          CBI_BurstInterval=self.cbiBurstIntervalDoubleSpinBox.value(),
-                                                          CBI_NumEns=self.cbiNumEnsSpinBox.value(),)
-
-        # Calculate the number of batteries used
-        self.calc_num_batt = Power.calculate_number_batteries(DeploymentDuration=deployment, PowerUsage=self.calc_power)
-
-        # Calculate all the ranges
-        (bt_range, wp_range, first_bin, cfg_range) = Range.calculate_predicted_range(SystemFrequency=self.freq,
-                                                Beams=self.numBeamsSpinBox.value(),
-                                                CWPON=self.cwponCheckBox.isChecked(),
-                                                CWPBL=self.cwpblDoubleSpinBox.value(),
-                                                CWPBS=self.cwpbsDoubleSpinBox.value(),
-                                                CWPBN=self.cwpbnSpinBox.value(),
-                                                CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
-                                                CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
-                                                CWPP=self.cwppSpinBox.value(),
-                                                CWPTBP=self.cwptbpDoubleSpinBox.value(),
-                                                CBTON=self.cbtonCheckBox.isChecked())
-
-        self.calc_bt_range = bt_range
-        self.calc_wp_range = wp_range
-        self.calc_first_bin = first_bin
-        self.calc_cfg_wp_range = cfg_range
-
-        # Calculate the maximum velocity
-        self.calc_max_vel = Velocity.calculate_max_velocity(SystemFrequency=self.freq,
-                                                            Beams=self.numBeamsSpinBox.value(),
-                                                            CWPON=self.cwponCheckBox.isChecked(),
-                                                            CWPBL=self.cwpblDoubleSpinBox.value(),
-                                                            CWPBS=self.cwpbsDoubleSpinBox.value(),
-                                                            CWPBN=self.cwpbnSpinBox.value(),
-                                                            CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
-                                                            CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
-                                                            CWPP=self.cwppSpinBox.value(),
-                                                            CWPTBP=self.cwptbpDoubleSpinBox.value(),
-                                                            CBTON=self.cbtonCheckBox.isChecked())
-
-        if self.cbiEnabledCheckBox.isChecked():
-            self.calc_data = DS.calculate_burst_storage_amount(CBI_BurstInterval=self.cbiBurstIntervalDoubleSpinBox.value(),
-                                                               CBI_NumEns=self.cbiNumEnsSpinBox.value(),
-                                                               DeploymentDuration=deployment,
-                                                               Beams=self.numBeamsSpinBox.value(),
-                                                               CEI=cei,
-                                                               CWPBN=self.cwpbnSpinBox.value(),
-                                                               IsE0000001=self.cedBeamVelCheckBox.isChecked(),
-                                                               IsE0000002=self.cedInstrVelCheckBox.isChecked(),
-                                                               IsE0000003=self.cedEarthVelCheckBox.isChecked(),
-                                                               IsE0000004=self.cedAmpCheckBox.isChecked(),
-                                                               IsE0000005=self.cedCorrCheckBox.isChecked(),
-                                                               IsE0000006=self.cedBeamGoodPingCheckBox.isChecked(),
-                                                               IsE0000007=self.cedEarthGoodPingCheckBox.isChecked(),
-                                                               IsE0000008=self.cedEnsCheckBox.isChecked(),
-                                                               IsE0000009=self.cedAncCheckBox.isChecked(),
-                                                               IsE0000010=self.cedBtCheckBox.isChecked(),
-                                                               IsE0000011=self.cedNmeaCheckBox.isChecked(),
-                                                               IsE0000012=self.cedWpEngCheckBox.isChecked(),
-                                                               IsE0000013=self.cedBtEngCheckBox.isChecked(),
-                                                               IsE0000014=self.cedSysSettingCheckBox.isChecked(),
-                                                               IsE0000015=self.cedRangeTrackingCheckBox.isChecked(),)
-        else:
-            self.calc_data = DS.calculate_storage_amount(DeploymentDuration=deployment,
-                                                         CEI=cei,
-                                                         Beams=self.numBeamsSpinBox.value(),
-                                                         CWPBN=self.cwpbnSpinBox.value(),
-                                                         IsE0000001=self.cedBeamVelCheckBox.isChecked(),
-                                                         IsE0000002=self.cedInstrVelCheckBox.isChecked(),
-                                                         IsE0000003=self.cedEarthVelCheckBox.isChecked(),
-                                                         IsE0000004=self.cedAmpCheckBox.isChecked(),
-                                                         IsE0000005=self.cedCorrCheckBox.isChecked(),
-                                                         IsE0000006=self.cedBeamGoodPingCheckBox.isChecked(),
-                                                         IsE0000007=self.cedEarthGoodPingCheckBox.isChecked(),
-                                                         IsE0000008=self.cedEnsCheckBox.isChecked(),
-                                                         IsE0000009=self.cedAncCheckBox.isChecked(),
-                                                         IsE0000010=self.cedBtCheckBox.isChecked(),
-                                                         IsE0000011=self.cedNmeaCheckBox.isChecked(),
-                                                         IsE0000012=self.cedWpEngCheckBox.isChecked(),
-                                                         IsE0000013=self.cedBtEngCheckBox.isChecked(),
-                                                         IsE0000014=self.cedSysSettingCheckBox.isChecked(),
-                                                         IsE0000015=self.cedRangeTrackingCheckBox.isChecked(),)
-
-        self.calc_std = STD.calculate_std(SystemFrequency=self.freq,
-                                          Beams=self.numBeamsSpinBox.value(),
-                                          CWPON=self.cwponCheckBox.isChecked(),
-                                          CWPBL=self.cwpblDoubleSpinBox.value(),
-                                          CWPBS=self.cwpbsDoubleSpinBox.value(),
-                                          CWPBN=self.cwpbnSpinBox.value(),
-                                          CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
-                                          CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
-                                          CWPP=self.cwppSpinBox.value(),
-                                          CWPTBP=self.cwptbpDoubleSpinBox.value(),
-                                          CBTON=self.cbtonCheckBox.isChecked())
+    def get_settings(self):
+        """
+        Get the settings from the widgets.  This must be called on the UI thread.
+        The settings are then given to calculate_prediction().
+        :return: Dictionary of the settings.
+        """
+        settings = dict(DeploymentDuration=self.predictor.deploymentDurationSpinBox.value(),
+                        CEI=self.predictor.ceiDoubleSpinBox.value(),
+                        CERECORD=self.predictor.cerecordCheckBox.isChecked(),
+                        Beams=self.numBeamsSpinBox.value(),
+                        SystemFrequency=self.freq,
+                        CWPON=self.cwponCheckBox.isChecked(),
+                        CWPBL=self.cwpblDoubleSpinBox.value(),
+                        CWPBS=self.cwpbsDoubleSpinBox.value(),
+                        CWPBN=self.cwpbnSpinBox.value(),
+                        CWPBB=self.cwpbbComboBox.itemData(self.cwpbbComboBox.currentIndex()),
+                        CWPBB_LagLength=self.cwpbbDoubleSpinBox.value(),
+                        CWPP=self.cwppSpinBox.value(),
+                        CWPTBP=self.cwptbpDoubleSpinBox.value(),
+                        CBTON=self.cbtonCheckBox.isChecked(),
+                        CBTBB=self.cbtbbComboBox.itemData(self.cbtbbComboBox.currentIndex()),
+                        CBI=self.cbiEnabledCheckBox.isChecked(),
+                        CBI_BurstInterval=self.cbiBurstIntervalDoubleSpinBox.value(),
+                        CBI_NumEns=self.cbiNumEnsSpinBox.value(),
+                        IsE0000001=self.cedBeamVelCheckBox.isChecked(),
+                        IsE0000002=self.cedInstrVelCheckBox.isChecked(),
+                        IsE0000003=self.cedEarthVelCheckBox.isChecked(),
+                        IsE0000004=self.cedAmpCheckBox.isChecked(),
+                        IsE0000005=self.cedCorrCheckBox.isChecked(),
+                        IsE0000006=self.cedBeamGoodPingCheckBox.isChecked(),
+                        IsE0000007=self.cedEarthGoodPingCheckBox.isChecked(),
+                        IsE0000008=self.cedEnsCheckBox.isChecked(),
+                        IsE0000009=self.cedAncCheckBox.isChecked(),
+                        IsE0000010=self.cedBtCheckBox.isChecked(),
+                        IsE0000011=self.cedNmeaCheckBox.isChecked(),
+                        IsE0000012=self.cedWpEngCheckBox.isChecked(),
+                        IsE0000013=self.cedBtEngCheckBox.isChecked(),
+                        IsE0000014=self.cedSysSettingCheckBox.isChecked(),
+                        IsE0000015=self.cedRangeTrackingCheckBox.isChecked(),)
+
+        return settings
+
+    def display_results(self, results):
+        """
+        Display the results from calculate_prediction().
+        This must be called on the UI thread.
+        :param results: Dictionary of the results.
+        :return:
+        """
+        self.calc_power = results['Power']
+        self.calc_num_batt = results['NumBatteries']
+        self.calc_bt_range = results['BtRange']
+        self.calc_wp_range = results['WpRange']
+        self.calc_first_bin = results['FirstBin']
+        self.calc_cfg_wp_range = results['CfgWpRange']
+        self.calc_max_vel = results['MaxVelocity']
+        self.calc_data = results['DataStorage']
+        self.calc_std = results['STD']
 
         # Update the display
         self.powerLabel.setText(str(round(self.calc_power, 3)) + " watt/hr")
@@ -450,52 +382,15 @@ class SubsystemVM(Ui_Subsystem, QWidget):
         self.dataUsageLabel.setText(str(DS.bytes_2_human_readable(self.calc_data)))
         self.stdLabel.setText(str(round(self.calc_std, 3)) + " m/s")
 
-        # Set the ping description
-        self.pingingTextBrowser.clear()
-        cfg_status_str = ""
-        err_status_str = ""
-
-        # CBI
-        if self.cbiEnabledCheckBox.isChecked():
-            msg, error_msg = Commands.pretty_print_burst(self.predictor.ceiDoubleSpinBox.value(),
-                                                          self.cbiBurstIntervalDoubleSpinBox.value(),
-                                                          self.cbiNumEnsSpinBox.value(),
-                                                          self.cwppSpinBox.value(),
-                                                          self.cwptbpDoubleSpinBox.value())
-            cfg_status_str += msg
-            err_status_str += error_msg
-        else:
-            msg, error_msg = Commands.pretty_print_standard(self.predictor.ceiDoubleSpinBox.value(),
-                                           self.cwppSpinBox.value(),
-                                           self.cwptbpDoubleSpinBox.value())
-            cfg_status_str += msg
-            err_status_str += error_msg
-
-        if self.cwponCheckBox.isChecked():
-            # Configured Water Profile depth
-            msg = Commands.pretty_print_cfg_depth(self.cwpblDoubleSpinBox.value(),
-                                                                         self.cwpbsDoubleSpinBox.value(),
-                                                                         self.cwpbnSpinBox.value(),
-                                                                         self.calc_first_bin)
-            cfg_status_str += msg
-            err_status_str += error_msg
-
         # Max Velocity and Accuracy tooltip
-        max_vel_acc_tt, error_msg = Commands.pretty_print_accuracy(self.calc_max_vel, self.calc_std)
-        err_status_str += error_msg
-        self.velAccGroupBox.setToolTip(max_vel_acc_tt)
-        self.maxVelLabel.setToolTip(max_vel_acc_tt)
-        self.stdLabel.setToolTip(max_vel_acc_tt)
-        if self.cwponCheckBox.isChecked():
-            cfg_status_str += max_vel_acc_tt
-
-        # Recording turned on
-        if self.predictor.cerecordCheckBox.isChecked():
-            cfg_status_str += "-Recording to the internal SD card.\n"
+        self.velAccGroupBox.setToolTip(results['AccuracyToolTip'])
+        self.maxVelLabel.setToolTip(results['AccuracyToolTip'])
+        self.stdLabel.setToolTip(results['AccuracyToolTip'])
 
         # Set the text to the browser
-        self.pingingTextBrowser.setText(cfg_status_str)
-        self.errorTextBrowser.setText(err_status_str)
+        self.pingingTextBrowser.clear()
+        self.pingingTextBrowser.setText(results['Status'])
+        self.errorTextBrowser.setText(results['Error'])
 
     def get_cmd_list(self):
         """
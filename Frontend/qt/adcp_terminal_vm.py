@@ -54,7 +54,7 @@ class AdcpTerminal(Ui_AdcpTerminal):
         the WAMP settings are initialized.
         :return: 
         """
-        yield self.parent.subscribe(self.on_serial_data, u"com.rti.data.serial")
+        yield self.parent.subscribe(self.on_serial_data, u"com.rti.data.serial.text")
         yield self.parent.subscribe(self.on_ens_json_data, u"com.rti.data.ens")
         self.parent.log.info("ADCP Terminal WAMP init")
 
@@ -90,11 +90,11 @@ class AdcpTerminal(Ui_AdcpTerminal):
 
     def on_serial_data(self, data):
         """
-        Called when serial data is received from WAMP.
-        :param data: JSON object containing serial data.
+        Called when serial terminal text is received from WAMP.
+        :param data: Dictionary containing serial text.
         :return: 
         """
-        json_data = json.loads(data)                        # convert to JSON
+        json_data = data
         self.check_serial_settings(json_data)               # Check serial settings
         #self.terminalText.setText(self.terminalText.toPlainText() + str(json_data["value"]))  # Set terminal output
 
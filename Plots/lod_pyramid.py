@@ -0,0 +1,230 @@
+import pandas as pd
+import numpy as np
+
+
+class LodPyramid:
+    """
+    Level of detail pyramid for long records.
+
+    Level 0 is the original data.  Each level above combines "factor" rows
+    of the level below into a tile, keeping the min, mean and max of each value
+    column.  The plots embed the most detailed level that fits the display, so
+    the size of the HTML file does not grow with the length of the record.
+
+    The mean of each value column keeps the original column name, so a level
+    can be given to the same glyphs as the original dataframe.  The min and
+    max are in the columns <col>_min and <col>_max.  The number of rows
+    combined in each tile is in the column tile_size.
+
+    Circular columns, like the heading in degrees, are averaged with the
+    mean of the sin and cos, so 359 and 1 average to 0 and not 180.  Their
+    <col>_min and <col>_max are the mean -/+ the circular standard deviation,
+    so the band does not span 0 to 360 at every wrap.
+    """
+
+    def __init__(self, df, value_cols, x_col=None, first_cols=None, factor=4, circular_cols=None):
+        """
+        Build all the levels of the pyramid.
+        :param df: Dataframe with a row for each ensemble.
+        :param value_cols: Columns to aggregate.
+        :param x_col: Column for the x axis.  If None, the dataframe index is used.
+        :param first_cols: Columns to keep the first value of each tile, like the ensemble number.
+        :param factor: Number of rows combined into a tile at each level.
+        :param circular_cols: Value columns in degrees to average as angles, like the heading.
+        """
+        self.value_cols = list(value_cols)
+        self.x_col = x_col
+        self.first_cols = list(first_cols) if first_cols else []
+        self.circular_cols = list(circular_cols) if circular_cols else []
+        self.factor = factor
+        self.levels = []
+
+        # Level 0
+        if x_col is None:
+            x = np.asarray(df.index)
+        else:
+            x = np.asarray(df[x_col])
+        values = np.asarray(df[self.value_cols], dtype=float).reshape(len(df), len(self.value_cols))
+        angles = np.radians(np.asarray(df[self.circular_cols], dtype=float).reshape(len(df), len(self.circular_cols)))
+        level = {'x': x,
+                 'first': {col: np.asarray(df[col]) for col in self.first_cols},
+                 'tile_size': np.ones(len(df), dtype=int),
+                 'min': values,
+                 'max': values,
+                 'sum': np.where(np.isnan(values), 0.0, values),
+                 'count': (~np.isnan(values)).astype(int),
+                 'sin': np.where(np.isnan(angles), 0.0, np.sin(angles)),
+                 'cos': np.where(np.isnan(angles), 0.0, np.cos(angles))}
+        self.levels.append(level)
+
+        # Combine the tiles until one is left
+        while len(level['x']) > 1:
+            level = self.build_level(level)
+            self.levels.append(level)
+
+    def build_level(self, level):
+        """
+        Combine the rows of the level into tiles.
+        :param level: Level below.
+        :return: New level.
+        """
+        factor = self.factor
+        num_rows = len(level['x'])
+        num_tiles = (num_rows + factor - 1) // factor
+        pad = num_tiles * factor - num_rows
+
+        def tiles(a, fill):
+            """
+            Pad the last tile and reshape to [tile, row in tile, col].
+            """
+            if pad:
+                a = np.concatenate([a, np.full((pad,) + a.shape[1:], fill, dtype=a.dtype)])
+            return a.reshape((num_tiles, factor) + a.shape[1:])
+
+        return {'x': level['x'][::factor],
+                'first': {col: values[::factor] for col, values in level['first'].items()},
+                'tile_size': tiles(level['tile_size'], 0).sum(axis=1),
+                'min': np.fmin.reduce(tiles(level['min'], np.nan), axis=1),      # fmin/fmax ignore NaN
+                'max': np.fmax.reduce(tiles(level['max'], np.nan), axis=1),
+                'sum': tiles(level['sum'], 0.0).sum(axis=1),
+                'count': tiles(level['count'], 0).sum(axis=1),
+                'sin': tiles(level['sin'], 0.0).sum(axis=1),
+                'cos': tiles(level['cos'], 0.0).sum(axis=1)}
+
+    def get_level_index(self, max_points):
+        """
+        Find the most detailed level that fits the number of points.
+        :param max_points: Maximum number of rows.
+        :return: Level index.
+        """
+        for index, level in enumerate(self.levels):
+            if len(level['x']) <= max_points:
+                return index
+        return len(self.levels) - 1
+
+    def get_level(self, max_points):
+        """
+        Get the most detailed level that fits the number of points.
+        :param max_points: Maximum number of rows.  The display width in pixels is a good value.
+        :return: Dataframe of the level.
+        """
+        return self.to_df(self.levels[self.get_level_index(max_points)])
+
+    def to_df(self, level, rows=slice(None)):
+        """
+        Convert the level to a dataframe.
+        :param level: Level to convert.
+        :param rows: Rows to convert.
+        :return: Dataframe with the mean, min and max of each value column.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = level['sum'][rows] / level['count'][rows]
+
+        data = {}
+        for col, values in level['first'].items():
+            data[col] = values[rows]
+        data['tile_size'] = level['tile_size'][rows]
+        for index, col in enumerate(self.value_cols):
+            data[col] = mean[:, index]
+            data[col + '_min'] = level['min'][rows][:, index]
+            data[col + '_max'] = level['max'][rows][:, index]
+
+        for index, col in enumerate(self.circular_cols):
+            count = level['count'][rows][:, self.value_cols.index(col)]
+            sin = level['sin'][rows][:, index]
+            cos = level['cos'][rows][:, index]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                # Mean resultant length, 1 if all the angles are the same
+                resultant = np.minimum(np.hypot(sin, cos) / count, 1.0)
+                spread = np.degrees(np.sqrt(-2.0 * np.log(resultant)))
+            angle = np.where(count > 0, np.degrees(np.arctan2(sin, cos)) % 360.0, np.nan)
+            data[col] = angle
+            data[col + '_min'] = angle - spread
+            data[col + '_max'] = angle + spread
+
+        if self.x_col is None:
+            return pd.DataFrame(data, index=level['x'][rows])
+
+        data[self.x_col] = level['x'][rows]
+        return pd.DataFrame(data)
+
+    def save(self, file_path):
+        """
+        Save the pyramid, so it is only built once for a project.
+        :param file_path: File path.
+        """
+        pd.to_pickle(self, file_path)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Load a saved pyramid.
+        :param file_path: File path.
+        :return: LodPyramid.
+        """
+        return pd.read_pickle(file_path)
+
+
+def get_lod(df, value_cols, max_points, x_col=None, first_cols=None, circular_cols=None):
+    """
+    Get the dataframe to embed in a plot.  If the dataframe
+    is already small enough, it is returned as is.
+    :param df: Dataframe or LodPyramid.
+    :param value_cols: Columns to aggregate.
+    :param max_points: Maximum number of rows.  If None, the dataframe is not changed.
+    :param x_col: Column for the x axis.  If None, the dataframe index is used.
+    :param first_cols: Columns to keep the first value of each tile.
+    :param circular_cols: Value columns in degrees to average as angles.
+    :return: Dataframe to plot.
+    """
+    if isinstance(df, LodPyramid):
+        return df.get_level(max_points if max_points else len(df.levels[0]['x']))
+
+    if max_points is None or len(df.index) <= max_points:
+        return df
+
+    first_cols = [col for col in (first_cols or []) if col in df.columns]
+    return LodPyramid(df, value_cols, x_col=x_col, first_cols=first_cols, circular_cols=circular_cols).get_level(max_points)
+
+
+def test_pyramid():
+    df = pd.DataFrame({'ensnum': np.arange(1, 11),
+                       'voltage': np.arange(10, dtype=float)})
+    df.loc[5, 'voltage'] = np.nan
+    pyramid = LodPyramid(df, ['voltage'], x_col='ensnum', first_cols=['ensnum'], factor=4)
+
+    assert [len(level['x']) for level in pyramid.levels] == [10, 3, 1]
+
+    level = pyramid.get_level(3)
+    assert list(level['ensnum']) == [1, 5, 9]
+    assert list(level['tile_size']) == [4, 4, 2]
+    assert list(level['voltage_min']) == [0.0, 4.0, 8.0]
+    assert list(level['voltage_max']) == [3.0, 7.0, 9.0]
+    assert np.allclose(level['voltage'], [1.5, 17.0 / 3.0, 8.5])          # NaN is not in the mean
+
+    top = pyramid.get_level(1)
+    assert top['voltage'][0] == np.nansum(df['voltage']) / 9
+    assert top['tile_size'][0] == 10
+
+    # Small enough to plot as is
+    assert get_lod(df, ['voltage'], 20) is df
+    assert len(get_lod(df, ['voltage'], 5, x_col='ensnum')) == 3
+
+
+def test_pyramid_circular():
+    df = pd.DataFrame({'ensnum': np.arange(1, 9),
+                       'heading': [358.0, 359.0, 1.0, 2.0, 90.0, 90.0, 90.0, np.nan]})
+    pyramid = LodPyramid(df, ['heading'], x_col='ensnum', circular_cols=['heading'], factor=4)
+
+    level = pyramid.get_level(2)
+    assert np.allclose((level['heading'] + 180.0) % 360.0 - 180.0, [0.0, 90.0])
+
+    # Spread around the mean, not 0 to 360
+    assert -3.0 < level['heading_min'][0] < 0.0
+    assert 0.0 < level['heading_max'][0] < 3.0
+    assert np.allclose([level['heading_min'][1], level['heading_max'][1]], 90.0)
+
+    # Level 0 is the original data
+    level = pyramid.get_level(8)
+    assert np.allclose(level['heading'][:7], df['heading'][:7])
+    assert np.isnan(level['heading'][7])
@@ -4,14 +4,27 @@ from bokeh.plotting import figure, show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper, BasicTicker, PrintfTickFormatter, ColorBar, Range1d
 from bokeh.transform import transform
 from bokeh.palettes import RdBu, Spectral, RdYlBu, RdGy, YlGnBu, Inferno, Plasma, PuBu, Greys, Magma, Viridis
+from rti_python.Plots.lod_pyramid import get_lod
 
 
-def plot_heading(project_name, heading_df, ss_code=None, ss_config=None):
+def plot_heading(project_name, heading_df, ss_code=None, ss_config=None, max_points=None):
+    """
+    Create a heading plot.
+    :param project_name: Project name for the file name.
+    :param heading_df: Heading dataframe or LodPyramid built with circular_cols=['heading']. [datetime, heading]
+    :param ss_code: Subsystem code.
+    :param ss_config: Subsystem Config Index.
+    :param max_points: Maximum number of points to embed in the plot.  If None, all the data is plotted.
+    """
 
     # Check for data to plot
     if heading_df is None:
         return
 
+    # Reduce the data to fit the display
+    # The heading is averaged as an angle, so it does not jump to 180 at the wrap
+    heading_df = get_lod(heading_df, ['heading'], max_points, x_col='datetime', circular_cols=['heading'])
+
     # If there is no data, than we cannot create a plot
     if heading_df.empty:
         return
@@ -25,7 +38,10 @@ def plot_heading(project_name, heading_df, ss_code=None, ss_config=None):
     p2 = figure(tools=TOOLS, toolbar_location='left', title="{} - Heading".format(project_name))
 
     # Combine the data into a Data frame for ColumnDataSource for the plot
-    p2.line(x='datetime', y='heading', source=ColumnDataSource(heading_df), line_width=5, line_color="White")
+    source = ColumnDataSource(heading_df)
+    if 'heading_min' in heading_df.columns:
+        p2.varea(x='datetime', y1='heading_min', y2='heading_max', source=source, fill_alpha=0.3)
+    p2.line(x='datetime', y='heading', source=source, line_width=5, line_color="White")
     p2.xaxis.axis_label = "DateTime"
     p2.yaxis.axis_label = 'heading'
 
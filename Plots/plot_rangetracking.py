@@ -4,14 +4,26 @@ from bokeh.plotting import figure, show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool, LinearColorMapper, BasicTicker, PrintfTickFormatter, ColorBar, Range1d
 from bokeh.transform import transform
 from bokeh.palettes import RdBu, Spectral, RdYlBu, RdGy, YlGnBu, Inferno, Plasma, PuBu, Greys, Magma, Viridis
+from rti_python.Plots.lod_pyramid import get_lod
 
 
-def plot_rangetracking(project_name, voltage_df, ss_code=None, ss_config=None):
+def plot_rangetracking(project_name, voltage_df, ss_code=None, ss_config=None, max_points=None):
+    """
+    Create a range tracking plot.
+    :param project_name: Project name for the file name.
+    :param voltage_df: Range tracking dataframe or LodPyramid. [ensnum, datetime, beam, voltage]
+    :param ss_code: Subsystem code.
+    :param ss_config: Subsystem Config Index.
+    :param max_points: Maximum number of points to embed in the plot.  If None, all the data is plotted.
+    """
 
     # Check for data to plot
     if voltage_df is None:
         return
 
+    # Reduce the data to fit the display
+    voltage_df = get_lod(voltage_df, ['voltage'], max_points, x_col='datetime', first_cols=['ensnum', 'beam'])
+
     # If there is no data, than we cannot create a plot
     if voltage_df.empty:
         return
@@ -25,7 +37,10 @@ def plot_rangetracking(project_name, voltage_df, ss_code=None, ss_config=None):
     plot = figure(tools=[TOOLS], title="{} - Voltage".format(project_name), x_axis_type="datetime")
 
     # Combine the data into a Data frame for ColumnDataSource for the plot
-    plot.line(x='datetime', y='voltage', source=ColumnDataSource(voltage_df), line_width=5, line_color="Goldenrod")
+    source = ColumnDataSource(voltage_df)
+    if 'voltage_min' in voltage_df.columns:
+        plot.varea(x='datetime', y1='voltage_min', y2='voltage_max', source=source, fill_color="Goldenrod", fill_alpha=0.3)
+    plot.line(x='datetime', y='voltage', source=source, line_width=5, line_color="Goldenrod")
 
     # Set the labels
     plot.xaxis.axis_label = "Date/Time"
@@ -0,0 +1,443 @@
+import os
+import sys
+import time
+import getopt
+import pytest
+import multiprocessing
+import pandas as pd
+import numpy as np
+from rti_python.Writer.rti_sql import rti_sql
+from rti_python.Plots.rti_sql_plot_mag_dir import plot_mag_dir, calc_mag_dir, build_mag_dir_lod
+from rti_python.Plots.plot_heading import plot_heading
+from rti_python.Plots.plot_voltage import plot_voltage
+from rti_python.Plots.lod_pyramid import LodPyramid
+
+# Database connection for the worker process
+_sql = None
+
+
+def init_worker(conn_string):
+    """
+    Create the database connection for the worker process.
+    Each worker keeps its connection for all its jobs.
+    :param conn_string: Database connection string.
+    """
+    global _sql
+    _sql = rti_sql(conn_string)
+
+
+def close_worker():
+    """
+    Close the database connection for the worker process.
+    """
+    global _sql
+    if _sql is not None:
+        _sql.close()
+        _sql = None
+
+
+class SubsystemReport:
+    """
+    Query and render all the plots for a subsystem configuration.
+    Each query is run once and shared with all the plots that use it.
+    The level of detail pyramids are also built once and given to the plots.
+    The time of each stage is kept in timing.
+    """
+
+    def __init__(self, sql, project_name, project_idx, adcp, ss_code, ss_config, max_points=None, lod_dir=None):
+        """
+        :param sql: Database connection.
+        :param project_name: Project name for the file names.
+        :param project_idx: Project index.
+        :param adcp: ADCP information from get_adcp_info().
+        :param ss_code: Subsystem code.
+        :param ss_config: Subsystem config index.
+        :param max_points: Maximum number of points to embed in each plot.
+        :param lod_dir: Folder to save the level of detail pyramids, so they are loaded the next time
+                        the report is built.  Delete the files when the project data changes.
+        """
+        self.sql = sql
+        self.project_name = project_name
+        self.project_idx = project_idx
+        self.adcp = adcp
+        self.ss_code = ss_code
+        self.ss_config = ss_config
+        self.max_points = max_points
+        self.lod_dir = lod_dir
+        self.results = {}
+        self.lods = {}
+        self.timing = {}
+
+    def timed(self, stage, func, *args, **kwargs):
+        """
+        Run the function and keep the time it took.
+        :param stage: Stage name.
+        :param func: Function to run.
+        :return: Result of the function.
+        """
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.timing[stage] = self.timing.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    def get(self, name):
+        """
+        Get the query result.  The query is only run the first time.
+        :param name: Query name. (earth_east, earth_north, bt_range, compass, voltage)
+        :return: Dataframe.
+        """
+        if name not in self.results:
+            if name == 'earth_east':
+                query = lambda: self.sql.get_earth_vel_data(self.project_idx, 0, self.ss_code, self.ss_config)
+            elif name == 'earth_north':
+                query = lambda: self.sql.get_earth_vel_data(self.project_idx, 1, self.ss_code, self.ss_config)
+            elif name == 'bt_range':
+                query = lambda: get_bin_range(self.sql.get_bottom_track_range(self.project_idx, self.ss_code, self.ss_config))
+            elif name == 'compass':
+                query = lambda: self.sql.get_compass_data(self.project_idx, self.ss_code, self.ss_config)
+            elif name == 'voltage':
+                query = lambda: self.sql.get_voltage_data(self.project_idx, self.ss_code, self.ss_config)
+            else:
+                raise ValueError("Unknown query: " + name)
+            self.results[name] = self.timed('query_' + name, query)
+        return self.results[name]
+
+    def get_mag_dir(self):
+        """
+        Get the cleaned velocities and the magnitude from calc_mag_dir().  They are only calculated the first time.
+        :return: Result of calc_mag_dir() or None if there is no velocity data.
+        """
+        if 'mag_dir' not in self.results:
+            east = self.get('earth_east')
+            north = self.get('earth_north')
+            bt_range = self.get('bt_range')
+            if east is None or north is None or east.empty or north.empty:
+                self.results['mag_dir'] = None
+            else:
+                self.results['mag_dir'] = self.timed('calc_mag_dir', calc_mag_dir, east, north, bt_range)
+        return self.results['mag_dir']
+
+    def get_lod(self, name):
+        """
+        Get the level of detail pyramid of the query result.  The pyramid is only built the first time.
+        If lod_dir is set, the pyramid is loaded from the folder or saved to it after it is built.
+        :param name: Query name. (mag_dir, bt_range, compass, voltage)
+        :return: LodPyramid or None if there is no data or all the points fit in max_points.
+        """
+        if self.max_points is None:
+            return None
+        if name not in self.lods:
+            self.lods[name] = self.timed('lod_' + name, self.load_lod, name)
+        return self.lods[name]
+
+    def load_lod(self, name):
+        """
+        Load the pyramid from lod_dir or build it.
+        :param name: Query name.
+        :return: LodPyramid or None.
+        """
+        if name in ('mag_dir', 'bt_range'):
+            mag_dir = self.get_mag_dir()
+            if mag_dir is None:
+                return None
+            df = mag_dir['mag'] if name == 'mag_dir' else mag_dir['bt_range']      # BinRange smoothed with the magnitude
+        else:
+            df = self.get(name)
+        if df is None or len(df.index) <= self.max_points:
+            return None
+
+        file_path = None
+        if self.lod_dir:
+            file_path = os.path.join(self.lod_dir, "{}_{}_{}_{}.lod".format(self.project_name, self.ss_config, self.ss_code, name))
+            if os.path.exists(file_path):
+                return LodPyramid.load(file_path)
+
+        if name == 'mag_dir':
+            pyramid = build_mag_dir_lod(mag_dir)
+        elif name == 'bt_range':
+            pyramid = LodPyramid(df, ['BinRange'])
+        elif name == 'compass':
+            pyramid = LodPyramid(df, ['heading'], x_col='datetime', circular_cols=['heading'])
+        elif name == 'voltage':
+            pyramid = LodPyramid(df, ['voltage'], x_col='datetime', first_cols=['ensnum'])
+        else:
+            raise ValueError("Unknown pyramid: " + name)
+
+        if file_path:
+            pyramid.save(file_path)
+        return pyramid
+
+    def render(self):
+        """
+        Render all the plots for the subsystem.
+        :return: Time of each stage.
+        """
+        mag_dir = self.get_mag_dir()
+        if mag_dir is not None:
+            self.timed('plot_mag_dir', plot_mag_dir, self.project_name, self.adcp,
+                       self.get('earth_east'), self.get('earth_north'), self.adcp['numbins'],
+                       bt_range_df=self.get('bt_range'), ss_code=self.ss_code, ss_config=self.ss_config,
+                       max_points=self.max_points, mag_dir=mag_dir,
+                       vel_lod=self.get_lod('mag_dir'), bt_range_lod=self.get_lod('bt_range'))
+        compass = self.get('compass')
+        self.timed('plot_heading', plot_heading, self.project_name, self.get_lod('compass') or compass,
+                   ss_code=self.ss_code, ss_config=self.ss_config, max_points=self.max_points)
+        voltage = self.get('voltage')
+        self.timed('plot_voltage', plot_voltage, self.project_name, self.get_lod('voltage') or voltage,
+                   ss_code=self.ss_code, ss_config=self.ss_config, max_points=self.max_points)
+        return self.timing
+
+
+def get_bin_range(bt_range_df):
+    """
+    Convert the bottom track range to the bin of the bottom.
+    The average of the good beams is used.
+    :param bt_range_df: Bottom track range from get_bottom_track_range().
+    :return: Dataframe with the BinRange column added.
+    """
+    if bt_range_df is None or bt_range_df.empty:
+        return bt_range_df
+
+    ranges = bt_range_df[['RangeBeam0', 'RangeBeam1', 'RangeBeam2', 'RangeBeam3']].astype(float)
+    ranges[ranges <= 0.0] = np.nan                              # Bad range
+    avg_range = ranges.mean(axis=1)
+    bt_range_df['BinRange'] = (avg_range - bt_range_df['RangeFirstBin'].astype(float)) / bt_range_df['BinSize'].astype(float)
+    return bt_range_df
+
+
+def subsystem_job(project_name, project_idx, adcp, ss_code, ss_config, max_points=None, lod_dir=None):
+    """
+    Job run in a worker process to create the report for a subsystem.
+    :return: (Subsystem code, Subsystem config, Time of each stage)
+    """
+    report = SubsystemReport(_sql, project_name, project_idx, adcp, ss_code, ss_config, max_points, lod_dir)
+    return ss_code, ss_config, report.render()
+
+
+def build_report(conn_string, project_name, project_idx, processes=None, max_points=None, lod_dir=None):
+    """
+    Create the report for all the subsystem configurations in the project.
+    Each subsystem is queried and rendered in its own worker process.
+    :param conn_string: Database connection string.
+    :param project_name: Project name for the file names.
+    :param project_idx: Project index.
+    :param processes: Number of worker processes.  If None, one for each subsystem.  If 1, run in this process.
+    :param max_points: Maximum number of points to embed in each plot.
+    :param lod_dir: Folder to save and load the level of detail pyramids.  If None, they are not saved.
+    :return: Dictionary of the time of each stage for each subsystem.  The total is in 'total'.
+    """
+    start = time.perf_counter()
+    timing = {}
+
+    # Plots are saved to the html folder
+    if not os.path.exists('html'):
+        os.makedirs('html')
+    if lod_dir and not os.path.exists(lod_dir):
+        os.makedirs(lod_dir)
+
+    # Project information shared by all the subsystems
+    sql = rti_sql(conn_string)
+    adcp = sql.get_adcp_info(project_idx)
+    ss_configs = sql.get_subsystem_configs(project_idx)
+    sql.close()
+    jobs = []
+    if ss_configs is not None:                                  # None if the query failed
+        jobs = [(project_name, project_idx, adcp, row['subsystemcode'], row['subsystemconfig'], max_points, lod_dir)
+                for index, row in ss_configs.iterrows()]
+    timing['setup'] = time.perf_counter() - start
+
+    if processes is None:
+        processes = min(len(jobs), multiprocessing.cpu_count())
+
+    if not jobs:
+        results = []
+    elif processes <= 1:
+        init_worker(conn_string)
+        try:
+            results = [subsystem_job(*job) for job in jobs]
+        finally:
+            close_worker()
+    else:
+        pool = multiprocessing.Pool(processes=processes, initializer=init_worker, initargs=(conn_string,))
+        try:
+            results = pool.starmap(subsystem_job, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    for ss_code, ss_config, ss_timing in results:
+        timing["{}_{}".format(ss_config, ss_code)] = ss_timing
+    timing['total'] = time.perf_counter() - start
+    return timing
+
+
+def print_timing(timing):
+    """
+    Print the time of each stage.
+    :param timing: Timing from build_report().
+    """
+    print("Setup: {0:.2f} s".format(timing['setup']))
+    for ss, ss_timing in timing.items():
+        if ss in ('setup', 'total'):
+            continue
+        print("Subsystem " + ss)
+        for stage, stage_time in ss_timing.items():
+            print("\t{0:20}: {1:.2f} s".format(stage, stage_time))
+    print("Total: {0:.2f} s".format(timing['total']))
+
+
+def main(argv):
+    conn_string = "host='localhost' port='5432' dbname='rti' user='test' password='123456'"
+    project_name = ''
+    project_idx = 1
+    processes = None
+    max_points = None
+    lod_dir = None
+    usage = 'project_report.py -c <conn string> -n <project name> -p <project index> -w <worker processes> -m <max points> -l <lod folder>'
+    try:
+        opts, args = getopt.getopt(argv, "hc:n:p:w:m:l:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-c"):
+            conn_string = arg
+        elif opt in ("-n"):
+            project_name = arg
+        elif opt in ("-p"):
+            project_idx = int(arg)
+        elif opt in ("-w"):
+            processes = int(arg)
+        elif opt in ("-m"):
+            max_points = int(arg)
+        elif opt in ("-l"):
+            lod_dir = arg
+
+    print_timing(build_report(conn_string, project_name, project_idx, processes, max_points, lod_dir))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+
+class _StubSql:
+    """
+    Database with a small project of two subsystems for the tests.
+    """
+    calls = []
+    ss_configs = pd.DataFrame({'subsystemcode': ['2', '3'], 'subsystemconfig': [0, 1]})
+
+    def __init__(self, conn_string=None):
+        pass
+
+    def close(self):
+        pass
+
+    def get_adcp_info(self, project_idx):
+        return {'numbins': 3}
+
+    def get_subsystem_configs(self, project_idx):
+        return _StubSql.ss_configs
+
+    def get_earth_vel_data(self, project_idx, beam, ss_code, ss_config):
+        _StubSql.calls.append(('earth_vel', beam, ss_code))
+        df = pd.DataFrame({'ensnum': np.arange(100), 'numbeams': 4, 'numbins': 3, 'beam': beam})
+        for bin_num in range(3):
+            df['bin' + str(bin_num)] = np.full(100, 0.1 * (beam + 1))
+        return df
+
+    def get_bottom_track_range(self, project_idx, ss_code, ss_config):
+        _StubSql.calls.append(('bt_range', ss_code))
+        return pd.DataFrame({'RangeBeam0': [10.0, 11.0], 'RangeBeam1': [12.0, 11.0], 'RangeBeam2': [11.0, 0.0],
+                             'RangeBeam3': [11.0, -1.0], 'RangeFirstBin': [1.0, 1.0], 'BinSize': [2.0, 2.0]})
+
+    def get_compass_data(self, project_idx, ss_code, ss_config):
+        _StubSql.calls.append(('compass', ss_code))
+        return pd.DataFrame({'datetime': pd.date_range('2020-01-01', periods=100, freq='min'),
+                             'heading': np.arange(100) * 7.0 % 360.0})
+
+    def get_voltage_data(self, project_idx, ss_code, ss_config):
+        _StubSql.calls.append(('voltage', ss_code))
+        return pd.DataFrame({'ensnum': np.arange(100),
+                             'datetime': pd.date_range('2020-01-01', periods=100, freq='min'),
+                             'voltage': np.linspace(12.0, 11.0, 100)})
+
+
+def _stub_plots(monkeypatch, plots):
+    """
+    Replace the plots, so only the arguments are kept.
+    """
+    module = sys.modules[__name__]
+    for name in ['plot_mag_dir', 'plot_heading', 'plot_voltage']:
+        monkeypatch.setattr(module, name, lambda *args, _name=name, **kwargs: plots.append((_name, args, kwargs)))
+
+
+def test_subsystem_report_get():
+    _StubSql.calls = []
+    report = SubsystemReport(_StubSql(), 'test', 1, {'numbins': 3}, '2', 0)
+
+    compass = report.get('compass')
+    assert report.get('compass') is compass
+    assert _StubSql.calls == [('compass', '2')]
+    assert list(report.timing.keys()) == ['query_compass']
+
+    # The magnitude uses the East, North and Bottom Track range queries
+    assert report.get_mag_dir() is report.get_mag_dir()
+    assert sorted(_StubSql.calls) == [('bt_range', '2'), ('compass', '2'), ('earth_vel', 0, '2'), ('earth_vel', 1, '2')]
+
+    with pytest.raises(ValueError):
+        report.get('unknown')
+
+
+def test_subsystem_report_lod(tmpdir, monkeypatch):
+    plots = []
+    _stub_plots(monkeypatch, plots)
+    report = SubsystemReport(_StubSql(), 'test', 1, {'numbins': 3}, '2', 0, max_points=10, lod_dir=str(tmpdir))
+    report.render()
+
+    # Each plot is given the pyramid built for the subsystem
+    assert isinstance(report.get_lod('compass'), LodPyramid)
+    assert [plot[1][1] for plot in plots if plot[0] != 'plot_mag_dir'] == [report.get_lod('compass'), report.get_lod('voltage')]
+    assert plots[0][2]['vel_lod'] is report.get_lod('mag_dir')
+    assert plots[0][2]['bt_range_lod'] is None                  # 2 ranges fit in max_points
+    assert sorted(os.listdir(str(tmpdir))) == ['test_0_2_compass.lod', 'test_0_2_mag_dir.lod', 'test_0_2_voltage.lod']
+
+    # Loaded from the folder the next time
+    loaded = SubsystemReport(_StubSql(), 'test', 1, {'numbins': 3}, '2', 0, max_points=10, lod_dir=str(tmpdir))
+    assert loaded.get_lod('voltage').levels[0]['x'].tolist() == report.get_lod('voltage').levels[0]['x'].tolist()
+    assert 'query_voltage' in loaded.timing
+
+    # All the points fit
+    report = SubsystemReport(_StubSql(), 'test', 1, {'numbins': 3}, '2', 0, max_points=100)
+    assert report.get_lod('voltage') is None
+
+
+def test_get_bin_range():
+    df = get_bin_range(_StubSql().get_bottom_track_range(1, '2', 0))
+
+    # Bad ranges (0 or less) are not in the average
+    assert df['BinRange'].tolist() == [5.0, 5.0]
+    assert get_bin_range(None) is None
+    assert get_bin_range(pd.DataFrame()).empty
+
+
+def test_build_report(tmpdir, monkeypatch):
+    plots = []
+    _stub_plots(monkeypatch, plots)
+    monkeypatch.setattr(sys.modules[__name__], 'rti_sql', _StubSql)
+    monkeypatch.chdir(str(tmpdir))
+
+    timing = build_report('conn', 'test', 1, processes=1)
+
+    assert list(timing.keys()) == ['setup', '0_2', '1_3', 'total']
+    assert list(timing['0_2'].keys()) == ['query_earth_east', 'query_earth_north', 'query_bt_range', 'calc_mag_dir',
+                                          'plot_mag_dir', 'query_compass', 'plot_heading', 'query_voltage', 'plot_voltage']
+    assert [plot[0] for plot in plots] == ['plot_mag_dir', 'plot_heading', 'plot_voltage'] * 2
+    assert os.path.isdir('html')
+
+    # No subsystems if the query fails
+    monkeypatch.setattr(_StubSql, 'ss_configs', None)
+    assert list(build_report('conn', 'test', 1, processes=1).keys()) == ['setup', 'total']
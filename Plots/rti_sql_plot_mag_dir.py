@@ -10,9 +10,10 @@ import numpy as np
 from scipy.interpolate import interp1d
 import rti_python.Plots.dataframe_html_table_summary as df_summary
 import rti_python.Plots.csv_summary as csv_summary
+from rti_python.Plots.lod_pyramid import LodPyramid, get_lod
 
 
-def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_bins, bt_range_df=None, ss_code=None, ss_config=None, max_vel=80.0, smoothing='hamming', smoothing_win=50, flip_y_axis=False):
+def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_bins, bt_range_df=None, ss_code=None, ss_config=None, max_vel=80.0, smoothing='hamming', smoothing_win=50, flip_y_axis=False, max_points=None, streamline_density=None, mag_dir=None, vel_lod=None, bt_range_lod=None):
     """
     Create a magnitude and direction plots.  This will use the incoming East and North velocities.
     :param project_name: Project name for the file name.
@@ -27,6 +28,11 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
     :param smoothing: Smoothing function to use. (boxcar,blackman,hamming,bartlett,blackmanharris,NONE)
     :param smoothing_win: Smoothing window.
     :param flip_y_axis: Flip the x axis so minimum is at top.
+    :param max_points: Maximum number of ensembles to embed in the plots.  If None, all the ensembles are plotted.
+    :param streamline_density: Draw the streamlines of the water flow on the vector plot with this density.  If None, no streamlines are drawn.
+    :param mag_dir: Result of calc_mag_dir() for the velocities.  If None, it is calculated.
+    :param vel_lod: LodPyramid from build_mag_dir_lod().  If None, it is built when the ensembles do not fit in max_points.
+    :param bt_range_lod: LodPyramid of the BinRange in mag_dir['bt_range'].  If None, it is built when the ensembles do not fit in max_points.
     :return:
     """
     # BAD VELOCITY
@@ -52,23 +58,13 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
         num_bins = adcp['numbins']
     num_ens = len(earth_vel_east_df.index)
 
-    # Init the data
-    x0_ens = []
-    y0_ens = []
-    x1_ens = []
-    y1_ens = []
-    length_vals = []
-    speed_vals = []
-
     # Clean up the data
-    earth_vel_east_df = earth_vel_east_df.drop(['ensnum', 'numbeams', 'numbins', 'beam'], axis=1)      # Ensemble number and beam column not needed
-    earth_vel_north_df = earth_vel_north_df.drop(['ensnum', 'numbeams', 'numbins', 'beam'], axis=1)    # Ensemble number and beam column not needed
-    earth_vel_east_df = earth_vel_east_df.interpolate()                         # Fill in any missing data (mean of prev/next)
-    earth_vel_north_df = earth_vel_north_df.interpolate()                       # Fill in any missing data
-    earth_vel_east_df = earth_vel_east_df.replace([None], 0.0)                  # Remove None so we can square
-    earth_vel_north_df = earth_vel_north_df.replace([None], 0.0)                # Remove None so we can square
-    earth_vel_east_df[earth_vel_east_df >= max_vel] = 0.0                       # Values marked bad set to 0
-    earth_vel_north_df[earth_vel_north_df >= max_vel] = 0.0                     # Values marked bad set to 0
+    if mag_dir is None:
+        mag_dir = calc_mag_dir(earth_vel_east_df, earth_vel_north_df, bt_range_df, max_vel, smoothing, smoothing_win)
+    earth_vel_east_df = mag_dir['east']
+    earth_vel_north_df = mag_dir['north']
+    df_mag = mag_dir['mag']
+    bt_range_df = mag_dir['bt_range']
 
     # DataTable and CSV for East and North Velocity
     file_name = project_name + '{}_Summary East Velocity.html'.format(ss_str)
@@ -84,60 +80,40 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
     file_name = os.path.join('html', file_name)
     csv_summary.generate_csv(file_name, earth_vel_north_df)
 
-
-    # Calculate the magnitude
-    df_mag = pd.DataFrame(np.sqrt(np.square(earth_vel_east_df) + np.square(earth_vel_north_df)))
-    df_mag[df_mag >= max_vel] = 0.0  # Values marked bad set to 0
-    # df_mag[(~(np.abs(df_mag-df_mag.mean()) > (1*df_mag.std())))] = 0.0
-    # df_mag[(np.abs(df_mag-df_mag.mean())<=(5.0*df_mag.std()))] = 0.0
-    # print(df_mag)
-
-    # Average the data
-    if smoothing:
-        df_mag = df_mag.rolling(window=smoothing_win, win_type=smoothing).mean()
-        df_mag = df_mag.replace([None], 0.0)                # Remove NaN
-
-        if bt_range_df is not None and not bt_range_df.empty:
-            print(bt_range_df)
-            bt_range_df["SmoothedBinRange"] = bt_range_df["BinRange"].rolling(window=5).mean()
-            #bt_range_df["BinRange"] = bt_range_df["SmoothedBinRange"].bfill()         # bfill used to replace NaN for the first window values with the first good value
-            bt_range_df["BinRange"] = bt_range_df["BinRange"].interpolate()           # Fill in any missing data (mean of prev/next)
-            print(bt_range_df)
-
     # Calculate the direction
     df_dir = pd.DataFrame(np.degrees(np.arctan2(earth_vel_east_df, earth_vel_north_df)))
 
-    # Create the quivers
-    for index, row in df_mag.iterrows():
-
-        for bin_loc in range(num_bins):
-            bin_str = 'bin' + str(bin_loc)
-
-            ens_loc = index
-            mag = row[bin_str]
-            vel_dir = df_dir.iloc[ens_loc][bin_str]
-            speed_vals.append(mag)
-
-            # Correct direction
-            if vel_dir < 0:
-                vel_dir = 360.0 + vel_dir
+    # Reduce the ensembles to fit the display
+    # Each tile is plotted at its center with the width of the tile
+    tile_size = np.ones(len(df_mag.index))
+    if max_points is not None and len(df_mag.index) > max_points:
+        if vel_lod is None:
+            vel_lod = build_mag_dir_lod(mag_dir)
+        level = vel_lod.get_level(max_points)
+        bin_cols = list(df_mag.columns)
+        df_mag = level[bin_cols]
+        df_dir = pd.DataFrame(np.degrees(np.arctan2(np.asarray(level[['east_' + col for col in bin_cols]].values, dtype=float),
+                                                    np.asarray(level[['north_' + col for col in bin_cols]].values, dtype=float))),
+                              index=level.index, columns=bin_cols)
+        tile_size = np.asarray(level['tile_size'], dtype=float)
+        tile_center = np.asarray(df_mag.index, dtype=float) + (tile_size - 1) / 2.0
+        df_mag.index = tile_center
+        df_dir.index = tile_center
 
-            # Apply scale factor to length
-            length_val = mag / SCALE_FACTOR  # Scale the length to fit better on the screen
-            length_vals.append(length_val)
-
-            # Generate angle for water direction
-            x1_val = ens_loc + length_val * np.cos(vel_dir)
-            y1_val = bin_loc + length_val * np.sin(vel_dir)
-
-            x0_ens.append(ens_loc)  # X = ensemble
-            y0_ens.append(bin_loc)  # Y = bin
-            x1_ens.append(x1_val)  # x1 = length and angle
-            y1_ens.append(y1_val)  # y1 = length and angle
+        if bt_range_df is not None and not bt_range_df.empty:
+            bt_range_df = get_lod(bt_range_lod if bt_range_lod is not None else bt_range_df, ['BinRange'], max_points)
+            if 'tile_size' in bt_range_df.columns:
+                # Same x as the magnitude tiles
+                bt_range_df.index = np.asarray(bt_range_df.index, dtype=float) + (np.asarray(bt_range_df['tile_size'], dtype=float) - 1) / 2.0
 
-    # Turn the 2D array to 1D
-    length = np.asarray(length_vals)
-    speed = np.asarray(speed_vals)
+    # Create the quivers
+    quivers = calc_quivers(df_mag, df_dir, num_bins, SCALE_FACTOR)
+    x0_ens = quivers['x0']
+    y0_ens = quivers['y0']
+    x1_ens = quivers['x1']
+    y1_ens = quivers['y1']
+    length = quivers['length']
+    speed = quivers['speed']
 
     """
     # Calculate the U and V directions for the direction lines
@@ -175,8 +151,7 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
     # cm = np.array(Virdis[256])
     # cm = np.array(PuBu[9])
     # cm = np.array(['#f7fbff', '#deebf7', '#c6dbef', '#6baed6', '#9ecae1', '#4292c6', '#2171b5', '#084594'])  # White to Blue
-    ix = ((length - length.min()) / (length.max() - length.min()) * 5).astype('int')
-    colors = cm[ix]
+    colors = cm[calc_color_index(length, 5)]
     # this is the colormap from the original NYTimes plot
     mapper = LinearColorMapper(palette=cm, low=speed.min(), high=speed.max())
     color_bar = ColorBar(color_mapper=mapper, major_label_text_font_size="5pt",
@@ -195,20 +170,27 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
         print("Upward Facing ADCP")
 
 
-    # p3 = figure(x_range=p1.x_range, y_range=p1.y_range)
-    # p3.multi_line(xs, ys, color="#ee6666", line_width=2, line_alpha=0.8)
+    # Draw the streamlines of the water flow
+    if streamline_density and len(earth_vel_east_df.index) > 1 and num_bins > 1:
+        bin_cols = ['bin' + str(bin_loc) for bin_loc in range(num_bins)]
+        xs, ys = streamlines(np.arange(len(earth_vel_east_df.index), dtype=float), np.arange(num_bins, dtype=float),
+                             np.asarray(earth_vel_east_df[bin_cols], dtype=float).T,
+                             np.asarray(earth_vel_north_df[bin_cols], dtype=float).T,
+                             density=streamline_density)
+        p1.multi_line(xs, ys, color="#ee6666", line_width=2, line_alpha=0.8)
 
     # Combine the data into a Data frame for ColumnDataSource for the plot
     speed_df = pd.DataFrame()
-    speed_df['speed'] = speed_vals
+    speed_df['speed'] = speed
     speed_df['ens'] = x0_ens
     speed_df['bin'] = y0_ens
+    speed_df['width'] = np.repeat(tile_size, num_bins)
     source = ColumnDataSource(speed_df)
 
     # Create Magnitude plot
     p2 = figure(x_range=p1.x_range, y_range=p1.y_range, tools=TOOLS, toolbar_location='left',
                 title="{} - Water Profile - Water Velocity".format(project_name))
-    p2.rect(x='ens', y='bin', width=1, height=1, source=source, fill_color=transform('speed', mapper), dilate=True,
+    p2.rect(x='ens', y='bin', width='width', height=1, source=source, fill_color=transform('speed', mapper), dilate=True,
             line_color=None)
     p2.xaxis.axis_label = "Ensembles"
     p2.yaxis.axis_label = 'Bins'
@@ -252,170 +234,316 @@ def plot_mag_dir(project_name, adcp, earth_vel_east_df, earth_vel_north_df, num_
     save(gridplot([[p2]], sizing_mode='stretch_both'))  # Just save to file
 
 
-def streamlines(self, x, y, u, v, density=1):
-    ''' Return streamlines of a vector flow.
+def calc_mag_dir(earth_vel_east_df, earth_vel_north_df, bt_range_df=None, max_vel=80.0, smoothing='hamming', smoothing_win=50):
+    """
+    Clean up the East and North velocities and calculate the magnitude.
+    :param earth_vel_east_df: East velocity dataframe. [ensnum, numbeams, numbins, beam, bin0 ... bin199]
+    :param earth_vel_north_df: North velocity dataframe. [ensnum, numbeams, numbins, beam, bin0 ... bin199]
+    :param bt_range_df: Average depth for each ensemble.  The dataframe is not changed.
+    :param max_vel: Maximum velocity to remove the BAD_Velocity and screen data.
+    :param smoothing: Smoothing function to use. (boxcar,blackman,hamming,bartlett,blackmanharris,NONE)
+    :param smoothing_win: Smoothing window.
+    :return: Dictionary with the east, north and mag dataframes [bin0 ... bin199] and the bt_range dataframe.
+    """
+    earth_vel_east_df = earth_vel_east_df.drop(['ensnum', 'numbeams', 'numbins', 'beam'], axis=1)      # Ensemble number and beam column not needed
+    earth_vel_north_df = earth_vel_north_df.drop(['ensnum', 'numbeams', 'numbins', 'beam'], axis=1)    # Ensemble number and beam column not needed
+    earth_vel_east_df = earth_vel_east_df.interpolate()                         # Fill in any missing data (mean of prev/next)
+    earth_vel_north_df = earth_vel_north_df.interpolate()                       # Fill in any missing data
+    earth_vel_east_df = earth_vel_east_df.replace([None], 0.0)                  # Remove None so we can square
+    earth_vel_north_df = earth_vel_north_df.replace([None], 0.0)                # Remove None so we can square
+    earth_vel_east_df[earth_vel_east_df >= max_vel] = 0.0                       # Values marked bad set to 0
+    earth_vel_north_df[earth_vel_north_df >= max_vel] = 0.0                     # Values marked bad set to 0
+
+    # Calculate the magnitude
+    df_mag = pd.DataFrame(np.sqrt(np.square(earth_vel_east_df) + np.square(earth_vel_north_df)))
+    df_mag[df_mag >= max_vel] = 0.0  # Values marked bad set to 0
+    # df_mag[(~(np.abs(df_mag-df_mag.mean()) > (1*df_mag.std())))] = 0.0
+    # df_mag[(np.abs(df_mag-df_mag.mean())<=(5.0*df_mag.std()))] = 0.0
+    # print(df_mag)
+
+    # Average the data
+    if smoothing:
+        df_mag = df_mag.rolling(window=smoothing_win, win_type=smoothing).mean()
+        df_mag = df_mag.replace([None], 0.0)                # Remove NaN
+
+        if bt_range_df is not None and not bt_range_df.empty:
+            bt_range_df = bt_range_df.copy()
+            print(bt_range_df)
+            bt_range_df["SmoothedBinRange"] = bt_range_df["BinRange"].rolling(window=5).mean()
+            #bt_range_df["BinRange"] = bt_range_df["SmoothedBinRange"].bfill()         # bfill used to replace NaN for the first window values with the first good value
+            bt_range_df["BinRange"] = bt_range_df["BinRange"].interpolate()           # Fill in any missing data (mean of prev/next)
+            print(bt_range_df)
 
-    * x and y are 1d arrays defining an *evenly spaced* grid.
-    * u and v are 2d arrays (shape [y,x]) giving velocities.
-    * density controls the closeness of the streamlines. For different
-      densities in each direction, use a tuple or list [densityx, densityy].
+    return {'east': earth_vel_east_df, 'north': earth_vel_north_df, 'mag': df_mag, 'bt_range': bt_range_df}
 
-    '''
 
-    # Set up some constants - size of the grid used.
+def build_mag_dir_lod(mag_dir):
+    """
+    Build a single level of detail pyramid for the magnitude and the East and North velocities.
+    The magnitude keeps the bin column names.  The velocities are in the east_<bin> and north_<bin> columns,
+    so the direction of each tile is calculated from the mean velocities.
+    :param mag_dir: Result of calc_mag_dir().
+    :return: LodPyramid.
+    """
+    df = pd.concat([mag_dir['mag'], mag_dir['east'].add_prefix('east_'), mag_dir['north'].add_prefix('north_')], axis=1)
+    return LodPyramid(df, list(df.columns))
+
+
+def calc_quivers(df_mag, df_dir, num_bins, scale_factor=1):
+    """
+    Calculate the quivers for every ensemble and bin.  The values are
+    ordered by ensemble, then bin.
+    :param df_mag: Magnitude dataframe. [bin0 ... bin199]
+    :param df_dir: Direction dataframe in degrees. [bin0 ... bin199]
+    :param num_bins: Number of bins to use.
+    :param scale_factor: Scale factor to allow the quivers to fit on the screen.
+    :return: Dictionary of 1D arrays: x0, y0, x1, y1, length, speed.
+    """
+    bin_cols = ['bin' + str(bin_loc) for bin_loc in range(num_bins)]
+    mag = np.asarray(df_mag[bin_cols].values, dtype=float)
+    vel_dir = np.asarray(df_dir[bin_cols].values, dtype=float)
+
+    # Correct direction
+    vel_dir = np.where(vel_dir < 0, 360.0 + vel_dir, vel_dir)
+
+    # Apply scale factor to length
+    length = mag / scale_factor
+
+    # X = ensemble, Y = bin
+    x0, y0 = np.meshgrid(np.asarray(df_mag.index.values, dtype=float), np.arange(num_bins, dtype=float), indexing='ij')
+
+    # Generate angle for water direction
+    # The direction is passed to cos/sin as is, so the plots match the previous reports
+    x1 = x0 + length * np.cos(vel_dir)
+    y1 = y0 + length * np.sin(vel_dir)
+
+    return {'x0': x0.ravel(),
+            'y0': y0.ravel(),
+            'x1': x1.ravel(),
+            'y1': y1.ravel(),
+            'length': length.ravel(),
+            'speed': mag.ravel()}
+
+
+def calc_color_index(length, max_index):
+    """
+    Scale the lengths to a color index.
+    :param length: Quiver lengths.
+    :param max_index: Index for the longest quiver.
+    :return: Color index for each length.
+    """
+    return ((length - length.min()) / (length.max() - length.min()) * max_index).astype('int')
+
+
+def streamlines(x, y, u, v, density=1, ds=0.01, max_length=2.0, min_length=0.2, num_slots=256):
+    """
+    Return streamlines of a vector flow.
+
+    The seeds are integrated together with RK4, forward and backward, as
+    arrays.  Each seed uses a slot until both its directions stop, then the
+    slot is given to the next seed.  A blank (occupancy) grid stops the
+    streamlines from running into each other.
+    :param x: 1D array defining an evenly spaced grid. (Ensembles)
+    :param y: 1D array defining an evenly spaced grid. (Bins)
+    :param u: 2D array (shape [y,x]) giving the velocities in x.
+    :param v: 2D array (shape [y,x]) giving the velocities in y.
+    :param density: Closeness of the streamlines.  For different densities in each direction, use [densityx, densityy].
+    :param ds: Integration step in axes coordinates.
+    :param max_length: Maximum length of each direction of a streamline in axes coordinates.
+    :param min_length: Streamlines shorter than this are removed.
+    :param num_slots: Number of seeds integrated together.
+    :return: List of the x arrays, List of the y arrays.
+    """
+    # Size of the grid
     NGX = len(x)
     NGY = len(y)
 
     # Constants used to convert between grid index coords and user coords.
-    DX = x[1]-x[0]
-    DY = y[1]-y[0]
+    DX = x[1] - x[0]
+    DY = y[1] - y[0]
     XOFF = x[0]
     YOFF = y[0]
 
-    # Now rescale velocity onto axes-coordinates
-    u = u / (x[-1]-x[0])
-    v = v / (y[-1]-y[0])
-    speed = np.sqrt(u*u+v*v)
-    # s (path length) will now be in axes-coordinates, but we must
-    # rescale u for integrations.
-    u *= NGX
-    v *= NGY
-    # Now u and v in grid-coordinates.
-
-    NBX = int(30*density)
-    NBY = int(30*density)
-    blank = np.zeros((NBY,NBX))
-
-    bx_spacing = NGX/float(NBX-1)
-    by_spacing = NGY/float(NBY-1)
-
-    def blank_pos(xi, yi):
-        return int((xi / bx_spacing) + 0.5), \
-               int((yi / by_spacing) + 0.5)
-
-    def value_at(a, xi, yi):
-        if type(xi) == np.ndarray:
-            x = xi.astype(np.int)
-            y = yi.astype(np.int)
-        else:
-            x = np.int(xi)
-            y = np.int(yi)
-
-        a00 = a[y,x]
-        a01 = a[y,x+1]
-        a10 = a[y+1,x]
-        a11 = a[y+1,x+1]
-        xt = xi - x
-        yt = yi - y
-        a0 = a00*(1-xt) + a01*xt
-        a1 = a10*(1-xt) + a11*xt
-        return a0*(1-yt) + a1*yt
-
-    def rk4_integrate(x0, y0):
-        # This function does RK4 forward and back trajectories from
-        # the initial conditions, with the odd 'blank array'
-        # termination conditions. TODO tidy the integration loops.
-
-        def f(xi, yi):
-            dt_ds = 1./value_at(speed, xi, yi)
-            ui = value_at(u, xi, yi)
-            vi = value_at(v, xi, yi)
-            return ui*dt_ds, vi*dt_ds
-
-        def g(xi, yi):
-            dt_ds = 1./value_at(speed, xi, yi)
-            ui = value_at(u, xi, yi)
-            vi = value_at(v, xi, yi)
-            return -ui*dt_ds, -vi*dt_ds
-
-        check = lambda xi, yi: xi>=0 and xi<NGX-1 and yi>=0 and yi<NGY-1
-
-        bx_changes = []
-        by_changes = []
-
-        # Integrator function
-        def rk4(x0, y0, f):
-            ds = 0.01               # min(1./NGX, 1./NGY, 0.01)
-            stotal = 0
-            xi = x0
-            yi = y0
-            xb, yb = blank_pos(xi, yi)
-            xf_traj = []
-            yf_traj = []
-            while check(xi, yi):
-                # Time step. First save the point.
-                xf_traj.append(xi)
-                yf_traj.append(yi)
-                # Next, advance one using RK4
-                try:
-                    k1x, k1y = f(xi, yi)
-                    k2x, k2y = f(xi + .5*ds*k1x, yi + .5*ds*k1y)
-                    k3x, k3y = f(xi + .5*ds*k2x, yi + .5*ds*k2y)
-                    k4x, k4y = f(xi + ds*k3x, yi + ds*k3y)
-                except IndexError:
-                    # Out of the domain on one of the intermediate steps
-                    break
-                xi += ds*(k1x+2*k2x+2*k3x+k4x) / 6.
-                yi += ds*(k1y+2*k2y+2*k3y+k4y) / 6.
-                # Final position might be out of the domain
-                if not check(xi, yi): break
-                stotal += ds
-                # Next, if s gets to thres, check blank.
-                new_xb, new_yb = blank_pos(xi, yi)
-                if new_xb != xb or new_yb != yb:
-                    # New square, so check and colour. Quit if required.
-                    if blank[new_yb,new_xb] == 0:
-                        blank[new_yb,new_xb] = 1
-                        bx_changes.append(new_xb)
-                        by_changes.append(new_yb)
-                        xb = new_xb
-                        yb = new_yb
-                    else:
-                        break
-                if stotal > 2:
-                    break
-            return stotal, xf_traj, yf_traj
-
-        integrator = rk4
-
-        sf, xf_traj, yf_traj = integrator(x0, y0, f)
-        sb, xb_traj, yb_traj = integrator(x0, y0, g)
-        stotal = sf + sb
-        x_traj = xb_traj[::-1] + xf_traj[1:]
-        y_traj = yb_traj[::-1] + yf_traj[1:]
-
-        # Tests to check length of traj. Remember, s in units of axes.
-        if len(x_traj) < 1: return None
-        if stotal > .2:
-            initxb, inityb = blank_pos(x0, y0)
-            blank[inityb, initxb] = 1
-            return x_traj, y_traj
-        else:
-            for xb, yb in zip(bx_changes, by_changes):
-                blank[yb, xb] = 0
-            return None
-
-    # A quick function for integrating trajectories if blank==0.
-    trajectories = []
+    # Rescale velocity onto axes-coordinates
+    u = np.asarray(u, dtype=float) / (x[-1] - x[0])
+    v = np.asarray(v, dtype=float) / (y[-1] - y[0])
+    speed = np.sqrt(u * u + v * v)
+
+    # s (path length) will be in axes-coordinates, but u and v are
+    # integrated in grid-coordinates
+    u = u * NGX
+    v = v * NGY
+
+    # Interpolate u, v and speed together
+    uvs = np.stack([u, v, speed])
+
+    # Blank grid
+    if np.isscalar(density):
+        density = [density, density]
+    NBX = int(30 * density[0])
+    NBY = int(30 * density[1])
+    blank = np.zeros(NBY * NBX, dtype=bool)
+    bx_spacing = NGX / float(NBX - 1)
+    by_spacing = NGY / float(NBY - 1)
+
+    def blank_index(xi, yi):
+        """
+        Index in the blank grid for each position.
+        """
+        xb = np.minimum((xi / bx_spacing + 0.5).astype(int), NBX - 1)
+        yb = np.minimum((yi / by_spacing + 0.5).astype(int), NBY - 1)
+        return yb * NBX + xb
+
+    def values_at(xi, yi):
+        """
+        Bilinear interpolation of u, v and speed at each position.
+        """
+        xg = xi.astype(int)
+        yg = yi.astype(int)
+        xt = xi - xg
+        yt = yi - yg
+        a0 = uvs[:, yg, xg] * (1 - xt) + uvs[:, yg, xg + 1] * xt
+        a1 = uvs[:, yg + 1, xg] * (1 - xt) + uvs[:, yg + 1, xg + 1] * xt
+        return a0 * (1 - yt) + a1 * yt
+
+    def in_domain(xi, yi):
+        return (xi >= 0) & (xi < NGX - 1) & (yi >= 0) & (yi < NGY - 1)
+
+    def f(xi, yi, direction):
+        ui, vi, si = values_at(xi, yi)
+        dt_ds = direction / si
+        return ui * dt_ds, vi * dt_ds
+
+    # Seeds, ordered from the edges of the blank grid inwards
+    seeds = []
+    seen = set()
+    for indent in range(max(NBX, NBY) // 2):
+        for xi in range(max(NBX, NBY) - 2 * indent):
+            for xb, yb in [(xi + indent, indent), (xi + indent, NBY - 1 - indent),
+                           (indent, xi + indent), (NBX - 1 - indent, xi + indent)]:
+                if 0 <= xb < NBX and 0 <= yb < NBY and (xb, yb) not in seen:
+                    seen.add((xb, yb))
+                    seeds.append((xb, yb))
+    seeds = np.array(seeds, dtype=int)
+    seed_cells = seeds[:, 1] * NBX + seeds[:, 0]
+    next_seed = 0
+
+    # Slot s holds the forward trajectory in s and the backward trajectory in s + num_slots
+    max_steps = int(max_length / ds) + 1
+    slot_seed = np.full(num_slots, -1)
+    direction = np.repeat([1.0, -1.0], num_slots)
+    xi = np.zeros(2 * num_slots)
+    yi = np.zeros(2 * num_slots)
+    cell = np.zeros(2 * num_slots, dtype=int)
+    running = np.zeros(2 * num_slots, dtype=bool)
+    traj_x = np.zeros((2 * num_slots, max_steps + 1))
+    traj_y = np.zeros((2 * num_slots, max_steps + 1))
+    num_points = np.zeros(2 * num_slots, dtype=int)
+
+    def trim(index):
+        """
+        Cut the trajectory where it enters a blank square used by another streamline.
+        :return: Number of points kept, Blank squares of the points kept.
+        """
+        n = num_points[index]
+        cells = blank_index(traj_x[index, :n], traj_y[index, :n])
+        changed = np.concatenate([[False], cells[1:] != cells[:-1]])
+        hit = np.nonzero(changed & blank[cells])[0]
+        if len(hit):
+            n = hit[0]
+        return n, cells[:n]
 
-    def traj(xb, yb):
-        if xb < 0 or xb >= NBX or yb < 0 or yb >= NBY:
-            return
-        if blank[yb, xb] == 0:
-            t = rk4_integrate(xb*bx_spacing, yb*by_spacing)
-            if t is not None:
-                trajectories.append(t)
-
-    # Now we build up the trajectory set. I've found it best to look
-    # for blank==0 along the edges first, and work inwards.
-    for indent in range((max(NBX,NBY))//2):
-        for xi in range(max(NBX,NBY)-2*indent):
-            traj(xi+indent, indent)
-            traj(xi+indent, NBY-1-indent)
-            traj(indent, xi+indent)
-            traj(NBX-1-indent, xi+indent)
-
-    xs = [np.array(t[0])*DX+XOFF for t in trajectories]
-    ys = [np.array(t[1])*DY+YOFF for t in trajectories]
-
-    return xs, ys
\ No newline at end of file
+    trajectories = []
+    while True:
+        # Give the free slots to the next seeds not in a blank square
+        for slot in np.nonzero(slot_seed < 0)[0]:
+            while next_seed < len(seeds) and blank[seed_cells[next_seed]]:
+                next_seed += 1
+            if next_seed >= len(seeds):
+                break
+            slot_seed[slot] = next_seed
+            for index in [slot, slot + num_slots]:
+                xi[index] = seeds[next_seed, 0] * bx_spacing
+                yi[index] = seeds[next_seed, 1] * by_spacing
+                cell[index] = seed_cells[next_seed]
+                running[index] = in_domain(xi[index], yi[index])
+                num_points[index] = 0
+            next_seed += 1
+
+        if np.all(slot_seed < 0):
+            break
+
+        active = np.nonzero(running)[0]
+        if len(active):
+            # Save the point
+            traj_x[active, num_points[active]] = xi[active]
+            traj_y[active, num_points[active]] = yi[active]
+            num_points[active] += 1
+
+            # RK4.  Trajectories leaving the domain on an intermediate step are stopped.
+            x0 = xi[active]
+            y0 = yi[active]
+            d = direction[active]
+            ok = num_points[active] <= max_steps
+            kx = []
+            ky = []
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for scale in [0.0, 0.5, 0.5, 1.0]:
+                    if kx:
+                        xs = x0 + scale * ds * kx[-1]
+                        ys = y0 + scale * ds * ky[-1]
+                        inside = in_domain(xs, ys)
+                        ok &= inside
+                        xs = np.where(inside, xs, 0.0)
+                        ys = np.where(inside, ys, 0.0)
+                    else:
+                        xs = x0
+                        ys = y0
+                    k1, k2 = f(xs, ys, d)
+                    kx.append(k1)
+                    ky.append(k2)
+                x1 = x0 + ds * (kx[0] + 2 * kx[1] + 2 * kx[2] + kx[3]) / 6.0
+                y1 = y0 + ds * (ky[0] + 2 * ky[1] + 2 * ky[2] + ky[3]) / 6.0
+
+                # Final position might be out of the domain, or in a bad (zero speed) cell
+                ok &= np.isfinite(x1) & np.isfinite(y1)
+                ok &= in_domain(np.where(ok, x1, -1.0), np.where(ok, y1, -1.0))
+
+            # Entered a blank square.  Squares stay blank, so the trajectory would be trimmed there.
+            new_cell = blank_index(np.where(ok, x1, 0.0), np.where(ok, y1, 0.0))
+            ok &= (new_cell == cell[active]) | ~blank[new_cell]
+
+            xi[active] = x1
+            yi[active] = y1
+            cell[active] = new_cell
+            running[active[~ok]] = False
+
+        # Keep or remove the streamlines of the seeds that stopped in both directions
+        for slot in np.nonzero((slot_seed >= 0) & ~running[:num_slots] & ~running[num_slots:])[0]:
+            seed_cell = seed_cells[slot_seed[slot]]
+            slot_seed[slot] = -1
+            forward = slot
+            backward = slot + num_slots
+            if blank[seed_cell] or num_points[forward] == 0:
+                continue
+
+            nf, cells_f = trim(forward)
+            blank[cells_f] = True
+            nb, cells_b = trim(backward)
+            blank[cells_b] = True
+
+            # Path length in axes units
+            stotal = (max(nf - 1, 0) + max(nb - 1, 0)) * ds
+            if stotal > min_length:
+                blank[seed_cell] = True
+                trajectories.append((np.concatenate([traj_x[backward, :nb][::-1], traj_x[forward, 1:nf]]),
+                                     np.concatenate([traj_y[backward, :nb][::-1], traj_y[forward, 1:nf]])))
+            else:
+                # Remove the squares of the short streamline
+                blank[cells_f] = False
+                blank[cells_b] = False
+
+    xs = [t[0] * DX + XOFF for t in trajectories]
+    ys = [t[1] * DY + YOFF for t in trajectories]
+
+    return xs, ys
@@ -0,0 +1,437 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("Async File Writer")
+logger.setLevel(logging.ERROR)
+FORMAT = '[%(asctime)-15s][%(levelname)s][%(funcName)s] %(message)s'
+logging.basicConfig(format=FORMAT)
+
+
+class AsyncFileWriter:
+    """
+    Write the data to a file on a separate thread.
+
+    write() only adds the data to a bounded queue, so a slow disk will
+    not stop the data from being read.  If the queue is full, the data is
+    dropped and counted.  If a write fails, the data is counted as dropped
+    and close() raises the error.  The writer thread combines the queued data into
+    larger writes, syncs the file to disk based on the fsync setting and
+    creates a new file when the file is too large or too old.  The
+    completed files can be compressed on another thread.
+    """
+
+    # Compression for the completed files.  Compression: (Module, Extension)
+    COMPRESSION = {
+        "gzip": ("gzip", ".gz"),
+        "bz2": ("bz2", ".bz2"),
+        "xz": ("lzma", ".xz"),
+    }
+
+    def __init__(self, get_file_path,
+                 max_file_size=1048576 * 16,
+                 max_file_time=None,
+                 queue_size=1048576 * 64,
+                 coalesce_size=1048576,
+                 coalesce_time=0.5,
+                 fsync_interval=None,
+                 compress=None,
+                 opener=open):
+        """
+        :param get_file_path: Function to get the file path for a new file.
+        :param max_file_size: Create a new file when the file is larger than this in bytes.
+        :param max_file_time: Create a new file when the file is older than this in seconds.  None for no limit.
+        :param queue_size: Max number of bytes waiting to be written.  Data is dropped if the queue is full.
+        :param coalesce_size: Write when this many bytes are queued.
+        :param coalesce_time: Write the queued data at least this often in seconds.
+        :param fsync_interval: Seconds between syncing the file to disk.  0 to sync every write.  None to only flush.
+        :param compress: Compress the completed files.  None, "gzip", "bz2" or "xz".
+        :param opener: Function to open the file.  open(path, mode)
+        """
+        if compress is not None and compress not in AsyncFileWriter.COMPRESSION:
+            raise ValueError("Unknown compression: " + str(compress))
+
+        self.get_file_path = get_file_path
+        self.max_file_size = max_file_size
+        self.max_file_time = max_file_time
+        self.queue_size = queue_size
+        self.coalesce_size = coalesce_size
+        self.coalesce_time = coalesce_time
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+        self.opener = opener
+
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.condition = threading.Condition()
+        self.isAlive = True
+
+        # Current file
+        self.file = None
+        self.file_path = None
+        self.file_size = 0
+        self.file_start = 0
+        self.last_fsync = 0
+        self.files = []                 # All the completed files
+
+        # Stats
+        self.bytes_received = 0
+        self.bytes_written = 0
+        self.bytes_dropped = 0
+        self.max_queued_bytes = 0
+        self.num_writes = 0
+        self.num_errors = 0
+        self.error = None               # Last write error
+
+        self.compressor = None
+        if compress is not None:
+            self.compressor = ThreadPoolExecutor(max_workers=1)
+        self.compress_futures = []
+
+        self.thread = threading.Thread(name='AsyncFileWriter', target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, data):
+        """
+        Add the data to the queue to be written.  This will not block.
+        :param data: Data to write.
+        :return: TRUE if the data was queued.  FALSE if the queue was full and the data was dropped.
+        """
+        with self.condition:
+            self.bytes_received += len(data)
+            if self.queued_bytes + len(data) > self.queue_size:
+                self.bytes_dropped += len(data)
+                return False
+
+            self.queue.append(bytes(data))
+            self.queued_bytes += len(data)
+            self.max_queued_bytes = max(self.max_queued_bytes, self.queued_bytes)
+            if self.queued_bytes >= self.coalesce_size:
+                self.condition.notify()
+        return True
+
+    def run(self):
+        """
+        Writer thread.  Wait for enough data or time then write the queued data.
+        """
+        while True:
+            with self.condition:
+                if self.isAlive and self.queued_bytes < self.coalesce_size:
+                    self.condition.wait(self.get_wait_time())
+
+                # Take all the queued data
+                chunks = list(self.queue)
+                self.queue.clear()
+                self.queued_bytes = 0
+                is_alive = self.isAlive
+
+            data = b"".join(chunks)
+            written = self.bytes_written
+            try:
+                if data:
+                    self.write_file(data)
+
+                # Rotate old files even if no data is received
+                if self.file is not None and self.is_file_old():
+                    self.close_file()
+            except Exception as e:
+                logger.exception("Error writing the file.")
+                with self.condition:
+                    self.bytes_dropped += len(data) - (self.bytes_written - written)
+                    self.num_errors += 1
+                    self.error = e
+                self.abort_file()
+
+            if not is_alive:
+                break
+
+        self.close_file()
+
+    def get_wait_time(self):
+        """
+        Time to wait for the next write or file rotation.
+        :return: Seconds to wait.
+        """
+        wait = self.coalesce_time
+        if self.file is not None and self.max_file_time is not None:
+            wait = min(wait, max(self.file_start + self.max_file_time - time.time(), 0))
+        return wait
+
+    def write_file(self, data):
+        """
+        Write the data to the file.  Create a new file when the file is full.
+        :param data: Data to write.
+        """
+        while data:
+            if self.file is None:
+                self.open_file()
+
+            # Fill the current file, then start a new file
+            size = len(data)
+            if self.max_file_size is not None:
+                size = min(size, max(self.max_file_size - self.file_size, 0))
+
+            if size > 0:
+                self.file.write(data[:size])
+                self.file_size += size
+                self.bytes_written += size
+                self.num_writes += 1
+                data = data[size:]
+                self.sync_file(force=False)
+
+            if self.max_file_size is not None and self.file_size >= self.max_file_size:
+                self.close_file()
+
+    def sync_file(self, force):
+        """
+        Flush the file and sync it to disk based on the fsync interval.
+        :param force: Sync to disk if the fsync interval is set.
+        """
+        self.file.flush()
+        if self.fsync_interval is None:
+            return
+
+        now = time.time()
+        if force or now - self.last_fsync >= self.fsync_interval:
+            try:
+                os.fsync(self.file.fileno())
+            except (AttributeError, OSError, ValueError):
+                pass
+            self.last_fsync = now
+
+    def is_file_old(self):
+        """
+        :return: TRUE if the file is older than the max file time.
+        """
+        return self.max_file_time is not None and time.time() - self.file_start >= self.max_file_time
+
+    def open_file(self):
+        """
+        Open a new file.
+        """
+        self.file_path = self.get_file_path()
+        logger.debug("Open File name: " + self.file_path)
+        self.file = self.opener(self.file_path, 'wb')
+        self.file_size = 0
+        self.file_start = time.time()
+        self.last_fsync = self.file_start
+
+    def close_file(self):
+        """
+        Close the file and compress it.
+        """
+        if self.file is None:
+            return
+
+        logger.debug("Close the file: " + self.file_path)
+        try:
+            self.sync_file(force=True)
+        finally:
+            self.file.close()
+            self.file = None
+
+        if self.compressor is not None:
+            self.compress_futures.append(self.compressor.submit(self.compress_file, self.file_path))
+        else:
+            self.files.append(self.file_path)
+
+    def abort_file(self):
+        """
+        Close the file after a write error.  The next write will open a new file.
+        """
+        if self.file is None:
+            return
+
+        try:
+            self.file.close()
+        except Exception:
+            logger.exception("Error closing the file.")
+        self.files.append(self.file_path)
+        self.file = None
+
+    def compress_file(self, file_path):
+        """
+        Compress the file and remove the uncompressed file.
+        :param file_path: File to compress.
+        :return: Compressed file path.
+        """
+        module_name, ext = AsyncFileWriter.COMPRESSION[self.compress]
+        module = __import__(module_name)
+
+        compressed_path = file_path + ext
+        with open(file_path, 'rb') as f_in, module.open(compressed_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1048576)
+        os.remove(file_path)
+
+        self.files.append(compressed_path)
+        return compressed_path
+
+    def close(self):
+        """
+        Write all the queued data, close the file and wait for the compression to complete.
+        If a write failed, the last error is raised.  The stats give the bytes dropped.
+        """
+        with self.condition:
+            self.isAlive = False
+            self.condition.notify()
+        self.thread.join()
+
+        if self.compressor is not None:
+            self.compressor.shutdown(wait=True)
+            for future in self.compress_futures:
+                future.result()
+
+        if self.error is not None:
+            raise self.error
+
+    def get_stats(self):
+        """
+        Get the writer statistics.
+        :return: Dictionary of the stats.
+        """
+        with self.condition:
+            return {"bytes_received": self.bytes_received,
+                    "bytes_written": self.bytes_written,
+                    "bytes_dropped": self.bytes_dropped,
+                    "queued_bytes": self.queued_bytes,
+                    "max_queued_bytes": self.max_queued_bytes,
+                    "num_writes": self.num_writes,
+                    "num_errors": self.num_errors,
+                    "num_files": len(self.files) + (1 if self.file is not None else 0)}
+
+
+def _file_paths(folder_path):
+    """
+    Create a function to get a new file path in the folder.
+    """
+    index = [0]
+
+    def get_file_path():
+        file_path = os.path.join(folder_path, "Adcp" + str(index[0]) + ".ens")
+        index[0] += 1
+        return file_path
+    return get_file_path
+
+
+def test_rotate_compress(tmpdir):
+    import io
+    import gzip
+
+    class StallFile(io.FileIO):
+        """
+        File that stops responding once, like a slow disk.
+        """
+        size = 0
+
+        def write(self, data):
+            self.size += len(data)
+            if 20000 <= self.size < 20000 + len(data):
+                time.sleep(0.2)
+            return super().write(data)
+
+    folder_path = str(tmpdir)
+    writer = AsyncFileWriter(_file_paths(folder_path),
+                             max_file_size=10000,
+                             coalesce_size=4096,
+                             coalesce_time=0.05,
+                             fsync_interval=0,
+                             compress="gzip",
+                             opener=StallFile)
+
+    # The stall does not block write()
+    data = bytes(range(256)) * 200
+    start = time.time()
+    for i in range(0, len(data), 1000):
+        assert writer.write(data[i:i + 1000])
+    assert time.time() - start < 0.1
+    writer.close()
+
+    stats = writer.get_stats()
+    assert stats["bytes_dropped"] == 0
+    assert stats["bytes_written"] == len(data)
+
+    # 51200 bytes in 10000 byte files
+    files = sorted(writer.files, key=lambda path: int(os.path.basename(path)[4:-7]))
+    assert len(files) == 6
+    assert all(path.endswith(".ens.gz") for path in files)
+    assert not any(name.endswith(".ens") for name in os.listdir(folder_path))
+
+    result = b"".join(gzip.open(path, 'rb').read() for path in files)
+    assert result == data
+
+
+def test_rotate_time(tmpdir):
+    writer = AsyncFileWriter(_file_paths(str(tmpdir)), max_file_size=None, max_file_time=0.1, coalesce_time=0.02)
+    writer.write(b"1" * 100)
+    time.sleep(0.3)
+    writer.write(b"2" * 100)
+    writer.close()
+
+    assert len(writer.files) == 2
+    assert open(writer.files[0], 'rb').read() == b"1" * 100
+    assert open(writer.files[1], 'rb').read() == b"2" * 100
+
+
+def test_slow_disk_drop(tmpdir):
+    import io
+
+    class StallFile(io.FileIO):
+        """
+        File that stops responding on the first write.
+        """
+        stalled = False
+
+        def write(self, data):
+            if not self.stalled:
+                self.stalled = True
+                time.sleep(0.3)
+            return super().write(data)
+
+    # Disk stops responding for longer than the queue can hold
+    writer = AsyncFileWriter(_file_paths(str(tmpdir)),
+                             queue_size=8192,
+                             coalesce_size=1024,
+                             coalesce_time=0.01,
+                             opener=StallFile)
+    for i in range(40):
+        writer.write(b"\x80" * 1024)
+        time.sleep(0.005)
+    writer.close()
+
+    stats = writer.get_stats()
+    assert stats["bytes_dropped"] > 0
+    assert stats["max_queued_bytes"] <= 8192
+    assert stats["bytes_written"] + stats["bytes_dropped"] == stats["bytes_received"] == 40 * 1024
+    assert os.path.getsize(writer.files[0]) == stats["bytes_written"]
+
+
+def test_write_error(tmpdir):
+    import io
+    import pytest
+
+    class FullDisk(io.FileIO):
+        """
+        File that fails after 2048 bytes, like a full disk.
+        """
+        def write(self, data):
+            if self.tell() + len(data) > 2048:
+                raise OSError(28, "No space left on device")
+            return super().write(data)
+
+    writer = AsyncFileWriter(_file_paths(str(tmpdir)), coalesce_size=1024, coalesce_time=0.01, opener=FullDisk)
+    for i in range(8):
+        writer.write(b"\x80" * 1024)
+        time.sleep(0.02)
+
+    # The error is given to the caller and the lost data is counted
+    with pytest.raises(OSError):
+        writer.close()
+    stats = writer.get_stats()
+    assert stats["num_errors"] > 0
+    assert stats["bytes_dropped"] > 0
+    assert stats["bytes_written"] + stats["bytes_dropped"] == stats["bytes_received"] == 8 * 1024
@@ -6,6 +6,7 @@ import json
 from log import logger
 from Comm.EnsembleReceiver import EnsembleReceiver
 from Codecs.AdcpCodec import AdcpCodec
+from Codecs.CompressedEnsFile import open_ens_file
 
 
 class EnsembleFileReader:
@@ -51,6 +52,7 @@ class EnsembleFileReader:
         Process the file given.  This read from the file
         and add it to the codec.  The codec will then decode
         the data and pass it to the UDP port.
+        The file can be a raw or compressed ensemble file.
         """
         # Check if the file exist
         if os.path.exists(file_path):
@@ -58,7 +60,7 @@ class EnsembleFileReader:
             logger.info("Open file: " + file_path)
 
             # Open the file
-            f = open(file_path, "rb")
+            f = open_ens_file(file_path)
 
             # Add the data from the file to the codec
             data = f.read(4096)
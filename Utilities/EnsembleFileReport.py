@@ -3,7 +3,10 @@ import logging
 import os.path
 import sys
 import getopt
+import json
+import time
 from Ensemble.Ensemble import Ensemble
+from Codecs.CompressedEnsFile import open_ens_file, is_compressed_file
 
 from PyCRC.CRCCCITT import CRCCCITT
 
@@ -18,6 +21,18 @@ class EnsembleFileReport:
     Decode RoweTech ADCP Binary data.
     """
 
+    # Values saved in the state file for follow mode
+    STATE_KEYS = ["Offset", "NumEnsembles", "FirstEnsembleNum", "LastEnsembleNum", "NumGoodEnsembles",
+                  "NumBadEnsNum", "NumBadPayloadSize", "NumBadChecksum", "NumBadEnsembles",
+                  "NumIncompleteEnsembles", "ContainsMultipleRuns", "IsMissingEnsembles",
+                  "NumMissingEnsembles", "NumMissingRanges", "MissingEnsembles", "HeadersFound", "prevEnsNum"]
+
+    # Number of bytes read from the file at a time in follow mode
+    BLOCK_SIZE = 16 * 1024 * 1024
+
+    # Number of the latest missing ensemble ranges kept, so the state file does not keep growing
+    MAX_MISSING_RANGES = 1000
+
     def __init__(self, verbose=False):
         self.NumEnsembles = 0
         self.FirstEnsembleNum = 0
@@ -34,24 +49,28 @@ class EnsembleFileReport:
 
         self.IsMissingEnsembles = False
         self.NumMissingEnsembles = 0
-        self.MissingEnsembles = []
+        self.NumMissingRanges = 0
+        self.MissingEnsembles = []              # [First, Last] of the latest missing ensemble ranges
 
         self.HeadersFound = 0
 
         self.prevEnsNum = 0
 
+        # File position scanned to in follow mode
+        self.Offset = 0
+
         self.verbose = verbose
 
     def report(self, infile):
         """
-        Read a Rowe DVL/ADCP ensemble file (.ENS)
+        Read a Rowe DVL/ADCP ensemble file (.ENS) or compressed ensemble file (.ENSZ)
         """
         # Check if file exist
         if not os.path.isfile(infile):
             logger.error("File path does not exist: ", infile)
             sys.exit()
 
-        with open(infile, 'rb') as f:
+        with open_ens_file(infile) as f:
             # Read entire file.
             raw = f.read()
 
@@ -112,12 +131,221 @@ class EnsembleFileReport:
                 print("* File contains multiple runs, ensemble numbers restarted")
             if self.IsMissingEnsembles:
                 print("* Missing Ensembles: " + str(self.NumMissingEnsembles))
-                for num in self.MissingEnsembles:
-                    print("\t" + str(num))
+                self.print_missing(self.MissingEnsembles)
 
             print("----------------------------------------")
             print("Number of Headers Found: ", self.HeadersFound)
 
+    def follow(self, infile, state_file=None, closed=False):
+        """
+        Report on the data added to the file since the last time it was followed.
+        The scan position and the counts are saved to the state file, so only the
+        new data in the file is read.  The last ensemble in the file is decoded when
+        it is complete.  A partial ensemble is kept for the next follow, because it
+        may still be getting recorded, unless the file is closed.
+        :param infile: File to report on.
+        :param state_file: File to store the state.  Default is the infile with .report added.
+        :param closed: The file is no longer recorded, so the partial ensemble at the end is decoded.
+        :return: Dictionary of the change in each count.
+        """
+        # Check if file exist
+        if not os.path.isfile(infile):
+            logger.error("File path does not exist: ", infile)
+            sys.exit()
+
+        # Compressed files are complete, report on the entire file
+        if is_compressed_file(infile):
+            self.report(infile)
+            return {}
+
+        if state_file is None:
+            state_file = infile + ".report"
+
+        self.load_state(state_file)
+
+        # File was replaced, start over
+        if os.path.getsize(infile) < self.Offset:
+            logger.info("File is smaller then the last scan, start over: " + infile)
+            self.__init__(self.verbose)
+
+        before = self.get_state()
+
+        with open(infile, 'rb') as f:
+            f.seek(self.Offset)
+            buffer = bytearray()
+
+            # Read only the new data
+            while True:
+                block = f.read(EnsembleFileReport.BLOCK_SIZE)
+                if not block:
+                    break
+
+                buffer.extend(block)
+                scanned = self.scan(buffer)
+                del buffer[:scanned]
+                self.Offset += scanned
+
+            # Nothing more will be added to the file
+            if closed and buffer:
+                self.Offset += self.scan(buffer, final=True)
+
+        self.save_state(state_file)
+
+        return self.print_delta(before)
+
+    def scan(self, buffer, final=False):
+        """
+        Decode all the ensembles in the buffer that have the next ensemble's header.
+        The last ensemble is decoded if its size and checksum are good.
+        :param buffer: Data read from the file.
+        :param final: No more data will be added, decode the rest of the buffer.
+        :return: Number of bytes scanned.  The buffer after this is kept for the next scan.
+        """
+        delimiter = b'\x80' * 16
+
+        ens_start = buffer.find(delimiter)
+        if ens_start < 0:
+            if final:
+                return len(buffer)
+
+            # Keep enough to find a header split between reads
+            return max(len(buffer) - (len(delimiter) - 1), 0)
+
+        while True:
+            next_ens = buffer.find(delimiter, ens_start + len(delimiter))
+            if next_ens < 0:
+                break
+
+            self.HeadersFound += 1
+            self.decode_ensemble(buffer[ens_start:next_ens])
+            ens_start = next_ens
+
+        # Last ensemble
+        ens_end = len(buffer) if final else self.find_complete_ensemble(buffer, ens_start)
+        if ens_end > ens_start:
+            self.HeadersFound += 1
+            self.decode_ensemble(buffer[ens_start:ens_end])
+            ens_start = ens_end
+
+        return ens_start
+
+    @staticmethod
+    def find_complete_ensemble(buffer, ens_start):
+        """
+        Check if the ensemble at the start has a good payload size and checksum.
+        :param buffer: Data read from the file.
+        :param ens_start: Start of the ensemble header.
+        :return: End of the ensemble, or the start if the ensemble is not complete.
+        """
+        header_size = Ensemble().HeaderSize
+        if len(buffer) - ens_start < header_size:
+            return ens_start
+
+        payload_size, payload_size_inv = struct.unpack("II", buffer[ens_start + 24:ens_start + 32])
+        if payload_size != Ensemble.ones_complement(payload_size_inv):
+            return ens_start
+
+        checksum_loc = ens_start + header_size + payload_size
+        ens_end = checksum_loc + Ensemble().ChecksumSize
+        if len(buffer) < ens_end:
+            return ens_start
+
+        checksum = struct.unpack("I", buffer[checksum_loc:ens_end])[0]
+        if checksum != CRCCCITT().calculate(input_data=bytes(buffer[ens_start + header_size:checksum_loc])):
+            return ens_start
+
+        return ens_end
+
+    def get_state(self):
+        """
+        Get the counts and scan position.
+        :return: Dictionary of the state.
+        """
+        state = {}
+        for key in EnsembleFileReport.STATE_KEYS:
+            value = getattr(self, key)
+            state[key] = list(value) if isinstance(value, list) else value
+        return state
+
+    def load_state(self, state_file):
+        """
+        Load the counts and scan position from the state file.
+        :param state_file: State file.
+        """
+        if not os.path.isfile(state_file):
+            return
+
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+
+        for key in EnsembleFileReport.STATE_KEYS:
+            if key in state:
+                setattr(self, key, state[key])
+
+        # Older state files have each missing ensemble number
+        self.MissingEnsembles = [[num, num] if isinstance(num, int) else num for num in self.MissingEnsembles]
+
+    def save_state(self, state_file):
+        """
+        Save the counts and scan position to the state file.
+        :param state_file: State file.
+        """
+        with open(state_file, 'w') as f:
+            json.dump(self.get_state(), f)
+
+    def print_delta(self, before):
+        """
+        Print the change in the counts since the state given.
+        :param before: State before the scan.
+        :return: Dictionary of the change in each count.
+        """
+        delta = {}
+        for key in EnsembleFileReport.STATE_KEYS:
+            value = getattr(self, key)
+            if isinstance(value, bool):
+                delta[key] = value and not before[key]
+            elif isinstance(value, list):
+                continue
+            elif key in ("FirstEnsembleNum", "LastEnsembleNum", "prevEnsNum", "Offset"):
+                delta[key] = value
+            else:
+                delta[key] = value - before[key]
+
+        # Latest ranges found in this scan
+        new_ranges = min(delta["NumMissingRanges"], len(self.MissingEnsembles))
+        delta["MissingEnsembles"] = self.MissingEnsembles[len(self.MissingEnsembles) - new_ranges:]
+
+        print("----------------------------------------")
+        print("Bytes Scanned: ", self.Offset - before["Offset"])
+        print("New Ensembles: ", delta["NumEnsembles"], " Total: ", self.NumEnsembles)
+        print("Last Ensemble Number: ", self.LastEnsembleNum)
+        print("New Good Ensembles: ", delta["NumGoodEnsembles"], " Total: ", self.NumGoodEnsembles)
+        print("----------------------------------------")
+        print("New Bad Ensemble Numbers: ", delta["NumBadEnsNum"], " Total: ", self.NumBadEnsNum)
+        print("New Bad Payload Sizes: ", delta["NumBadPayloadSize"], " Total: ", self.NumBadPayloadSize)
+        print("New Bad Checksum: ", delta["NumBadChecksum"], " Total: ", self.NumBadChecksum)
+        print("New Incomplete Ensembles: ", delta["NumIncompleteEnsembles"], " Total: ", self.NumIncompleteEnsembles)
+        if delta["ContainsMultipleRuns"]:
+            print("* New run found, ensemble numbers restarted")
+        if delta["NumMissingEnsembles"] > 0:
+            print("* New Missing Ensembles: " + str(delta["NumMissingEnsembles"]))
+            self.print_missing(delta["MissingEnsembles"])
+        print("----------------------------------------")
+
+        return delta
+
+    @staticmethod
+    def print_missing(ranges):
+        """
+        Print the missing ensemble ranges.
+        :param ranges: List of [First, Last] missing ensemble numbers.
+        """
+        for first, last in ranges:
+            if first == last:
+                print("\t" + str(first))
+            else:
+                print("\t" + str(first) + " - " + str(last))
+
     def decode_ensemble(self, ens):
         """
         Decode the ensemble.
@@ -158,8 +386,10 @@ class EnsembleFileReport:
 
             self.IsMissingEnsembles = True
             self.NumMissingEnsembles += (ens_num[0] - self.prevEnsNum - 1)
-            for x in range(self.prevEnsNum+1, ens_num[0]):
-                self.MissingEnsembles.append(x)
+            if ens_num[0] > self.prevEnsNum + 1:
+                self.NumMissingRanges += 1
+                self.MissingEnsembles.append([self.prevEnsNum + 1, ens_num[0] - 1])
+                del self.MissingEnsembles[:-EnsembleFileReport.MAX_MISSING_RANGES]
 
         # Set Previous Ensemble
         self.prevEnsNum = ens_num[0]
@@ -215,28 +445,137 @@ class EnsembleFileReport:
 def main(argv):
     inputfile = ''
     verbose = False
+    follow = False
+    state_file = None
+    interval = 0
+    closed = False
+    usage = 'EnsembleFileReport.py -i <inputfile> -v -f -c -s <statefile> -w <seconds>'
     try:
-        opts, args = getopt.getopt(argv,"hvi:",["ifile=","verbose"])
+        opts, args = getopt.getopt(argv,"hvfci:s:w:",["ifile=","verbose","follow","closed","state=","watch="])
     except getopt.GetoptError:
-        print('EnsembleFileReport.py -i <inputfile> -v')
+        print(usage)
         sys.exit(2)
     for opt, arg in opts:
         if opt == '-h':
-            print('EnsembleFileReport.py -i <inputfile> -v')
+            print(usage)
+            print('-f Follow mode.  Only report on the data added since the last follow.')
+            print('-c File is closed.  Follow mode decodes the partial ensemble at the end.')
+            print('-s State file for follow mode.  Default is <inputfile>.report')
+            print('-w Keep following the file every given seconds.')
             sys.exit()
         elif opt in ("-i", "--ifile"):
             inputfile = arg
         elif opt in ("-v", "--verbose"):
             verbose = True
             print("Verbose ON")
+        elif opt in ("-f", "--follow"):
+            follow = True
+        elif opt in ("-c", "--closed"):
+            follow = True
+            closed = True
+        elif opt in ("-s", "--state"):
+            state_file = arg
+        elif opt in ("-w", "--watch"):
+            follow = True
+            interval = float(arg)
     print('Input file is: ', inputfile)
 
-    # Run report on file
-    EnsembleFileReport(verbose).report(inputfile)
+    if follow:
+        # Report on only the new data in the file
+        report = EnsembleFileReport(verbose)
+        report.follow(inputfile, state_file, closed)
+        while interval > 0:
+            time.sleep(interval)
+            report.follow(inputfile, state_file)
+    else:
+        # Run report on file
+        EnsembleFileReport(verbose).report(inputfile)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
 
 
-
-
+def _create_ens(ens_num, payload_size=100):
+    """
+    Create a binary ensemble with a good checksum.
+    """
+    payload = bytes([ens_num % 256]) * payload_size
+    header = b'\x80' * 16 + struct.pack("IIII", ens_num, ~ens_num & 0xFFFFFFFF, payload_size, ~payload_size & 0xFFFFFFFF)
+    return header + payload + struct.pack("I", CRCCCITT().calculate(input_data=payload))
+
+
+def test_follow(tmpdir):
+    infile = str(tmpdir.join("test.ens"))
+    state_file = str(tmpdir.join("test.ens.report"))
+
+    with open(infile, 'wb') as f:
+        for ens_num in range(1, 11):
+            f.write(_create_ens(ens_num))
+
+    # The last ensemble is complete, so it does not wait for the next header
+    delta = EnsembleFileReport().follow(infile, state_file)
+    assert delta["NumEnsembles"] == 10
+    assert delta["NumGoodEnsembles"] == 10
+    assert delta["LastEnsembleNum"] == 10
+
+    # Append more ensembles with missing ensembles and a partial ensemble
+    with open(infile, 'ab') as f:
+        for ens_num in [11, 12, 14, 15, 18]:
+            f.write(_create_ens(ens_num))
+        f.write(_create_ens(19)[:50])
+
+    # New report object, so the state is loaded from the file
+    report = EnsembleFileReport()
+    delta = report.follow(infile, state_file)
+    assert delta["NumEnsembles"] == 5
+    assert delta["NumGoodEnsembles"] == 5
+    assert delta["NumMissingEnsembles"] == 3
+    assert delta["MissingEnsembles"] == [[13, 13], [16, 17]]
+    assert report.NumEnsembles == 15
+    assert report.LastEnsembleNum == 18
+
+    # Only the pending ensemble is scanned
+    assert os.path.getsize(infile) - report.Offset == 50
+
+    # Nothing new
+    delta = report.follow(infile, state_file)
+    assert delta["NumEnsembles"] == 0
+    assert delta["MissingEnsembles"] == []
+
+    # Finish the partial ensemble
+    with open(infile, 'ab') as f:
+        f.write(_create_ens(19)[50:])
+        f.write(_create_ens(20))
+    delta = report.follow(infile, state_file)
+    assert delta["NumEnsembles"] == 2
+    assert delta["NumGoodEnsembles"] == 2
+    assert report.NumBadChecksum == 0
+
+    # The recorder closed the file with a partial ensemble
+    with open(infile, 'ab') as f:
+        f.write(_create_ens(21)[:50])
+    delta = report.follow(infile, state_file, closed=True)
+    assert delta["NumEnsembles"] == 1
+    assert delta["NumIncompleteEnsembles"] == 1
+    assert report.Offset == os.path.getsize(infile)
+
+
+def test_missing_ranges_limited(tmpdir):
+    infile = str(tmpdir.join("test.ens"))
+    state_file = str(tmpdir.join("test.ens.report"))
+
+    with open(infile, 'wb') as f:
+        for ens_num in range(1, 60, 2):
+            f.write(_create_ens(ens_num, 10))
+
+    EnsembleFileReport.MAX_MISSING_RANGES = 10
+    try:
+        report = EnsembleFileReport()
+        delta = report.follow(infile, state_file)
+    finally:
+        EnsembleFileReport.MAX_MISSING_RANGES = 1000
+
+    assert report.NumMissingEnsembles == 29
+    assert report.NumMissingRanges == 29
+    assert report.MissingEnsembles == [[num, num] for num in range(40, 60, 2)]
+    assert delta["MissingEnsembles"] == report.MissingEnsembles
@@ -6,6 +6,7 @@ import socket
 import threading
 
 from Comm.AdcpSerialPortServer import AdcpSerialPortServer
+from Utilities.AsyncFileWriter import AsyncFileWriter
 
 logger = logging.getLogger("Ensemble File Report")
 logger.setLevel(logging.DEBUG)
@@ -19,6 +20,9 @@ class SerialDataRecorder:
     It will record the serial data and write it to the file path given.
     If no file path is given it will write it in the same directory as
     the application is run.
+
+    The data is written to the file by an AsyncFileWriter, so a slow
+    disk will not stop the data from being read from the socket.
     """
 
     # Max file size.  16mbs
@@ -27,7 +31,22 @@ class SerialDataRecorder:
     # Recorder File name
     RECORDER_FILE_NAME = "Adcp"
 
-    def __init__(self, verbose=False):
+    # Socket read size
+    READ_SIZE = 65536
+
+    # Socket receive buffer size
+    SOCKET_BUFFER_SIZE = 1048576
+
+    def __init__(self, verbose=False, max_file_size=MAX_FILE_SIZE, max_file_time=None,
+                 queue_size=1048576 * 64, fsync_interval=None, compress=None):
+        """
+        :param verbose: Verbose output.
+        :param max_file_size: Create a new file when the file is larger than this in bytes.
+        :param max_file_time: Create a new file when the file is older than this in seconds.
+        :param queue_size: Max number of bytes waiting to be written to the file.
+        :param fsync_interval: Seconds between syncing the file to disk.  0 to sync every write.
+        :param compress: Compress the completed files.  None, "gzip", "bz2" or "xz".
+        """
         self.serial_server = None
         self.serial_server_thread = None
         self.comm_port = ""
@@ -39,9 +58,14 @@ class SerialDataRecorder:
         self.raw_serial_socket = None
         self.isAlive = True
         self.file = None
-        self.file_size = 0
         self.file_name = self.RECORDER_FILE_NAME
 
+        self.max_file_size = max_file_size
+        self.max_file_time = max_file_time
+        self.queue_size = queue_size
+        self.fsync_interval = fsync_interval
+        self.compress = compress
+
     def connect(self, comm_port, baud, folder_path, file_name, tcp_port=55056):
         """
         Connect to the serial port server to receive data.
@@ -76,6 +100,7 @@ class SerialDataRecorder:
 
             # Create socket
             self.raw_serial_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.raw_serial_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
             self.raw_serial_socket.connect(('localhost', int(port)))
             self.raw_serial_socket.settimeout(1)    # Set timeout to stop thread if terminated
         except ConnectionRefusedError as err:
@@ -89,29 +114,19 @@ class SerialDataRecorder:
     def read_tcp_socket(self):
         """
         Read the data from the TCP port.  This is the raw data from the serial port.
-        Then write this data to the file.
+        Then queue this data to be written to the file.
         """
         while self.isAlive:
             try:
                 # Read data from socket
-                data = self.raw_serial_socket.recv(4096)
+                data = self.raw_serial_socket.recv(self.READ_SIZE)
 
                 # If data exist process
                 if len(data) > 0:
-                    # Write the data to the file
-                    self.file.write(data)
-
-                    # Keep track of the file size
-                    self.file_size += len(data)
-
-                    # Limit the output prompt
-                    #if self.file_size % 5 == 0:
-                    #    print('.', end="", flush=True)
-
-                    # Check the file size to see if a new file needs to be created
-                    if self.file_size > self.MAX_FILE_SIZE:
-                        self.close_file_write()                 # Close this file
-                        self.create_file_writer()               # Open a new file
+                    # Queue the data to be written to the file
+                    # The file writer will create a new file when the file is full
+                    if not self.file.write(data) and self.verbose:
+                        logger.debug("Write queue full, data dropped")
 
             except socket.timeout:
                 # Just a socket timeout, continue on
@@ -124,21 +139,27 @@ class SerialDataRecorder:
 
     def create_file_writer(self):
         """
-        Create a file writer.  This will open the file and have it ready
-        to write data to the file.
+        Create a file writer.  The file writer will open the file on its
+        own thread and create a new file when the file is full.
         """
-        file_path = self.get_new_file()
-        logger.debug("Open File name: " + file_path)
-
-        self.file_size = 0
-        self.file = open(file_path, 'wb')
+        self.file = AsyncFileWriter(self.get_new_file,
+                                    max_file_size=self.max_file_size,
+                                    max_file_time=self.max_file_time,
+                                    queue_size=self.queue_size,
+                                    fsync_interval=self.fsync_interval,
+                                    compress=self.compress)
 
     def close_file_write(self):
         """
-        Close the file.
+        Close the file.  This will write all the queued data.
         """
         logger.debug("Close the file")
-        self.file.close()
+        if self.file is not None:
+            try:
+                self.file.close()
+            except Exception:
+                logger.exception("Error writing the data to the file.")
+            logger.debug("File writer stats: " + str(self.file.get_stats()))
 
     def get_new_file(self):
         """
@@ -156,13 +177,26 @@ class SerialDataRecorder:
         file_path = os.path.join(self.folder_path, file_name + ".ens")
 
         # Continue to create a file until a new file name is found
-        while os.path.exists(file_path):
+        # Include the compressed files
+        while os.path.exists(file_path) or self.is_compressed_file(file_path):
             index += 1
             file_name = self.file_name + str(index)
             file_path = os.path.join(self.folder_path, file_name + ".ens")
 
         return file_path
 
+    @staticmethod
+    def is_compressed_file(file_path):
+        """
+        Check if a compressed version of the file exist.
+        :param file_path: File path.
+        :return: TRUE if the compressed file exist.
+        """
+        for module_name, ext in AsyncFileWriter.COMPRESSION.values():
+            if os.path.exists(file_path + ext):
+                return True
+        return False
+
     def stop_adcp_server(self):
         """
         Stop the ADCP Serial TCP server
@@ -196,8 +230,13 @@ def main(argv):
     folder_path = 'recorder'
     verbose = False
     file_name = "Adcp"
+    max_file_size = SerialDataRecorder.MAX_FILE_SIZE
+    max_file_time = None
+    fsync_interval = None
+    compress = None
     try:
-        opts, args = getopt.getopt(argv, "hlvc:b:f:p:n:", ["comm=", "baud=", "folder=", "name=", "tcp=", "verbose"])
+        opts, args = getopt.getopt(argv, "hlvc:b:f:p:n:s:t:y:z:", ["comm=", "baud=", "folder=", "name=", "tcp=", "verbose",
+                                                                   "size=", "time=", "fsync=", "compress="])
     except getopt.GetoptError:
         print('SerialDataRecorder.py -c <comm> -b <baud> -f <folder> -p <tcp> -n <file_name> -v')
         sys.exit(2)
@@ -209,6 +248,10 @@ def main(argv):
             print('-p <tcp>\t : TCP Port to output the serial data.  Default 55056.  Change if used already.')
             print('-f <folder>\t : Folder path to store the serial data.  Default is same path as application.')
             print('-n <file_name>\t : File name for the files.  Default is "Adcp.')
+            print('-s <size>\t : Max file size in MB.  Default 16.')
+            print('-t <seconds>\t : Create a new file after the given seconds.  Default no limit.')
+            print('-y <seconds>\t : Sync the file to disk every given seconds.  0 for every write.  Default no sync.')
+            print('-z <compress>\t : Compress the completed files.  gzip, bz2 or xz.')
             print('-v\t : Verbose output.')
             print('Utilities:')
             print('-l\t : Print all available Serial Ports')
@@ -226,6 +269,14 @@ def main(argv):
             tcp_port = arg
         elif opt in ("-n", "--name"):
             file_name = arg
+        elif opt in ("-s", "--size"):
+            max_file_size = int(float(arg) * 1048576)
+        elif opt in ("-t", "--time"):
+            max_file_time = float(arg)
+        elif opt in ("-y", "--fsync"):
+            fsync_interval = float(arg)
+        elif opt in ("-z", "--compress"):
+            compress = arg
         elif opt in ("-v", "--verbose"):
             verbose = True
             print("Verbose ON")
@@ -240,7 +291,8 @@ def main(argv):
     # Verify a good serial port was given
     if comm_port in serial_list:
         # Run serial port
-        sdr = SerialDataRecorder(verbose).connect(comm_port, baud, folder_path, file_name, tcp_port)
+        sdr = SerialDataRecorder(verbose, max_file_size, max_file_time,
+                                 fsync_interval=fsync_interval, compress=compress).connect(comm_port, baud, folder_path, file_name, tcp_port)
         sdr.stop_adcp_server()
     else:
         print("----------------------------------------------------------------")
@@ -2,7 +2,7 @@
 Python compatibility helpers.
 """
 import sys
-import collections
+import collections.abc
 import warnings
 
 __all__ = ["stringify", "byteify", "isiterable", "ISPYTHON2", "ISPYTHON3",
@@ -25,11 +25,11 @@ else:
     stringify = lambda x, enc: x.decode(enc)
     long = int
     unichr = chr
-    callable = lambda x: isinstance(x, collections.Callable)
+    callable = lambda x: isinstance(x, collections.abc.Callable)
     ISPYTHON3 = True
     unicode = str
 
-isiterable = lambda x: isinstance(x, collections.Iterable)
+isiterable = lambda x: isinstance(x, collections.abc.Iterable)
 
 
 def platform_is_64bit():
@@ -1,7 +1,19 @@
 """General purpose event handling routines"""
+import time
+import logging
+import threading
+import collections
 from .compat import *
 
-__all__ = ["EventHandler", "MPEventHandler"]
+__all__ = ["EventHandler", "AsyncEventHandler", "MPEventHandler",
+           "POLICY_BLOCK", "POLICY_DROP_NEWEST", "POLICY_DROP_OLDEST"]
+
+# Policy when a subscriber's queue is full
+POLICY_BLOCK = "block"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_DROP_OLDEST = "drop_oldest"
+
+logger = logging.getLogger("Events")
 
 _HASMP = True
 try:
@@ -61,6 +73,206 @@ class EventHandler(object):
         self.callbacks.remove(callback)
 
 
+class _Subscriber(object):
+    """A callback with its own queue and worker thread."""
+    def __init__(self, callback, sender, queue_size, policy, coalesce):
+        self.callback = callback
+        self.sender = sender
+        self.queue_size = max(queue_size, 1)
+        self.policy = policy
+        self.coalesce = coalesce
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.is_alive = True
+        self.busy = False
+
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+        self.thread = threading.Thread(name="EventHandler", target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, args):
+        """Queues the event arguments for the callback."""
+        entry = (time.perf_counter(), args)
+        with self.condition:
+            if not self.is_alive:
+                return False
+            if self.coalesce:
+                # Only the latest event is kept
+                self.coalesced += len(self.queue)
+                self.queue.clear()
+            elif len(self.queue) >= self.queue_size:
+                if self.policy == POLICY_DROP_NEWEST:
+                    self.dropped += 1
+                    self.log_drop()
+                    return False
+                elif self.policy == POLICY_DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                    self.log_drop()
+                else:
+                    while self.is_alive and len(self.queue) >= self.queue_size:
+                        self.condition.wait()
+            self.queue.append(entry)
+            self.condition.notify_all()
+        return True
+
+    def log_drop(self):
+        """Logs the first dropped event and every 100th after."""
+        if self.dropped % 100 == 1:
+            logger.warning("Event callback %r is too slow, %d events dropped",
+                           self.callback, self.dropped)
+
+    def run(self):
+        """Calls the callback with each queued event."""
+        while True:
+            with self.condition:
+                while self.is_alive and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    break
+                queued, args = self.queue.popleft()
+                self.busy = True
+                self.condition.notify_all()
+
+            try:
+                self.callback(self.sender, *args)
+            except Exception as ex:
+                self.errors += 1
+                logger.error("Error in event callback %r: %s", self.callback, ex)
+
+            latency = time.perf_counter() - queued
+            with self.condition:
+                self.busy = False
+                self.delivered += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """Waits until all the queued events are processed."""
+        end = None if timeout is None else time.perf_counter() + timeout
+        with self.condition:
+            while self.queue or self.busy:
+                remaining = None if end is None else end - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self):
+        """Stops the worker thread after the queued events are processed."""
+        with self.condition:
+            self.is_alive = False
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def get_metrics(self):
+        """Gets the delivery, drop and latency metrics."""
+        with self.condition:
+            return {"callback": self.callback,
+                    "queue_size": len(self.queue),
+                    "delivered": self.delivered,
+                    "dropped": self.dropped,
+                    "coalesced": self.coalesced,
+                    "errors": self.errors,
+                    "avg_latency": self.latency_total / max(self.delivered, 1),
+                    "max_latency": self.latency_max}
+
+
+class AsyncEventHandler(EventHandler):
+    """An event handling class in which each callback is executed on
+    its own long-lived worker thread.
+
+    Calling the AsyncEventHandler only queues the arguments for each
+    callback, so a slow callback does not delay the caller or the other
+    callbacks. Each callback has a bounded queue. When the queue is full,
+    the policy decides if the caller waits (POLICY_BLOCK), the new event
+    is dropped (POLICY_DROP_NEWEST) or the oldest event is dropped
+    (POLICY_DROP_OLDEST). A coalescing callback only receives the latest
+    event, which is useful for displays. Exceptions raised by a callback
+    are logged and counted, and do not affect the other callbacks.
+
+    By default the caller waits, so no events are lost for file writers
+    and databases. Dropping events is chosen for each callback, like a
+    plot: handler.add(plot.update, policy=POLICY_DROP_OLDEST). Dropped
+    events are logged and counted in the metrics.
+    """
+    def __init__(self, sender, queue_size=100, policy=POLICY_BLOCK,
+                 coalesce=False):
+        super(AsyncEventHandler, self).__init__(sender)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.coalesce = coalesce
+        self.subscribers = []
+
+    def __call__(self, *args):
+        """Queues the event for all connected callbacks.
+
+        Returns a list with True for each callback the event was queued
+        for and False for each callback the event was dropped for.
+        """
+        return [subscriber.put(args) for subscriber in list(self.subscribers)]
+
+    def __setitem__(self, index, value):
+        subscriber = self.subscribers[index]
+        self.subscribers[index] = self._subscribe(value)
+        self.callbacks[index] = value
+        subscriber.stop()
+
+    def __delitem__(self, index):
+        self.remove(self.callbacks[index])
+
+    def add(self, callback, queue_size=None, policy=None, coalesce=None):
+        """Adds a callback to the AsyncEventHandler.
+
+        The queue size, policy and coalesce mode of the AsyncEventHandler
+        are used, unless they are given for the callback.
+        """
+        subscriber = self._subscribe(callback, queue_size, policy, coalesce)
+        self.callbacks.append(callback)
+        self.subscribers.append(subscriber)
+
+    def _subscribe(self, callback, queue_size=None, policy=None, coalesce=None):
+        """Creates the subscriber thread for the callback."""
+        if not callable(callback):
+            raise TypeError("callback mus be callable")
+        return _Subscriber(callback, self.sender,
+                           self.queue_size if queue_size is None else queue_size,
+                           self.policy if policy is None else policy,
+                           self.coalesce if coalesce is None else coalesce)
+
+    def remove(self, callback):
+        """Removes a callback from the AsyncEventHandler.
+
+        The events already queued for the callback are still processed.
+        """
+        index = self.callbacks.index(callback)
+        del self.callbacks[index]
+        subscriber = self.subscribers.pop(index)
+        subscriber.stop()
+
+    def join(self, timeout=None):
+        """Waits until all the queued events are processed."""
+        return all([subscriber.join(timeout) for subscriber in list(self.subscribers)])
+
+    def close(self):
+        """Removes all callbacks and stops the worker threads."""
+        while self.callbacks:
+            self.remove(self.callbacks[0])
+
+    def get_metrics(self):
+        """Gets the metrics for each callback."""
+        return [subscriber.get_metrics() for subscriber in list(self.subscribers)]
+
+
 def _mp_callback(args):
     # args = (function, sender, (args))
     fargs = args[2]
@@ -76,6 +288,9 @@ class MPEventHandler(EventHandler):
     will not apply any locks, synchronous state changes or anything else
     to the arguments being used. Consider it a "fire-and-forget" event
     handling strategy
+
+    The worker processes are created on the first event and reused for
+    all the following events. Call close() to stop them.
     """
     def __init__(self, sender, maxprocs=None):
         if not _HASMP:
@@ -83,15 +298,143 @@ class MPEventHandler(EventHandler):
                                    "no multiprocessing support found")
         super(MPEventHandler, self).__init__(sender)
         self.maxprocs = maxprocs
+        self.pool = None
 
     def __call__(self, *args):
-        if self.maxprocs is not None:
-            pool = Pool(processes=self.maxprocs)
-        else:
-            pool = Pool()
+        if self.pool is None:
+            self.pool = Pool(processes=self.maxprocs)
         psize = len(self.callbacks)
         pv = zip(self.callbacks, [self.sender] * psize, [args[:]] * psize)
-        results = pool.map_async(_mp_callback, pv)
-        pool.close()
-        pool.join()
-        return results
\ No newline at end of file
+        return self.pool.map_async(_mp_callback, pv)
+
+    def close(self):
+        """Waits for the queued events and stops the worker processes."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def _mp_square(sender, value):
+    return value * value
+
+
+def test_async_slow_subscriber():
+    fast = []
+    slow = []
+
+    def slow_callback(sender, value):
+        time.sleep(0.05)
+        slow.append(value)
+
+    def bad_callback(sender, value):
+        raise ValueError("bad")
+
+    handler = AsyncEventHandler("sender", queue_size=2)
+    handler.add(lambda sender, value: fast.append((sender, value)), queue_size=100)
+    handler.add(slow_callback, policy=POLICY_DROP_OLDEST)
+    handler += bad_callback
+    assert len(handler) == 3
+
+    start = time.perf_counter()
+    for value in range(10):
+        handler(value)
+    assert time.perf_counter() - start < 0.05
+
+    assert handler.join(5)
+    assert fast == [("sender", value) for value in range(10)]
+
+    # Oldest dropped from the slow queue, latest always delivered
+    metrics = handler.get_metrics()
+    assert slow[-1] == 9
+    assert metrics[1]["dropped"] > 0
+    assert metrics[1]["delivered"] + metrics[1]["dropped"] == 10
+    assert metrics[2]["errors"] == 10
+    assert metrics[2]["dropped"] == 0
+
+    handler -= slow_callback
+    handler(10)
+    handler.join(5)
+    assert fast[-1] == ("sender", 10)
+    assert slow[-1] == 9
+    handler.close()
+    assert len(handler) == 0
+
+
+def test_async_coalesce_block():
+    gate = threading.Event()
+    shown = []
+    recorded = []
+
+    def display(sender, value):
+        gate.wait()
+        shown.append(value)
+
+    handler = AsyncEventHandler(None)
+    handler.add(display, coalesce=True)
+    handler.add(lambda sender, value: recorded.append(value), queue_size=1, policy=POLICY_BLOCK)
+
+    for value in range(20):
+        handler(value)
+    gate.set()
+    handler.join(5)
+
+    # Display only gets the latest, blocking subscriber gets everything
+    assert shown[-1] == 19
+    assert len(shown) < 20
+    assert recorded == list(range(20))
+    handler.close()
+
+
+def test_async_default_blocks():
+    recorded = []
+
+    def slow_writer(sender, value):
+        time.sleep(0.01)
+        recorded.append(value)
+
+    # A slow writer gets every event by default
+    handler = AsyncEventHandler(None, queue_size=2)
+    handler += slow_writer
+    for value in range(10):
+        assert handler(value) == [True]
+    handler.join(5)
+
+    assert recorded == list(range(10))
+    assert handler.get_metrics()[0]["dropped"] == 0
+    handler.close()
+
+
+def test_async_setitem_order():
+    recorded = []
+
+    def first(sender, value):
+        recorded.append(("first", value))
+
+    def second(sender, value):
+        recorded.append(("second", value))
+
+    def replaced(sender, value):
+        recorded.append(("replaced", value))
+
+    handler = AsyncEventHandler(None)
+    handler += first
+    handler += second
+    handler[0] = replaced
+
+    assert handler.callbacks == [replaced, second]
+    assert [sub.callback for sub in handler.subscribers] == [replaced, second]
+    handler(1)
+    handler.join(5)
+    assert sorted(recorded) == [("replaced", 1), ("second", 1)]
+    handler.close()
+
+
+def test_mp_pool_reused():
+    handler = MPEventHandler(None, maxprocs=1)
+    handler += _mp_square
+    results = [handler(value) for value in range(5)]
+    pool = handler.pool
+    assert [result.get(10) for result in results] == [[value * value] for value in range(5)]
+    assert handler.pool is pool
+    handler.close()
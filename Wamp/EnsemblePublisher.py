@@ -0,0 +1,445 @@
+import numpy as np
+
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSerializer import EnsembleSerializer
+from Ensemble.EnsembleSeries import is_bad_value
+from Ensemble import OnlineStats
+
+
+# Topic for the entire ensemble
+ENS_TOPIC = u"com.rti.data.ens"
+
+# Topic for the running statistics of the datasets
+STATS_TOPIC = u"com.rti.data.ens.stats"
+
+# Datasets that can be published separately.
+# Topic name: (Flag in ensemble, Dataset in ensemble, [Bin x Beam] array in dataset)
+# Datasets without an array are published with all their values.
+DATASETS = {
+    u"beam_velocity": ("IsBeamVelocity", "BeamVelocity", "Velocities"),
+    u"instrument_velocity": ("IsInstrumentVelocity", "InstrumentVelocity", "Velocities"),
+    u"earth_velocity": ("IsEarthVelocity", "EarthVelocity", "Velocities"),
+    u"amplitude": ("IsAmplitude", "Amplitude", "Amplitude"),
+    u"correlation": ("IsCorrelation", "Correlation", "Correlation"),
+    u"good_beam": ("IsGoodBeam", "GoodBeam", "GoodBeam"),
+    u"good_earth": ("IsGoodEarth", "GoodEarth", "GoodEarth"),
+    u"ensemble_data": ("IsEnsembleData", "EnsembleData", None),
+    u"ancillary_data": ("IsAncillaryData", "AncillaryData", None),
+    u"bottom_track": ("IsBottomTrack", "BottomTrack", None),
+    u"range_tracking": ("IsRangeTracking", "RangeTracking", None),
+    u"system_setup": ("IsSystemSetup", "SystemSetup", None),
+    u"nmea": ("IsNmeaData", "NmeaData", None),
+}
+
+# Check for the bad values in the [Bin x Beam] arrays when averaging.
+# A velocity or correlation of 88.888 is bad.  An amplitude of 88.888 dB is
+# a valid value, so only NaN is bad, like the good ping counts.
+BAD_VALUES = {
+    u"beam_velocity": is_bad_value,
+    u"instrument_velocity": is_bad_value,
+    u"earth_velocity": is_bad_value,
+    u"correlation": is_bad_value,
+}
+
+
+class TopicConfig:
+    """
+    Settings for a dataset topic.
+    """
+
+    def __init__(self, decimate=1, average=False, binary=False):
+        """
+        :param decimate: Publish every Nth ensemble.
+        :param average: Average the ensembles between each publish.  Only for [Bin x Beam] datasets.
+        :param binary: Publish the [Bin x Beam] values as float32 bytes instead of a list.
+        """
+        self.decimate = max(int(decimate), 1)
+        self.average = average
+        self.binary = binary
+
+        # Ensembles since the last publish
+        self.count = 0
+        self.sum = None
+        self.num = None
+
+    def reset(self):
+        """
+        Clear the accumulated ensembles.
+        """
+        self.count = 0
+        self.sum = None
+        self.num = None
+
+
+class EnsemblePublisher:
+    """
+    Publish each dataset of the ensemble to its own topic.
+    com.rti.data.ens.amplitude, com.rti.data.ens.earth_velocity ...
+
+    A topic is only serialized and published when it has a subscriber.
+    The subscriptions are tracked with add_subscription() and
+    remove_subscription() using the WAMP subscription meta events.
+    Exact, prefix and wildcard subscriptions are matched like the router.
+    If the subscriptions are not tracked, all the topics are published.
+    """
+
+    def __init__(self, publish, track_subscriptions=True):
+        """
+        :param publish: Function to publish the topic and payload.  session.publish()
+        :param track_subscriptions: Only publish topics with subscribers.
+        """
+        self.publish = publish
+        self.track_subscriptions = track_subscriptions
+        self.subscriptions = {}         # Subscription ID: (Topic, Match)
+        self.configs = {}               # Dataset: TopicConfig
+        self.serializer = EnsembleSerializer(round_floats=True)
+
+        # Running statistics, see configure_stats()
+        self.stats = None
+        self.stats_every = 0
+        self.stats_binary = False
+        self.stats_count = 0
+
+    @staticmethod
+    def get_topic(dataset):
+        """
+        Get the topic for the dataset.
+        :param dataset: Dataset name.
+        :return: Topic.
+        """
+        return ENS_TOPIC + u"." + dataset
+
+    @staticmethod
+    def get_stats_topic(dataset):
+        """
+        Get the statistics topic for the dataset.
+        :param dataset: Dataset name.
+        :return: Topic.
+        """
+        return STATS_TOPIC + u"." + dataset
+
+    @staticmethod
+    def get_stats_datasets():
+        """
+        :return: Dictionary of the datasets with statistics.  Dataset: Dataset in ensemble
+        """
+        return {dataset: ds_name for dataset, (flag, ds_name, array_name) in DATASETS.items()
+                if ds_name in OnlineStats.DATASETS}
+
+    @staticmethod
+    def get_topics():
+        """
+        :return: List of all the topics published.
+        """
+        return ([ENS_TOPIC] + [EnsemblePublisher.get_topic(dataset) for dataset in DATASETS] +
+                [EnsemblePublisher.get_stats_topic(dataset) for dataset in EnsemblePublisher.get_stats_datasets()])
+
+    def add_subscription(self, sub_id, topic, match=u"exact"):
+        """
+        A topic has a subscriber.
+        :param sub_id: WAMP subscription ID.
+        :param topic: Topic subscribed to.
+        :param match: WAMP match policy.  exact, prefix or wildcard.
+        """
+        self.subscriptions[sub_id] = (topic, match)
+
+    def remove_subscription(self, sub_id):
+        """
+        A topic has no more subscribers.
+        :param sub_id: WAMP subscription ID.
+        """
+        self.subscriptions.pop(sub_id, None)
+
+    def is_subscribed(self, topic):
+        """
+        Check if the topic has a subscriber.
+        :param topic: Topic.
+        :return: TRUE if the topic should be published.
+        """
+        if not self.track_subscriptions:
+            return True
+
+        for sub_topic, match in self.subscriptions.values():
+            if match == u"prefix":
+                if topic.startswith(sub_topic):
+                    return True
+            elif match == u"wildcard":
+                # Empty parts of the subscription match any part of the topic
+                sub_parts = sub_topic.split(u".")
+                parts = topic.split(u".")
+                if len(sub_parts) == len(parts) and all(not sub or sub == part for sub, part in zip(sub_parts, parts)):
+                    return True
+            elif topic == sub_topic:
+                return True
+        return False
+
+    def configure(self, dataset, decimate=1, average=False, binary=False):
+        """
+        Set the decimation, averaging and binary option for the dataset's topic.
+        :param dataset: Dataset name.
+        :param decimate: Publish every Nth ensemble.
+        :param average: Average the ensembles between each publish.
+        :param binary: Publish the values as float32 bytes.
+        :return: TRUE if the dataset exist.
+        """
+        if dataset not in DATASETS:
+            return False
+
+        self.configs[dataset] = TopicConfig(decimate, average, binary)
+        return True
+
+    def configure_stats(self, window=600, mode='fixed', publish_every=10, binary=False):
+        """
+        Keep running statistics of the datasets and publish them to
+        com.rti.data.ens.stats.amplitude, com.rti.data.ens.stats.earth_velocity ...
+        :param window: Number of ensembles in the window.  If 0, the statistics are stopped.
+        :param mode: 'fixed' for the last window ensembles or 'exponential'.
+        :param publish_every: Publish the statistics every Nth ensemble.
+        :param binary: Publish the values as float32 bytes.
+        :return: TRUE if the statistics are kept.
+        """
+        if window <= 0:
+            self.stats = None
+            return False
+
+        datasets = list(EnsemblePublisher.get_stats_datasets().values())
+        self.stats = OnlineStats.EnsembleStats(window=window, mode=mode, datasets=datasets)
+        self.stats_every = max(int(publish_every), 1)
+        self.stats_binary = binary
+        self.stats_count = 0
+        return True
+
+    def publish_stats(self, ens):
+        """
+        Add the ensemble to the statistics and publish the
+        statistics topics with subscribers.
+        :param ens: Ensemble.
+        """
+        self.stats.process_ensemble(self, ens)
+        self.stats_count += 1
+        if self.stats_count < self.stats_every:
+            return
+        self.stats_count = 0
+
+        for dataset, ds_name in EnsemblePublisher.get_stats_datasets().items():
+            topic = EnsemblePublisher.get_stats_topic(dataset)
+            if self.is_subscribed(topic):
+                payload = self.stats.create_payload(ds_name, self.stats_binary)
+                if payload is not None:
+                    self.publish(topic, payload)
+
+    def publish_ensemble(self, ens):
+        """
+        Publish the ensemble to all the topics with subscribers.
+        :param ens: Ensemble.
+        """
+        # Entire ensemble
+        if self.is_subscribed(ENS_TOPIC):
+            self.publish(ENS_TOPIC, self.serializer.to_json(ens))
+
+        ens_num = 0
+        if ens.IsEnsembleData:
+            ens_num = ens.EnsembleData.EnsembleNumber
+
+        for dataset, (flag, ds_name, array_name) in DATASETS.items():
+            topic = EnsemblePublisher.get_topic(dataset)
+            if not getattr(ens, flag) or not self.is_subscribed(topic):
+                continue
+
+            config = self.configs.get(dataset)
+            if config is None:
+                config = self.configs[dataset] = TopicConfig()
+
+            payload = self.create_payload(ens_num, getattr(ens, ds_name), array_name, config,
+                                          BAD_VALUES.get(dataset, np.isnan))
+            if payload is not None:
+                self.publish(topic, payload)
+
+        if self.stats is not None:
+            self.publish_stats(ens)
+
+    def create_payload(self, ens_num, ds, array_name, config, is_bad=np.isnan):
+        """
+        Create the payload for the dataset.  If the ensemble is decimated, nothing is created.
+        :param ens_num: Ensemble number.
+        :param ds: Dataset.
+        :param array_name: Name of the [Bin x Beam] array in the dataset.
+        :param config: Topic configuration.
+        :param is_bad: Function to find the bad values in the array when averaging.
+        :return: Payload or None if nothing to publish.
+        """
+        config.count += 1
+
+        if array_name is None:
+            # Datasets without an array can only be decimated
+            if config.count < config.decimate:
+                return None
+            config.reset()
+            return EnsembleSerializer.to_dict(ds)
+
+        if config.average:
+            # Accumulate the good values
+            values = np.array(getattr(ds, array_name), dtype=float)
+            good = ~is_bad(values)
+            if config.sum is None or config.sum.shape != values.shape:
+                config.sum = np.zeros(values.shape)
+                config.num = np.zeros(values.shape)
+            config.sum += np.where(good, values, 0.0)
+            config.num += good
+
+            if config.count < config.decimate:
+                return None
+
+            values = np.where(config.num > 0, config.sum / np.maximum(config.num, 1), Ensemble.BadVelocity)
+        else:
+            if config.count < config.decimate:
+                return None
+            values = np.array(getattr(ds, array_name), dtype=float)
+
+        num_ens = config.count
+        config.reset()
+
+        payload = {"EnsembleNumber": ens_num,
+                   "Name": ds.Name,
+                   "NumEnsembles": num_ens,
+                   "Shape": list(values.shape)}
+        if config.binary:
+            # Little endian float32 [Bin x Beam]
+            payload["Format"] = "<f4"
+            payload["Values"] = values.astype("<f4").tobytes()
+        else:
+            payload["Values"] = values.tolist()
+
+        return payload
+
+
+def _create_ens(ens_num, amp):
+    """
+    Create an ensemble with Amplitude and Ensemble data.
+    """
+    from Ensemble.Amplitude import Amplitude
+    from Ensemble.EnsembleData import EnsembleData
+
+    ens = Ensemble()
+    ens_data = EnsembleData(0, 0)
+    ens_data.EnsembleNumber = ens_num
+    ens.AddEnsembleData(ens_data)
+
+    ds = Amplitude(3, 4)
+    for bin_num in range(3):
+        for beam in range(4):
+            ds.Amplitude[bin_num][beam] = amp
+    ds.Amplitude[0][0] = Ensemble.BadVelocity
+    ens.AddAmplitude(ds)
+    return ens
+
+
+def test_publish_subscribed_only():
+    published = []
+    publisher = EnsemblePublisher(lambda topic, payload: published.append((topic, payload)))
+
+    # No subscribers
+    publisher.publish_ensemble(_create_ens(1, 10.0))
+    assert published == []
+
+    publisher.add_subscription(100, u"com.rti.data.ens.amplitude")
+    publisher.publish_ensemble(_create_ens(2, 10.0))
+    assert [topic for topic, payload in published] == [u"com.rti.data.ens.amplitude"]
+    assert published[0][1]["EnsembleNumber"] == 2
+    assert published[0][1]["Values"][1] == [10.0] * 4
+
+    publisher.remove_subscription(100)
+    publisher.publish_ensemble(_create_ens(3, 10.0))
+    assert len(published) == 1
+
+
+def test_publish_prefix_wildcard():
+    published = []
+    publisher = EnsemblePublisher(lambda topic, payload: published.append((topic, payload)))
+
+    publisher.add_subscription(100, u"com.rti.data.ens.stats", u"prefix")
+    assert publisher.is_subscribed(u"com.rti.data.ens.stats.amplitude")
+    assert not publisher.is_subscribed(u"com.rti.data.ens.amplitude")
+
+    publisher.add_subscription(101, u"com.rti.data.ens.", u"wildcard")
+    assert publisher.is_subscribed(u"com.rti.data.ens.amplitude")
+    assert not publisher.is_subscribed(u"com.rti.data.ens")
+
+    publisher.publish_ensemble(_create_ens(1, 10.0))
+    assert u"com.rti.data.ens.amplitude" in [topic for topic, payload in published]
+
+
+def test_publish_average_float32_bad_value():
+    from Ensemble.Correlation import Correlation
+
+    published = []
+    publisher = EnsemblePublisher(lambda topic, payload: published.append((topic, payload)), track_subscriptions=False)
+    publisher.configure(u"correlation", decimate=2, average=True)
+    publisher.configure(u"amplitude", decimate=2, average=True)
+
+    # A decoded bad value is 88.888 as a float32
+    for ens_num in range(2):
+        ens = _create_ens(ens_num, 10.0 + ens_num)
+        ens.Amplitude.Amplitude[1][1] = float(np.float32(Ensemble.BadVelocity))
+        corr = Correlation(3, 4)
+        corr.Correlation = [[0.5] * 4 for bin_num in range(3)]
+        corr.Correlation[0][1] = float(np.float32(Ensemble.BadVelocity))
+        ens.AddCorrelation(corr)
+        publisher.publish_ensemble(ens)
+
+    corr = [payload for topic, payload in published if topic == u"com.rti.data.ens.correlation"]
+    assert corr[0]["Values"][0][1] == Ensemble.BadVelocity
+    assert corr[0]["Values"][1][1] == 0.5
+
+    # 88.888 dB is a valid amplitude
+    amp = [payload for topic, payload in published if topic == u"com.rti.data.ens.amplitude"]
+    assert np.isclose(amp[0]["Values"][1][1], np.float32(Ensemble.BadVelocity))
+    assert amp[0]["Values"][1][2] == 10.5
+
+    # Datasets without an array are published as a dictionary
+    ens_data = [payload for topic, payload in published if topic == u"com.rti.data.ens.ensemble_data"]
+    assert ens_data[1]["EnsembleNumber"] == 1
+
+
+def test_publish_average_binary():
+    published = []
+    publisher = EnsemblePublisher(lambda topic, payload: published.append((topic, payload)), track_subscriptions=False)
+    publisher.configure(u"amplitude", decimate=4, average=True, binary=True)
+
+    for ens_num in range(8):
+        publisher.publish_ensemble(_create_ens(ens_num, float(ens_num)))
+
+    amp = [payload for topic, payload in published if topic == u"com.rti.data.ens.amplitude"]
+    assert len(amp) == 2
+    assert amp[1]["EnsembleNumber"] == 7
+    assert amp[1]["NumEnsembles"] == 4
+
+    values = np.frombuffer(amp[1]["Values"], dtype=amp[1]["Format"]).reshape(amp[1]["Shape"])
+    assert values[0][0] == np.float32(Ensemble.BadVelocity)
+    assert values[2][3] == np.float32((4 + 5 + 6 + 7) / 4.0)
+
+    # All the ensemble data is published without decimation
+    assert len([topic for topic, payload in published if topic == u"com.rti.data.ens.ensemble_data"]) == 8
+
+
+def test_publish_stats():
+    published = []
+    publisher = EnsemblePublisher(lambda topic, payload: published.append((topic, payload)))
+    publisher.configure_stats(window=10, publish_every=2)
+    publisher.add_subscription(100, u"com.rti.data.ens.stats.amplitude")
+    assert u"com.rti.data.ens.stats.amplitude" in EnsemblePublisher.get_topics()
+
+    for ens_num in range(5):
+        publisher.publish_ensemble(_create_ens(ens_num, float(ens_num)))
+
+    assert [topic for topic, payload in published] == [u"com.rti.data.ens.stats.amplitude"] * 2
+    stats = published[1][1]
+    assert stats["EnsembleNumber"] == 3
+    assert stats["NumEnsembles"] == 4
+    assert stats["mean"][1][0] == 1.5
+    assert stats["good"][0][0] == 0.0                   # Always bad
+    assert stats["mean"][0][0] == Ensemble.BadVelocity
+
+    assert not publisher.configure_stats(window=0)
+    publisher.publish_ensemble(_create_ens(5, 5.0))
+    assert len(published) == 2
@@ -26,13 +26,13 @@
 
 import six
 from os import environ
-import json
 
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.serialport import SerialPort
 from twisted.protocols.basic import LineReceiver
 
 from autobahn.twisted.wamp import ApplicationSession
+from Codecs.SerialSplitter import SerialSplitter
 
 
 class McuProtocol(LineReceiver):
@@ -44,18 +44,29 @@ class McuProtocol(LineReceiver):
     def __init__(self, session):
         self.session = session
 
+        # Split the terminal text from the binary ensembles
+        self.splitter = SerialSplitter()
+
 
     def connectionMade(self):
         print('Serial port connected.')
 
     def dataReceived(self, data):
-        payload = {}
-        payload["port"] = self.session.config.extra['port']
-        payload["baud"] = self.session.config.extra['baudrate']
-        payload["value"] = str(data)
+        """
+        Publish the raw serial data as binary, like WampSerialProtocol.
+        The terminal text is published separately as text.
+        :param data: Data received from the serial port.
+        """
+        port = self.session.config.extra['port']
+        baud = self.session.config.extra['baudrate']
 
         # publish WAMP event to all subscribers on topic
-        self.session.publish(u"com.rti.data.serial", json.dumps(payload))
+        self.session.publish(u"com.rti.data.serial", {"port": port, "baud": baud, "type": SerialSplitter.BINARY, "value": bytes(data)})
+
+        for data_type, value in self.splitter.add(data):
+            if data_type == SerialSplitter.TEXT:
+                text = self.splitter.decode(value)
+                self.session.publish(u"com.rti.data.serial.text", {"port": port, "baud": baud, "type": SerialSplitter.TEXT, "value": text})
 
     def lineReceived(self, line):
         print("Serial line RX: {0}".format(line))
@@ -4,19 +4,22 @@ import json
 import glob
 import datetime
 
-from twisted.internet.protocol import ReconnectingClientFactory
+from twisted.internet.protocol import ReconnectingClientFactory, Protocol
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.serialport import SerialPort
-from twisted.protocols.basic import LineReceiver
 import twisted.internet.error
 
 from autobahn.twisted.wamp import ApplicationSession
 from Codecs.AdcpCodec import AdcpCodec
+from Codecs.SerialSplitter import SerialSplitter
+from Wamp.EnsemblePublisher import EnsemblePublisher
 
 
-class WampSerialProtocol(LineReceiver):
+class WampSerialProtocol(Protocol):
     """
     Serial communication protocol.
+    The serial data is passed through as raw binary.  The terminal
+    text is split from the binary ensembles and published separately.
     """
     # need a reference to our WS-MCU gateway factory to dispatch PubSub events
     def __init__(self, session, port, baud):
@@ -32,6 +35,9 @@ class WampSerialProtocol(LineReceiver):
         except Exception as e:
             self.session.log.error('Could not open serial port: {0}'.format(e))
 
+        # Split the terminal text from the binary ensembles
+        self.splitter = SerialSplitter()
+
         # Setup codec
         self.codec = AdcpCodec()
         self.codec.EnsembleEvent += self.ensemble_event
@@ -96,28 +102,26 @@ class WampSerialProtocol(LineReceiver):
     def dataReceived(self, data):
         """
         Data received from the serial port.
+        The raw data is published as binary.  The terminal text is
+        published as text and the binary ensembles are decoded.
         :param data: Data received from the serial port.
         :return: 
         """
-        payload = {}
-        payload["port"] = self.session.config.extra['port']
-        payload["baud"] = self.session.config.extra['baudrate']
-        try:
-            payload["value"] = data.decode('utf-8')
-            payload["type"] = "command"
-        except:
-            payload["value"] = str(data)
-            payload["type"] = "binary"
+        port = self.session.config.extra['port']
+        baud = self.session.config.extra['baudrate']
 
         # Publish WAMP event to all subscribers on topic
-        self.session.publish(u"com.rti.data.serial", json.dumps(payload))
-
-        # Add data to the codec
-        self.codec.add(data)
-
-    def lineReceived(self, line):
-        # Not Used
-        self.session.log.info("Serial line RX: {0}".format(line))
+        # The WAMP serializer will handle the binary payload
+        self.session.publish(u"com.rti.data.serial", {"port": port, "baud": baud, "type": SerialSplitter.BINARY, "value": bytes(data)})
+
+        for data_type, value in self.splitter.add(data):
+            if data_type == SerialSplitter.TEXT:
+                # Terminal output
+                text = self.splitter.decode(value)
+                self.session.publish(u"com.rti.data.serial.text", {"port": port, "baud": baud, "type": SerialSplitter.TEXT, "value": text})
+            else:
+                # Add ensemble data to the codec
+                self.codec.add(value)
 
     def ensemble_event(self, sender, ens):
         """
@@ -126,8 +130,8 @@ class WampSerialProtocol(LineReceiver):
         :param ens: Ensemble as JSON.
         :return: 
         """
-        # publish WAMP event to all subscribers on topic
-        self.session.publish(u"com.rti.data.ens", json.dumps(ens, default=lambda o: o.__dict__))
+        # publish WAMP event to all subscribers on the ensemble and dataset topics
+        self.session.ens_publisher.publish_ensemble(ens)
 
     def send_command(self, cmd):
         """
@@ -164,6 +168,9 @@ class WampAdcpComponent(ApplicationSession, ReconnectingClientFactory):
         print("WAMP ADCP component created")
         self.serialProtocol = None
 
+        # Publish the ensemble datasets to topics with subscribers
+        self.ens_publisher = EnsemblePublisher(self.publish)
+
     def clientConnectionFailed(self, connector, reason):
         print("Client connection failed .. retrying ..")
         self.retry(connector)
@@ -187,9 +194,46 @@ class WampAdcpComponent(ApplicationSession, ReconnectingClientFactory):
         yield self.register(self.send_cmd, u"com.rti.oncmd")
         yield self.register(self.send_break, u"com.rti.onbreak")
         yield self.register(self.set_time, u"com.rti.onsettime")
+        yield self.register(self.ens_publisher.configure, u"com.rti.ens.topic.config")
+        yield self.register(self.ens_publisher.configure_stats, u"com.rti.ens.stats.config")
+
+        # Track the subscriptions to only publish the ensemble topics with subscribers
+        try:
+            yield self.subscribe(self.on_subscription_create, u"wamp.subscription.on_create")
+            yield self.subscribe(self.on_subscription_delete, u"wamp.subscription.on_delete")
+
+            # Subscriptions made before joining, with any match policy
+            sub_lists = yield self.call(u"wamp.subscription.list")
+            for match, sub_ids in sub_lists.items():
+                for sub_id in sub_ids:
+                    details = yield self.call(u"wamp.subscription.get", sub_id)
+                    if details:
+                        self.ens_publisher.add_subscription(sub_id, details['uri'], details.get('match', match))
+        except Exception as e:
+            # Router does not give the subscription meta API, publish all the topics
+            self.log.error("Subscription meta API not available: " + str(e))
+            self.ens_publisher.track_subscriptions = False
 
         self.log.info("WAMP Connection made")
 
+    def on_subscription_create(self, session_id, details):
+        """
+        A topic has its first subscriber.
+        :param session_id: Session that subscribed.
+        :param details: Subscription details.
+        :return:
+        """
+        self.ens_publisher.add_subscription(details['id'], details['uri'], details.get('match', u"exact"))
+
+    def on_subscription_delete(self, session_id, sub_id):
+        """
+        A topic has no more subscribers.
+        :param session_id: Session that unsubscribed.
+        :param sub_id: Subscription ID.
+        :return:
+        """
+        self.ens_publisher.remove_subscription(sub_id)
+
     def reconnect_serial(self, port, baud):
         """
         Reconnect the serial port connection.  This will create a new
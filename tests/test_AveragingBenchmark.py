@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import getopt
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleData import EnsembleData
+from Ensemble.AncillaryData import AncillaryData
+from Ensemble.EarthVelocity import EarthVelocity
+from Ensemble.Amplitude import Amplitude
+from Ensemble.Correlation import Correlation
+from Ensemble.GoodEarth import GoodEarth
+from Ensemble.EnsembleAverager import EnsembleAverager
+
+
+def create_ensembles(num_ens, num_bins):
+    """
+    Create 1 Hz ensembles with some bad velocities.
+    """
+    rng = np.random.RandomState(0)
+    vel = rng.normal(0.0, 0.5, (num_ens, num_bins, 4))
+    vel[rng.uniform(size=(num_ens, num_bins)) < 0.05] = Ensemble.BadVelocity
+    amp = rng.normal(40.0, 5.0, (num_ens, num_bins, 4))
+
+    ensembles = []
+    for index in range(num_ens):
+        ens = Ensemble()
+        ens_data = EnsembleData(0, 0)
+        ens_data.EnsembleNumber = index + 1
+        ens_data.NumBins = num_bins
+        ens_data.NumBeams = 4
+        ens_data.ActualPingCount = 10
+        ens_data.Year, ens_data.Month, ens_data.Day = 2017, 1, 1
+        ens_data.Hour, remain = divmod(index, 3600)
+        ens_data.Minute, ens_data.Second = divmod(remain, 60)
+        ens.AddEnsembleData(ens_data)
+        anc = AncillaryData(0, 0)
+        anc.Heading = float(index % 360)
+        anc.Pitch = 1.0
+        ens.AddAncillaryData(anc)
+        earth = EarthVelocity(0, 0)
+        earth.Velocities = vel[index].tolist()
+        ens.AddEarthVelocity(earth)
+        ds = Amplitude(0, 0)
+        ds.Amplitude = amp[index].tolist()
+        ens.AddAmplitude(ds)
+        ds = Correlation(0, 0)
+        ds.Correlation = amp[index].tolist()
+        ens.AddCorrelation(ds)
+        ds = GoodEarth(0, 0)
+        ds.GoodEarth = [[10] * 4] * num_bins
+        ens.AddGoodEarth(ds)
+        ensembles.append(ens)
+    return ensembles, vel
+
+
+def dataframe_average(ensembles, seconds):
+    """
+    Load every ensemble into a DataFrame, like the rows in Postgres,
+    and average the time intervals with pandas.
+    """
+    rows = []
+    for ens in ensembles:
+        ens_time = ens.EnsembleData.datetime()
+        for bin_num, bin_vel in enumerate(ens.EarthVelocity.Velocities):
+            for beam, value in enumerate(bin_vel):
+                rows.append((ens_time, bin_num, beam, value, ens.Amplitude.Amplitude[bin_num][beam],
+                             ens.Correlation.Correlation[bin_num][beam], ens.GoodEarth.GoodEarth[bin_num][beam]))
+    df = pd.DataFrame(rows, columns=['time', 'bin', 'beam', 'vel', 'amp', 'corr', 'good'])
+    df.loc[df.vel == Ensemble.BadVelocity, 'vel'] = np.nan
+    df['interval'] = df.time.values.astype('datetime64[s]').astype(np.int64) // seconds
+    grouped = df.groupby(['interval', 'bin', 'beam'])
+    return grouped.agg({'vel': 'mean', 'amp': 'mean', 'corr': 'mean', 'good': 'sum'})
+
+
+def averager_average(ensembles, seconds):
+    """
+    Average the ensembles as they are received.
+    """
+    averaged = []
+    averager = EnsembleAverager(seconds=seconds)
+    averager.EnsembleEvent += lambda sender, ens: averaged.append(ens)
+    for ens in ensembles:
+        averager.process_ensemble(None, ens)
+    averager.flush()
+    return averaged
+
+
+def run(name, func, ensembles, seconds):
+    """
+    Run the function and print the time.  Run it again to find the peak memory.
+    """
+    start = time.perf_counter()
+    result = func(ensembles, seconds)
+    run_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(ensembles, seconds)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{0:12}: {1:.3f} s  {2:.1f} us/ens  peak memory {3:.1f} MB".format(
+        name, run_time, run_time / len(ensembles) * 1e6, peak / 1e6))
+    return result
+
+
+def main(argv):
+    num_ens = 3600
+    num_bins = 50
+    seconds = 600
+    usage = 'test_AveragingBenchmark.py -n <num ens> -b <num bins> -s <seconds>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:s:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-s"):
+            seconds = int(arg)
+
+    ensembles, vel = create_ensembles(num_ens, num_bins)
+    df = run("DataFrame", dataframe_average, ensembles, seconds)
+    averaged = run("Averager", averager_average, ensembles, seconds)
+    print("{0} ensembles averaged to {1}".format(num_ens, len(averaged)))
+
+    # Same averages, each ensemble has all 4 components good or bad
+    assert len(averaged) == int(np.ceil(num_ens / float(seconds)))
+    for index, ens in enumerate(averaged):
+        interval = vel[index * seconds:(index + 1) * seconds]
+        expected = np.nanmean(np.where(interval == Ensemble.BadVelocity, np.nan, interval), axis=0)
+        assert np.allclose(ens.EarthVelocity.Velocities, expected)
+        assert np.allclose(np.array(ens.EarthVelocity.Velocities).ravel(), df.vel.values[index * num_bins * 4:(index + 1) * num_bins * 4])
+        assert np.allclose(np.array(ens.Amplitude.Amplitude).ravel(), df.amp.values[index * num_bins * 4:(index + 1) * num_bins * 4])
+        assert ens.GoodEarth.GoodEarth[0][0] == 10 * len(interval)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import getopt
+import numpy as np
+
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+from bokeh.plotting import figure
+from bokeh.protocol import Protocol
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Frontend.Bokeh.EnsembleStream import EnsembleHub, DocumentStream, TimeSeriesStream, ProfileStream, HeatmapStream
+
+
+def create_ens(ens_num, num_bins):
+    """
+    Create an ensemble like the JSON ensembles from WAMP.
+    """
+    amp = np.random.uniform(20.0, 100.0, (num_bins, 4))
+    return {'EnsembleData': {'EnsembleNumber': ens_num},
+            'AncillaryData': {'Heading': float(ens_num % 360)},
+            'Amplitude': {'Amplitude': amp.tolist()}}
+
+
+class Session:
+    """
+    Document for one browser, with the change events sent to the browser.
+    """
+
+    def __init__(self, hub, num_bins, window, rollover, rebuild):
+        self.doc = Document()
+        self.events = []
+        self.doc.on_change(lambda event: self.events.append(event))
+        self.rebuild = rebuild
+        self.num_bins = num_bins
+        self.window = window
+        self.rollover = rollover
+
+        self.series = ColumnDataSource(dict(ens=[], heading=[]))
+        self.profile = ColumnDataSource(dict(bin=[], amp0=[], amp1=[], amp2=[], amp3=[]))
+        self.heatmap = ColumnDataSource(dict(image=[], x=[], y=[], dw=[], dh=[]))
+
+        fig = figure()
+        fig.line(x='ens', y='heading', source=self.series)
+        for beam in range(4):
+            fig.line(x='amp' + str(beam), y='bin', source=self.profile)
+        fig.image(image='image', x='x', y='y', dw='dw', dh='dh', source=self.heatmap)
+        self.doc.add_root(fig)
+
+        self.stream = DocumentStream(hub)
+        if not rebuild:
+            self.stream.add(TimeSeriesStream(self.series, {'ens': lambda ens: ens['EnsembleData']['EnsembleNumber'],
+                                                           'heading': lambda ens: ens['AncillaryData']['Heading']},
+                                             rollover))
+            profile = {'bin': lambda ens: range(len(ens['Amplitude']['Amplitude']))}
+            for beam in range(4):
+                profile['amp' + str(beam)] = lambda ens, beam=beam: [amp[beam] for amp in ens['Amplitude']['Amplitude']]
+            self.stream.add(ProfileStream(self.profile, profile))
+            self.stream.add(HeatmapStream(self.heatmap, lambda ens: [amp[0] for amp in ens['Amplitude']['Amplitude']],
+                                          num_bins, window))
+        else:
+            self.ens = []
+            self.image = np.full((num_bins, window), np.nan)
+        self.events = []
+
+    def tick(self):
+        """
+        Update the document, then serialize the changes like the server does.
+        :return: Bytes sent to the browser.
+        """
+        if not self.rebuild:
+            self.stream.tick()
+        else:
+            # Previous apps: rebuild the data sources from the latest ensembles
+            self.stream.seq, ensembles, skipped = self.stream.hub.get_since(self.stream.seq)
+            for ens in ensembles:
+                self.ens.append(ens)
+                self.image = np.roll(self.image, -1, axis=1)
+                self.image[:, -1] = [amp[0] for amp in ens['Amplitude']['Amplitude']]
+            self.ens = self.ens[-self.rollover:]
+            if ensembles:
+                amp = np.array(self.ens[-1]['Amplitude']['Amplitude'])
+                self.series.data = dict(ens=[ens['EnsembleData']['EnsembleNumber'] for ens in self.ens],
+                                        heading=[ens['AncillaryData']['Heading'] for ens in self.ens])
+                self.profile.data = dict(bin=list(range(len(amp))), amp0=amp[:, 0], amp1=amp[:, 1], amp2=amp[:, 2], amp3=amp[:, 3])
+                self.heatmap.data = dict(image=[self.image.copy()], x=[0], y=[0], dw=[self.window], dh=[self.num_bins])
+
+        size = 0
+        if self.events:
+            msg = Protocol().create("PATCH-DOC", self.events)
+            size = len(msg.content_json) + sum(len(buffer.to_bytes()) for buffer in msg.buffers)
+            self.events = []
+        return size
+
+
+def run(num_sessions, num_ens, num_bins, window, rollover, rebuild):
+    """
+    Send the ensembles to all the sessions.
+    :return: (Seconds for each ensemble, Bytes for each ensemble and session)
+    """
+    hub = EnsembleHub()
+    sessions = [Session(hub, num_bins, window, rollover, rebuild) for i in range(num_sessions)]
+
+    # Fill the rollover window first
+    for ens_num in range(rollover):
+        hub.add(create_ens(ens_num, num_bins))
+        for session in sessions:
+            session.tick()
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for ens_num in range(rollover, rollover + num_ens):
+        hub.add(create_ens(ens_num, num_bins))
+        for session in sessions:
+            total_bytes += session.tick()
+    elapsed = time.perf_counter() - start
+    return elapsed / num_ens, total_bytes / num_ens / num_sessions
+
+
+def main(argv):
+    num_ens = 50
+    num_bins = 30
+    window = 200
+    rollover = 200
+    rate = 10.0
+    usage = 'test_BokehStreamThroughput.py -n <num ens> -b <num bins> -w <heatmap window> -r <rollover>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:w:r:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-w"):
+            window = int(arg)
+        elif opt in ("-r"):
+            rollover = int(arg)
+
+    print("Bins: {0}  Heatmap window: {1}  Rollover: {2}  Rate: {3} Hz".format(num_bins, window, rollover, rate))
+    for num_sessions in [1, 10, 50]:
+        for name, rebuild in [("rebuild", True), ("stream", False)]:
+            ens_time, ens_bytes = run(num_sessions, num_ens, num_bins, window, rollover, rebuild)
+            print("{0:3} browsers {1:8}: {2:7.1f} ms/ens  {3:8.0f} bytes/ens/browser  max browsers at {4} Hz: {5:.0f}".format(
+                num_sessions, name, ens_time * 1000, ens_bytes, rate, num_sessions / (ens_time * rate)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import getopt
+from datetime import datetime, timedelta
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Codecs.CompressedEnsFile import CompressedEnsReader, compress_file, zstandard, lz4, _create_ens
+from Codecs.BinaryCodec import BinaryCodec
+
+
+def create_file(file_path, num_ens, num_bins):
+    """
+    Create a raw ensemble file.
+    """
+    start = datetime(2017, 7, 1, 12, 0, 0)
+    with open(file_path, 'wb') as f:
+        for ens_num in range(1, num_ens + 1):
+            f.write(_create_ens(ens_num, num_bins, 4, start + timedelta(seconds=ens_num)))
+
+
+def decode_raw(file_path):
+    """
+    Decode the raw file with the binary codec.
+    :return: Decoded ensembles.
+    """
+    ensembles = []
+    codec = BinaryCodec()
+    codec.EnsembleEvent += lambda sender, ens: ensembles.append(ens)
+    with open(file_path, 'rb') as f:
+        data = f.read(4096)
+        while data:
+            codec.add(data)
+            data = f.read(4096)
+
+    # The codec decodes one ensemble for each add()
+    while codec.buffer.find(b'\x80' * 16) >= 0 and len(codec.buffer) > 32:
+        size = len(codec.buffer)
+        codec.find_ensemble()
+        if len(codec.buffer) == size:
+            break
+    return ensembles
+
+
+def main(argv):
+    inputfile = ''
+    num_ens = 2000
+    num_bins = 60
+    processes = None
+    usage = 'test_CompressedEnsBenchmark.py -i <raw ens file> -n <num ens> -b <num bins> -p <processes>'
+    try:
+        opts, args = getopt.getopt(argv, "hi:n:b:p:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-i"):
+            inputfile = arg
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-p"):
+            processes = int(arg)
+
+    folder_path = tempfile.mkdtemp()
+    if not inputfile:
+        inputfile = os.path.join(folder_path, "bench.ens")
+        create_file(inputfile, num_ens, num_bins)
+    raw_size = os.path.getsize(inputfile)
+    print("Raw file: {0} bytes".format(raw_size))
+
+    start = time.perf_counter()
+    count = len(decode_raw(inputfile))
+    raw_time = time.perf_counter() - start
+    print("raw      : ratio 1.00  decode {0:.1f} ens/s ({1} ens)".format(count / raw_time, count))
+
+    codecs = ["zlib"]
+    if zstandard is not None:
+        codecs.append("zstd")
+    if lz4 is not None:
+        codecs.append("lz4")
+
+    for codec in codecs:
+        comp_file = os.path.join(folder_path, "bench." + codec + ".ensz")
+        start = time.perf_counter()
+        compress_file(inputfile, comp_file, codec)
+        comp_time = time.perf_counter() - start
+
+        with CompressedEnsReader(comp_file) as reader:
+            # Decompress only
+            start = time.perf_counter()
+            while reader.read(1048576):
+                pass
+            read_time = time.perf_counter() - start
+
+            # Decode one process, then in parallel
+            start = time.perf_counter()
+            count = len(reader.decode(processes=1))
+            serial_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            count = len(reader.decode(processes=processes))
+            parallel_time = time.perf_counter() - start
+
+        print("{0:9}: ratio {1:.2f}  compress {2:.1f} MB/s  decompress {3:.1f} MB/s  "
+              "decode {4:.1f} ens/s  parallel decode {5:.1f} ens/s ({6} ens)".format(
+                  codec, raw_size / os.path.getsize(comp_file),
+                  raw_size / comp_time / 1e6, raw_size / read_time / 1e6,
+                  count / serial_time, count / parallel_time, count))
+
+    shutil.rmtree(folder_path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
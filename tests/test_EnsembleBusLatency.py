@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import getopt
+import multiprocessing
+import numpy as np
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Comm.EnsembleBus import EnsembleBusWriter, EnsembleBusReader
+
+
+def reader_process(name, count, ready, results):
+    """
+    Read the ensembles and measure the time from publish to read.
+    """
+    reader = EnsembleBusReader(name)
+    ready.set()
+
+    latencies = []
+    while len(latencies) + reader.overruns < count:
+        slot = reader.wait_next(timeout=5.0)
+        if slot is None:
+            break
+        now = time.perf_counter()
+
+        # Use the data, then check it was not overwritten
+        total = slot.arrays["EarthVelocity"].sum()
+        if reader.is_valid(slot):
+            latencies.append(now - slot.PublishTime)
+
+    results.put((latencies, reader.overruns))
+    reader.close()
+
+
+def run(num_readers, count, interval, num_bins):
+    """
+    Publish the ensembles with the number of readers.
+    :return: (Latencies of all the readers, Total overruns)
+    """
+    name = "rti_bench_bus_" + str(os.getpid())
+    writer = EnsembleBusWriter(name, num_slots=64, max_bins=num_bins, max_beams=4)
+
+    results = multiprocessing.Queue()
+    readers = []
+    for i in range(num_readers):
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=reader_process, args=(name, count, ready, results))
+        process.start()
+        ready.wait()
+        readers.append(process)
+
+    arrays = {ds: np.random.uniform(-2.0, 2.0, (num_bins, 4)).astype(np.float32)
+              for ds in ["BeamVelocity", "InstrumentVelocity", "EarthVelocity", "Amplitude", "Correlation"]}
+    for ens_num in range(1, count + 1):
+        writer.publish_arrays(ens_num, time.time(), arrays, {"Heading": 10.0})
+        time.sleep(interval)
+
+    latencies = []
+    overruns = 0
+    for process in readers:
+        reader_latencies, reader_overruns = results.get()
+        latencies.extend(reader_latencies)
+        overruns += reader_overruns
+    for process in readers:
+        process.join()
+
+    writer.close()
+    return np.array(latencies), overruns
+
+
+def main(argv):
+    count = 500
+    interval = 0.002
+    num_bins = 200
+    usage = 'test_EnsembleBusLatency.py -n <num ens> -i <publish interval> -b <num bins>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:i:b:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            count = int(arg)
+        elif opt in ("-i"):
+            interval = float(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+
+    print("Ensembles: {0}  Interval: {1} s  Bins: {2}  CPUs: {3}".format(count, interval, num_bins, os.cpu_count()))
+    for num_readers in [1, 4, 16]:
+        latencies, overruns = run(num_readers, count, interval, num_bins)
+        latencies *= 1e6
+        print("{0:2} readers: median {1:8.1f} us  p99 {2:8.1f} us  max {3:8.1f} us  overruns {4}".format(
+            num_readers, np.median(latencies), np.percentile(latencies, 99), latencies.max(), overruns))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
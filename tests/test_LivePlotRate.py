@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import json
+import socket
+import getopt
+import threading
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib import cm
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Frontend.LivePlot import LivePlot
+
+
+class LegacyLivePlot(LivePlot):
+    """
+    Previous amplitude plot.  A new figure is created for each
+    amplitude dataset on the receive thread.
+    """
+
+    def process(self, jsonData):
+        if self.is_alive and "E000004" in jsonData["Name"]:
+            fig, ax = plt.subplots()
+            cax = ax.imshow(jsonData["Amplitude"], interpolation=self.methods[1], cmap=cm.coolwarm, vmin=0, vmax=12)
+            ax.set_title('Amplitude Data')
+            plt.colorbar(cax)
+            plt.pause(0.05)
+            self.amp_count += 1
+            self.frame_count += 1
+
+
+def send(port, rate, duration, num_bins):
+    """
+    Send the amplitude datasets at the rate in datasets per second.
+    :return: Datasets sent.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        due = int((time.perf_counter() - start) * rate)
+        while count < due:
+            amp = [[float((count + bin_num + beam) % 12) for beam in range(4)] for bin_num in range(num_bins)]
+            data = json.dumps({"EnsembleNumber": count + 1, "Name": "E000004", "Amplitude": amp}) + "\n"
+            sock.sendto(data.encode(), ("127.0.0.1", port))
+            count += 1
+        time.sleep(0.001)
+    sock.close()
+    return count
+
+
+def run(mode, port, rate, duration, num_bins, refresh_rate):
+    """
+    Receive the datasets and plot them in the mode.
+    :return: (Sent, Received, Frames drawn)
+    """
+    plot = LegacyLivePlot(port, start=False) if mode == "legacy" else LivePlot(port, refresh_rate, start=False)
+    if mode == "blit":
+        plot.create_amp_plot()
+    plot.start_reader()
+    time.sleep(0.2)
+
+    sender = []
+    thread = threading.Thread(target=lambda: sender.append(send(port, rate, duration, num_bins)))
+    thread.start()
+
+    # Draw on this thread, like the GUI timer
+    while thread.is_alive():
+        if mode == "blit":
+            plot.update_amp_plot()
+        time.sleep(1.0 / refresh_rate)
+    thread.join()
+    time.sleep(0.5)
+    plot.close()
+    plot.reader_thread.join()
+    plt.close('all')
+    return sender[0], plot.amp_count, plot.frame_count
+
+
+def main(argv):
+    port = 55098
+    rate = 500
+    duration = 5.0
+    num_bins = 30
+    refresh_rate = 10.0
+    usage = 'test_LivePlotRate.py -p <port> -r <datasets per second> -d <seconds> -b <num bins> -f <refresh rate>'
+    try:
+        opts, args = getopt.getopt(argv, "hp:r:d:b:f:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-p"):
+            port = int(arg)
+        elif opt in ("-r"):
+            rate = int(arg)
+        elif opt in ("-d"):
+            duration = float(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-f"):
+            refresh_rate = float(arg)
+
+    for mode in ["off", "blit", "legacy"]:
+        sent, received, frames = run(mode, port, rate, duration, num_bins, refresh_rate)
+        print("{0:6}: sent {1:6}  ingested {2:6} ({3:7.1f} ens/s)  frames {4:4}".format(
+            mode, sent, received, received / duration, frames))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
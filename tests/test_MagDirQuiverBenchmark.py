@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import getopt
+import numpy as np
+import pandas as pd
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../../')
+
+from rti_python.Plots.rti_sql_plot_mag_dir import calc_quivers, calc_color_index
+
+
+def calc_quivers_loop(df_mag, df_dir, num_bins, scale_factor=1):
+    """
+    Previous quiver calculation, one ensemble and bin at a time.
+    """
+    x0_ens = []
+    y0_ens = []
+    x1_ens = []
+    y1_ens = []
+    length_vals = []
+    speed_vals = []
+    for index, row in df_mag.iterrows():
+        for bin_loc in range(num_bins):
+            bin_str = 'bin' + str(bin_loc)
+            mag = row[bin_str]
+            vel_dir = df_dir.iloc[index][bin_str]
+            speed_vals.append(mag)
+            if vel_dir < 0:
+                vel_dir = 360.0 + vel_dir
+            length_val = mag / scale_factor
+            length_vals.append(length_val)
+            x0_ens.append(index)
+            y0_ens.append(bin_loc)
+            x1_ens.append(index + length_val * np.cos(vel_dir))
+            y1_ens.append(bin_loc + length_val * np.sin(vel_dir))
+
+    return {'x0': x0_ens, 'y0': y0_ens, 'x1': x1_ens, 'y1': y1_ens,
+            'length': np.asarray(length_vals), 'speed': np.asarray(speed_vals)}
+
+
+def main(argv):
+    num_ens = 2000
+    num_bins = 100
+    usage = 'test_MagDirQuiverBenchmark.py -n <num ens> -b <num bins>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+
+    columns = ['bin' + str(bin_num) for bin_num in range(num_bins)]
+    east = pd.DataFrame(np.random.uniform(-2.0, 2.0, (num_ens, num_bins)), columns=columns)
+    north = pd.DataFrame(np.random.uniform(-2.0, 2.0, (num_ens, num_bins)), columns=columns)
+    df_mag = pd.DataFrame(np.sqrt(np.square(east) + np.square(north)))
+    df_dir = pd.DataFrame(np.degrees(np.arctan2(east, north)))
+
+    start = time.perf_counter()
+    loop = calc_quivers_loop(df_mag, df_dir, num_bins)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quivers = calc_quivers(df_mag, df_dir, num_bins)
+    colors = calc_color_index(quivers['length'], 5)
+    vector_time = time.perf_counter() - start
+
+    for key in loop:
+        assert np.array_equal(np.asarray(loop[key], dtype=float), quivers[key])
+    assert np.array_equal(calc_color_index(loop['length'], 5), colors)
+
+    print("{0} ens x {1} bins: loop {2:.3f} s  vectorized {3:.4f} s  speedup {4:.0f}x".format(
+        num_ens, num_bins, loop_time, vector_time, loop_time / vector_time))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
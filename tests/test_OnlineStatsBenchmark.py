@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import getopt
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Ensemble.Ensemble import Ensemble
+from Ensemble.OnlineStats import RollingStats
+
+
+def dataframe_stats(data, window, snapshot_every):
+    """
+    Keep a DataFrame for each ensemble, like tests/test_numpy_ens.py,
+    and calculate the statistics of the last window ensembles.
+    """
+    history = []
+    snapshot = None
+    for ens, values in enumerate(data):
+        df = pd.DataFrame(columns=['B0', 'B1', 'B2', 'B3'], data=values)
+        df[df == Ensemble.BadVelocity] = np.nan
+        history.append(df)
+        if (ens + 1) % snapshot_every == 0:
+            grouped = pd.concat(history[-window:]).groupby(level=0)
+            snapshot = {'mean': grouped.mean().values, 'std': grouped.std().values,
+                        'min': grouped.min().values, 'max': grouped.max().values}
+    return snapshot
+
+
+def online_stats(data, window, snapshot_every, mode='fixed'):
+    """
+    Update the online statistics with each ensemble.
+    """
+    stats = RollingStats(window=window, mode=mode)
+    snapshot = None
+    for ens, values in enumerate(data):
+        stats.add(values)
+        if (ens + 1) % snapshot_every == 0:
+            snapshot = stats.snapshot()
+    return snapshot
+
+
+def run(name, func, *args):
+    """
+    Run the function and print the time.  Run it again to find the peak memory.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    run_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{0:12}: {1:.3f} s  {2:.1f} us/ens  peak memory {3:.1f} MB".format(
+        name, run_time, run_time / len(args[0]) * 1e6, peak / 1e6))
+    return result
+
+
+def main(argv):
+    num_ens = 5000
+    num_bins = 50
+    window = 600
+    snapshot_every = 10
+    usage = 'test_OnlineStatsBenchmark.py -n <num ens> -b <num bins> -w <window> -s <snapshot every>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:w:s:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-w"):
+            window = int(arg)
+        elif opt in ("-s"):
+            snapshot_every = int(arg)
+
+    rng = np.random.RandomState(0)
+    data = rng.normal(0.0, 1.0, (num_ens, num_bins, 4))
+    data[rng.uniform(size=data.shape) < 0.05] = Ensemble.BadVelocity
+
+    df_snapshot = run("DataFrames", dataframe_stats, data, window, snapshot_every)
+    snapshot = run("Fixed", online_stats, data, window, snapshot_every)
+    run("Exponential", online_stats, data, window, snapshot_every, 'exponential')
+
+    # Same statistics over the ensembles in the window
+    last = np.where(data[-snapshot['NumEnsembles']:] == Ensemble.BadVelocity, np.nan, data[-snapshot['NumEnsembles']:])
+    assert np.allclose(snapshot['mean'], np.nanmean(last, axis=0))
+    assert np.allclose(snapshot['std'], np.nanstd(last, axis=0, ddof=1))
+    if snapshot['NumEnsembles'] == window:
+        assert np.allclose(snapshot['mean'], df_snapshot['mean'])
+        assert np.allclose(snapshot['max'], df_snapshot['max'])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import getopt
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Utilities.AsyncFileWriter import AsyncFileWriter
+
+
+class SlowFile:
+    """
+    File that simulates a slow disk.  Each write takes the latency plus the
+    time to write the data at the given rate.  A stall can be added to
+    simulate the disk not responding.
+    """
+
+    def __init__(self, path, mode, latency=0.0, rate=None, stall_after=None, stall_time=0.0):
+        """
+        :param path: File path.
+        :param mode: File mode.
+        :param latency: Seconds for each write.
+        :param rate: Bytes per second written.  None for no limit.
+        :param stall_after: Stall once after this many bytes.
+        :param stall_time: Seconds to stall.
+        """
+        self.file = open(path, mode)
+        self.latency = latency
+        self.rate = rate
+        self.stall_after = stall_after
+        self.stall_time = stall_time
+        self.size = 0
+
+    def write(self, data):
+        delay = self.latency
+        if self.rate:
+            delay += len(data) / self.rate
+        self.size += len(data)
+        if self.stall_after is not None and self.size >= self.stall_after:
+            delay += self.stall_time
+            self.stall_after = None
+        time.sleep(delay)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class SocketBuffer:
+    """
+    Simulate the kernel socket receive buffer.  The serial data is added
+    at the baud rate.  If the buffer is full, the data is dropped.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.buffer = bytearray()
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.done = False
+
+    def add(self, data):
+        with self.condition:
+            space = self.size - len(self.buffer)
+            if len(data) > space:
+                self.dropped += len(data) - space
+                data = data[:space]
+            self.buffer.extend(data)
+            self.condition.notify()
+
+    def recv(self, size):
+        with self.condition:
+            while not self.buffer and not self.done:
+                self.condition.wait(0.1)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+
+def serial_port(sock_buffer, rate, duration):
+    """
+    Add data to the socket buffer at the given rate in bytes per second.
+    """
+    chunk = b'\x80' * int(rate / 100)
+    start = time.perf_counter()
+    count = 0
+    while time.perf_counter() - start < duration:
+        count += 1
+        sock_buffer.add(chunk)
+        sleep = start + count * 0.01 - time.perf_counter()
+        if sleep > 0:
+            time.sleep(sleep)
+    with sock_buffer.condition:
+        sock_buffer.done = True
+        sock_buffer.condition.notify()
+    return count * len(chunk)
+
+
+def run(writer_type, rate, duration, socket_size, latency, disk_rate, stall_after, stall_time, queue_size):
+    """
+    Record the serial data to a slow disk.
+    :return: (Bytes sent, Bytes dropped by the socket, Bytes dropped by the writer, Bytes written)
+    """
+    folder_path = tempfile.mkdtemp()
+    file_path = os.path.join(folder_path, "Adcp.ens")
+
+    def opener(path, mode):
+        return SlowFile(path, mode, latency, disk_rate, stall_after, stall_time)
+
+    sock_buffer = SocketBuffer(socket_size)
+    result = {}
+    sender = threading.Thread(target=lambda: result.update(sent=serial_port(sock_buffer, rate, duration)))
+    sender.start()
+
+    writer_dropped = 0
+    if writer_type == "sync":
+        # Previous recorder.  Read and write on the same thread.
+        f = opener(file_path, 'wb')
+        while True:
+            data = sock_buffer.recv(4096)
+            if not data:
+                break
+            f.write(data)
+        f.close()
+        written = os.path.getsize(file_path)
+    else:
+        writer = AsyncFileWriter(lambda: file_path, max_file_size=None, queue_size=queue_size, opener=opener)
+        while True:
+            data = sock_buffer.recv(65536)
+            if not data:
+                break
+            writer.write(data)
+        writer.close()
+        stats = writer.get_stats()
+        writer_dropped = stats["bytes_dropped"]
+        written = stats["bytes_written"]
+
+    sender.join()
+    shutil.rmtree(folder_path)
+
+    return result["sent"], sock_buffer.dropped, writer_dropped, written
+
+
+def main(argv):
+    baud = 921600
+    duration = 6.0
+    latency = 0.002
+    stall_time = 3.0
+    queue_size = 1048576 * 64
+    usage = 'test_RecorderSlowDisk.py -b <baud> -d <seconds> -l <write latency> -s <stall seconds> -q <queue bytes>'
+    try:
+        opts, args = getopt.getopt(argv, "hb:d:l:s:q:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-b"):
+            baud = int(arg)
+        elif opt in ("-d"):
+            duration = float(arg)
+        elif opt in ("-l"):
+            latency = float(arg)
+        elif opt in ("-s"):
+            stall_time = float(arg)
+        elif opt in ("-q"):
+            queue_size = int(arg)
+
+    # 10 bits per byte on the serial port
+    rate = baud / 10
+    socket_size = 212992           # Default Linux socket receive buffer
+
+    print("Baud: {0}  Write latency: {1} s  Stall: {2} s after 1 second of data".format(baud, latency, stall_time))
+    for writer_type in ["sync", "async"]:
+        sent, sock_dropped, writer_dropped, written = run(writer_type, rate, duration, socket_size,
+                                                          latency, None, int(rate), stall_time, queue_size)
+        print("{0:5}: Sent {1} bytes  Socket dropped {2}  Writer dropped {3}  Written {4}".format(
+            writer_type, sent, sock_dropped, writer_dropped, written))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
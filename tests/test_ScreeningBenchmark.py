@@ -0,0 +1,153 @@
+import os
+import sys
+import math
+import time
+import getopt
+import numpy as np
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSeries import EnsembleSeries
+from Ensemble.Screening import ProfileScreen
+
+OPTIONS = dict(min_correlation=0.25, min_amplitude=5.0, min_good_beam=0.5, min_good_earth=0.5,
+               max_error_velocity=0.5, side_lobe=True, fish_threshold=25.0, beam_angle=20.0)
+
+
+def screen_loop(series, min_correlation, min_amplitude, min_good_beam, min_good_earth,
+                max_error_velocity, side_lobe, fish_threshold, beam_angle, three_beam=True):
+    """
+    Screen one ensemble, bin and beam at a time, like WaveEnsemble.add_4_beam().
+    """
+    beam_vel = series.beam_vel.tolist()
+    earth_vel = series.earth_vel.tolist()
+    corr = series.correlation.tolist()
+    amp = series.amplitude.tolist()
+    good_beam = series.good_beam.tolist()
+    good_earth = series.good_earth.tolist()
+    beam_mask = []
+    earth_mask = []
+    for ens in range(series.num_ens):
+        pings = series.actual_ping_count[ens]
+        ranges = [r for r in series.bt_range[ens] if r > 0.0]
+        cutoff = min(ranges) * math.cos(math.radians(beam_angle)) if ranges and side_lobe else None
+        ens_beam = []
+        ens_earth = []
+        for bin_num in range(len(beam_vel[ens])):
+            bin_bottom = series.first_bin_range[ens] + (bin_num + 0.5) * series.bin_size[ens]
+            in_side_lobe = cutoff is not None and bin_bottom > cutoff
+            weakest = min(amp[ens][bin_num])
+            bin_beam = []
+            for beam in range(len(beam_vel[ens][bin_num])):
+                bad = abs(beam_vel[ens][bin_num][beam] - Ensemble.BadVelocity) < 1e-3
+                bad = bad or corr[ens][bin_num][beam] < min_correlation
+                bad = bad or amp[ens][bin_num][beam] < min_amplitude
+                bad = bad or good_beam[ens][bin_num][beam] / pings < min_good_beam
+                bad = bad or amp[ens][bin_num][beam] - weakest > fish_threshold
+                bin_beam.append(bad or in_side_lobe)
+            ens_beam.append(bin_beam)
+
+            bad = sum(bin_beam) > (1 if three_beam else 0) or in_side_lobe
+            for comp in range(3):
+                bad = bad or abs(earth_vel[ens][bin_num][comp] - Ensemble.BadVelocity) < 1e-3
+                bad = bad or good_earth[ens][bin_num][comp] / pings < min_good_earth
+            error_vel = earth_vel[ens][bin_num][3]
+            bad = bad or (abs(error_vel) > max_error_velocity and abs(error_vel - Ensemble.BadVelocity) >= 1e-3)
+            ens_earth.append(bad)
+        beam_mask.append(ens_beam)
+        earth_mask.append(ens_earth)
+    return np.array(beam_mask), np.array(earth_mask)
+
+
+def create_series(num_ens, num_bins):
+    """
+    Create a deployment with some bad data for each screen.
+    """
+    rng = np.random.RandomState(0)
+    series = EnsembleSeries(num_ens, num_bins)
+    shape = (num_ens, num_bins, 4)
+    series.beam_vel = np.where(rng.uniform(size=shape) < 0.02, Ensemble.BadVelocity, rng.normal(0.0, 1.0, shape))
+    series.earth_vel = np.where(rng.uniform(size=shape) < 0.02, Ensemble.BadVelocity, rng.normal(0.0, 0.2, shape))
+    series.correlation = rng.uniform(0.0, 1.0, shape)
+    series.amplitude = rng.normal(40.0, 10.0, shape)
+    series.actual_ping_count = np.full(num_ens, 10.0)
+    series.good_beam = rng.binomial(10, 0.9, shape).astype(float)
+    series.good_earth = rng.binomial(10, 0.9, shape).astype(float)
+    series.first_bin_range = np.full(num_ens, 1.0)
+    series.bin_size = np.full(num_ens, 0.5)
+    series.bt_range = rng.uniform(10.0, 30.0, (num_ens, 4))
+    return series
+
+
+def main(argv):
+    num_ens = 20000
+    num_bins = 50
+    block_size = 1000
+    loop_ens = 2000
+    usage = 'test_ScreeningBenchmark.py -n <num ens> -b <num bins> -k <block size> -l <loop ens>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:k:l:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-k"):
+            block_size = int(arg)
+        elif opt in ("-l"):
+            loop_ens = int(arg)
+
+    series = create_series(num_ens, num_bins)
+
+    # Loop on the first ensembles only, it is slow
+    loop_series = create_series(loop_ens, num_bins)
+    start = time.perf_counter()
+    loop_beam, loop_earth = screen_loop(loop_series, **OPTIONS)
+    loop_time = time.perf_counter() - start
+    screen = ProfileScreen(loop_series, block_size=block_size, **OPTIONS)
+    beam_mask, earth_mask = screen.get_masks()
+    assert np.array_equal(beam_mask, loop_beam)
+    assert np.array_equal(earth_mask, loop_earth)
+    print("Loop: {0} ens x {1} bins {2:.3f} s  ({3:.1f} us/ens)".format(
+        loop_ens, num_bins, loop_time, loop_time / loop_ens * 1e6))
+
+    screen = ProfileScreen(series, block_size=block_size, **OPTIONS)
+    start = time.perf_counter()
+    beam_mask, earth_mask = screen.get_masks()
+    first_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    earth = screen.apply_earth(series.earth_vel)
+    cached_time = time.perf_counter() - start
+
+    # Plot a window of the deployment
+    start = time.perf_counter()
+    for window_start in range(0, num_ens - 500, 500):
+        screen.beam_mask(window_start, window_start + 500)
+    window_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    screen.set_options(min_correlation=0.5)
+    screen.get_masks()
+    rescreen_time = time.perf_counter() - start
+
+    print("Screen: {0} ens x {1} bins {2:.3f} s  ({3:.1f} us/ens)  speedup {4:.0f}x".format(
+        num_ens, num_bins, first_time, first_time / num_ens * 1e6, (loop_time / loop_ens) / (first_time / num_ens)))
+    print("Apply earth mask (cached): {0:.3f} s".format(cached_time))
+    print("Windows of 500 ens (cached): {0:.4f} s".format(window_time))
+    print("Change correlation threshold: {0:.3f} s".format(rescreen_time))
+    print("Good earth values: {0:.1%}".format(np.mean(~np.isnan(earth[..., 0]))))
+    for name, count in sorted(screen.counts().items()):
+        print("\t{0:15}: {1}".format(name, count))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
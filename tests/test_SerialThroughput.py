@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import tty
+import threading
+import getopt
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Codecs.SerialSplitter import SerialSplitter, _create_ens
+
+
+def create_stream(num_ens, payload_size):
+    """
+    Create a serial stream of terminal text and binary ensembles.
+    """
+    data = bytearray()
+    for ens_num in range(num_ens):
+        data.extend(b"ENS " + str(ens_num).encode() + b"\r\n")
+        data.extend(_create_ens(ens_num, payload_size))
+    return bytes(data)
+
+
+def decode_json_path(data):
+    """
+    Previous data path of WampSerialProtocol.dataReceived().  Try to decode
+    every chunk, fall back to the string of the bytes, then JSON encode the
+    payload.  The protocols override dataReceived(), so LineReceiver did
+    not split or buffer the lines.
+    """
+    payload = {"port": "/dev/pts", "baud": 115200}
+    try:
+        payload["value"] = data.decode('utf-8')
+        payload["type"] = "command"
+    except:
+        payload["value"] = str(data)
+        payload["type"] = "binary"
+    return json.dumps(payload)
+
+
+def raw_path(splitter):
+    """
+    Raw data path.  Pass the binary through and only decode the terminal text.
+    """
+    def process(data):
+        payload = {"port": "/dev/pts", "baud": 115200, "type": SerialSplitter.BINARY, "value": bytes(data)}
+        for data_type, value in splitter.add(data):
+            if data_type == SerialSplitter.TEXT:
+                splitter.decode(value)
+        return payload
+    return process
+
+
+def measure(process, stream, chunk_size):
+    """
+    Write the stream to a pseudo-terminal and process the data read from the other side.
+    :return: Bytes per second processed.
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+
+    def writer():
+        for i in range(0, len(stream), chunk_size):
+            os.write(master, stream[i:i + chunk_size])
+
+    thread = threading.Thread(target=writer)
+    start = time.perf_counter()
+    thread.start()
+
+    received = 0
+    while received < len(stream):
+        data = os.read(slave, 4096)
+        received += len(data)
+        process(data)
+
+    elapsed = time.perf_counter() - start
+    thread.join()
+    os.close(master)
+    os.close(slave)
+
+    return received / elapsed
+
+
+def main(argv):
+    num_ens = 2000
+    payload_size = 4000
+    try:
+        opts, args = getopt.getopt(argv, "hn:s:", [])
+    except getopt.GetoptError:
+        print('test_SerialThroughput.py -n <num ens> -s <payload size>')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print('test_SerialThroughput.py -n <num ens> -s <payload size>')
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-s"):
+            payload_size = int(arg)
+
+    stream = create_stream(num_ens, payload_size)
+
+    before = measure(decode_json_path, stream, 1024)
+    after = measure(raw_path(SerialSplitter()), stream, 1024)
+
+    # 10 bits per byte on the serial port
+    print("Decode+JSON path: {0:.1f} MB/s ({1:.0f} baud)".format(before / 1e6, before * 10))
+    print("Raw path:         {0:.1f} MB/s ({1:.0f} baud)".format(after / 1e6, after * 10))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import time
+import getopt
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Ensemble.EnsembleSerializer import EnsembleSerializer, _create_ens
+
+
+def run(name, func, count):
+    """
+    Run the function count times and print the average time and size.
+    :return: Average time in seconds and the JSON string.
+    """
+    json_str = func()
+    start = time.perf_counter()
+    for i in range(count):
+        json_str = func()
+    run_time = (time.perf_counter() - start) / count
+    print("{0:12}: {1:.3f} ms {2} bytes".format(name, run_time * 1000, len(json_str)))
+    return run_time, json_str
+
+
+def main(argv):
+    num_bins = 200
+    count = 200
+    usage = 'test_SerializerBenchmark.py -b <num bins> -n <count>'
+    try:
+        opts, args = getopt.getopt(argv, "hb:n:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-n"):
+            count = int(arg)
+
+    ens = _create_ens(num_bins, 4)
+    full = EnsembleSerializer()
+    rounded = EnsembleSerializer(round_floats=True)
+
+    json_time, json_str = run("json.dumps", lambda: json.dumps(ens, default=lambda o: o.__dict__), count)
+    full_time, full_str = run("Full floats", lambda: full.to_json(ens), count)
+    round_time, round_str = run("Rounded", lambda: rounded.to_json(ens), count)
+    print("Rounded speedup: {0:.1f}x".format(json_time / round_time))
+
+    assert full_str == json_str
+    assert json.loads(round_str)["GoodBeam"] == json.loads(json_str)["GoodBeam"]
+    assert len(round_str) < len(json_str)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
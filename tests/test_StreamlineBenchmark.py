@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import getopt
+import numpy as np
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../../')
+
+from rti_python.Plots.rti_sql_plot_mag_dir import streamlines
+
+
+def main(argv):
+    num_ens = 1000
+    num_bins = 200
+    noise = 0.3
+    usage = 'test_StreamlineBenchmark.py -n <num ens> -b <num bins> -s <noise m/s>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:s:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-s"):
+            noise = float(arg)
+
+    # Water flow with noise and some bad bins set to 0
+    x = np.arange(num_ens, dtype=float)
+    y = np.arange(num_bins, dtype=float)
+    X, Y = np.meshgrid(x / num_ens, y / num_bins)
+    east = np.cos(6 * Y) + 0.3 * np.sin(4 * X) + noise * np.random.standard_normal(X.shape)
+    north = 0.5 * np.sin(5 * X) + noise * np.random.standard_normal(X.shape)
+    bad = np.random.random(X.shape) < 0.05
+    east[bad] = 0.0
+    north[bad] = 0.0
+
+    for density in [1, 2]:
+        start = time.perf_counter()
+        xs, ys = streamlines(x, y, east, north, density=density)
+        elapsed = time.perf_counter() - start
+        print("{0} ens x {1} bins density {2}: {3} streamlines {4} points in {5:.3f} s".format(
+            num_ens, num_bins, density, len(xs), sum(len(sx) for sx in xs), elapsed))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
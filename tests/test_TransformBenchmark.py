@@ -0,0 +1,173 @@
+import os
+import sys
+import math
+import time
+import getopt
+import numpy as np
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Ensemble.Ensemble import Ensemble
+from Ensemble.EnsembleSeries import EnsembleSeries
+from Ensemble.Transform import transform, compare_velocity, earth_to_beam, to_bad_value
+
+
+def transform_loop(beam_vel, heading, pitch, roll, beam_angle=20.0):
+    """
+    Transform one ensemble and bin at a time.  4 beam solutions only.
+    """
+    a = 1.0 / (2.0 * math.sin(math.radians(beam_angle)))
+    b = 1.0 / (4.0 * math.cos(math.radians(beam_angle)))
+    d = a / math.sqrt(2.0)
+    earth = []
+    for ens in range(len(beam_vel)):
+        sh, ch = math.sin(math.radians(heading[ens])), math.cos(math.radians(heading[ens]))
+        sp, cp = math.sin(math.radians(pitch[ens])), math.cos(math.radians(pitch[ens]))
+        sr, cr = math.sin(math.radians(roll[ens])), math.cos(math.radians(roll[ens]))
+        bins = []
+        for bin_num in range(len(beam_vel[ens])):
+            b0, b1, b2, b3 = beam_vel[ens][bin_num]
+            if any(abs(vel - Ensemble.BadVelocity) < 1e-3 for vel in (b0, b1, b2, b3)):
+                bins.append([Ensemble.BadVelocity] * 4)
+                continue
+            x = a * (b0 - b1)
+            y = a * (b3 - b2)
+            z = b * (b0 + b1 + b2 + b3)
+            bins.append([x * (ch * cr + sh * sp * sr) + y * sh * cp + z * (ch * sr - sh * sp * cr),
+                         x * (-sh * cr + ch * sp * sr) + y * ch * cp + z * (-sh * sr - ch * sp * cr),
+                         -x * cp * sr + y * sp + z * cp * cr,
+                         d * (b0 + b1 - b2 - b3)])
+        earth.append(bins)
+    return earth
+
+
+def create_series(num_ens, num_bins, bad_fraction=0.01):
+    """
+    Create a deployment with the earth velocities the ADCP would give.
+    The velocities are stored as 32 bit floats like the ensembles.
+    """
+    rng = np.random.RandomState(0)
+    series = EnsembleSeries(num_ens, num_bins)
+    series.ens_num = np.arange(1, num_ens + 1, dtype=float)
+    series.heading = rng.uniform(0.0, 360.0, num_ens)
+    series.pitch = rng.uniform(-15.0, 15.0, num_ens)
+    series.roll = rng.uniform(-15.0, 15.0, num_ens)
+    series.first_bin_range = np.full(num_ens, 1.0)
+    series.bin_size = np.full(num_ens, 0.5)
+
+    earth = rng.uniform(-2.0, 2.0, (num_ens, num_bins, 4))
+    earth[..., 3] = 0.0
+    beam = earth_to_beam(earth, series.heading, series.pitch, series.roll)
+    bad = rng.uniform(size=beam.shape) < bad_fraction
+    beam[bad] = Ensemble.BadVelocity
+    series.beam_vel = beam.astype(np.float32).astype(float)
+
+    # ADCP only gives the 4 beam solutions
+    earth[bad.any(axis=-1)] = Ensemble.BadVelocity
+    series.earth_vel = earth.astype(np.float32).astype(float)
+    return series
+
+
+def read_file(file_path):
+    """
+    Decode all the ensembles in the file.
+    """
+    from Codecs.AdcpCodec import AdcpCodec
+    from Codecs.CompressedEnsFile import open_ens_file
+
+    ensembles = []
+    codec = AdcpCodec()
+    codec.EnsembleEvent += lambda sender, ens: ensembles.append(ens)
+    f = open_ens_file(file_path)
+    data = f.read(4096)
+    while len(data) > 0:
+        codec.add(data)
+        data = f.read(4096)
+    f.close()
+    return ensembles
+
+
+def best_time(func, repeat=3):
+    """
+    Best time of the runs.  The first run also allocates the arrays.
+    :return: Time in seconds, Result of the last run.
+    """
+    times = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def print_compare(name, stats):
+    print("{0}: {1} values  RMS {2}  max {3}  within tolerance {4:.2%}  bad mismatch {5}".format(
+        name, stats['count'], np.round(stats['rms'], 4), np.round(stats['max'], 4), stats['within'], stats['bad_mismatch']))
+
+
+def main(argv):
+    num_ens = 10000
+    num_bins = 50
+    file_path = None
+    declination = 0.0
+    usage = 'test_TransformBenchmark.py -n <num ens> -b <num bins> -f <ensemble file> -d <declination>'
+    try:
+        opts, args = getopt.getopt(argv, "hn:b:f:d:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n"):
+            num_ens = int(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-f"):
+            file_path = arg
+        elif opt in ("-d"):
+            declination = float(arg)
+
+    if file_path:
+        # Validate against the velocities the ADCP calculated
+        start = time.perf_counter()
+        series = EnsembleSeries.from_ensembles(read_file(file_path))
+        print("Read {0} ensembles in {1:.2f} s".format(series.num_ens, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        instr, earth = transform(series, declination=declination, three_beam=False)
+        print("Transform: {0:.3f} s".format(time.perf_counter() - start))
+        print_compare("Instrument", compare_velocity(instr, series.instr_vel))
+        print_compare("Earth", compare_velocity(earth, series.earth_vel))
+        return
+
+    series = create_series(num_ens, num_bins)
+
+    start = time.perf_counter()
+    loop = transform_loop(series.beam_vel.tolist(), series.heading, series.pitch, series.roll)
+    loop_time = time.perf_counter() - start
+
+    vector_time, (instr, earth) = best_time(lambda: transform(series, three_beam=False))
+
+    assert np.allclose(to_bad_value(earth), loop, atol=1e-9)
+    stats = compare_velocity(earth, series.earth_vel)
+    assert stats['bad_mismatch'] == 0
+    assert stats['within'] == 1.0
+
+    print("{0} ens x {1} bins: loop {2:.3f} s  vectorized {3:.4f} s  speedup {4:.0f}x".format(
+        num_ens, num_bins, loop_time, vector_time, loop_time / vector_time))
+    print_compare("Earth", stats)
+
+    three_beam_time, (instr, earth) = best_time(lambda: transform(series))
+    print("3 beam solutions: {0:.4f} s  {1} more good values".format(
+        three_beam_time, int((~np.isnan(earth)).sum()) - stats['count']))
+
+    for method in ['nearest', 'linear']:
+        map_time, result = best_time(lambda: transform(series, bin_mapping=method))
+        print("Bin mapping {0}: {1:.4f} s".format(method, map_time))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
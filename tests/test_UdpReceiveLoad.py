@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import json
+import socket
+import getopt
+import threading
+import multiprocessing
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + '/../')
+
+from Comm.EnsembleReceiver import EnsembleReceiver
+
+DATASETS = ["E000008", "E000001", "E000002", "E000003", "E000004", "E000005"]
+
+
+def create_dataset(ens_num, name, num_bins):
+    """
+    Create a JSON dataset like BinaryCodecUdp sends.
+    """
+    data = [[0.123 * bin_num + beam for beam in range(4)] for bin_num in range(num_bins)]
+    return (json.dumps({"EnsembleNumber": ens_num, "Name": name, "NumElements": num_bins, "Data": data}) + "\n").encode()
+
+
+def sender_process(port, rate, duration, num_bins, sent):
+    """
+    Send the datasets at the rate in datagrams per second.
+    """
+    payloads = [create_dataset(1, name, num_bins) for name in DATASETS]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    count = 0
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end:
+        # Send the datagrams that are due, then sleep
+        due = int((now - start) * rate)
+        while count < due:
+            sock.sendto(payloads[count % len(payloads)], ("127.0.0.1", port))
+            count += 1
+        time.sleep(0.001)
+        now = time.perf_counter()
+    sock.close()
+    sent.value = count
+
+
+def busy_wait(work):
+    """
+    Simulate the time to process a dataset.
+    """
+    end = time.perf_counter() + work
+    while time.perf_counter() < end:
+        pass
+
+
+class LoadReceiver(EnsembleReceiver):
+    """
+    Count the datasets received.
+    """
+
+    def __init__(self, work):
+        EnsembleReceiver.__init__(self)
+        self.work = work
+        self.count = 0
+
+    def process(self, json_data):
+        self.count += 1
+        busy_wait(self.work)
+
+
+def run_batched(port, work, stop):
+    """
+    Receive with the batched EnsembleReceiver.
+    :return: Datasets received.
+    """
+    receiver = LoadReceiver(work)
+    thread = threading.Thread(target=receiver.connect, args=(port,))
+    thread.start()
+    stop.wait()
+    receiver.close()
+    thread.join()
+    return receiver.count
+
+
+def run_readline(port, work, stop):
+    """
+    Receive one datagram at a time with readline() and the default receive buffer.
+    :return: Datasets received.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.5)
+    sock.bind(('', port))
+    file_socket = sock.makefile()
+    count = 0
+    while not stop.is_set():
+        try:
+            json.loads(file_socket.readline())
+            count += 1
+            busy_wait(work)
+        except (socket.timeout, OSError, ValueError):
+            continue
+    sock.close()
+    return count
+
+
+def run(receive, port, rate, duration, num_bins, work):
+    """
+    Send at the rate and count the datasets received.
+    :return: (Sent, Received)
+    """
+    stop = threading.Event()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(receive(port, work, stop)))
+    thread.start()
+    time.sleep(0.2)
+
+    sent = multiprocessing.Value('i', 0)
+    sender = multiprocessing.Process(target=sender_process, args=(port, rate, duration, num_bins, sent))
+    sender.start()
+    sender.join()
+
+    # Let the receiver finish the data buffered
+    time.sleep(1.0)
+    stop.set()
+    thread.join()
+    return sent.value, result[0]
+
+
+def main(argv):
+    port = 55099
+    duration = 3.0
+    num_bins = 30
+    work = 0.00002
+    rates = [1000, 5000, 10000, 20000, 40000]
+    usage = 'test_UdpReceiveLoad.py -p <port> -d <seconds per rate> -b <num bins> -w <seconds of work per dataset> -r <rate,rate,...>'
+    try:
+        opts, args = getopt.getopt(argv, "hp:d:b:w:r:", [])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-p"):
+            port = int(arg)
+        elif opt in ("-d"):
+            duration = float(arg)
+        elif opt in ("-b"):
+            num_bins = int(arg)
+        elif opt in ("-w"):
+            work = float(arg)
+        elif opt in ("-r"):
+            rates = [int(rate) for rate in arg.split(",")]
+
+    print("Datagram: {0} bytes  Work: {1} us  CPUs: {2}".format(
+        len(create_dataset(1, "E000001", num_bins)), work * 1e6, os.cpu_count()))
+    for rate in rates:
+        for name, receive in [("readline", run_readline), ("batched", run_batched)]:
+            sent, received = run(receive, port, rate, duration, num_bins, work)
+            loss = 100.0 * (sent - received) / sent if sent else 0.0
+            print("{0:6} dgram/s {1:9}: sent {2:7}  received {3:7}  loss {4:6.2f} %".format(
+                rate, name, sent, received, loss))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])